@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from django.db import models as m
+from django.db.models.signals import post_save, post_delete
 from django_extensions.db.fields import UUIDField
 from django.contrib.auth.models import (
     AbstractBaseUser, BaseUserManager, PermissionsMixin)
@@ -1958,3 +1959,19 @@ class DbWorkflowStep(m.Model):
     def __str__(self):
         return "Step {} for workflow {} [{}]".format(self.name,
                                                      self.parent.module_class, self.parent.pk)
+
+
+def _bump_computers_version(sender, **kwargs):
+    """
+    Store a new version of the computers and the authinfos (see
+    aiida.backends.utils.get_computers_version) whenever any of them is
+    saved or deleted.
+    """
+    from aiida.backends.utils import bump_computers_version
+
+    bump_computers_version()
+
+
+for _model in [DbComputer, DbAuthInfo]:
+    post_save.connect(_bump_computers_version, sender=_model)
+    post_delete.connect(_bump_computers_version, sender=_model)
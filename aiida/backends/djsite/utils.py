@@ -1,11 +1,10 @@
 # -*- coding: utf-8 -*-
 
-import logging
 import os
 
 import django
 
-from aiida.utils.logger import get_dblogger_extra
+from aiida.utils.logger import get_dblogger_extra, BufferedDBLogHandler
 
 __copyright__ = u"Copyright (c), This file is part of the AiiDA platform. For further information please visit http://www.aiida.net/. All rights reserved."
 __license__ = "MIT license, see LICENSE.txt file."
@@ -45,26 +44,31 @@ def _load_dbenv_noschemacheck(process, profile):
     django.setup()
 
 
-class DBLogHandler(logging.Handler):
-    def emit(self, record):
+class DBLogHandler(BufferedDBLogHandler):
+    """
+    Stores the log records in the DbLog table with Django, see
+    BufferedDBLogHandler.
+    """
+
+    def _store_rows(self, rows):
         from django.core.exceptions import ImproperlyConfigured
 
         try:
             from aiida.backends.djsite.db.models import DbLog
 
-            DbLog.add_from_logrecord(record)
+            DbLog.objects.bulk_create([DbLog(**row) for row in rows])
 
         except ImproperlyConfigured:
             # Probably, the logger was called without the
             # Django settings module loaded. Then,
             # This ignore should be a no-op.
             pass
-        except Exception:
-            # To avoid loops with the error handler, I just print.
-            # Hopefully, though, this should not happen!
-            import traceback
 
-            traceback.print_exc()
+    def _worker_finished(self):
+        # Django opens a connection per thread
+        from django.db import connection
+
+        connection.close()
 
 
 def get_log_messages(obj):
@@ -108,18 +112,18 @@ def set_daemon_user(user_email):
                        description="The only user that is allowed to run the "
                                    "AiiDA daemon on this DB instance")
 
+# The default user, as a tuple (email, DbUser)
 _aiida_autouser_cache = None
 
 
 def get_automatic_user():
     """
     Return the default user for this installation of AiiDA.
+
+    The user is cached until the email configured for the profile changes.
     """
     global _aiida_autouser_cache
 
-    if _aiida_autouser_cache is not None:
-        return _aiida_autouser_cache
-
     from django.core.exceptions import ObjectDoesNotExist
     from aiida.backends.djsite.db.models import DbUser
     from aiida.common.exceptions import ConfigurationError
@@ -127,9 +131,14 @@ def get_automatic_user():
 
     email = get_configured_user_email()
 
+    if (_aiida_autouser_cache is not None and
+            _aiida_autouser_cache[0] == email):
+        return _aiida_autouser_cache[1]
+
     try:
-        _aiida_autouser_cache = DbUser.objects.get(email=email)
-        return _aiida_autouser_cache
+        dbuser = DbUser.objects.get(email=email)
+        _aiida_autouser_cache = (email, dbuser)
+        return dbuser
     except ObjectDoesNotExist:
         raise ConfigurationError("No aiida user with email {}".format(
             email))
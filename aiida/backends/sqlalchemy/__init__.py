@@ -6,4 +6,20 @@ __license__ = "MIT license, see LICENSE.txt file."
 __authors__ = "The AiiDA team."
 __version__ = "0.7.1"
 
+# The session of the database environment, set by load_dbenv. It is normally
+# a scoped_session, i.e. a proxy to a different session for each thread (see
+# get_current_session).
 session = None
+
+
+def get_current_session():
+    """
+    Return the session of the current thread (or the session of the database
+    environment, if it is not a scoped_session), or None if the database
+    environment is not loaded.
+    """
+    from sqlalchemy.orm import scoped_session
+
+    if isinstance(session, scoped_session):
+        return session()
+    return session
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
-from sqlalchemy import orm
+from sqlalchemy import inspect, orm
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm.exc import UnmappedClassError
 
@@ -28,7 +28,8 @@ class _QueryProperty(object):
             mapper = orm.class_mapper(_type)
             if mapper:
                 return self.query_class(
-                    mapper, session=aiida.backends.sqlalchemy.session)
+                    mapper,
+                    session=aiida.backends.sqlalchemy.get_current_session())
         except UnmappedClassError:
             return None
 
@@ -63,11 +64,34 @@ class Model(object):
     session = _SessionProperty()
 
     def save(self, commit=True):
+        self._attach_related()
         self.session.add(self)
         if commit:
             self.session.commit()
         return self
 
+    def _attach_related(self):
+        """
+        Replace the objects referenced by this one that belong to the session
+        of another thread (e.g. the user of a node created in another thread)
+        with the same objects in the session of the current thread, which
+        otherwise refuses to add this one.
+        """
+        session = aiida.backends.sqlalchemy.get_current_session()
+        state = inspect(self)
+        for relationship in state.mapper.relationships:
+            if relationship.uselist:
+                continue
+            related = state.dict.get(relationship.key)
+            if related is None:
+                continue
+            related_state = inspect(related)
+            if (related_state.key is not None and
+                    related_state.session is not None and
+                    related_state.session is not session):
+                setattr(self, relationship.key, session.query(
+                    type(related)).get(related_state.identity))
+
     def delete(self, commit=True):
         self.session.delete(self)
         if commit:
@@ -2,6 +2,8 @@
 
 import json
 
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from sqlalchemy.schema import Column
 from sqlalchemy.types import Integer, String, Boolean, Text
 from sqlalchemy.orm import relationship, backref
@@ -103,3 +105,40 @@ class DbComputer(Base):
             return "{} ({})".format(self.name, self.hostname)
         else:
             return "{} ({}) [DISABLED]".format(self.name, self.hostname)
+
+
+def _bump_computers_version(session, flush_context, instances):
+    """
+    Store a new version of the computers and the authinfos (see
+    aiida.backends.utils.get_computers_version) in the same flush as the
+    changes of any of them.
+    """
+    import uuid
+    from pytz import UTC
+    from sqlalchemy.orm.attributes import flag_modified
+    from aiida.backends.sqlalchemy.models.authinfo import DbAuthInfo
+    from aiida.backends.sqlalchemy.models.settings import DbSetting
+    from aiida.backends.utils import COMPUTERS_VERSION_SETTING
+    from aiida.utils import timezone
+
+    classes = (DbComputer, DbAuthInfo)
+    changed = (any(isinstance(obj, classes)
+                   for obj in list(session.new) + list(session.deleted)) or
+               any(isinstance(obj, classes) and session.is_modified(obj)
+                   for obj in session.dirty))
+    if not changed:
+        return
+
+    # Not with DbSetting.set_value, that commits
+    setting = session.query(DbSetting).filter_by(
+        key=COMPUTERS_VERSION_SETTING).first()
+    if setting is None:
+        setting = DbSetting(key=COMPUTERS_VERSION_SETTING)
+        session.add(setting)
+    setting.val = uuid.uuid4().hex
+    setting.description = "Changed whenever a computer or an authinfo is saved"
+    setting.time = timezone.datetime.now(tz=UTC)
+    flag_modified(setting, "val")
+
+
+event.listen(Session, 'before_flush', _bump_computers_version)
@@ -165,3 +165,92 @@ class TestSessionSqla(AiidaTestCase):
         code.store()
 
         self.drop_connection()
+
+    def test_scoped_session(self):
+        """
+        With a scoped_session, each thread uses its own session, also for the
+        queries of the models, and remove_session replaces the session of
+        the current thread only.
+        """
+        import threading
+
+        from aiida.backends.sqlalchemy import get_current_session
+        from aiida.backends.sqlalchemy.models.user import DbUser
+        from aiida.backends.sqlalchemy.utils import (get_scoped_session,
+                                                     remove_session)
+
+        old_session = aiida.backends.sqlalchemy.session
+        aiida.backends.sqlalchemy.session = get_scoped_session(
+            bind=self._AiidaTestCase__backend_instance.connection)
+        try:
+            main_session = get_current_session()
+            self.assertIs(DbUser.query.session, main_session)
+
+            thread_sessions = []
+
+            def get_thread_session():
+                thread_sessions.append(DbUser.query.session)
+                remove_session()
+
+            thread = threading.Thread(target=get_thread_session)
+            thread.start()
+            thread.join()
+            self.assertIsNot(thread_sessions[0], main_session)
+            # The session of the main thread is not affected by the other one
+            self.assertIs(get_current_session(), main_session)
+
+            remove_session()
+            self.assertIsNot(get_current_session(), main_session)
+        finally:
+            remove_session()
+            aiida.backends.sqlalchemy.session = old_session
+
+    def test_store_in_other_thread(self):
+        """
+        Nodes created in a thread can be stored and linked by another thread
+        (as done by the workers of the MultithreadedEngine), in its own
+        session.
+        """
+        import threading
+
+        from aiida.backends.sqlalchemy.utils import (get_scoped_session,
+                                                     remove_session)
+        from aiida.common.links import LinkType
+        from aiida.orm import load_node
+        from aiida.orm.node import Node
+
+        old_session = aiida.backends.sqlalchemy.session
+        aiida.backends.sqlalchemy.session = get_scoped_session(
+            bind=self._AiidaTestCase__backend_instance.connection)
+        try:
+            # Created in the main thread, with the user of its session
+            parent = Node()
+            child = Node()
+            parent_uuid = parent.uuid
+
+            pks = []
+            errors = []
+
+            def store_and_link():
+                try:
+                    parent.store()
+                    child.add_link_from(parent, label='input',
+                                        link_type=LinkType.CREATE)
+                    child.store()
+                    pks.append(child.pk)
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    remove_session()
+
+            thread = threading.Thread(target=store_and_link)
+            thread.start()
+            thread.join()
+            self.assertEquals(errors, [])
+
+            inputs = load_node(pks[0]).get_inputs(also_labels=True)
+            self.assertEquals([(label, node.uuid) for label, node in inputs],
+                              [('input', parent_uuid)])
+        finally:
+            remove_session()
+            aiida.backends.sqlalchemy.session = old_session
@@ -24,16 +24,18 @@ from dateutil import parser
 import re
 
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 
 from aiida.common.exceptions import InvalidOperation, ConfigurationError
-from aiida.common.setup import (get_profile_config, DEFAULT_USER_CONFIG_FIELD)
+from aiida.common.setup import (get_profile_config, get_property,
+                                DEFAULT_USER_CONFIG_FIELD)
 
 from aiida.backends import sqlalchemy, settings
 from aiida.backends.utils import check_schema_version
 
 from aiida.backends.profile import (is_profile_loaded,
                                     load_profile)
+from aiida.utils.logger import BufferedDBLogHandler
 
 
 # def is_dbenv_loaded():
@@ -58,15 +60,46 @@ def get_session(engine=None, expire_on_commit=True):
     return Session()
 
 
+def get_scoped_session(bind=None, expire_on_commit=True):
+    """
+    :param bind: the engine (or connection) that will be used by the
+        sessionmaker
+    :param expire_on_commit: should the sessions expire on commits?
+
+    :returns: A sqlalchemy scoped_session, i.e. a proxy to a different
+        session for each thread. The session of a thread is created when it
+        is first used, and closed by remove_session.
+    """
+    return scoped_session(sessionmaker(bind=bind,
+                                       expire_on_commit=expire_on_commit))
+
+
+def remove_session():
+    """
+    Close the session of the current thread (returning its connection to the
+    pool), so that a new one is created when it is used again. The objects
+    loaded by the session are detached from it.
+    """
+    if isinstance(sqlalchemy.session, scoped_session):
+        sqlalchemy.session.remove()
+
+
 def get_engine(config):
     engine_url = (
         "postgresql://{AIIDADB_USER}:{AIIDADB_PASS}@"
         "{AIIDADB_HOST}:{AIIDADB_PORT}/{AIIDADB_NAME}"
     ).format(**config)
 
-    engine = create_engine(engine_url,
-                           json_serializer=dumps_json,
-                           json_deserializer=loads_json)
+    # Every thread uses its own session, and therefore its own connection
+    # of the pool
+    engine = create_engine(
+        engine_url,
+        json_serializer=dumps_json,
+        json_deserializer=loads_json,
+        pool_size=get_property('sqlalchemy.pool_size'),
+        max_overflow=get_property('sqlalchemy.pool_max_overflow'),
+        pool_timeout=get_property('sqlalchemy.pool_timeout'),
+        pool_recycle=get_property('sqlalchemy.pool_recycle'))
 
     return engine
 
@@ -108,32 +141,112 @@ def _load_dbenv_noschemacheck(process=None, profile=None, connection=None):
 
     if not connection:
         engine = get_engine(config)
-        sqlalchemy.session = get_session(engine=engine)
+        sqlalchemy.session = get_scoped_session(bind=engine)
     else:
-        Session = sessionmaker()
-        sqlalchemy.session = Session(bind=connection)
+        engine = connection.engine
+        sqlalchemy.session = get_scoped_session(bind=connection)
+
+    _add_dblog_handler(engine)
+
+
+class DBLogHandler(BufferedDBLogHandler):
+    """
+    Stores the log records in the DbLog table with SQLAlchemy, see
+    BufferedDBLogHandler.
 
+    The background thread uses its own session on the given engine, so that
+    it never goes through the scoped session of the database environment.
+    """
+
+    def __init__(self, engine, *args, **kwargs):
+        """
+        :param engine: the engine of the database environment
+        """
+        super(DBLogHandler, self).__init__(*args, **kwargs)
+        self._engine = engine
+        self._session = None
+        self._insert = None
+
+    def _get_insert(self):
+        from sqlalchemy import bindparam, cast, Text
+        from sqlalchemy.dialects.postgresql import JSONB
+        from aiida.backends.sqlalchemy.models.log import DbLog
+
+        # The metadata is already serialized: it is cast rather than being
+        # serialized again by the JSONB type
+        columns = ['time', 'loggername', 'levelname', 'objname', 'objpk',
+                   'message']
+        values = {c: bindparam('b_' + c) for c in columns}
+        values['metadata'] = cast(bindparam('b_metadata', type_=Text), JSONB)
+        return DbLog.__table__.insert().values(**values)
+
+    def _store_rows(self, rows):
+        if self._session is None:
+            self._session = get_session(engine=self._engine)
+            self._insert = self._get_insert()
+
+        try:
+            self._session.execute(
+                self._insert,
+                [{'b_' + k: v for k, v in row.iteritems()} for row in rows])
+            self._session.commit()
+        except Exception:
+            self._session.rollback()
+            raise
+
+    def _worker_finished(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+def _add_dblog_handler(engine):
+    """
+    Attach a DBLogHandler to the aiida logger, unless there is one already.
+
+    :param engine: the engine on which the log records are stored
+    """
+    from aiida.common import aiidalogger
+
+    if any(isinstance(h, DBLogHandler) for h in aiidalogger.handlers):
+        return
+    aiidalogger.addHandler(
+        DBLogHandler(engine, level=get_property('logging.db_loglevel')))
+
+# The default user, as a tuple (email, id of the DbUser). The id rather than
+# the DbUser is cached, since the DbUser belongs to a session.
 _aiida_autouser_cache = None
 
 
 def get_automatic_user():
-    from aiida.common.utils import get_configured_user_email
-    # global _aiida_autouser_cache
+    """
+    Return the default user for this installation of AiiDA.
 
-    # if _aiida_autouser_cache is not None:
-    #     return _aiida_autouser_cache
+    The id of the user is cached until the email configured for the profile
+    changes, so that the user is loaded without queries if it is already in
+    the session.
+    """
+    global _aiida_autouser_cache
 
     from aiida.backends.sqlalchemy.models.user import DbUser
     from aiida.common.utils import get_configured_user_email
     
     email = get_configured_user_email()
 
-    _aiida_autouser_cache = DbUser.query.filter(DbUser.email == email).first()
+    if (_aiida_autouser_cache is not None and
+            _aiida_autouser_cache[0] == email):
+        dbuser = DbUser.query.get(_aiida_autouser_cache[1])
+        # The user may have been deleted in the meantime
+        if dbuser is not None and dbuser.email == email:
+            return dbuser
+
+    dbuser = DbUser.query.filter(DbUser.email == email).first()
 
-    if not _aiida_autouser_cache:
+    if not dbuser:
         raise ConfigurationError("No aiida user with email {}".format(
             email))
-    return _aiida_autouser_cache
+    _aiida_autouser_cache = (email, dbuser.id)
+    return dbuser
 
 
 def get_daemon_user():
@@ -61,6 +61,12 @@ class TestBackupScriptUnit(AiidaTestCase):
         '"days_to_backup": null, ' \
         '"backup_dir": "/scratch/./aiida_user////backup//"}'
 
+    _json_test_input_7 = '{"backup_length_threshold": 2, "periodicity": 2,' + \
+        ' "oldest_object_backedup": "2014-07-18 13:54:53.688484+00:00", ' + \
+        '"end_date_of_backup": null, "days_to_backup": null, "backup_dir": ' +\
+        '"/scratch/aiida_user/backupScriptDest", "workers": 8, ' + \
+        '"compare_hashes": true}'
+
     def setUp(self):
         super(TestBackupScriptUnit, self).setUp()
         if not is_dbenv_loaded():
@@ -264,6 +270,76 @@ class TestBackupScriptUnit(AiidaTestCase):
 
         self.check_full_deserialization_serialization(input_string, backup_inst)
 
+    def test_full_deserialization_serialization_5(self):
+        """
+        This method tests the correct deserialization / serialization of the
+        variables that should be stored in a file, with the optional
+        variables.
+        """
+        input_string = self._json_test_input_7
+        backup_inst = self._backup_setup_inst
+
+        self.check_full_deserialization_serialization(input_string, backup_inst)
+        self.assertEqual(backup_inst._workers, 8)
+        self.assertTrue(backup_inst._compare_hashes)
+
+    def test_incremental_directory_backup(self):
+        """
+        This method tests that the backup of a directory only copies the
+        changed files, and removes from the backup what is no longer in the
+        repository.
+        """
+        import os
+        from aiida.common.additions.backup_script.backup_base import (
+            BackupManifest, _scan_directory, _sync_directory)
+        from aiida.common.utils import are_dir_trees_equal
+
+        temp_folder = tempfile.mkdtemp()
+        try:
+            source_dir = os.path.join(temp_folder, u"source")
+            dest_dir = os.path.join(temp_folder, u"dest")
+            os.makedirs(os.path.join(source_dir, "path", "sub"))
+            for name in ["a", "b", os.path.join("sub", "c")]:
+                with open(os.path.join(source_dir, "path", name), 'w') as f:
+                    f.write(name)
+            os.symlink("a", os.path.join(source_dir, "path", "link"))
+
+            (entry, copied) = _sync_directory(
+                source_dir, dest_dir, _scan_directory(dest_dir), False)
+            self.assertEqual(copied, 3)
+            self.assertTrue(are_dir_trees_equal(source_dir, dest_dir))
+            self.assertEqual(entry, _scan_directory(dest_dir))
+
+            # Nothing changed
+            (entry, copied) = _sync_directory(
+                source_dir, dest_dir, entry, False)
+            self.assertEqual(copied, 0)
+
+            # A file bigger, a file removed, a directory replaced by a file
+            with open(os.path.join(source_dir, "path", "a"), 'a') as f:
+                f.write("more")
+            os.remove(os.path.join(source_dir, "path", "b"))
+            shutil.rmtree(os.path.join(source_dir, "path", "sub"))
+            with open(os.path.join(source_dir, "path", "sub"), 'w') as f:
+                f.write("sub")
+            (entry, copied) = _sync_directory(
+                source_dir, dest_dir, entry, False)
+            self.assertEqual(copied, 2)
+            self.assertTrue(are_dir_trees_equal(source_dir, dest_dir))
+            self.assertTrue(os.path.islink(
+                os.path.join(dest_dir, "path", "link")))
+
+            # The entries survive a round trip through the manifest
+            manifest = BackupManifest(os.path.join(temp_folder, "manifest"))
+            manifest.set("node", entry)
+            manifest.close()
+            manifest = BackupManifest(os.path.join(temp_folder, "manifest"))
+            self.assertEqual(manifest.get("node"), entry)
+            self.assertIsNone(manifest.get("other_node"))
+            manifest.close()
+        finally:
+            shutil.rmtree(temp_folder, ignore_errors=True)
+
     def test_timezone_addition_and_dir_correction(self):
         """
         This method tests if the timezone is added correctly to timestamps
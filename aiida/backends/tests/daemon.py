@@ -0,0 +1,664 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the daemon: the cache of the computers metadata, the submission,
+update and kill of the calculations, and the metrics.
+"""
+from aiida.backends.testbase import AiidaTestCase
+
+__copyright__ = u"Copyright (c), This file is part of the AiiDA platform. For further information please visit http://www.aiida.net/. All rights reserved."
+__license__ = "MIT license, see LICENSE.txt file."
+__version__ = "0.7.1"
+__authors__ = "The AiiDA team."
+
+
+class TestDaemonMetadataCache(AiidaTestCase):
+
+    def test_invalidation(self):
+        from aiida.orm import Computer
+        from aiida.backends.utils import get_computers_version
+        from aiida.daemon.metadatacache import DaemonMetadataCache
+
+        new_comp = Computer(name='bbb',
+                            hostname='bbb',
+                            transport_type='local',
+                            scheduler_type='pbspro',
+                            workdir='/tmp/aiida')
+        new_comp.store()
+
+        cache = DaemonMetadataCache()
+        cache.refresh()
+        version = get_computers_version()
+        scheduler = cache.get_scheduler(new_comp.dbcomputer)
+        self.assertEquals(scheduler.__class__.__name__, 'PbsproScheduler')
+        # The same class is returned, with a new instance
+        other_scheduler = cache.get_scheduler(new_comp.dbcomputer)
+        self.assertIs(other_scheduler.__class__, scheduler.__class__)
+        self.assertIsNot(other_scheduler, scheduler)
+
+        # Any change of a computer changes the version, and clears the cache
+        new_comp.set_scheduler_type('slurm')
+        self.assertNotEquals(get_computers_version(), version)
+        cache.refresh()
+        scheduler = cache.get_scheduler(new_comp.dbcomputer)
+        self.assertEquals(scheduler.__class__.__name__, 'SlurmScheduler')
+
+        # Also a new authinfo, but not reading the computers
+        from aiida.backends.utils import get_automatic_user
+        version = get_computers_version()
+        Computer.get(new_comp.pk).get_scheduler_type()
+        self.assertEquals(get_computers_version(), version)
+        _configure_computer(new_comp, get_automatic_user())
+        self.assertNotEquals(get_computers_version(), version)
+
+    def test_new_session(self):
+        """
+        When the session of the cached authinfos and codes is gone (e.g. at
+        the end of a daemon task), they are loaded again by id, and the
+        other cached values are kept.
+        """
+        from aiida.orm import Code, Computer, User
+        from aiida.backends.utils import get_automatic_user
+        from aiida.daemon.metadatacache import DaemonMetadataCache
+
+        new_comp = Computer(name='ccc',
+                            hostname='ccc',
+                            transport_type='local',
+                            scheduler_type='direct',
+                            workdir='/tmp/aiida')
+        new_comp.store()
+        dbuser = get_automatic_user()
+        _configure_computer(new_comp, dbuser)
+        code = Code(remote_computer_exec=(new_comp, '/bin/true'))
+        code.store()
+
+        cache = DaemonMetadataCache()
+        cache.refresh()
+        authinfo = cache.get_authinfo(new_comp, User(dbuser=dbuser))
+        cache.get_transport(authinfo)
+        cached_code = cache.get_code(code.uuid)
+        transports = dict(cache._transports)
+
+        cache._clear_session_objects()
+        self.assertEquals(
+            cache.get_authinfo(new_comp, User(dbuser=dbuser)).id, authinfo.id)
+        self.assertEquals(cache.get_code(code.uuid).pk, cached_code.pk)
+        self.assertEquals(cache._transports, transports)
+
+
+def _configure_computer(computer, dbuser):
+    """
+    Create the authinfo of the user for the computer, with no parameters.
+    """
+    from aiida.backends.settings import BACKEND
+    from aiida.backends.profile import BACKEND_DJANGO, BACKEND_SQLA
+
+    if BACKEND == BACKEND_DJANGO:
+        from aiida.backends.djsite.db.models import DbAuthInfo
+    elif BACKEND == BACKEND_SQLA:
+        from aiida.backends.sqlalchemy.models.authinfo import DbAuthInfo
+    else:
+        raise Exception("Unknown backend {}".format(BACKEND))
+
+    authinfo = DbAuthInfo(dbcomputer=computer.dbcomputer, aiidauser=dbuser)
+    authinfo.set_auth_params({})
+    authinfo.save()
+
+
+class TestKillCalculations(AiidaTestCase):
+
+    def test_kill_calculations(self):
+        """
+        The jobs of the calculations of a computer are killed with a single
+        kill command, and kill raises the errors that kill_calculations
+        reports for each calculation.
+        """
+        import subprocess
+        from aiida.orm import Code, Computer
+        from aiida.orm.calculation.job import kill_calculations
+        from aiida.backends.utils import get_automatic_user
+        from aiida.common.datastructures import calc_states
+        from aiida.common.exceptions import (InvalidOperation,
+                                             RemoteOperationError)
+
+        computer = Computer(name='kill', hostname='localhost',
+                            transport_type='local', scheduler_type='direct',
+                            workdir='/tmp/aiida')
+        computer.store()
+        _configure_computer(computer, get_automatic_user())
+        code = Code(remote_computer_exec=(computer, '/bin/true'))
+        code.store()
+
+        def new_calc(state=None, job_id=None):
+            calc = code.new_calc()
+            calc.set_resources({"num_machines": 1,
+                                "num_mpiprocs_per_machine": 1})
+            calc.store_all()
+            if job_id is not None:
+                calc._set_state(calc_states.SUBMITTING)
+                calc._set_job_id(job_id)
+            if state is not None:
+                calc._set_state(state)
+            return calc
+
+        processes = [subprocess.Popen(['sleep', '60']) for _ in range(2)]
+        gone = subprocess.Popen(['true'])
+        gone.wait()
+        try:
+            new = new_calc()
+            running = [new_calc(calc_states.WITHSCHEDULER, p.pid)
+                       for p in processes]
+            finished = new_calc(calc_states.FINISHED)
+
+            results = kill_calculations([new, finished] + running)
+            self.assertIsNone(results[new.pk])
+            self.assertEquals(new.get_state(), calc_states.FAILED)
+            self.assertIsInstance(results[finished.pk], InvalidOperation)
+            for calc, process in zip(running, processes):
+                self.assertIsNone(results[calc.pk])
+                self.assertEquals(process.wait(), -15)
+
+            with self.assertRaises(InvalidOperation):
+                finished.kill()
+            with self.assertRaises(RemoteOperationError):
+                new_calc(calc_states.WITHSCHEDULER, gone.pid).kill()
+        finally:
+            for process in processes:
+                if process.poll() is None:
+                    process.kill()
+
+
+class TestUploadCalc(AiidaTestCase):
+
+    def test_copy_from_other_computer(self):
+        """
+        The remote_copy_list entries on another computer are copied by
+        stage_calc into the working directory of the calculation.
+        """
+        import os
+        import shutil
+        import tempfile
+        from aiida.orm import Code, Computer, DataFactory, User
+        from aiida.backends.utils import get_automatic_user
+        from aiida.common.datastructures import calc_states
+        from aiida.daemon.execmanager import upload_calc, stage_calc
+        from aiida.daemon.metadatacache import metadata_cache
+
+        ParameterData = DataFactory('parameter')
+        RemoteData = DataFactory('remote')
+
+        workdir = tempfile.mkdtemp()
+        other_workdir = tempfile.mkdtemp()
+        try:
+            dbuser = get_automatic_user()
+            computers = []
+            for name, folder in [('upload-dest', workdir),
+                                 ('upload-source', other_workdir)]:
+                computer = Computer(name=name, hostname='localhost',
+                                    transport_type='local',
+                                    scheduler_type='direct',
+                                    workdir=folder)
+                computer.store()
+                _configure_computer(computer, dbuser)
+                computers.append(computer)
+            computer, other_computer = computers
+
+            source = os.path.join(other_workdir, 'source')
+            os.mkdir(source)
+            with open(os.path.join(source, 'data.txt'), 'w') as f:
+                f.write('data')
+
+            code = Code(remote_computer_exec=(computer, '/bin/true'))
+            code.set_input_plugin_name('simpleplugins.templatereplacer')
+            code.store()
+
+            calc = code.new_calc()
+            calc.set_resources({"num_machines": 1,
+                                "num_mpiprocs_per_machine": 1})
+            calc.set_withmpi(False)
+            calc.add_link_from(ParameterData(dict={
+                'files_to_copy': [('remote_input', 'copied')]}).store(),
+                               label='template')
+            calc.add_link_from(RemoteData(computer=other_computer,
+                                          remote_path=source).store(),
+                               label='remote_input')
+            calc.store_all()
+            calc.submit()
+
+            # The new computers are not in the cache of previous tests
+            metadata_cache.refresh()
+            authinfo = metadata_cache.get_authinfo(computer,
+                                                   User(dbuser=dbuser))
+            with metadata_cache.get_transport(authinfo) as t:
+                staging = upload_calc(calc, authinfo, t)
+                self.assertEquals(len(staging['other_computer_copy_list']), 1)
+                stage_calc(staging)
+
+            self.assertEquals(calc.get_state(), calc_states.SUBMITTING)
+            with open(os.path.join(staging['workdir'], 'copied',
+                                   'data.txt')) as f:
+                self.assertEquals(f.read(), 'data')
+        finally:
+            shutil.rmtree(workdir)
+            shutil.rmtree(other_workdir)
+
+
+class TestSubmitStagedCalcs(AiidaTestCase):
+    """
+    Submission of staged calculations in job arrays, with a fake scheduler
+    (recording the submitted scripts) and a fake transport.
+    """
+
+    def setUp(self):
+        import aiida.common.setup
+        from aiida.orm import Code, Computer
+        from aiida.scheduler.plugins.slurm import SlurmScheduler
+        from aiida.daemon.metadatacache import metadata_cache
+
+        class FakeScheduler(SlurmScheduler):
+            def __init__(self):
+                super(FakeScheduler, self).__init__()
+                self.fail = False
+                self.scripts = []
+                self.submitted = []
+
+            def get_submit_array_script(self, job_tmpl,
+                                        task_working_directories,
+                                        task_script):
+                self.scripts.append(('array', job_tmpl,
+                                     task_working_directories))
+                return "array"
+
+            def get_submit_packed_script(self, job_tmpl,
+                                         task_working_directories,
+                                         task_script, max_concurrent_tasks):
+                self.scripts.append(('pack', job_tmpl,
+                                     task_working_directories))
+                return "pack"
+
+            def submit_from_script(self, working_directory, submit_script):
+                from aiida.scheduler import SchedulerError
+
+                if self.fail:
+                    raise SchedulerError("Submission failed")
+                self.submitted.append((working_directory, submit_script))
+                return str(100 + len(self.submitted))
+
+        class FakeTransport(object):
+            def __init__(self):
+                self.put = []
+
+            def putfile(self, localpath, remotepath):
+                self.put.append(remotepath)
+
+            def _set_logger_extra(self, logger_extra):
+                pass
+
+        class FakeAuthInfo(object):
+            pass
+
+        self.computer = Computer(name='submit-{}'.format(id(self)),
+                                 hostname='localhost', transport_type='local',
+                                 scheduler_type='slurm', workdir='/tmp/aiida')
+        self.computer.store()
+        self.code = Code(remote_computer_exec=(self.computer, '/bin/true'))
+        self.code.store()
+
+        self.scheduler = FakeScheduler()
+        self.transport = FakeTransport()
+        self.authinfo = FakeAuthInfo()
+        self.authinfo.dbcomputer = self.computer.dbcomputer
+        metadata_cache.get_scheduler = lambda dbcomputer: self.scheduler
+        self.addCleanup(delattr, metadata_cache, 'get_scheduler')
+
+        self.properties = {'daemon.job_arrays': True,
+                           'daemon.job_array_max_size': 2,
+                           'daemon.job_packing_size': 0,
+                           'daemon.job_packing_concurrency': 0}
+        get_property = aiida.common.setup.get_property
+        aiida.common.setup.get_property = lambda name, *args: (
+            self.properties[name] if name in self.properties
+            else get_property(name, *args))
+        self.addCleanup(setattr, aiida.common.setup, 'get_property',
+                        get_property)
+
+    def new_calc_staging(self, script_filename='aiida.submit',
+                         num_machines=1, max_wallclock_seconds=3600):
+        """
+        Return a calculation in the SUBMITTING state, with its staging
+        dictionary (as returned by upload_calc).
+        """
+        from aiida.common.datastructures import calc_states
+
+        calc = self.code.new_calc()
+        calc.set_resources({"num_machines": num_machines,
+                            "num_mpiprocs_per_machine": 2})
+        calc.store_all()
+        calc._set_state(calc_states.SUBMITTING)
+        staging = {
+            'calc_pk': calc.pk,
+            'workdir': '/scratch/{}'.format(calc.uuid),
+            'script_filename': script_filename,
+            'code_uuids': [self.code.uuid],
+            'job_tmpl': {
+                'job_name': 'aiida-{}'.format(calc.pk),
+                'job_resource': {'num_machines': num_machines,
+                                 'num_mpiprocs_per_machine': 2},
+                'max_wallclock_seconds': max_wallclock_seconds,
+                'max_memory_kb': 1000,
+            },
+        }
+        return (calc, staging)
+
+    def test_job_arrays(self):
+        """
+        The calculations with the same job array key are submitted in job
+        arrays of at most daemon.job_array_max_size calculations, and each
+        of them gets the job id of its task.
+        """
+        from aiida.common.datastructures import calc_states
+        from aiida.daemon.execmanager import (submit_staged_calcs,
+                                              JOB_ARRAY_SCRIPT_FILENAME)
+
+        calcs_stagings = [self.new_calc_staging() for _ in range(3)]
+        # A different submit script, so a different job array key
+        calcs_stagings.append(self.new_calc_staging('other.submit'))
+        workdirs = [staging['workdir'] for _, staging in calcs_stagings]
+
+        submit_staged_calcs(calcs_stagings, self.authinfo, self.transport)
+
+        self.assertEquals(self.scheduler.submitted, [
+            (workdirs[0], JOB_ARRAY_SCRIPT_FILENAME),
+            (workdirs[2], 'aiida.submit'),
+            (workdirs[3], 'other.submit')])
+        self.assertEquals(len(self.scheduler.scripts), 1)
+        self.assertEquals(self.scheduler.scripts[0][2], workdirs[:2])
+        self.assertEquals(self.transport.put, [
+            '{}/{}'.format(workdirs[0], JOB_ARRAY_SCRIPT_FILENAME)])
+
+        job_ids = ['101_1', '101_2', '102', '103']
+        for (calc, _), job_id in zip(calcs_stagings, job_ids):
+            self.assertEquals(calc.get_job_id(), job_id)
+            self.assertEquals(calc.get_state(), calc_states.WITHSCHEDULER)
+            self.assertIsNotNone(calc.out.remote_folder)
+
+    def test_submission_failed(self):
+        """
+        If the submission of a job array fails, all its calculations are
+        SUBMISSIONFAILED, and the other job arrays are submitted anyway.
+        """
+        from aiida.common.datastructures import calc_states
+        from aiida.daemon.execmanager import submit_staged_calcs
+
+        self.properties['daemon.job_array_max_size'] = 3
+        calcs_stagings = [self.new_calc_staging() for _ in range(3)]
+        other = self.new_calc_staging('other.submit')
+
+        self.scheduler.fail = True
+        submit_staged_calcs(calcs_stagings, self.authinfo, self.transport)
+        for calc, _ in calcs_stagings:
+            self.assertEquals(calc.get_state(),
+                              calc_states.SUBMISSIONFAILED)
+            self.assertIsNone(calc.get_job_id())
+
+        self.scheduler.fail = False
+        submit_staged_calcs([other], self.authinfo, self.transport)
+        self.assertEquals(other[0].get_state(), calc_states.WITHSCHEDULER)
+
+
+    def test_pack(self):
+        """
+        The calculations packed in a job get its job id. The job requests
+        the resources of daemon.job_packing_concurrency calculations, and
+        the walltime of a calculation times the number of rounds.
+        """
+        from aiida.common.datastructures import calc_states
+        from aiida.daemon.execmanager import (submit_staged_calcs,
+                                              JOB_PACK_SCRIPT_FILENAME)
+
+        self.properties['daemon.job_packing_size'] = 5
+        self.properties['daemon.job_packing_concurrency'] = 2
+        calcs_stagings = [self.new_calc_staging() for _ in range(5)]
+        # On many machines, not packed
+        calcs_stagings.append(self.new_calc_staging(num_machines=2))
+        workdirs = [staging['workdir'] for _, staging in calcs_stagings]
+
+        submit_staged_calcs(calcs_stagings, self.authinfo, self.transport)
+
+        self.assertEquals(self.scheduler.submitted, [
+            (workdirs[0], JOB_PACK_SCRIPT_FILENAME),
+            (workdirs[5], 'aiida.submit')])
+        (kind, job_tmpl, task_workdirs) = self.scheduler.scripts[0]
+        self.assertEquals(kind, 'pack')
+        self.assertEquals(task_workdirs, workdirs[:5])
+        self.assertEquals(job_tmpl.max_wallclock_seconds, 3 * 3600)
+        self.assertEquals(job_tmpl.max_memory_kb, 2 * 1000)
+        self.assertEquals(job_tmpl.job_resource.num_machines, 1)
+        self.assertEquals(job_tmpl.job_resource.num_mpiprocs_per_machine, 4)
+
+        for calc, _ in calcs_stagings[:5]:
+            self.assertEquals(calc.get_job_id(), '101')
+            self.assertEquals(calc.get_state(), calc_states.WITHSCHEDULER)
+        self.assertEquals(calcs_stagings[5][0].get_job_id(), '102')
+
+    def test_get_job_template(self):
+        """
+        The resources are scaled from the values per machine.
+        """
+        from aiida.daemon.execmanager import _get_job_template
+
+        _, staging = self.new_calc_staging()
+        job_tmpl = _get_job_template(self.scheduler, staging['job_tmpl'])
+        self.assertEquals(job_tmpl.job_resource.num_mpiprocs_per_machine, 2)
+        self.assertEquals(job_tmpl.job_resource.get_tot_num_mpiprocs(), 2)
+        self.assertEquals(job_tmpl.max_memory_kb, 1000)
+
+        job_tmpl = _get_job_template(self.scheduler, staging['job_tmpl'],
+                                     scale_resources=3)
+        self.assertEquals(job_tmpl.job_resource.num_machines, 1)
+        self.assertEquals(job_tmpl.job_resource.num_mpiprocs_per_machine, 6)
+        self.assertEquals(job_tmpl.job_resource.get_tot_num_mpiprocs(), 6)
+        self.assertEquals(job_tmpl.max_memory_kb, 3000)
+        # The walltime is scaled by submit_staged_calcs_as_pack
+        self.assertEquals(job_tmpl.max_wallclock_seconds, 3600)
+
+    def test_finished_packed_calcs(self):
+        """
+        The calculations whose job is still in the queue are computed if
+        their task wrote its exit code, also when they are the last ones of
+        their packed job.
+        """
+        import os
+        import shutil
+        import tempfile
+        from aiida.daemon.execmanager import _get_finished_packed_calcs
+        from aiida.scheduler import PACKED_TASK_EXIT_CODE_FILE
+        from aiida.transport.plugins.local import LocalTransport
+
+        class FakeCalc(object):
+            def __init__(self, pk, job_id, workdir):
+                self.pk = pk
+                self.job_id = job_id
+                self.workdir = workdir
+
+            def get_job_id(self):
+                return self.job_id
+
+            def _get_remote_workdir(self):
+                return self.workdir
+
+        folder = tempfile.mkdtemp()
+        try:
+            calcs = []
+            for pk, job_id, finished in [(1, '101', True), (2, '101', False),
+                                         (3, '102', True), (4, '103', True)]:
+                workdir = os.path.join(folder, 'calc {}'.format(pk))
+                os.mkdir(workdir)
+                if finished:
+                    with open(os.path.join(
+                            workdir, PACKED_TASK_EXIT_CODE_FILE), 'w') as f:
+                        f.write('0\n')
+                calcs.append(FakeCalc(pk, job_id, workdir))
+            # The job 103 is not in the queue anymore
+            found_jobs = {'101': None, '102': None}
+
+            with LocalTransport() as t:
+                self.properties['daemon.job_packing_size'] = 0
+                self.assertEquals(
+                    _get_finished_packed_calcs(t, calcs, found_jobs), set())
+                self.properties['daemon.job_packing_size'] = 2
+                # The calculation 3 is the last one of its packed job
+                self.assertEquals(
+                    _get_finished_packed_calcs(t, calcs, found_jobs),
+                    set([1, 3]))
+        finally:
+            shutil.rmtree(folder)
+
+
+class TestRemoteFileCache(AiidaTestCase):
+
+    def test_put_with_cache(self):
+        import os
+        import shutil
+        import tempfile
+        from aiida.daemon import remotefilecache
+        from aiida.transport.plugins.local import LocalTransport
+
+        class FakeAuthInfo(object):
+            id = -1
+
+        local_dir = tempfile.mkdtemp()
+        remote_dir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(local_dir, 'Si.UPF'), 'w') as f:
+                f.write('Si')
+            file_list = [(os.path.join(local_dir, 'Si.UPF'), 'Si.UPF')]
+
+            with LocalTransport() as t:
+                for workdir in ['calc1', 'calc2']:
+                    os.mkdir(os.path.join(remote_dir, workdir))
+                    t.chdir(os.path.join(remote_dir, workdir))
+                    remotefilecache.put_with_cache(t, FakeAuthInfo(),
+                                                   remote_dir, file_list)
+
+                # The file is uploaded once, and hard-linked twice
+                cached = os.listdir(os.path.join(
+                    remote_dir, remotefilecache.CACHE_FOLDER))
+                self.assertEquals(len(cached), 1)
+                self.assertEquals(os.stat(os.path.join(
+                    remote_dir, 'calc2', 'Si.UPF')).st_nlink, 3)
+
+                # If the cache is removed, the files are put anyway
+                shutil.rmtree(os.path.join(remote_dir,
+                                           remotefilecache.CACHE_FOLDER))
+                os.mkdir(os.path.join(remote_dir, 'calc3'))
+                t.chdir(os.path.join(remote_dir, 'calc3'))
+                remotefilecache.put_with_cache(t, FakeAuthInfo(),
+                                               remote_dir, file_list)
+                with open(os.path.join(remote_dir, 'calc3', 'Si.UPF')) as f:
+                    self.assertEquals(f.read(), 'Si')
+                self.assertIsNone(remotefilecache._get_cached_path(
+                    FakeAuthInfo(), cached[0]))
+        finally:
+            shutil.rmtree(local_dir)
+            shutil.rmtree(remote_dir)
+
+
+class TestDaemonMetrics(AiidaTestCase):
+
+    def test_metrics(self):
+        import json
+        import os
+        import shutil
+        import tempfile
+        from aiida.daemon.metrics import (
+            DaemonMetrics, load_metrics, format_prometheus, STAGE_TRANSPORT,
+            STAGE_DATABASE)
+
+        metrics = DaemonMetrics()
+        # Ignored, since no task is running
+        metrics.add_calculations(10)
+
+        metrics.start_task('updater')
+        with metrics.timer(STAGE_TRANSPORT):
+            # Nested blocks of the same stage are not counted again
+            with metrics.timer(STAGE_TRANSPORT):
+                pass
+        metrics.add_calculations(3)
+        metrics.stop_task()
+        metrics.start_task('updater')
+        metrics.add_calculations()
+        metrics.stop_task()
+
+        task_metrics = metrics.get_metrics()['updater']
+        self.assertEquals(task_metrics['runs'], 2)
+        self.assertEquals(task_metrics['calculations'], 4)
+        self.assertGreaterEqual(task_metrics['seconds'],
+                                task_metrics['stages'][STAGE_TRANSPORT])
+        self.assertEquals(task_metrics['stages'][STAGE_DATABASE], 0.)
+
+        folder = tempfile.mkdtemp()
+        try:
+            metrics.save(folder)
+            # The metrics of the processes are summed
+            with open(os.path.join(folder, '0.json'), 'w') as f:
+                json.dump(metrics.get_metrics(), f)
+            merged = load_metrics(folder)
+        finally:
+            shutil.rmtree(folder)
+
+        self.assertEquals(merged['updater']['runs'], 4)
+        self.assertEquals(merged['updater']['calculations'], 8)
+        text = format_prometheus(merged)
+        self.assertIn('aiida_daemon_task_runs_total{task="updater"} 4', text)
+        self.assertIn('aiida_daemon_task_stage_seconds_total{task="updater",'
+                      'stage="transport"}', text)
+
+    def test_failed_statements(self):
+        """
+        The time of the SQLAlchemy statements is recorded also when they
+        fail, and nothing is left behind on the connection.
+        """
+        import time
+        from aiida.daemon.metrics import DaemonMetrics, STAGE_DATABASE
+
+        class FakeConnection(object):
+            def __init__(self):
+                self.info = {}
+
+        class FakeExceptionContext(object):
+            def __init__(self, connection):
+                self.connection = connection
+
+        metrics = DaemonMetrics()
+        conn = FakeConnection()
+        metrics.start_task('submitter')
+        metrics._before_cursor_execute(conn, None, "SELECT 1", (), None, False)
+        metrics._after_cursor_execute(conn, None, "SELECT 1", (), None, False)
+        metrics._before_cursor_execute(conn, None, "SELECT x", (), None, False)
+        time.sleep(0.01)
+        metrics._handle_error(FakeExceptionContext(conn))
+        self.assertEquals(conn.info, {})
+        metrics.stop_task()
+
+        self.assertGreater(
+            metrics.get_metrics()['submitter']['stages'][STAGE_DATABASE], 0.)
+
+    def test_other_threads(self):
+        """
+        The time spent in the stages by other threads than the one running
+        the task is not recorded.
+        """
+        import threading
+        from aiida.daemon.metrics import DaemonMetrics, STAGE_DATABASE
+
+        metrics = DaemonMetrics()
+        metrics.start_task('submitter')
+        thread = threading.Thread(
+            target=metrics._add_stage_time, args=(STAGE_DATABASE, 10.))
+        thread.start()
+        thread.join()
+        metrics._add_stage_time(STAGE_DATABASE, 1.)
+        metrics.stop_task()
+
+        self.assertEquals(
+            metrics.get_metrics()['submitter']['stages'][STAGE_DATABASE], 1.)
@@ -1683,6 +1683,159 @@ class TestStructureDataReload(AiidaTestCase):
             self.assertAlmostEqual(c.sites[1].position[i], 1.)
 
 
+class TestStructureDataDescriptors(AiidaTestCase):
+    """
+    Tests the descriptors stored with the StructureData, and the queries
+    on them.
+    """
+
+    def test_descriptors(self):
+        """
+        The descriptors are stored with the structure
+        """
+        from aiida.orm.data.structure import StructureData
+
+        cell = ((2., 0., 0.), (0., 2., 0.), (0., 0., 2.))
+        a = StructureData(cell=cell)
+        a.append_atom(position=(0., 0., 0.), symbols=['Ba'])
+        a.append_atom(position=(1., 1., 1.), symbols=['Ti'])
+        a.append_atom(position=(1., 1., 0.), symbols=['O'])
+        a.append_atom(position=(1., 0., 1.), symbols=['O'])
+        a.append_atom(position=(0., 1., 1.), symbols=['O'])
+        a.store()
+
+        descriptors = a.get_attr('descriptors')
+        self.assertEqual(descriptors['formula'], 'BaO3Ti')
+        self.assertEqual(descriptors['formula_reduced'], 'BaO3Ti')
+        self.assertEqual(descriptors['composition'],
+                         {'Ba': 1., 'Ti': 1., 'O': 3.})
+        self.assertEqual(descriptors['elements'], 'Ba,O,Ti')
+        self.assertEqual(descriptors['nelements'], 3)
+        self.assertEqual(descriptors['nsites'], 5)
+        self.assertAlmostEqual(descriptors['volume'], 8.)
+        for length in descriptors['cell_lengths']:
+            self.assertAlmostEqual(length, 2.)
+
+    def test_descriptor_filters(self):
+        """
+        Structures are selected by elements and formula in the database
+        """
+        from aiida.orm.data.structure import (StructureData,
+                                              get_descriptor_filters)
+        from aiida.orm.querybuilder import QueryBuilder
+
+        cell = ((1., 0., 0.), (0., 1., 0.), (0., 0., 1.))
+        pks = {}
+        for symbols in (['Ba', 'Ti'], ['Ba'], ['Sr', 'Ti', 'Ti']):
+            s = StructureData(cell=cell)
+            for i, symbol in enumerate(symbols):
+                s.append_atom(position=(0., 0., i * 0.3), symbols=[symbol])
+            s.store()
+            pks[''.join(symbols)] = s.pk
+
+        def query(*args, **kwargs):
+            qb = QueryBuilder()
+            qb.append(StructureData,
+                      filters=get_descriptor_filters(*args, **kwargs),
+                      project=['id'])
+            return set(_[0] for _ in qb.all()) & set(pks.values())
+
+        self.assertEqual(query(['Ba']), {pks['BaTi'], pks['Ba']})
+        self.assertEqual(query(['Ba', 'Sr'], mode='any'), set(pks.values()))
+        self.assertEqual(query(['Ba', 'Ti'], mode='all'), {pks['BaTi']})
+        self.assertEqual(query(['Ba', 'Ti'], mode='only'),
+                         {pks['BaTi'], pks['Ba']})
+        self.assertEqual(query(['Ba', 'Sr', 'Ti'], mode='only'),
+                         set(pks.values()))
+        self.assertEqual(query(['Sr'], mode='only'), set())
+        self.assertEqual(query(formula='SrTi2'), {pks['SrTiTi']})
+
+
+class TestStructureDataCompact(AiidaTestCase):
+    """
+    Tests the compact representation of the sites of the StructureData.
+    """
+
+    def test_compact_reload(self):
+        """
+        Build a compact structure, store it and reload it
+        """
+        from aiida.orm.data.structure import StructureData
+
+        cell = ((1., 0., 0.), (0., 2., 0.), (0., 0., 3.))
+        a = StructureData(cell=cell)
+        a.set_compact()
+        a.append_atom(position=(0., 0., 0.), symbols=['Ba'])
+        a.append_atom(position=(1., 1., 1.), symbols=['Ti'])
+        a.append_atom(position=(0.5, 0.5, 0.5), symbols=['Ba'])
+        self.assertTrue(a.is_compact())
+        self.assertEqual(len(a.sites), 3)
+        a.store()
+
+        b = load_node(a.uuid, parent_class=StructureData)
+        self.assertTrue(b.is_compact())
+        self.assertEqual(len(b.kinds), 2)
+        self.assertEqual(len(b.sites), 3)
+        self.assertEqual([s.kind_name for s in b.sites], ['Ba', 'Ti', 'Ba'])
+        for i in range(3):
+            self.assertAlmostEqual(b.sites[1].position[i], 1.)
+            self.assertAlmostEqual(b.sites[-1].position[i], 0.5)
+        self.assertEqual(b.get_formula(), 'Ba2Ti')
+        self.assertEqual(b.get_attr('descriptors')['nsites'], 3)
+
+        # A copy can be modified
+        c = b.copy()
+        c.append_atom(position=(0., 0., 1.), symbols=['Ti'])
+        self.assertEqual(len(c.sites), 4)
+        self.assertEqual(len(b.sites), 3)
+        c.store()
+        self.assertEqual(len(load_node(c.pk).sites), 4)
+
+    def test_compact_switch(self):
+        """
+        Switch between the default and the compact representations
+        """
+        from aiida.orm.data.structure import StructureData
+
+        a = StructureData()
+        a.append_atom(position=(0., 0., 0.), symbols=['Ba'])
+        a.append_atom(position=(0.5, 0., 0.), symbols=['O'])
+        raw_sites = a.get_attr('sites')
+
+        a.set_compact()
+        self.assertRaises(AttributeError, a.get_attr, 'sites')
+        a.reset_sites_positions([(0., 0., 0.), (0.5, 0.5, 0.)])
+        self.assertAlmostEqual(a.sites[1].position[1], 0.5)
+
+        a.set_compact(False)
+        self.assertFalse(a.is_compact())
+        self.assertEqual([s['kind_name'] for s in a.get_attr('sites')],
+                         [s['kind_name'] for s in raw_sites])
+        self.assertAlmostEqual(a.get_attr('sites')[1]['position'][1], 0.5)
+
+    def test_formulas(self):
+        """
+        The formulas listed by verdi are computed from the kinds and the
+        sites in the database and the repository, for both representations
+        """
+        from aiida.cmdline.commands.data import _get_structure_formulas
+        from aiida.orm.data.structure import StructureData
+
+        pks = []
+        for compact in (False, True):
+            a = StructureData()
+            a.set_compact(compact)
+            for i, symbol in enumerate(['Ba', 'Ti', 'O', 'O', 'O']):
+                a.append_atom(position=(0., 0., 0.5 * i), symbols=[symbol])
+            a.store()
+            pks.append(a.pk)
+
+        formulas = _get_structure_formulas(pks, 'reduce')
+        for pk in pks:
+            self.assertEqual(formulas[pk],
+                             ('BaTiO3', {'Ba', 'Ti', 'O'}))
+
+
 class TestStructureDataFromAse(AiidaTestCase):
     """
     Tests the creation of Sites from/to a ASE object.
@@ -2645,6 +2798,182 @@ class TestKpointsData(AiidaTestCase):
         klist = k.get_kpoints(cartesian=True)
         self.assertTrue(numpy.allclose(klist, input_klist, atol=1e-16))
 
+    def test_path(self):
+        """
+        Test the generation of a path of kpoints from explicit coordinates.
+        """
+        from aiida.orm.data.array.kpoints import KpointsData
+        import numpy
+
+        k = KpointsData()
+        k.set_kpoints_path([('G', (0., 0., 0.), 'X', (0.5, 0., 0.), 6),
+                            ('X', (0.5, 0., 0.), 'M', (0.5, 0.5, 0.), 3),
+                            ('R', (0.5, 0.5, 0.5), 'G', (0., 0., 0.), 3)])
+
+        klist = k.get_kpoints()
+        # the points shared by two consecutive segments are not repeated
+        self.assertEqual(len(klist), 11)
+        self.assertTrue(numpy.allclose(klist[:6, 0],
+                                       numpy.linspace(0., 0.5, 6)))
+        self.assertTrue(numpy.allclose(klist[6], [0.5, 0.25, 0.]))
+        self.assertTrue(numpy.allclose(klist[-1], [0., 0., 0.]))
+        self.assertEqual(k.labels, [(0, 'G'), (5, 'X'), (7, 'M'),
+                                    (8, 'R'), (10, 'G')])
+
+
+class TestBandsData(AiidaTestCase):
+    """
+    Tests the band gap analysis of BandsData objects.
+    """
+
+    def _get_bands(self, bands, occupations=None):
+        from aiida.orm.data.array.bands import BandsData
+        import numpy
+
+        bands = numpy.array(bands, dtype=float)
+        b = BandsData()
+        b.set_kpoints(numpy.zeros((bands.shape[-2], 3)))
+        b.set_bands(bands, occupations=occupations)
+        return b
+
+    def test_find_bandgap(self):
+        """
+        Test the band gap from the occupations, the number of electrons and
+        the Fermi energy.
+        """
+        from aiida.orm.data.array.bands import find_bandgap, find_homo_lumo
+
+        insulator = self._get_bands([[-3., 1., 4.], [-2., 2., 5.]],
+                                    occupations=[[2., 0., 0.], [2., 0., 0.]])
+        self.assertEqual(find_bandgap(insulator), (True, 3.))
+        self.assertEqual(find_bandgap(insulator, number_electrons=2),
+                         (True, 3.))
+        self.assertEqual(find_bandgap(insulator, number_electrons=4),
+                         (True, 2.))
+        self.assertEqual(find_bandgap(insulator, fermi_energy=0.),
+                         (True, 3.))
+        self.assertEqual(find_homo_lumo(insulator), (-2., 1.))
+
+        # an odd number of electrons without spin polarization
+        self.assertEqual(find_bandgap(insulator, number_electrons=3),
+                         (False, None))
+        self.assertEqual(find_homo_lumo(insulator, number_electrons=3),
+                         (None, None))
+
+        # the Fermi energy crosses the second band
+        self.assertEqual(find_bandgap(insulator, fermi_energy=1.5),
+                         (False, None))
+
+        with self.assertRaises(ValueError):
+            find_bandgap(insulator, number_electrons=6)
+        with self.assertRaises(ValueError):
+            find_bandgap(insulator, number_electrons=2, fermi_energy=0.)
+
+        # the homo is not the same band at every kpoint
+        metal = self._get_bands([[-3., 1., 4.], [-2., 2., 5.]],
+                                occupations=[[2., 0., 0.], [2., 2., 0.]])
+        self.assertEqual(find_bandgap(metal), (False, None))
+
+        # no occupations
+        with self.assertRaises(KeyError):
+            find_bandgap(self._get_bands([[-3., 1., 4.], [-2., 2., 5.]]))
+
+    def test_find_bandgap_spin(self):
+        """
+        Test the band gap of spin-polarized bands, also for each spin.
+        """
+        from aiida.orm.data.array.bands import find_bandgap
+
+        bands = self._get_bands([[[0., 1., 5.], [0., 1.5, 5.]],
+                                 [[0., 3., 4.], [0., 3., 4.]]],
+                                occupations=[[[1., 1., 0.], [1., 1., 0.]],
+                                             [[1., 0., 0.], [1., 0., 0.]]])
+        self.assertEqual(find_bandgap(bands), (True, 1.5))
+        self.assertEqual(find_bandgap(bands, spin_resolved=True),
+                         [(True, 3.5), (True, 3.)])
+        self.assertEqual(find_bandgap(bands, number_electrons=[2, 1],
+                                      spin_resolved=True),
+                         [(True, 3.5), (True, 3.)])
+
+    def test_find_bandgaps(self):
+        """
+        Test that the batch analysis of stored nodes gives the same results
+        as find_bandgap.
+        """
+        from aiida.orm.data.array.bands import find_bandgap, find_bandgaps
+
+        nodes = [
+            self._get_bands([[-3., 1., 4.], [-2., 2., 5.]],
+                            occupations=[[2., 0., 0.], [2., 0., 0.]]),
+            self._get_bands([[-3., 1., 4.], [-2., 2., 5.]],
+                            occupations=[[2., 0., 0.], [2., 2., 0.]]),
+            self._get_bands([[-1., 0., 2., 3.]],
+                            occupations=[[2., 2., 0., 0.]]),
+        ]
+        for node in nodes:
+            node.store()
+
+        self.assertEqual(find_bandgaps(nodes),
+                         [find_bandgap(node) for node in nodes])
+        self.assertEqual(find_bandgaps(nodes, number_electrons=[2, 4, 4]),
+                         [(True, 3.), (True, 2.), (True, 2.)])
+        self.assertEqual(find_bandgaps(nodes, homo_lumo=True)[0],
+                         (True, 3., -2., 1.))
+
+    def test_find_bandgaps_chunks(self):
+        """
+        Test that the nodes are analysed in chunks, and that a node that
+        cannot be analysed does not stop the others.
+        """
+        from aiida.orm.data.array import bands
+
+        nodes = [
+            self._get_bands([[-3., 1., 4.], [-2., 2., 5.]],
+                            occupations=[[2., 0., 0.], [2., 0., 0.]]),
+            # Without occupations, the metallicity cannot be determined
+            self._get_bands([[-3., 1., 4.], [-2., 2., 5.]]),
+            self._get_bands([[-1., 0., 2., 3.]],
+                            occupations=[[2., 2., 0., 0.]]),
+        ]
+        for node in nodes:
+            node.store()
+
+        chunk_size = bands.BANDGAPS_CHUNK_SIZE
+        bands.BANDGAPS_CHUNK_SIZE = 2
+        try:
+            self.assertEqual(bands.find_bandgaps(nodes),
+                             [(True, 3.), None, (True, 2.)])
+        finally:
+            bands.BANDGAPS_CHUNK_SIZE = chunk_size
+        with self.assertRaises(KeyError):
+            bands.find_bandgap(nodes[1])
+
+    def test_find_bandgaps_errors(self):
+        """
+        Test that a node that cannot be analysed, with the same shape as
+        the others, does not stop them.
+        """
+        from aiida.orm.data.array.bands import find_bandgap, find_bandgaps
+
+        good = self._get_bands([[-3., 1., 4.], [-2., 2., 5.]],
+                               occupations=[[2., 0., 0.], [2., 0., 0.]])
+        # A kpoint without occupied bands
+        bad = self._get_bands([[-3., 1., 4.], [-2., 2., 5.]],
+                              occupations=[[2., 0., 0.], [0., 0., 0.]])
+        for node in [good, bad]:
+            node.store()
+
+        self.assertEqual(find_bandgaps([good, bad, good]),
+                         [(True, 3.), None, (True, 3.)])
+        with self.assertRaises(ValueError):
+            find_bandgap(bad)
+
+        # A Fermi energy above all the bands
+        self.assertEqual(find_bandgaps([good, good], fermi_energy=[0., 10.]),
+                         [(True, 3.), None])
+        with self.assertRaises(ValueError):
+            find_bandgap(good, fermi_energy=10.)
+
 # class TestData(AiidaTestCase):
 #     """
 #     Tests generic Data class.
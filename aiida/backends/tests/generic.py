@@ -246,6 +246,60 @@ class TestGroups(AiidaTestCase):
         # Cleanup
         g.delete()
 
+    def test_add_nodes_repeated(self):
+        """
+        Test adding the same nodes more than once in the same call
+        """
+        from aiida.orm.group import Group
+
+        n1 = Node().store()
+        n2 = Node().store()
+
+        g = Group(name='test_adding_repeated_nodes').store()
+        g.add_nodes([n1, n1.dbnode, n1])
+        g.add_nodes([n1, n2, n2])
+        self.assertEquals(len(g.nodes), 2)
+        self.assertEquals(set([n1.pk, n2.pk]), set([_.pk for _ in g.nodes]))
+
+        g.remove_nodes([n1, n1.dbnode])
+        self.assertEquals([n2.pk], [_.pk for _ in g.nodes])
+
+        # Cleanup
+        g.delete()
+
+    def test_autogroup(self):
+        """
+        Test that the stored nodes are added to the autogroup in batches
+        """
+        import aiida.orm.autogroup
+        from aiida.orm.autogroup import Autogroup, VERDIAUTOGROUP_TYPE
+        from aiida.orm.group import Group
+
+        autogroup = Autogroup()
+        autogroup.set_include(['all'])
+        autogroup.set_exclude([])
+        autogroup.set_group_name('test_autogroup')
+        autogroup.buffer_size = 3
+
+        aiida.orm.autogroup.current_autogroup = autogroup
+        try:
+            nodes = [Node().store() for _ in range(4)]
+        finally:
+            aiida.orm.autogroup.current_autogroup = None
+
+        g = Group.get(name='test_autogroup', type_string=VERDIAUTOGROUP_TYPE)
+        # The first three nodes filled the buffer
+        self.assertEquals(set([_.pk for _ in nodes[:3]]),
+                          set([_.pk for _ in g.nodes]))
+        # The others are added at the latest at the exit of the process
+        self.assertTrue(autogroup._flush_at_exit)
+        autogroup.flush()
+        self.assertEquals(set([_.pk for _ in nodes]),
+                          set([_.pk for _ in g.nodes]))
+
+        # Cleanup
+        g.delete()
+
     def test_remove_nodes(self):
         """
         Test node removal
@@ -389,3 +443,108 @@ class TestDbExtras(AiidaTestCase):
     def test_replacement(self):
         pass
 
+
+
+class TestDbLog(AiidaTestCase):
+    """
+    Test the storage of the log records in the DbLog table
+    """
+
+    def _flush_dblog_handlers(self):
+        from aiida.common import aiidalogger
+        from aiida.utils.logger import BufferedDBLogHandler
+
+        handlers = [h for h in aiidalogger.handlers
+                    if isinstance(h, BufferedDBLogHandler)]
+        self.assertTrue(handlers)
+        for handler in handlers:
+            handler.flush()
+
+    def test_log_messages(self):
+        from aiida.common import aiidalogger
+        from aiida.backends.utils import get_log_messages
+        from aiida.utils.logger import get_dblogger_extra
+
+        n = Node().store()
+        logger = aiidalogger.getChild('test_dblog')
+        for i in range(3):
+            logger.error("Message {}".format(i),
+                         extra=get_dblogger_extra(n))
+        # Records without extra are not stored
+        logger.error("Not stored")
+
+        self._flush_dblog_handlers()
+
+        messages = get_log_messages(n)
+        self.assertEquals([m['message'] for m in messages],
+                          ["Message {}".format(i) for i in range(3)])
+        self.assertEquals(messages[0]['levelname'], 'ERROR')
+        self.assertEquals(messages[0]['loggername'], logger.name)
+        self.assertEquals(messages[0]['metadata']['objpk'], n.pk)
+
+    def test_overflow_drop(self):
+        import logging
+        import threading
+        from aiida.utils.logger import BufferedDBLogHandler
+
+        class BlockedHandler(BufferedDBLogHandler):
+            def __init__(self, *args, **kwargs):
+                super(BlockedHandler, self).__init__(*args, **kwargs)
+                self.stored = []
+                self.unblock = threading.Event()
+
+            def _store_rows(self, rows):
+                self.unblock.wait()
+                self.stored.extend(rows)
+
+        handler = BlockedHandler(queue_size=2, flush_interval=0.,
+                                 overflow='drop', batch_size=1)
+        logger = logging.getLogger('aiida_test_dblog_drop')
+        logger.propagate = False
+        logger.addHandler(handler)
+        try:
+            for i in range(20):
+                logger.error("Message {}".format(i),
+                             extra={'objpk': 1, 'objname': 'test'})
+            handler.unblock.set()
+            handler.flush()
+        finally:
+            logger.removeHandler(handler)
+
+        # The worker holds one row, the queue at most two: no more than
+        # three records can have been kept
+        self.assertTrue(1 <= len(handler.stored) <= 3)
+        self.assertEquals(handler.stored[0]['message'], "Message 0")
+
+
+class TestConfigCache(AiidaTestCase):
+
+    def test_get_config(self):
+        import json
+        import os
+        import shutil
+        import tempfile
+        from aiida.common import setup
+
+        old_config_folder = setup.AIIDA_CONFIG_FOLDER
+        config_folder = tempfile.mkdtemp()
+        setup.AIIDA_CONFIG_FOLDER = config_folder
+        try:
+            setup.store_config({'profiles': {'a': {}}})
+            config = setup.get_config()
+            self.assertEquals(config, {'profiles': {'a': {}}})
+
+            # The caller can modify the returned configuration
+            config['profiles']['b'] = {}
+            self.assertEquals(setup.get_config(), {'profiles': {'a': {}}})
+
+            # A modification of the file by someone else is seen
+            with open(os.path.join(config_folder, setup.CONFIG_FNAME),
+                      'w') as f:
+                json.dump({'profiles': {'abc': {}}}, f)
+            setup.reload_config()
+            self.assertEquals(setup.get_config(), {'profiles': {'abc': {}}})
+        finally:
+            setup.AIIDA_CONFIG_FOLDER = old_config_folder
+            setup.reload_config()
+            shutil.rmtree(config_folder)
@@ -619,6 +619,108 @@ class RESTApiTestSuite(RESTApiTestCase):
                                      '&transport_type="ssh"&orderby=-id&limit=2',
                                      expected_list_ids=[4, 2])
 
+    ############### keyset pagination and counts #######################
+    def test_computers_list_cursor(self):
+        """
+        Browse the computers two at a time following the cursors returned in
+        the Link header
+        """
+        import re
+
+        url = self.get_url_prefix() + '/computers?orderby=+id&limit=2&cursor=""'
+        received = []
+        app.config['TESTING'] = True
+        with app.test_client() as client:
+            for _ in range(4):
+                rv = client.get(url)
+                response = json.loads(rv.data)
+                received.extend(c["id"] for c in
+                                response["data"]["computers"])
+                # No count by default in keyset pagination
+                self.assertNotIn("X-Total-Count", rv.headers)
+                next_link = re.search(r'<http://localhost([^>]*)>; rel=next',
+                                      rv.headers.get("Link", ""))
+                if next_link is None:
+                    break
+                url = next_link.group(1)
+
+        self.assertEqual(received, sorted(c["id"] for c in
+                                          self.get_dummy_data()["computers"]))
+
+    def test_computers_list_cursor_offset(self):
+        """
+        A cursor cannot be combined with an offset
+        """
+        expected_error = "cursor key is incompatible with page and offset"
+        RESTApiTestCase.process_test(self, "computers",
+                                     '/computers?offset=2&cursor=""',
+                                     expected_errormsg=expected_error)
+
+    def test_computers_list_count(self):
+        """
+        The total count is optional
+        """
+        url = self.get_url_prefix() + '/computers?limit=2&count=none'
+        app.config['TESTING'] = True
+        with app.test_client() as client:
+            rv = client.get(url)
+            self.assertNotIn("X-Total-Count", rv.headers)
+            rv = client.get(self.get_url_prefix() + '/computers?limit=2')
+            self.assertEqual(int(rv.headers["X-Total-Count"]),
+                             len(self.get_dummy_data()["computers"]))
+
+    def test_computers_list_count_cache(self):
+        """
+        The cached counts are bounded in number, and expire
+        """
+        from aiida.restapi import caching
+        from aiida.restapi.translator.base import BaseTranslator
+
+        count_cache = BaseTranslator._count_cache
+        BaseTranslator._count_cache = caching.LRUCache(2)
+        app.config['TESTING'] = True
+        try:
+            caching.cache.clear()
+            with app.test_client() as client:
+                for node_pk in [-3, -2, -1]:
+                    client.get(self.get_url_prefix() +
+                               '/computers?limit=1&id>' + str(node_pk))
+            self.assertEqual(len(BaseTranslator._count_cache._entries), 2)
+        finally:
+            BaseTranslator._count_cache = count_cache
+
+        expiring = caching.LRUCache(2)
+        expiring.set('count', 0, timeout=-1)
+        self.assertIsNone(expiring.get('count'))
+        expiring.set('count', 0, timeout=60)
+        self.assertEqual(expiring.get('count'), 0)
+
+    def test_computers_list_stream(self):
+        """
+        Streamed responses have the same content as the buffered ones, and
+        the cursor of the next page is still returned
+        """
+        import aiida.restapi.resources as resources
+
+        url = self.get_url_prefix() + '/computers?orderby=+id&limit=2'
+        app.config['TESTING'] = True
+        with app.test_client() as client:
+            buffered = client.get(url)
+            self.assertFalse(buffered.is_streamed)
+
+            threshold = resources.STREAM_THRESHOLD
+            resources.STREAM_THRESHOLD = 0
+            try:
+                streamed = client.get(url)
+                self.assertTrue(streamed.is_streamed)
+                self.assertEqual(json.loads(streamed.data)["data"],
+                                 json.loads(buffered.data)["data"])
+
+                streamed = client.get(url + '&cursor=""')
+                self.assertIn("rel=next", streamed.headers["Link"])
+            finally:
+                resources.STREAM_THRESHOLD = threshold
+
     ########## pass unknown url parameter ###########
     def test_computers_unknown_param(self):
         """
@@ -732,3 +834,171 @@ class RESTApiTestSuite(RESTApiTestCase):
             RESTApiTestCase.compare_extra_response_data(self, "calculations",
                                                         url,
                                                         response, pk=node_pk)
+
+    ############### caching #############
+    def test_calculation_attributes_etag(self):
+        """
+        A client sending back the ETag of the response gets a 304, until
+        the node is modified
+        """
+        from aiida.orm import load_node
+
+        node_pk = self.get_dummy_data()["calculations"][1]["id"]
+        url = self.get_url_prefix() + "/calculations/" + str(
+            node_pk) + "/content/extras"
+        app.config['TESTING'] = True
+        with app.test_client() as client:
+            rv = client.get(url)
+            self.assertEqual(rv.status_code, 200)
+            etag = rv.headers["ETag"]
+
+            rv = client.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(rv.status_code, 304)
+
+            # The node version changes, and so does the ETag
+            load_node(node_pk).set_extra("extra1", "OK")
+            rv = client.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(rv.status_code, 200)
+            self.assertNotEqual(rv.headers["ETag"], etag)
+            response = json.loads(rv.data)
+            self.assertEqual(response["data"]["extras"], {'extra1': 'OK'})
+
+    def test_calculations_list_etag(self):
+        """
+        The ETag of a query changes when an existing node is modified, at
+        the latest after CACHE_CONFIG['query_timeout'] seconds
+        """
+        from aiida.orm import load_node
+        from aiida.restapi import caching
+
+        node_pk = self.get_dummy_data()["calculations"][1]["id"]
+        url = self.get_url_prefix() + "/calculations?label=\"etag\""
+        app.config['TESTING'] = True
+        get_time_bucket = caching.get_time_bucket
+        with app.test_client() as client:
+            try:
+                caching.get_time_bucket = lambda timeout: 0
+                rv = client.get(url)
+                self.assertEqual(rv.status_code, 200)
+                etag = rv.headers["ETag"]
+                self.assertEqual(json.loads(rv.data)["data"]["calculations"],
+                                 [])
+
+                # The modification does not add nodes or links
+                load_node(node_pk).label = "etag"
+                rv = client.get(url, headers={"If-None-Match": etag})
+                self.assertEqual(rv.status_code, 304)
+
+                # In the next period, the query is run again
+                caching.get_time_bucket = lambda timeout: 1
+                rv = client.get(url, headers={"If-None-Match": etag})
+                self.assertEqual(rv.status_code, 200)
+                self.assertNotEqual(rv.headers["ETag"], etag)
+                self.assertEqual(len(json.loads(rv.data)["data"][
+                                         "calculations"]), 1)
+            finally:
+                caching.get_time_bucket = get_time_bucket
+                load_node(node_pk).label = ""
+
+    ############### statistics #############
+    def test_calculations_statistics(self):
+        """
+        The statistics are aggregated by the database
+        """
+        url = self.get_url_prefix() + "/calculations/statistics"
+        app.config['TESTING'] = True
+        with app.test_client() as client:
+            rv = client.get(url)
+            response = json.loads(rv.data)
+            statistics = response["data"]
+            n_calcs = len(self.get_dummy_data()["calculations"])
+            self.assertEqual(statistics["total"], n_calcs)
+            self.assertEqual(sum(statistics["ctime_by_day"].values()),
+                             n_calcs)
+            self.assertEqual(sum(statistics["mtime_by_month"].values()),
+                             n_calcs)
+            self.assertEqual(sum(u["total"] for u in
+                                 statistics["users"].values()), n_calcs)
+
+    def test_statistics_summary(self):
+        """
+        The largest id of the nodes enters the stored summary only the grace
+        time after it was seen; the nodes are always counted once.
+        """
+        import time
+        from aiida.backends.utils import (get_global_setting,
+                                          del_global_setting)
+        from aiida.orm.node import Node
+        from aiida.restapi.common import statistics
+
+        class Clock(object):
+            def __init__(self):
+                self.now = time.time()
+
+            def time(self):
+                return self.now
+
+        def get_summary():
+            return json.loads(get_global_setting(statistics.SUMMARY_SETTING))
+
+        qb = QueryBuilder()
+        qb.append(Node, project=['id'])
+        ids = [pk for pk, in qb.all()]
+
+        try:
+            del_global_setting(statistics.SUMMARY_SETTING)
+        except KeyError:
+            pass
+        clock = Clock()
+        statistics.time = clock
+        try:
+            counts = statistics.get_ctime_summary()
+            self.assertEqual(sum(c[3] for c in counts), len(ids))
+            summary = get_summary()
+            self.assertIsNone(summary['watermark'])
+            self.assertEqual([c[1] for c in summary['checkpoints']],
+                             [max(ids)])
+
+            # Not settled yet
+            clock.now += statistics.CHECKPOINT_INTERVAL
+            statistics.get_ctime_summary()
+            self.assertIsNone(get_summary()['watermark'])
+
+            clock.now += statistics.STATISTICS_GRACE_TIME
+            counts = statistics.get_ctime_summary()
+            self.assertEqual(sum(c[3] for c in counts), len(ids))
+            summary = get_summary()
+            self.assertEqual(summary['watermark'], max(ids))
+            self.assertEqual(sum(c[3] for c in summary['counts']), len(ids))
+            self.assertEqual(summary['checkpoints'], [])
+        finally:
+            statistics.time = time
+
+    ############### io tree #############
+    def test_calculation_tree(self):
+        """
+        The io tree contains the inputs and the outputs of the calculation,
+        and the links between them and the calculation
+        """
+        node_pk = self.get_dummy_data()["calculations"][1]["id"]
+        url = self.get_url_prefix() + "/calculations/" + str(
+            node_pk) + "/io/tree?depth=1"
+        app.config['TESTING'] = True
+        with app.test_client() as client:
+            rv = client.get(url)
+            response = json.loads(rv.data)
+            tree = response["data"]
+            main = tree["nodes"][0]
+            self.assertEqual(main["nodeid"], node_pk)
+            self.assertEqual(main["group"], "mainNode")
+            groups = sorted(n["group"] for n in tree["nodes"][1:])
+            self.assertEqual(groups, ["ancestors-1", "ancestors-1",
+                                      "desc-1"])
+            self.assertEqual(len(tree["edges"]), 3)
+            for edge in tree["edges"]:
+                self.assertIn(0, (edge["from"], edge["to"]))
+
+            # Only one link is followed in each direction
+            rv = client.get(url + "&fanout=1")
+            response = json.loads(rv.data)
+            self.assertEqual(len(response["data"]["nodes"]), 3)
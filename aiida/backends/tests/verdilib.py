@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the manifest of the verdi commands.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+from StringIO import StringIO
+
+from aiida.backends.testbase import AiidaTestCase
+
+__copyright__ = u"Copyright (c), This file is part of the AiiDA platform. For further information please visit http://www.aiida.net/. All rights reserved."
+__license__ = "MIT license, see LICENSE.txt file."
+__version__ = "0.7.1"
+__authors__ = "The AiiDA team."
+
+COMMANDS_MODULE = '''
+from aiida.cmdline.baseclass import VerdiCommandWithSubcommands
+
+
+class Fake(VerdiCommandWithSubcommands):
+    """
+    A command of the tests
+
+    It has two subcommands.
+    """
+
+    def __init__(self):
+        self.valid_subcommands = {
+            'show': (self.show, self.complete_none),
+            'list': (self.show, self.complete_none),
+        }
+
+    def show(self, *args):
+        print "shown", " ".join(args)
+'''
+
+
+class TestCommandsManifest(AiidaTestCase):
+    """
+    The manifest of the verdi commands is built from the modules of the
+    commands, stored, and rebuilt when its key changes. The commands of the
+    tests are defined in a package created in a temporary folder.
+    """
+
+    def setUp(self):
+        import aiida.common.setup
+        from aiida.cmdline import verdilib
+
+        self.folder = tempfile.mkdtemp()
+        self.config_folder = os.path.join(self.folder, 'config')
+        os.mkdir(self.config_folder)
+        self.pkg = 'verditestcommands{}'.format(id(self))
+        os.mkdir(os.path.join(self.folder, self.pkg))
+        with open(os.path.join(self.folder, self.pkg, '__init__.py'),
+                  'w') as f:
+            f.write("")
+        with open(os.path.join(self.folder, self.pkg, 'commands.py'),
+                  'w') as f:
+            f.write(COMMANDS_MODULE)
+        sys.path.insert(0, self.folder)
+        self.module = '{}.commands'.format(self.pkg)
+
+        self.external_commands = verdilib._external_commands
+        verdilib._external_commands = [(self.module, 'Fake')]
+        self.aiida_config_folder = aiida.common.setup.AIIDA_CONFIG_FOLDER
+        aiida.common.setup.AIIDA_CONFIG_FOLDER = self.config_folder
+        self.manifest_file = os.path.join(self.config_folder,
+                                          verdilib.COMMANDS_MANIFEST_FNAME)
+
+    def tearDown(self):
+        import aiida.common.setup
+        from aiida.cmdline import verdilib
+
+        verdilib._external_commands = self.external_commands
+        aiida.common.setup.AIIDA_CONFIG_FOLDER = self.aiida_config_folder
+        sys.path.remove(self.folder)
+        self.forget_module()
+        sys.modules.pop(self.pkg, None)
+        shutil.rmtree(self.folder)
+
+    def forget_module(self):
+        """
+        Forget the module of the commands, as a new verdi process would.
+        """
+        sys.modules.pop(self.module, None)
+
+    def test_manifest(self):
+        """
+        The manifest is built from the modules if there is no stored
+        manifest, and then read without importing them.
+        """
+        from aiida.cmdline import verdilib
+
+        manifest = verdilib.get_commands_manifest()
+        self.assertEqual(manifest, {'fake': {
+            'module': self.module,
+            'class': 'Fake',
+            'doc': sys.modules[self.module].Fake.__doc__,
+            'subcommands': ['list', 'show'],
+        }})
+        self.assertTrue(os.path.exists(self.manifest_file))
+
+        self.forget_module()
+        self.assertEqual(verdilib.get_commands_manifest(), manifest)
+        self.assertNotIn(self.module, sys.modules)
+
+    def test_invalidation(self):
+        """
+        The stored manifest is rebuilt if its key changed (e.g. with a new
+        version of AiiDA) or if it is broken.
+        """
+        import aiida
+        from aiida.cmdline import verdilib
+
+        verdilib.get_commands_manifest()
+        with open(self.manifest_file) as f:
+            stored = json.load(f)
+        self.assertEqual(stored['key'], verdilib._get_manifest_key())
+
+        # A stale key
+        stored['key'] = ['0.0.0'] + stored['key'][1:]
+        stored['commands']['fake']['doc'] = "Stale"
+        with open(self.manifest_file, 'w') as f:
+            json.dump(stored, f)
+        self.forget_module()
+        manifest = verdilib.get_commands_manifest()
+        self.assertNotEqual(manifest['fake']['doc'], "Stale")
+        self.assertIn(self.module, sys.modules)
+
+        # A new version
+        version = aiida.__version__
+        aiida.__version__ = version + '.post'
+        try:
+            self.assertNotEqual(verdilib._get_manifest_key(), stored['key'])
+            self.forget_module()
+            verdilib.get_commands_manifest()
+            self.assertIn(self.module, sys.modules)
+            with open(self.manifest_file) as f:
+                self.assertEqual(json.load(f)['key'][0], aiida.__version__)
+        finally:
+            aiida.__version__ = version
+
+        # A broken file
+        with open(self.manifest_file, 'w') as f:
+            f.write("{")
+        self.assertEqual(verdilib.get_commands_manifest(), manifest)
+
+    def test_external_commands(self):
+        """
+        The key of the manifest includes the modification time of the
+        module of each command defined in other files.
+        """
+        from aiida.cmdline import verdilib
+
+        verdilib._external_commands = self.external_commands
+        key = verdilib._get_manifest_key()
+        self.assertEqual(len(key), len(self.external_commands) + 1)
+        self.assertNotIn(None, key)
+
+        # Each command is found in its module, with its class name
+        names = set()
+        for module_name, class_name in self.external_commands:
+            self.assertTrue(module_name.startswith('aiida.cmdline.commands.'))
+            names.add(class_name.lower())
+        self.assertEqual(len(names), len(self.external_commands))
+
+    def test_get_command_class(self):
+        """
+        The class of a command is imported only when it is requested.
+        """
+        from aiida.cmdline import verdilib
+
+        list_commands = getattr(verdilib, 'list_commands', None)
+        verdilib.list_commands = {'fake': (self.module, 'Fake')}
+        try:
+            self.assertNotIn(self.module, sys.modules)
+            command_class = verdilib.get_command_class('fake')
+        finally:
+            verdilib.list_commands = list_commands
+        self.assertEqual(command_class.__name__, 'Fake')
+        self.assertEqual(command_class.__module__, self.module)
+
+    def run_verdi(self, *args):
+        """
+        Run verdi with the given arguments, and return its standard output.
+        """
+        from aiida.backends import settings
+        from aiida.cmdline import verdilib
+
+        process = settings.CURRENT_AIIDADB_PROCESS
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            verdilib.exec_from_cmdline(['verdi'] + list(args))
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+            settings.CURRENT_AIIDADB_PROCESS = process
+
+    def test_completion(self):
+        """
+        The commands and their subcommands are completed from the manifest,
+        without importing the module of the command.
+        """
+        self.run_verdi('completion', '1', 'verdi', '')
+        self.forget_module()
+
+        commands = self.run_verdi('completion', '1', 'verdi', '').split()
+        self.assertIn('fake', commands)
+        self.assertIn('help', commands)
+        self.assertNotIn('completion', commands)
+
+        output = self.run_verdi('completion', '2', 'verdi', 'fake', '')
+        self.assertEqual(output.split(), ['list', 'show'])
+        self.assertNotIn(self.module, sys.modules)
+
+        self.assertEqual(self.run_verdi('fake', 'show', 'x').strip(),
+                         "shown x")
@@ -73,6 +73,26 @@ def get_automatic_user():
         raise ValueError("This method doesn't exist for this backend")
 
 
+def close_session():
+    """
+    Release the database session (and connection) of the current thread.
+
+    To be called at the end of a unit of work of a thread (e.g. a daemon
+    task or a REST API request), so that the next one starts with a new
+    session, and the connection can be reused by other threads meanwhile.
+    With SQLAlchemy, the objects loaded before are detached from the
+    session.
+    """
+    if settings.BACKEND == BACKEND_SQLA:
+        from aiida.backends.sqlalchemy.utils import remove_session
+        remove_session()
+    elif settings.BACKEND == BACKEND_DJANGO:
+        from django.db import close_old_connections
+        close_old_connections()
+    else:
+        raise Exception("unknown backend {}".format(settings.BACKEND))
+
+
 def get_workflow_list(*args, **kwargs):
     if settings.BACKEND == BACKEND_SQLA:
         from aiida.backends.sqlalchemy.cmdline import (
@@ -145,6 +165,34 @@ def get_authinfo(computer, aiidauser):
     return authinfo
 
 
+COMPUTERS_VERSION_SETTING = 'daemon|computers_version'
+
+
+def get_computers_version():
+    """
+    Return a value that changes whenever a computer or an authinfo is
+    created, modified or deleted, or None if none was ever stored.
+
+    The value is a global setting, replaced with a new random value by the
+    backends when the computers or the authinfos are saved (see
+    bump_computers_version), so that checking it costs a single query.
+    """
+    try:
+        return get_global_setting(COMPUTERS_VERSION_SETTING)
+    except KeyError:
+        return None
+
+
+def bump_computers_version():
+    """
+    Store a new value of the version of the computers and the authinfos.
+    """
+    import uuid
+
+    set_global_setting(COMPUTERS_VERSION_SETTING, uuid.uuid4().hex,
+                       "Changed whenever a computer or an authinfo is saved")
+
+
 def get_daemon_user():
     if settings.BACKEND == BACKEND_DJANGO:
         from aiida.backends.djsite.utils import (get_daemon_user
@@ -631,8 +631,8 @@ class Calculation(VerdiCommandWithSubcommands):
 
         from aiida.cmdline import wait_for_confirmation
         from aiida.orm.calculation.job import JobCalculation as Calc
-        from aiida.common.exceptions import NotExistent, InvalidOperation, \
-            RemoteOperationError
+        from aiida.orm.calculation.job import kill_calculations
+        from aiida.common.exceptions import NotExistent
 
         import argparse
 
@@ -655,18 +655,23 @@ class Calculation(VerdiCommandWithSubcommands):
             if not wait_for_confirmation():
                 sys.exit(0)
 
-        counter = 0
+        calcs = []
         for calc_pk in parsed_args.calcs:
             try:
-                c = load_node(calc_pk, parent_class=Calc)
-
-                c.kill()  # Calc.kill(calc_pk)
-                counter += 1
+                calcs.append(load_node(calc_pk, parent_class=Calc))
             except NotExistent:
                 print >> sys.stderr, ("WARNING: calculation {} "
                                       "does not exist.".format(calc_pk))
-            except (InvalidOperation, RemoteOperationError) as e:
-                print >> sys.stderr, (e.message)
+
+        # One transport is opened for each (computer, user) pair
+        results = kill_calculations(calcs)
+
+        counter = 0
+        for calc in calcs:
+            if results[calc.pk] is None:
+                counter += 1
+            else:
+                print >> sys.stderr, results[calc.pk]
         print >> sys.stderr, "{} calculation{} killed.".format(counter,
                                                                "" if counter == 1 else "s")
 
@@ -832,21 +837,31 @@ class Calculation(VerdiCommandWithSubcommands):
             counter = 0
             t = dic['transport']
             with t:
-                remote_user = remote_user = t.whoami()
-                aiida_workdir = dic['computer'].get_workdir().format(
-                    username=remote_user)
+                remote_user = t.whoami()
+                aiida_workdir = os.path.normpath(dic['computer'].get_workdir(
+                ).format(username=remote_user))
 
-                t.chdir(aiida_workdir)
+                # Only the remote folders of the calculations, in the AiiDA
+                # work directory, are removed.
                 # Hardcoding the sharding equal to 3 parts!
-                existing_folders = t.glob('*/*/*')
-
-                folders_to_delete = [i for i in existing_folders if
-                                     i.replace("/", "") in dic['uuids']]
-
-                for folder in folders_to_delete:
-                    t.rmtree(folder)
+                uuids = set(dic['uuids'])
+                folders_to_delete = []
+                for remote_workdir in dic['remotes']:
+                    folder = os.path.relpath(os.path.normpath(remote_workdir),
+                                             aiida_workdir)
+                    if (folder.count("/") == 2 and
+                            folder.replace("/", "") in uuids):
+                        folders_to_delete.append(
+                            os.path.join(aiida_workdir, folder))
+
+                # The folders are removed in batches, with one command each
+                results = t.rmtrees(folders_to_delete)
+
+            for folder in folders_to_delete:
+                if results[folder] is None:
                     counter += 1
-                    if counter % 20 == 0 and counter > 0:
-                        print("Deleted work directories: {}".format(counter))
+                else:
+                    print("Error cleaning the remote folder {}: {}".format(
+                        folder, results[folder]))
 
             print("{} remote folder(s) cleaned.".format(counter))
@@ -563,13 +563,9 @@ class Code(VerdiCommandWithSubcommands):
     """
 
     def __init__(self):
-        from aiida.backends.utils import load_dbenv, is_dbenv_loaded
         """
         A dictionary with valid commands and functions to be called.
         """
-        if not is_dbenv_loaded():
-            load_dbenv()
-
         self.valid_subcommands = {
             'list': (self.code_list, self.complete_none),
             'show': (self.code_show, self.complete_code_names_and_pks),
@@ -581,6 +577,22 @@ class Code(VerdiCommandWithSubcommands):
             'reveal': (self.code_reveal, self.complete_code_pks),
         }
 
+    def run(self, *args):
+        from aiida.backends.utils import load_dbenv, is_dbenv_loaded
+
+        # The environment is loaded here rather than in __init__, so that
+        # the subcommands can be listed without a database
+        if not is_dbenv_loaded():
+            load_dbenv()
+        super(Code, self).run(*args)
+
+    def complete(self, subargs_idx, subargs):
+        from aiida.backends.utils import load_dbenv, is_dbenv_loaded
+
+        if not is_dbenv_loaded():
+            load_dbenv()
+        super(Code, self).complete(subargs_idx, subargs)
+
     def complete_code_names(self, subargs_idx, subargs):
         code_names = [c[1] for c in self.get_code_data()]
         return "\n".join(code_names)
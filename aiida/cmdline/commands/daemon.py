@@ -46,6 +46,10 @@ class Daemon(VerdiCommandWithSubcommands):
 
     * logshow: show the log in a continuous fashion, similar to the 'tail -f' \
         command. Press CTRL+C to exit.
+
+    * metrics: show the metrics of the daemon tasks (number of runs, time
+        spent in the transports, the database and the parsers, calculations
+        handled); with --prometheus, in the Prometheus text format.
     """
 
     def __init__(self):
@@ -60,6 +64,7 @@ class Daemon(VerdiCommandWithSubcommands):
             'stop': (self.daemon_stop, self.complete_none),
             'status': (self.daemon_status, self.complete_none),
             'logshow': (self.daemon_logshow, self.complete_none),
+            'metrics': (self.daemon_metrics, self.complete_none),
             'restart': (self.daemon_restart, self.complete_none),
             'configureuser': (self.configure_user, self.complete_none),
         }
@@ -145,8 +150,11 @@ class Daemon(VerdiCommandWithSubcommands):
 
         print "Clearing all locks ..."
         from aiida.orm.lock import LockManager
+        from aiida.daemon.metrics import clear_metrics
 
         LockManager().clear_all()
+        # The metrics of the processes of the previous daemon
+        clear_metrics()
 
         print "Starting AiiDA Daemon ..."
         process = subprocess.Popen(
@@ -379,6 +387,41 @@ class Daemon(VerdiCommandWithSubcommands):
             # exit on CTRL+C
             process.kill()
 
+    def daemon_metrics(self, *args):
+        """
+        Print the metrics of the daemon tasks.
+        """
+        from aiida.daemon.metrics import (
+            load_metrics, format_prometheus, STAGES)
+
+        if args not in [(), ('--prometheus',)]:
+            print >> sys.stderr, (
+                "The only argument allowed for the '{}' command is "
+                "--prometheus.".format(self.get_full_command_name()))
+            sys.exit(1)
+
+        metrics = load_metrics()
+        if args:
+            sys.stdout.write(format_prometheus(metrics))
+            return
+
+        if not metrics:
+            print "No metrics recorded (the daemon did not run any task yet)"
+            return
+
+        print "{:<18} {:>6} {:>11} {:>9} {:>6} {}".format(
+            "task", "runs", "total [s]", "last [s]", "calcs",
+            " ".join("{:>13}".format("{} [s]".format(stage))
+                     for stage in STAGES))
+        for task in sorted(metrics):
+            task_metrics = metrics[task]
+            print "{:<18} {:>6} {:>11.3f} {:>9.3f} {:>6} {}".format(
+                task, task_metrics['runs'], task_metrics['seconds'],
+                task_metrics['last_seconds'], task_metrics['calculations'],
+                " ".join("{:>13.3f}".format(
+                    task_metrics['stages'].get(stage, 0.))
+                         for stage in STAGES))
+
     def daemon_restart(self, *args):
         """
         Restart the daemon. Before restarting, wait for the daemon to really
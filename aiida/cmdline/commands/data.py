@@ -775,6 +775,82 @@ class _Upf(VerdiCommandWithSubcommands, Importable):
             print e
 
 
+# Formula modes that are stored in the descriptors of the structures
+_descriptor_formulas = {'hill': 'formula', 'hill_compact': 'formula_reduced'}
+
+
+def _get_structure_formulas(structure_ids, formulamode):
+    """
+    Computes the formulas of the structures from their kinds and sites. This
+    is needed for the structures stored without descriptors (see
+    StructureData.get_descriptors), or for the formula modes that are not
+    part of the descriptors.
+
+    :param structure_ids: the ids of the structures
+    :param formulamode: the formula mode, see get_formula
+    :return: a dictionary {id: (formula, elements)} where elements is the
+        set of element symbols. Structures without kinds or sites are left
+        out.
+    """
+    import itertools
+    from aiida.orm.querybuilder import QueryBuilder
+    from aiida.orm.data.structure import (StructureData, get_formula,
+                                          get_symbols_string)
+
+    formulas = {}
+    if not structure_ids:
+        return formulas
+
+    qb = QueryBuilder()
+    qb.append(StructureData, filters={'id': {'in': list(structure_ids)}},
+              project=["id", "uuid", "attributes.kinds", "attributes.sites",
+                       "attributes.compact_sites"])
+    for [id, uuid, akinds, asites, compact] in qb.iterall():
+        if akinds is not None and compact:
+            # The sites are not in the attributes, but in the repository
+            asites = [{'kind_name': akinds[i]['name']}
+                      for i in StructureData._load_kind_indices(uuid)]
+
+        # We want only the StructureData that have attributes
+        if akinds is None or asites is None:
+            continue
+
+        elements = set(itertools.chain.from_iterable(
+            k['symbols'] for k in akinds))
+
+        symbol_dict = {}
+        for k in akinds:
+            symbols = k['symbols']
+            weights = k['weights']
+            symbol_dict[k['name']] = get_symbols_string(symbols, weights)
+
+        try:
+            symbol_list = []
+            for s in asites:
+                symbol_list.append(symbol_dict[s['kind_name']])
+            formula = get_formula(symbol_list, mode=formulamode)
+        # If for some reason there is no kind with the name
+        # referenced by the site
+        except KeyError:
+            formula = "<<UNKNOWN>>"
+        formulas[id] = (formula, elements)
+
+    return formulas
+
+
+def _match_elements(elements, selected, mode):
+    """
+    Selection of the structures by elements, for the structures stored
+    without descriptors (see get_descriptor_filters for the meaning of mode)
+    """
+    if mode == 'any':
+        return any(e in elements for e in selected)
+    elif mode == 'all':
+        return all(e in elements for e in selected)
+    else:
+        return all(e in selected for e in elements)
+
+
 class _Bands(VerdiCommandWithSubcommands, Listable, Visualizable, Exportable):
     """
     Manipulation on the bands
@@ -810,7 +886,6 @@ class _Bands(VerdiCommandWithSubcommands, Listable, Visualizable, Exportable):
         from aiida.backends.utils import get_automatic_user
         from aiida.orm.implementation import User
         from aiida.orm.implementation import Group
-        from aiida.orm.data.structure import (get_formula, get_symbols_string)
         from aiida.orm.data.array.bands import BandsData
         from aiida.orm.data.structure import StructureData
 
@@ -835,66 +910,61 @@ class _Bands(VerdiCommandWithSubcommands, Listable, Visualizable, Exportable):
             qb.append(Group, tag="group", filters=group_filters,
                       group_of="bdata")
 
+        formula_key = _descriptor_formulas.get(args.formulamode)
         qb.append(StructureData, tag="sdata", ancestor_of="bdata",
                   # We don't care about the creator of StructureData
-                  project=["id", "attributes.kinds", "attributes.sites"])
+                  project=["id",
+                           "attributes.descriptors.{}".format(
+                               formula_key or 'formula'),
+                           "attributes.descriptors.elements"])
 
         qb.order_by({StructureData: {'ctime': 'desc'}})
 
         list_data = qb.distinct()
 
-        entry_list = []
+        # We process only one StructureData per BandsData.
+        # We want to process the closest StructureData to
+        # every BandsData.
+        # We hope that the StructureData with the latest
+        # creation time is the closest one.
+        # This will be updated when the QueryBuilder supports
+        # order_by by the distance of two nodes.
+        rows = []
         already_visited_bdata = set()
-        if list_data.count() > 0:
-            for [bid, blabel, bdate, sid, akinds, asites] in list_data.all():
-
-                # We process only one StructureData per BandsData.
-                # We want to process the closest StructureData to
-                # every BandsData.
-                # We hope that the StructureData with the latest
-                # creation time is the closest one.
-                # This will be updated when the QueryBuilder supports
-                # order_by by the distance of two nodes.
-                if already_visited_bdata.__contains__(bid):
+        for row in list_data.iterall():
+            if row[0] in already_visited_bdata:
+                continue
+            already_visited_bdata.add(row[0])
+            rows.append(row)
+
+        # The formula and the elements come from the descriptors, unless
+        # the structure has none or the formula mode is not stored
+        formulas = _get_structure_formulas(
+            [sid for [bid, blabel, bdate, sid, formula, elements] in rows
+             if elements is None or formula_key is None],
+            args.formulamode)
+
+        entry_list = []
+        for [bid, blabel, bdate, sid, formula, elements] in rows:
+            if elements is not None:
+                elements = set(elements.split(","))
+                if formula_key is None:
+                    formula = formulas[sid][0]
+            elif sid in formulas:
+                (formula, elements) = formulas[sid]
+            else:
+                continue
+
+            if args.element is not None:
+                if not _match_elements(elements, args.element, 'any'):
                     continue
-                already_visited_bdata.add(bid)
-
-                if args.element is not None:
-                    all_symbols = [_["symbols"][0] for _ in akinds]
-                    if not any([s in args.element for s in all_symbols]
-                               ):
-                        continue
-
-                if args.element_only is not None:
-                    all_symbols = [_["symbols"][0] for _ in akinds]
-                    if not all(
-                            [s in all_symbols for s in args.element_only]
-                            ):
-                        continue
-
-                # We want only the StructureData that have attributes
-                if akinds is None or asites is None:
+
+            if args.element_only is not None:
+                if not _match_elements(elements, args.element_only, 'all'):
                     continue
 
-                symbol_dict = {}
-                for k in akinds:
-                    symbols = k['symbols']
-                    weights = k['weights']
-                    symbol_dict[k['name']] = get_symbols_string(symbols,
-                                                                weights)
-
-                try:
-                    symbol_list = []
-                    for s in asites:
-                        symbol_list.append(symbol_dict[s['kind_name']])
-                    formula = get_formula(symbol_list,
-                                          mode=args.formulamode)
-                # If for some reason there is no kind with the name
-                # referenced by the site
-                except KeyError:
-                    formula = "<<UNKNOWN>>"
-                entry_list.append([str(bid), str(formula),
-                                   bdate.strftime('%d %b %Y'), blabel])
+            entry_list.append([str(bid), str(formula),
+                               bdate.strftime('%d %b %Y'), blabel])
 
         return entry_list
 
@@ -1043,7 +1113,7 @@ class _Structure(VerdiCommandWithSubcommands,
         from aiida.backends.utils import get_automatic_user
         from aiida.orm.implementation import User
         from aiida.orm.implementation import Group
-        from aiida.orm.data.structure import (get_formula, get_symbols_string)
+        from aiida.orm.data.structure import get_descriptor_filters
 
         qb = QueryBuilder()
         if args.all_users is False:
@@ -1055,10 +1125,23 @@ class _Structure(VerdiCommandWithSubcommands,
 
         st_data_filters = {}
         self.query_past_days_qb(st_data_filters, args)
+
+        # The selection by elements runs in the database through the
+        # descriptors of the structures. Those stored without descriptors
+        # are selected below
+        element_mode = 'only' if args.elementonly else 'any'
+        if args.element is not None:
+            st_data_filters['or'] = [
+                get_descriptor_filters(args.element, mode=element_mode),
+                {'attributes': {'!has_key': 'descriptors'}}]
+
+        formula_key = _descriptor_formulas.get(args.formulamode)
         qb.append(StructureData, tag="struc", created_by="creator",
                   filters=st_data_filters,
-                  project=["id", "label", "attributes.kinds",
-                           "attributes.sites"])
+                  project=["id", "label",
+                           "attributes.descriptors.{}".format(
+                               formula_key or 'formula'),
+                           "attributes.descriptors.elements"])
 
         group_filters = {}
         self.query_group_qb(group_filters, args)
@@ -1066,48 +1149,28 @@ class _Structure(VerdiCommandWithSubcommands,
             qb.append(Group, tag="group", filters=group_filters,
                       group_of="struc")
 
-        struc_list_data = qb.distinct()
+        rows = qb.distinct().all()
+
+        # The formula comes from the descriptors, unless the structure has
+        # none or the formula mode is not stored
+        formulas = _get_structure_formulas(
+            [id for [id, label, formula, elements] in rows
+             if elements is None or formula_key is None],
+            args.formulamode)
 
         entry_list = []
-        if struc_list_data.count() > 0:
-            for [id, label, akinds, asites] in struc_list_data.all():
-
-                # If symbols are defined there is a filtering of the structures
-                # based on the element
-                # When QueryBuilder will support this (attribute)s filtering,
-                # it will be pushed in the query.
-                if args.element is not None:
-                    all_symbols = [_["symbols"][0] for _ in akinds]
-                    if not any([s in args.element for s in all_symbols]
-                               ):
-                        continue
-
-                    if args.elementonly:
-                        print "Not implemented elementonly search"
-                        sys.exit(1)
-
-                # We want only the StructureData that have attributes
-                if akinds is None or asites is None:
+        for [id, label, formula, elements] in rows:
+            if elements is None:
+                if id not in formulas:
+                    continue
+                (formula, elements) = formulas[id]
+                if args.element is not None and not _match_elements(
+                        elements, args.element, element_mode):
                     continue
+            elif formula_key is None:
+                formula = formulas[id][0]
 
-                symbol_dict = {}
-                for k in akinds:
-                    symbols = k['symbols']
-                    weights = k['weights']
-                    symbol_dict[k['name']] = get_symbols_string(symbols,
-                                                                weights)
-
-                try:
-                    symbol_list = []
-                    for s in asites:
-                        symbol_list.append(symbol_dict[s['kind_name']])
-                    formula = get_formula(symbol_list,
-                                          mode=args.formulamode)
-                # If for some reason there is no kind with the name
-                # referenced by the site
-                except KeyError:
-                    formula = "<<UNKNOWN>>"
-                entry_list.append([str(id), str(formula), label])
+            entry_list.append([str(id), str(formula), label])
 
         return entry_list
 
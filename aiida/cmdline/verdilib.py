@@ -24,25 +24,33 @@ from aiida.cmdline.baseclass import VerdiCommand, VerdiCommandRouter
 from aiida.cmdline import pass_to_django_manage
 from aiida.backends import settings as settings_profile
 
-# Import here from other files; once imported, it will be found and
-# used as a command-line parameter
-from aiida.cmdline.commands.user import User
-from aiida.cmdline.commands.calculation import Calculation
-from aiida.cmdline.commands.code import Code
-from aiida.cmdline.commands.computer import Computer
-from aiida.cmdline.commands.daemon import Daemon
-from aiida.cmdline.commands.data import Data
-from aiida.cmdline.commands.devel import Devel
-from aiida.cmdline.commands.exportfile import Export
-from aiida.cmdline.commands.group import Group
-from aiida.cmdline.commands.graph import Graph
-from aiida.cmdline.commands.importfile import Import
-from aiida.cmdline.commands.node import Node
-from aiida.cmdline.commands.profile import Profile
-from aiida.cmdline.commands.workflow import Workflow
-from aiida.cmdline.commands.work import Work
-from aiida.cmdline.commands.comment import Comment
-from aiida.cmdline.commands.shell import Shell
+# The commands defined in other files. They are not imported here: their
+# names and docstrings are read from a cached manifest (see
+# get_commands_manifest), and their module is only imported when they are
+# invoked. To add a command, add its module and class name to this list.
+_external_commands = [
+    ('aiida.cmdline.commands.user', 'User'),
+    ('aiida.cmdline.commands.calculation', 'Calculation'),
+    ('aiida.cmdline.commands.code', 'Code'),
+    ('aiida.cmdline.commands.computer', 'Computer'),
+    ('aiida.cmdline.commands.daemon', 'Daemon'),
+    ('aiida.cmdline.commands.data', 'Data'),
+    ('aiida.cmdline.commands.devel', 'Devel'),
+    ('aiida.cmdline.commands.exportfile', 'Export'),
+    ('aiida.cmdline.commands.group', 'Group'),
+    ('aiida.cmdline.commands.graph', 'Graph'),
+    ('aiida.cmdline.commands.importfile', 'Import'),
+    ('aiida.cmdline.commands.node', 'Node'),
+    ('aiida.cmdline.commands.profile', 'Profile'),
+    ('aiida.cmdline.commands.workflow', 'Workflow'),
+    ('aiida.cmdline.commands.work', 'Work'),
+    ('aiida.cmdline.commands.comment', 'Comment'),
+    ('aiida.cmdline.commands.shell', 'Shell'),
+]
+
+# The file, in the AiiDA configuration folder, where the manifest is cached
+COMMANDS_MANIFEST_FNAME = 'verdi_commands.json'
+
 from aiida.cmdline import execname
 
 __copyright__ = u"Copyright (c), This file is part of the AiiDA platform. For further information please visit http://www.aiida.net/. All rights reserved."
@@ -242,11 +250,15 @@ class Completion(VerdiCommand):
                 command = args[2 + cword_offset]
             except IndexError:
                 return
-            try:
-                CommandClass = list_commands[command]
-            except KeyError:
+            if command not in list_commands:
                 return
-            CommandClass().complete(subargs_idx=cword - 2 - cword_offset,
+            subargs_idx = cword - 2 - cword_offset
+            # The subcommands are known without importing the command
+            if subargs_idx == 0 and subcommands.get(command) is not None:
+                print "\n".join(subcommands[command])
+                return
+            CommandClass = get_command_class(command)
+            CommandClass().complete(subargs_idx=subargs_idx,
                                     subargs=args[3 + cword_offset:])
 
 
@@ -580,6 +592,8 @@ def setup(profile, only_config, non_interactive=False, **kwargs):
         nuser.force_save()
 
     from aiida.common.utils import get_configured_user_email
+    from aiida.cmdline.commands.user import User
+
     email = get_configured_user_email()
     print "Starting user configuration for {}...".format(email)
     if email == DEFAULT_AIIDA_USER:
@@ -1042,6 +1056,7 @@ class Run(VerdiCommand):
                 self.get_full_command_name(), parsed_args.scriptname)
             sys.exit(1)
         else:
+            script_failed = True
             try:
                 # Must add also argv[0]
                 new_argv = [parsed_args.scriptname] + parsed_args.new_args
@@ -1051,6 +1066,7 @@ class Run(VerdiCommand):
                     # Pass only globals_dict
                     exec (f, globals_dict)
                     # print sys.argv
+                script_failed = False
             except SystemExit as e:
                 ## Script called sys.exit()
                 # print sys.argv, "(sys.exit {})".format(e.message)
@@ -1060,6 +1076,18 @@ class Run(VerdiCommand):
                 raise
             finally:
                 f.close()
+                # Add to the group the nodes still buffered, without hiding
+                # the exception of the script, if any
+                if parsed_args.group:
+                    try:
+                        aiida_verdilib_autogroup.flush()
+                    except Exception as e:
+                        if not script_failed:
+                            raise
+                        print >> sys.stderr, (
+                            "{}: Unable to add the nodes to the group '{}': "
+                            "{}".format(self.get_full_command_name(),
+                                        automatic_group_name, e))
 
 
 ########################################################################
@@ -1100,6 +1128,132 @@ def get_command_suggestion(command):
                                         for i in similar_cmds])
 
 
+def get_command_class(command):
+    """
+    Return the class of a verdi command, importing its module if needed.
+
+    :param command: the name of the command, a key of list_commands
+    """
+    import importlib
+
+    module_name, class_name = list_commands[command]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def _get_subcommands(command_class):
+    """
+    Return the sorted names of the subcommands of a command, or None if the
+    command has no subcommands (or if they cannot be found without running
+    it).
+    """
+    try:
+        command = command_class()
+    except Exception:
+        return None
+    for attribute in ['valid_subcommands', 'routed_subcommands']:
+        names = getattr(command, attribute, None)
+        if names:
+            return sorted(names)
+    return None
+
+
+def _get_manifest_key():
+    """
+    Return the key identifying the version of the manifest: the AiiDA
+    version and the modification times of the modules of the commands.
+    """
+    commands_folder = os.path.dirname(os.path.abspath(__file__))
+    key = [aiida.__version__]
+    for module_name, _ in _external_commands:
+        path = os.path.join(commands_folder,
+                            *module_name.split('.')[2:]) + '.py'
+        try:
+            key.append(os.path.getmtime(path))
+        except OSError:
+            key.append(None)
+    return key
+
+
+def _build_commands_manifest():
+    """
+    Import the modules of all the commands, and return the manifest of the
+    commands: a dictionary with the command names as keys, and as values
+    dictionaries with the 'module' and 'class' of the command, its 'doc'
+    and the list of its 'subcommands' (or None).
+    """
+    import importlib
+
+    manifest = {}
+    for module_name, class_name in _external_commands:
+        command_class = getattr(importlib.import_module(module_name),
+                                class_name)
+        manifest[command_class.get_command_name()] = {
+            'module': module_name,
+            'class': class_name,
+            'doc': command_class.__doc__ or "",
+            'subcommands': _get_subcommands(command_class),
+        }
+    return manifest
+
+
+def get_commands_manifest():
+    """
+    Return the manifest of the commands defined in other files (see
+    _build_commands_manifest).
+
+    The manifest is cached in the AiiDA configuration folder, and rebuilt
+    when AiiDA is updated or when the module of a command changes, so that
+    usually no command module is imported to list the commands or to
+    complete them.
+    """
+    import json
+    from aiida.common.setup import AIIDA_CONFIG_FOLDER
+
+    aiida_dir = os.path.expanduser(AIIDA_CONFIG_FOLDER)
+    manifest_file = os.path.join(aiida_dir, COMMANDS_MANIFEST_FNAME)
+    key = _get_manifest_key()
+
+    try:
+        with open(manifest_file) as f:
+            cached = json.load(f)
+        if cached['key'] == key:
+            return cached['commands']
+    except (IOError, ValueError, KeyError, TypeError):
+        pass
+
+    manifest = _build_commands_manifest()
+
+    # The configuration folder is not created here, if it does not exist
+    # (i.e. before 'verdi setup') the manifest is rebuilt at each call.
+    # The file is replaced atomically, since several verdi processes may
+    # write it at the same time
+    if os.path.isdir(aiida_dir):
+        temp_file = "{}.{}".format(manifest_file, os.getpid())
+        try:
+            with open(temp_file, 'w') as f:
+                json.dump({'key': key, 'commands': manifest}, f)
+            os.rename(temp_file, manifest_file)
+        except (IOError, OSError):
+            pass
+
+    return manifest
+
+
+def _split_docstring(docstring):
+    """
+    Return the short and the long description of a command from its
+    docstring, managing correctly the case of empty docstrings.
+    """
+    lines = [l.strip() for l in docstring.splitlines()]
+    empty_lines = [bool(l) for l in lines]
+    try:
+        first_idx = empty_lines.index(True)  # The first non-empty line
+    except ValueError:
+        # All False
+        return "No description available", ""
+    return lines[first_idx], os.linesep.join(lines[first_idx + 1:])
+
+
 def print_usage(execname):
     print >> sys.stderr, ("Usage: {} [--profile=PROFILENAME|-p PROFILENAME] "
                           "COMMAND [<args>]".format(execname))
@@ -1119,6 +1273,7 @@ def exec_from_cmdline(argv):
 
     global execname
     global list_commands
+    global subcommands
     global short_doc
     global long_doc
 
@@ -1129,37 +1284,34 @@ def exec_from_cmdline(argv):
     # List of command names that should be hidden or not completed.
     hidden_commands = ['completion', 'completioncommand', 'listparams']
 
-    # Retrieve the list of commands
+    # The commands defined in this file
     verdilib_namespace = verdilib.__dict__
-
-    list_commands = {v.get_command_name(): v for v in
-                     verdilib_namespace.itervalues()
-                     if inspect.isclass(v) and not v == VerdiCommand and
-                     issubclass(v, VerdiCommand)
-                     and not v.__name__.startswith('_')
-                     and not v._abstract}
-
-    # Retrieve the list of docstrings, managing correctly the
-    # case of empty docstrings. Each value is a list of lines
-    raw_docstrings = {k: (v.__doc__ if v.__doc__ else "").splitlines()
-                      for k, v in list_commands.iteritems()}
+    local_commands = [v for v in verdilib_namespace.itervalues()
+                      if inspect.isclass(v) and not v == VerdiCommand and
+                      issubclass(v, VerdiCommand)
+                      and v.__module__ == verdilib.__name__
+                      and not v.__name__.startswith('_')
+                      and not v._abstract]
+
+    # Map each command name to the module and the name of its class, and
+    # retrieve the docstrings
+    list_commands = {}
+    subcommands = {}
+    docstrings = {}
+    for v in local_commands:
+        list_commands[v.get_command_name()] = (v.__module__, v.__name__)
+        docstrings[v.get_command_name()] = v.__doc__ or ""
+    for k, v in get_commands_manifest().iteritems():
+        list_commands[k] = (v['module'], v['class'])
+        subcommands[k] = v['subcommands']
+        docstrings[k] = v['doc']
 
     short_doc = {}
     long_doc = {}
-    for k, v in raw_docstrings.iteritems():
+    for k, v in docstrings.iteritems():
         if k in hidden_commands:
             continue
-        lines = [l.strip() for l in v]
-        empty_lines = [bool(l) for l in lines]
-        try:
-            first_idx = empty_lines.index(True)  # The first non-empty line
-        except ValueError:
-            # All False
-            short_doc[k] = "No description available"
-            long_doc[k] = ""
-            continue
-        short_doc[k] = lines[first_idx]
-        long_doc[k] = os.linesep.join(lines[first_idx + 1:])
+        short_doc[k], long_doc[k] = _split_docstring(v)
 
     execname = os.path.basename(argv[0])
 
@@ -1184,7 +1336,7 @@ def exec_from_cmdline(argv):
 
     try:
         if command in list_commands:
-            CommandClass = list_commands[command]()
+            CommandClass = get_command_class(command)()
             CommandClass.run(*argv[command_position + 1:])
         else:
             print >> sys.stderr, ("{}: '{}' is not a valid command. "
@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 import json
 import datetime
+import errno
 import shutil
 import os
 import logging
+import sys
+from multiprocessing.pool import ThreadPool
 
 from abc import abstractmethod, ABCMeta
 
@@ -26,6 +29,12 @@ class AbstractBackup(object):
     oldest node/workflow object found and it will periodically backup
     (in periods of *periodicity* days) until the ending date of the backup
     specified by *end_date_of_backup* or *days_to_backup*.
+
+    The directories are copied by a pool of *workers* threads, and only the
+    files that changed (in size or modification time, or in md5 sum if
+    *compare_hashes* is set) since the previous backup are copied. The
+    backed up files are listed in a manifest in the backup directory (see
+    BackupManifest).
     """
 
     __metaclass__ = ABCMeta
@@ -37,6 +46,11 @@ class AbstractBackup(object):
     END_DATE_OF_BACKUP_KEY = "end_date_of_backup"
     PERIODICITY_KEY = "periodicity"
     BACKUP_LENGTH_THRESHOLD_KEY = "backup_length_threshold"
+    WORKERS_KEY = "workers"
+    COMPARE_HASHES_KEY = "compare_hashes"
+
+    # The number of threads copying the directories, if not given
+    DEFAULT_WORKERS = 4
 
     # Backup parameters that will be populated by the JSON file
 
@@ -64,6 +78,24 @@ class AbstractBackup(object):
 
     _additional_back_time_mins = None
 
+    # How many threads copy the directories (optional)
+    _workers = None
+
+    # If the md5 sums of the files whose size or modification time changed
+    # are compared with those of the backed up files, to avoid copying
+    # them if the content did not change (optional)
+    _compare_hashes = None
+
+    # How many directories are read from the database and handed to the
+    # threads at a time
+    _directory_batch_size = 1000
+
+    # The name of the manifest, in the backup directory
+    _manifest_filename = "backup_manifest.sqlite"
+
+    # The normalized path of the repository
+    _repository_path = None
+
     _ignore_backup_dir_existence_check = False
 
     def __init__(self, backup_info_filepath, additional_back_time_mins):
@@ -227,6 +259,24 @@ class AbstractBackup(object):
                                "an integer")
             raise
 
+        # Parse the optional number of threads
+        if backup_variables.get(self.WORKERS_KEY) is not None:
+            try:
+                self._workers = int(backup_variables.get(self.WORKERS_KEY))
+            except ValueError:
+                self._logger.error("The number of workers should be "
+                                   "an integer")
+                raise
+            if self._workers < 1:
+                self._logger.error("The number of workers should be "
+                                   "at least 1")
+                raise BackupError("The number of workers should be "
+                                  "at least 1")
+
+        if backup_variables.get(self.COMPARE_HASHES_KEY) is not None:
+            self._compare_hashes = bool(
+                backup_variables.get(self.COMPARE_HASHES_KEY))
+
     def _dictionarize_backup_info(self):
         """
         This dictionarises the backup information and returns the dictionary.
@@ -244,6 +294,12 @@ class AbstractBackup(object):
                 int((self._backup_length_threshold.total_seconds() / 3600))
         }
 
+        # The optional variables are only written if they were set
+        if self._workers is not None:
+            backup_variables[self.WORKERS_KEY] = self._workers
+        if self._compare_hashes is not None:
+            backup_variables[self.COMPARE_HASHES_KEY] = self._compare_hashes
+
         return backup_variables
 
     def _store_backup_info(self, backup_info_file_name):
@@ -332,11 +388,11 @@ class AbstractBackup(object):
         return REPOSITORY_PATH
 
     def _backup_needed_files(self, query_sets):
-        REPOSITORY_PATH = self._get_repository_path()
-        repository_path = os.path.normpath(REPOSITORY_PATH)
+        self._repository_path = os.path.normpath(self._get_repository_path())
 
         parent_dir_set = set()
         copy_counter = 0
+        file_counter = 0
 
         dir_no_to_copy = 0
 
@@ -348,71 +404,74 @@ class AbstractBackup(object):
         last_progress_print = datetime.datetime.now()
         percent_progress = 0
 
-        for query_set in query_sets:
-            iterator = self._get_query_set_iterator(query_set)
-
-            for item in iterator:
-                source_dir = self._get_source_directory(item)
-
-                # Get the relative directory without the / which
-                # separates the repository_path from the relative_dir.
-                relative_dir = source_dir[(len(repository_path) + 1):]
-                destination_dir = os.path.join(self._backup_dir, relative_dir)
-
-                # Remove the destination directory if it already exists
-                if os.path.exists(destination_dir):
-                    shutil.rmtree(destination_dir)
-
-                # Copy the needed directory
-                try:
-                    shutil.copytree(source_dir, destination_dir, True, None)
-                except EnvironmentError as e:
-                    self._logger.warning(
-                        "Problem copying directory {} ".format(source_dir) +
-                        "to {}. ".format(destination_dir) +
-                        "More information: {} (Error no: {})".format(
-                            e.strerror,
-                            e.errno))
-                    # Raise envEr
-
-                # Extract the needed parent directories
-                AbstractBackup._extract_parent_dirs(relative_dir, parent_dir_set)
-                copy_counter += 1
-
-                if (self._logger.getEffectiveLevel() <= logging.INFO and
-                            (datetime.datetime.now() -
-                                 last_progress_print).seconds > 60):
-                    last_progress_print = datetime.datetime.now()
-                    percent_progress = (copy_counter * 100 / dir_no_to_copy)
-                    self._logger.info(
-                        "Copied {} ".format(copy_counter) +
-                        "directories [{}]".format(item.__class__.__name__, ) +
-                        " ({}/100)".format(percent_progress))
-
-                if (self._logger.getEffectiveLevel() <= logging.INFO and
-                            percent_progress < (
-                                        copy_counter * 100 / dir_no_to_copy)):
-                    percent_progress = (copy_counter * 100 / dir_no_to_copy)
-                    last_progress_print = datetime.datetime.now()
-                    self._logger.info(
-                        "Copied {} ".format(copy_counter) +
-                        "directories [{}]".format(item.__class__.__name__, ) +
-                        " ({}/100)".format(percent_progress))
-
-        self._logger.info("{} directories copied".format(copy_counter))
+        manifest = BackupManifest(
+            os.path.join(self._backup_dir, self._manifest_filename))
+        pool = ThreadPool(self._workers or self.DEFAULT_WORKERS)
+        try:
+            for query_set in query_sets:
+                iterator = self._get_query_set_iterator(query_set)
+
+                # The items are read from the database in this thread, and
+                # their directories are copied by the pool in batches
+                for items in _get_batches(iterator, self._directory_batch_size):
+                    tasks = []
+                    for item in items:
+                        source_dir = self._get_source_directory(item)
+
+                        # Get the relative directory without the / which
+                        # separates the repository_path from the relative_dir.
+                        relative_dir = source_dir[
+                                       (len(self._repository_path) + 1):]
+                        tasks.append((relative_dir, manifest.get(relative_dir)))
+
+                        # Extract the needed parent directories (the
+                        # directory itself is handled by the workers)
+                        AbstractBackup._extract_parent_dirs(
+                            os.path.dirname(relative_dir), parent_dir_set)
+
+                    for (relative_dir, entry, copied) in pool.imap_unordered(
+                            self._backup_directory, tasks):
+                        manifest.set(relative_dir, entry)
+                        copy_counter += 1
+                        file_counter += copied
+
+                        if (self._logger.getEffectiveLevel() <= logging.INFO and
+                                ((datetime.datetime.now() -
+                                  last_progress_print).seconds > 60 or
+                                 percent_progress <
+                                 (copy_counter * 100 / dir_no_to_copy))):
+                            last_progress_print = datetime.datetime.now()
+                            percent_progress = (copy_counter * 100 /
+                                                dir_no_to_copy)
+                            self._logger.info(
+                                "Copied {} ".format(copy_counter) +
+                                "directories [{}]".format(
+                                    items[0].__class__.__name__) +
+                                " ({}/100)".format(percent_progress))
+
+                    manifest.commit()
+        finally:
+            pool.close()
+            pool.join()
+            manifest.close()
+
+        self._logger.info("{} directories backed up, {} files copied".format(
+            copy_counter, file_counter))
 
         self._logger.info("Start setting permissions")
         perm_counter = 0
         for tempRelPath in parent_dir_set:
             try:
-                shutil.copystat(os.path.join(repository_path, tempRelPath),
+                shutil.copystat(os.path.join(self._repository_path,
+                                             tempRelPath),
                                 os.path.join(self._backup_dir, tempRelPath))
             except OSError as e:
                 self._logger.warning(
                     "Problem setting permissions to directory " +
                     "{}.".format(os.path.join(self._backup_dir,
                                               tempRelPath)))
-                self._logger.warning(os.path.join(repository_path, tempRelPath))
+                self._logger.warning(os.path.join(self._repository_path,
+                                                  tempRelPath))
                 self._logger.warning("More information: " +
                                      "{} (Error no: {})".format(e.strerror,
                                                                 e.errno))
@@ -426,6 +485,40 @@ class AbstractBackup(object):
                           "less or equal to {}".format(
             self._oldest_object_bk))
 
+    def _backup_directory(self, task):
+        """
+        Bring the backup of a directory of the repository up to date. It is
+        run by the threads of the pool.
+
+        :param task: a tuple with the path of the directory relative to the
+            repository, and its entry in the manifest (None if it is not
+            in the manifest)
+        :return: a tuple with the relative path, the new entry in the
+            manifest (None if the directory could not be backed up) and the
+            number of copied files
+        """
+        (relative_dir, entry) = task
+        source_dir = _to_unicode(
+            os.path.join(self._repository_path, relative_dir))
+        destination_dir = _to_unicode(
+            os.path.join(self._backup_dir, relative_dir))
+
+        try:
+            if entry is None:
+                # Compare with the content of the backup, e.g. if the
+                # directory was backed up before the manifest existed
+                entry = _scan_directory(destination_dir)
+            return (relative_dir,) + _sync_directory(
+                source_dir, destination_dir, entry, self._compare_hashes)
+        except EnvironmentError as e:
+            self._logger.warning(
+                "Problem copying directory {} ".format(source_dir) +
+                "to {}. ".format(destination_dir) +
+                "More information: {} (Error no: {})".format(
+                    e.strerror,
+                    e.errno))
+            return (relative_dir, None, 0)
+
     @staticmethod
     def _extract_parent_dirs(given_rel_dir, parent_dir_set):
         """
@@ -499,6 +592,221 @@ class AbstractBackup(object):
         pass
 
 
+class BackupManifest(object):
+    """
+    The list of the backed up directories of the repository, with the files,
+    symbolic links and sub-directories that they contained when they were
+    backed up. Files are recorded with their size, modification time (in
+    seconds) and md5 sum (or None if it was not computed).
+
+    The manifest is stored in an SQLite database, with one JSON entry per
+    directory, so that a backup only reads the entries of the directories
+    it is copying.
+    """
+
+    def __init__(self, filepath):
+        import sqlite3
+
+        self._connection = sqlite3.connect(filepath)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS manifest "
+            "(dir TEXT PRIMARY KEY, entry TEXT NOT NULL)")
+
+    def get(self, relative_dir):
+        """
+        :return: the entry of the given directory, a dictionary with the
+            keys 'files' (relative path -> [size, mtime, md5]), 'links'
+            (relative path -> target) and 'dirs' (list of relative paths),
+            or None if the directory is not in the manifest
+        """
+        row = self._connection.execute(
+            "SELECT entry FROM manifest WHERE dir = ?",
+            (relative_dir,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def set(self, relative_dir, entry):
+        """
+        Replace the entry of a directory. If entry is None, the directory
+        is removed from the manifest.
+        """
+        if entry is None:
+            self._connection.execute(
+                "DELETE FROM manifest WHERE dir = ?", (relative_dir,))
+        else:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO manifest (dir, entry) VALUES (?, ?)",
+                (relative_dir, json.dumps(entry)))
+
+    def commit(self):
+        self._connection.commit()
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
+
+
+def _get_batches(iterable, batch_size):
+    """
+    Yield the elements of iterable in lists of batch_size elements (the
+    last one may be shorter).
+    """
+    batch = []
+    for element in iterable:
+        batch.append(element)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _to_unicode(path):
+    """
+    Return the path as unicode, so that the names returned by os.walk are
+    unicode too and compare equal to those decoded from the manifest.
+    """
+    if isinstance(path, unicode):
+        return path
+    return path.decode(sys.getfilesystemencoding() or 'utf-8')
+
+
+def _remove(path):
+    """
+    Remove a file, a symbolic link or a directory tree, if it exists.
+    """
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+def _walk(directory):
+    """
+    Like os.walk, but yields the relative path of each directory and the
+    symbolic links (also those to directories, which are not descended)
+    separately from the files.
+    """
+    for (root, dirs, files) in os.walk(directory):
+        links = [name for name in dirs + files
+                 if os.path.islink(os.path.join(root, name))]
+        if links:
+            dirs[:] = [name for name in dirs if name not in links]
+            files = [name for name in files if name not in links]
+        yield (root, os.path.relpath(root, directory), dirs, files, links)
+
+
+def _scan_directory(directory):
+    """
+    Return the manifest entry corresponding to the content of a directory
+    (without md5 sums). The entry is empty if the directory does not exist.
+    """
+    entry = {'files': {}, 'links': {}, 'dirs': []}
+    if not os.path.isdir(directory):
+        return entry
+
+    for (root, rel_root, dirs, files, links) in _walk(directory):
+        for name in dirs:
+            entry['dirs'].append(os.path.normpath(os.path.join(rel_root, name)))
+        for name in links:
+            entry['links'][os.path.normpath(os.path.join(rel_root, name))] = \
+                os.readlink(os.path.join(root, name))
+        for name in files:
+            st = os.stat(os.path.join(root, name))
+            entry['files'][os.path.normpath(os.path.join(rel_root, name))] = \
+                [st.st_size, int(st.st_mtime), None]
+
+    return entry
+
+
+def _sync_directory(source_dir, destination_dir, old_entry, compare_hashes):
+    """
+    Make destination_dir a copy of source_dir, preserving the permissions
+    and the modification times like shutil.copytree, but only copying the
+    files that changed with respect to old_entry, the manifest entry of
+    the destination. What is no longer in the source is removed from the
+    destination.
+
+    :param compare_hashes: if True, files whose size or modification time
+        changed are not copied if their md5 sum did not change
+    :return: a tuple with the new manifest entry and the number of copied
+        files
+    """
+    from aiida.common.utils import md5_file
+
+    if not os.path.isdir(source_dir):
+        raise OSError(errno.ENOENT, os.strerror(errno.ENOENT), source_dir)
+
+    old_files = old_entry['files']
+    old_links = old_entry['links']
+    old_dirs = set(old_entry['dirs'])
+
+    entry = {'files': {}, 'links': {}, 'dirs': []}
+    copied = 0
+    # The modification times of the directories are set at the end, since
+    # writing in them changes them
+    dirs_to_stat = []
+
+    for (root, rel_root, dirs, files, links) in _walk(source_dir):
+        dest_root = os.path.normpath(os.path.join(destination_dir, rel_root))
+        rel_root = os.path.normpath(rel_root)
+        if rel_root != '.':
+            entry['dirs'].append(rel_root)
+        if rel_root == '.' or rel_root not in old_dirs:
+            if not os.path.isdir(dest_root) or os.path.islink(dest_root):
+                _remove(dest_root)
+                os.makedirs(dest_root)
+        dirs_to_stat.append((root, dest_root))
+
+        for name in links:
+            rel_path = os.path.normpath(os.path.join(rel_root, name))
+            target = os.readlink(os.path.join(root, name))
+            if old_links.get(rel_path) != target:
+                dest_path = os.path.join(dest_root, name)
+                _remove(dest_path)
+                os.symlink(target, dest_path)
+            entry['links'][rel_path] = target
+
+        for name in files:
+            rel_path = os.path.normpath(os.path.join(rel_root, name))
+            source_path = os.path.join(root, name)
+            dest_path = os.path.join(dest_root, name)
+            st = os.stat(source_path)
+            size = st.st_size
+            mtime = int(st.st_mtime)
+            md5 = None
+
+            old = old_files.get(rel_path)
+            if old is not None and old[0] == size and old[1] == mtime:
+                # Unchanged
+                md5 = old[2]
+            else:
+                if compare_hashes:
+                    md5 = md5_file(source_path)
+                if (old is not None and md5 is not None and old[0] == size
+                        and old[2] == md5):
+                    # Same content, only the times changed
+                    shutil.copystat(source_path, dest_path)
+                else:
+                    if rel_path in old_links or rel_path in old_dirs:
+                        _remove(dest_path)
+                    shutil.copy2(source_path, dest_path)
+                    copied += 1
+            entry['files'][rel_path] = [size, mtime, md5]
+
+    # Remove what is no longer in the source
+    new_paths = set(entry['files']).union(entry['links'], entry['dirs'])
+    for rel_path in set(old_files).union(old_links).difference(new_paths):
+        _remove(os.path.join(destination_dir, rel_path))
+    for rel_path in sorted(old_dirs.difference(new_paths), reverse=True):
+        _remove(os.path.join(destination_dir, rel_path))
+
+    for (source_path, dest_path) in reversed(dirs_to_stat):
+        shutil.copystat(source_path, dest_path)
+
+    return (entry, copied)
+
 
 class BackupError(Exception):
     def __init__(self, value):
@@ -163,6 +163,15 @@ class BackupSetup(object):
 
  * ``backup_dir``: The destination directory of the backup. e.g.
    ``"backup_dir": "/scratch/aiida_user/backup_script_dest"``
+
+ * ``workers`` (optional): The number of threads copying the directories of
+   the repository in parallel (4 by default). e.g. ``"workers": 8``
+
+ * ``compare_hashes`` (optional): Only the files whose size or modification
+   time changed since the previous backup are copied. If ``compare_hashes``
+   is ``true``, the md5 sum of these files is also compared with the one
+   recorded when they were backed up, and files whose content did not
+   change are not copied again. e.g. ``"compare_hashes": false``
 """
         sys.stdout.write(info_str)
 
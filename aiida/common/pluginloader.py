@@ -76,6 +76,16 @@ def get_class_typestring(type_string):
         return pieces[0], ".".join(pieces[1:-2]), pieces[-2]
 
 
+# The file, in the AiiDA configuration folder, where the plugin index is
+# cached
+PLUGIN_INDEX_FNAME = 'plugin_index.json'
+
+# In-memory caches of the plugin indexes, of load_plugin and of BaseFactory
+_plugin_indexes = {}
+_loaded_plugins = {}
+_factory_plugins = {}
+
+
 def _existing_plugins_with_module(base_class, plugins_module_path,
                                   pkgname, basename, max_depth, suffix=None):
     """
@@ -91,32 +101,34 @@ def _existing_plugins_with_module(base_class, plugins_module_path,
         :param suffix: The suffix that is appended to the basename when looking
             for the (sub)class name. If not provided (or None), use the base
             class name.
-        :return: a list of valid strings that can be used using a Factory or with
-            load_plugin.
+        :return: a dictionary whose keys are the valid strings that can be
+            used using a Factory or with load_plugin, and whose values are
+            the corresponding 'module:class' strings.
     """
     import pkgutil
     import os
 
     if max_depth == 0:
-        return []
+        return {}
     else:
-        retlist = _find_module(base_class, pkgname, basename, suffix)
-
-        for _, name, ismod in pkgutil.walk_packages([plugins_module_path]):
-            if ismod:
-                retlist += _existing_plugins_with_module(
-                    base_class, os.path.join(plugins_module_path, name),
-                    "{}.{}".format(pkgname, name),
-                    "{}.{}".format(basename, name) if basename else name,
-                    max_depth - 1, suffix=suffix)
+        plugins = _find_module(base_class, pkgname, basename, suffix)
 
-            # This has to be done anyway, for classes in the __init__ file.
+        for _, name, ismod in pkgutil.iter_modules([plugins_module_path]):
             this_pkgname = "{}.{}".format(pkgname, name)
             this_basename = "{}.{}".format(basename, name) if basename else name
 
-            retlist += _find_module(base_class, this_pkgname, this_basename, suffix)
+            if ismod and max_depth > 1:
+                # The recursion also looks at the classes in the __init__
+                # file, each module is imported only once
+                plugins.update(_existing_plugins_with_module(
+                    base_class, os.path.join(plugins_module_path, name),
+                    this_pkgname, this_basename,
+                    max_depth - 1, suffix=suffix))
+            else:
+                plugins.update(_find_module(base_class, this_pkgname,
+                                            this_basename, suffix))
 
-        return list(set(retlist))
+        return plugins
 
 
 def _find_module(base_class, pkgname, this_basename, suffix=None):
@@ -140,15 +152,13 @@ def _find_module(base_class, pkgname, this_basename, suffix=None):
     :param suffix: The suffix that is appended to the basename when looking
         for the (sub)class name. If not provided (or None), use the base
         class name.
-    :return: a list of valid strings, acceptable by the *Factory functions.
-       Does not return the class itself.
+    :return: a dictionary whose keys are valid strings, acceptable by the
+       *Factory functions, and whose values are the corresponding
+       'module:class' strings. Does not return the class itself.
     """
     import inspect
 
-    retlist = []
-
-    # print ' '*(5-max_depth), '>', pkgname
-    #print ' '*(5-max_depth), ' ', this_basename
+    plugins = {}
 
     pkg = importlib.import_module(pkgname)
     for k, v in pkg.__dict__.iteritems():
@@ -170,19 +180,174 @@ def _find_module(base_class, pkgname, this_basename, suffix=None):
             if k == "{}{}".format(
                     pkgname.rpartition('.')[2].capitalize(),
                     actual_suffix):
-                retlist.append(this_basename)
+                name = this_basename
             else:
-                retlist.append(
-                    ("{}.{}".format(this_basename, k) if this_basename
-                     else k))
-                #print ' '*(5-max_depth), ' ->', "{}.{}".format(this_basename, k)
-    return retlist
+                name = ("{}.{}".format(this_basename, k) if this_basename
+                        else k)
+            plugins[name] = "{}:{}".format(pkgname, k)
+    return plugins
+
+
+def _get_package_signature(path):
+    """
+    Return a signature of the files of a package, that changes when a module
+    is added, removed or modified: the AiiDA version, the number of python
+    files and their latest modification time.
+    """
+    import os
+
+    count = 0
+    latest = 0.
+    for dirpath, _, filenames in os.walk(path):
+        latest = max(latest, os.path.getmtime(dirpath))
+        for filename in filenames:
+            if filename.endswith('.py'):
+                count += 1
+                latest = max(latest, os.path.getmtime(
+                    os.path.join(dirpath, filename)))
+    return [aiida.__version__, count, latest]
+
+
+def _get_plugin_index_file():
+    import os
+    from aiida.common.setup import AIIDA_CONFIG_FOLDER
+
+    return os.path.join(os.path.expanduser(AIIDA_CONFIG_FOLDER),
+                        PLUGIN_INDEX_FNAME)
+
+
+def _read_plugin_index_file():
+    """
+    :return: the content of the plugin index file, an empty dictionary if
+      it does not exist or cannot be read
+    """
+    import json
+
+    try:
+        with open(_get_plugin_index_file()) as f:
+            index = json.load(f)
+    except (IOError, ValueError):
+        return {}
+    if not isinstance(index, dict):
+        return {}
+    return index
+
+
+def _write_plugin_index_entry(key, entry):
+    """
+    Store an entry in the plugin index file. The file is replaced
+    atomically, and nothing is written if the AiiDA configuration folder
+    does not exist.
+    """
+    import json
+    import os
+
+    index_file = _get_plugin_index_file()
+    if not os.path.isdir(os.path.dirname(index_file)):
+        return
+
+    index = _read_plugin_index_file()
+    index[key] = entry
+    temp_file = "{}.{}".format(index_file, os.getpid())
+    try:
+        with open(temp_file, 'w') as f:
+            json.dump(index, f)
+        os.rename(temp_file, index_file)
+    except (IOError, OSError):
+        logger.debug("Unable to write the plugin index {}".format(index_file))
+
+
+def _get_plugin_index_entry(key, path):
+    """
+    Return the entry of the plugin index with the given key, if it is valid
+    for the files of the package in path, or None. The entries are checked
+    against the files once per process, and then kept in memory.
+    """
+    try:
+        return _plugin_indexes[key]
+    except KeyError:
+        pass
+
+    entry = _read_plugin_index_file().get(key)
+    if entry is None or entry['signature'] != _get_package_signature(path):
+        return None
+    _plugin_indexes[key] = entry
+    return entry
+
+
+def _get_plugin_index_key(base_class, plugins_module_name, max_depth,
+                          suffix):
+    return "{}.{}|{}|{}|{}".format(base_class.__module__, base_class.__name__,
+                                   plugins_module_name, max_depth, suffix)
+
+
+def get_plugin_index(base_class, plugins_module_name, max_depth=5,
+                     suffix=None):
+    """
+    Return the index of the plugins of a given base class: a dictionary
+    whose keys are the valid plugin strings, and whose values are the
+    corresponding 'module:class' strings.
+
+    Finding the plugins requires importing all the modules of the package.
+    The index is therefore stored in the AiiDA configuration folder, and
+    only rebuilt when a module of the package is added, removed or
+    modified (or when AiiDA is updated). This is checked once per process.
+
+    See existing_plugins for the parameters.
+    """
+    try:
+        pluginmod = importlib.import_module(plugins_module_name)
+    except ImportError:
+        raise MissingPluginError("Unable to load the plugin module {}".format(
+            plugins_module_name))
+
+    key = _get_plugin_index_key(base_class, plugins_module_name, max_depth,
+                                suffix)
+    entry = _get_plugin_index_entry(key, pluginmod.__path__[0])
+    if entry is None:
+        signature = _get_package_signature(pluginmod.__path__[0])
+        plugins = _existing_plugins_with_module(base_class,
+                                                pluginmod.__path__[0],
+                                                plugins_module_name,
+                                                "",
+                                                max_depth, suffix)
+        entry = {'signature': signature, 'plugins': plugins}
+        _write_plugin_index_entry(key, entry)
+        _plugin_indexes[key] = entry
+
+    return {str(k): str(v) for k, v in entry['plugins'].iteritems()}
+
+
+def _find_indexed_plugin(base_class, plugins_module, plugin_type):
+    """
+    Look for the plugin in the existing indexes of the plugins of
+    base_class in plugins_module (see get_plugin_index), without building
+    them.
+
+    :return: the 'module:class' string of the plugin, or None if it is not
+        indexed
+    """
+    try:
+        path = importlib.import_module(plugins_module).__path__[0]
+    except (ImportError, AttributeError):
+        return None
+
+    prefix = "{}.{}|{}|".format(base_class.__module__, base_class.__name__,
+                                plugins_module)
+    keys = set(_plugin_indexes) | set(_read_plugin_index_file())
+    for key in sorted(k for k in keys if k.startswith(prefix)):
+        entry = _get_plugin_index_entry(key, path)
+        if entry is not None and plugin_type in entry['plugins']:
+            return str(entry['plugins'][plugin_type])
+    return None
 
 
 def existing_plugins(base_class, plugins_module_name, max_depth=5, suffix=None):
     """
     Return a list of strings of valid plugins.
 
+    The list is read from the plugin index (see get_plugin_index), so that
+    the plugins are not imported.
 
     :param base_class: Identify all subclasses of the base_class
     :param plugins_module_name: a string with the full module name separated
@@ -196,17 +361,8 @@ def existing_plugins(base_class, plugins_module_name, max_depth=5, suffix=None):
     :return: a list of valid strings that can be used using a Factory or with
         load_plugin.
     """
-    try:
-        pluginmod = importlib.import_module(plugins_module_name)
-    except ImportError:
-        raise MissingPluginError("Unable to load the plugin module {}".format(
-            plugins_module_name))
-
-    return _existing_plugins_with_module(base_class,
-                                         pluginmod.__path__[0],
-                                         plugins_module_name,
-                                         "",
-                                         max_depth, suffix)
+    return get_plugin_index(base_class, plugins_module_name, max_depth,
+                            suffix).keys()
 
 
 def load_plugin(base_class, plugins_module, plugin_type):
@@ -243,9 +399,19 @@ def load_plugin(base_class, plugins_module, plugin_type):
        and plugin_class will be the class 'aiida.transport.plugins.ssh.SshTransport'
     """
 
-    module_name = ".".join([plugins_module, plugin_type])
-    real_plugin_module, plugin_name = module_name.rsplit('.', 1)
+    try:
+        return _loaded_plugins[(base_class, plugins_module, plugin_type)]
+    except KeyError:
+        pass
 
+    module_name = ".".join([plugins_module, plugin_type])
+    # The index also resolves the short names (e.g. 'ssh' for
+    # 'ssh.SshTransport'); otherwise, the last part is the class name
+    classpath = _find_indexed_plugin(base_class, plugins_module, plugin_type)
+    if classpath is not None:
+        real_plugin_module, plugin_name = classpath.split(':')
+    else:
+        real_plugin_module, plugin_name = module_name.rsplit('.', 1)
 
     try:
         pluginmod = importlib.import_module(real_plugin_module)
@@ -261,6 +427,8 @@ def load_plugin(base_class, plugins_module, plugin_type):
 
     try:
         if issubclass(pluginclass, base_class):
+            _loaded_plugins[(base_class, plugins_module,
+                             plugin_type)] = pluginclass
             return pluginclass
         else:
             # Quick way of going into the except case
@@ -303,7 +471,12 @@ def BaseFactory(module, base_class, base_modname, suffix=None):
       By default, use the name of the base_class.
     """
     try:
-        return load_plugin(base_class, base_modname, module)
+        return _factory_plugins[(module, base_class, base_modname, suffix)]
+    except KeyError:
+        pass
+
+    try:
+        pluginclass = load_plugin(base_class, base_modname, module)
     except MissingPluginError as e1:
         # Automatically add subclass name and try again
         if suffix is None:
@@ -313,10 +486,13 @@ def BaseFactory(module, base_class, base_modname, suffix=None):
         mname = module.rpartition('.')[2].capitalize() + actual_suffix
         new_module = module + '.' + mname
         try:
-            return load_plugin(base_class, base_modname, new_module)
+            pluginclass = load_plugin(base_class, base_modname, new_module)
         except MissingPluginError as e2:
             err_msg = ("Neither {} or {} could be loaded from {}. "
                        "Error messages were: '{}', '{}'").format(
                 module, new_module, base_modname, e1, e2)
             raise MissingPluginError(err_msg)
 
+    _factory_plugins[(module, base_class, base_modname, suffix)] = pluginclass
+    return pluginclass
+
@@ -62,25 +62,87 @@ def backup_config():
             os.umask(old_umask)
 
 
-def get_config():
+# The parsed configuration file, as a tuple (stat, config), where stat
+# identifies the version of the file that was read (see _get_config_stat)
+_config_cache = None
+
+
+def _get_config_stat(conf_file):
     """
-    Return all the configurations
+    Return a tuple (path, mtime, size) identifying the current version of the
+    configuration file.
+
+    :raise OSError: if the file does not exist
+    """
+    stat = os.stat(conf_file)
+    return (conf_file, stat.st_mtime, stat.st_size)
+
+
+def _copy_config(value):
+    """
+    Return a deep copy of a configuration value (faster than copy.deepcopy,
+    since the configuration contains only dictionaries, lists and
+    immutable values).
+    """
+    if isinstance(value, dict):
+        return {k: _copy_config(v) for k, v in value.iteritems()}
+    elif isinstance(value, list):
+        return [_copy_config(v) for v in value]
+    else:
+        return value
+
+
+def reload_config():
+    """
+    Drop the cached configuration, so that the configuration file is read
+    again at the next get_config call (this is needed only if the file was
+    modified by another process within the resolution of its modification
+    time).
+    """
+    global _config_cache
+
+    _config_cache = None
+
+
+def _read_config():
+    """
+    Return the parsed configuration file, from the cache if the file did not
+    change (i.e., if its modification time and size did not change).
+
+    .. note:: the returned dictionary is shared: it must not be modified.
+
+    :raise ConfigurationError: if there is no configuration file
     """
     import json
     from aiida.common.exceptions import ConfigurationError
     from aiida.backends.settings import IN_DOC_MODE, DUMMY_CONF_FILE
 
+    global _config_cache
+
     if IN_DOC_MODE:
         return DUMMY_CONF_FILE
 
     aiida_dir = os.path.expanduser(AIIDA_CONFIG_FOLDER)
     conf_file = os.path.join(aiida_dir, CONFIG_FNAME)
     try:
-        with open(conf_file, "r") as json_file:
-            return json.load(json_file)
-    except IOError:
+        stat = _get_config_stat(conf_file)
+        if _config_cache is None or _config_cache[0] != stat:
+            with open(conf_file, "r") as json_file:
+                _config_cache = (stat, json.load(json_file))
+    except (IOError, OSError):
         # No configuration file
         raise ConfigurationError("No configuration file found")
+    return _config_cache[1]
+
+
+def get_config():
+    """
+    Return all the configurations
+
+    The parsed file is cached (see reload_config); a new copy is returned at
+    each call, so that it can be modified by the caller.
+    """
+    return _copy_config(_read_config())
 
 
 def get_or_create_config():
@@ -101,6 +163,8 @@ def store_config(confs):
     """
     import json
 
+    global _config_cache
+
     aiida_dir = os.path.expanduser(AIIDA_CONFIG_FOLDER)
     conf_file = os.path.join(aiida_dir, CONFIG_FNAME)
     old_umask = os.umask(DEFAULT_UMASK)
@@ -109,6 +173,9 @@ def store_config(confs):
             json.dump(confs, json_file)
     finally:
         os.umask(old_umask)
+    # Read again at the next get_config, even if the modification time
+    # and size did not change
+    _config_cache = None
 
 
 def install_daemon_files(aiida_dir, daemon_dir, log_dir, local_user,
@@ -418,7 +485,7 @@ def get_default_profile(process):
     :return: None if no default profile is found, otherwise the name of the
       default profile for the given process
     """
-    confs = get_config()
+    confs = _read_config()
     try:
         return confs['default_profiles'][process]
     except KeyError:
@@ -432,7 +499,7 @@ def get_profiles_list():
     """
     from aiida.common.exceptions import ConfigurationError
 
-    all_config = get_config()
+    all_config = _read_config()
     try:
         return all_config['profiles'].keys()
     except KeyError:
@@ -457,7 +524,8 @@ def get_profile_config(profile, conf_dict=None, set_test_location=True):
         ConfigurationError, ProfileConfigurationError)
 
     if conf_dict is None:
-        confs = get_config()
+        # A copy of the profile is returned at the end
+        confs = _read_config()
     else:
         confs = conf_dict
 
@@ -514,6 +582,8 @@ def get_profile_config(profile, conf_dict=None, set_test_location=True):
     #         profile_info['AIIDADB_ENGINE'] = 'sqlite3'
     #         profile_info['AIIDADB_NAME'] = ":memory:"
 
+    if conf_dict is None:
+        return _copy_config(profile_info)
     return profile_info
 
 
@@ -995,6 +1065,116 @@ _property_table = {
         "Minimum level to log to the DbLog table",
         "WARNING",
         ["CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG"]),
+    "logging.db_log_queue_size": (
+        "logging_db_log_queue_size",
+        "int",
+        "Maximum number of log records waiting to be stored in the DbLog "
+        "table",
+        10000,
+        None),
+    "logging.db_log_flush_interval": (
+        "logging_db_log_flush_interval",
+        "float",
+        "Maximum time (in seconds) a log record waits before being stored in "
+        "the DbLog table",
+        1.,
+        None),
+    "logging.db_log_overflow": (
+        "logging_db_log_overflow",
+        "string",
+        "What to do with a log record when the queue of the records waiting "
+        "to be stored in the DbLog table is full: 'block' waits for some room "
+        "in the queue, 'drop' discards the record",
+        "block",
+        ["block", "drop"]),
+    "daemon.remote_file_cache": (
+        "daemon_remote_file_cache",
+        "bool",
+        "Whether the daemon uploads the files of the local_copy_list of the "
+        "calculations once for every computer, in a cache folder of the "
+        "remote working directory, and hard-links them (read-only) in the "
+        "working directory of each calculation",
+        False,
+        None),
+    "daemon.direct_remote_copy": (
+        "daemon_direct_remote_copy",
+        "bool",
+        "Whether the daemon first tries to copy the files of the "
+        "remote_copy_list coming from another computer directly between the "
+        "two computers (with scp, run on the source computer), instead of "
+        "streaming them through the computer of the daemon",
+        False,
+        None),
+    "daemon.job_arrays": (
+        "daemon_job_arrays",
+        "bool",
+        "Whether the daemon submits the calculations with the same codes and "
+        "the same scheduler options (resources, walltime, queue, ...) on the "
+        "same computer together, as a job array, if the scheduler supports "
+        "it",
+        False,
+        None),
+    "daemon.job_array_max_size": (
+        "daemon_job_array_max_size",
+        "int",
+        "Maximum number of calculations in a job array submitted by the "
+        "daemon",
+        1000,
+        None),
+    "daemon.job_packing_size": (
+        "daemon_job_packing_size",
+        "int",
+        "If larger than 1, the daemon packs up to this number of calculations "
+        "with the same codes and the same scheduler options on the same "
+        "computer in a single job, running them concurrently (only for "
+        "calculations on a single machine); takes precedence over "
+        "daemon.job_arrays",
+        0,
+        None),
+    "daemon.job_packing_concurrency": (
+        "daemon_job_packing_concurrency",
+        "int",
+        "Maximum number of calculations running at the same time in a job "
+        "packed by the daemon: the job requests the resources of this number "
+        "of calculations (0 to run all the calculations of the job at the "
+        "same time)",
+        0,
+        None),
+    "daemon.metrics_port": (
+        "daemon_metrics_port",
+        "int",
+        "If not 0, the local port (on 127.0.0.1) where the daemon serves the "
+        "metrics of its tasks, in the Prometheus text format",
+        0,
+        None),
+    "sqlalchemy.pool_size": (
+        "sqlalchemy_pool_size",
+        "int",
+        "Number of database connections kept open by the SQLAlchemy backend "
+        "(each thread using the database uses its own connection)",
+        5,
+        None),
+    "sqlalchemy.pool_max_overflow": (
+        "sqlalchemy_pool_max_overflow",
+        "int",
+        "Number of database connections that the SQLAlchemy backend can open "
+        "beyond sqlalchemy.pool_size, and that are closed when released",
+        10,
+        None),
+    "sqlalchemy.pool_timeout": (
+        "sqlalchemy_pool_timeout",
+        "float",
+        "Maximum time (in seconds) a thread waits for a database connection "
+        "when all of them are in use, with the SQLAlchemy backend",
+        30.,
+        None),
+    "sqlalchemy.pool_recycle": (
+        "sqlalchemy_pool_recycle",
+        "int",
+        "Time (in seconds) after which the database connections are opened "
+        "again by the SQLAlchemy backend (-1 to never reopen them)",
+        -1,
+        None),
     "tcod.depositor_username": (
         "tcod_depositor_username",
         "string",
@@ -1025,6 +1205,13 @@ _property_table = {
         "E-mail address for TCOD depositions",
         None,
         None),
+    "structure.descriptors_spacegroup": (
+        "structure_descriptors_spacegroup",
+        "bool",
+        "Whether to compute the space group (with pyspglib) in the "
+        "descriptors that are stored with each StructureData",
+        False,
+        None),
     "warnings.showdeprecations":(
         "show_deprecations",
         "bool",
@@ -1083,8 +1270,8 @@ def get_property(name, default=_NoDefaultValue()):
 
     try:
         try:
-            config = get_config()
-            return config[key]
+            config = _read_config()
+            return _copy_config(config[key])
         except ConfigurationError:
             raise KeyError("No configuration file found")
     except KeyError:
@@ -1155,6 +1342,16 @@ def set_property(name, value):
             actual_value = bool(value)
     elif type_string == "string":
         actual_value = unicode(value)
+    elif type_string == "int":
+        try:
+            actual_value = int(value)
+        except ValueError:
+            raise ValueError("Invalid int value for property {}".format(name))
+    elif type_string == "float":
+        try:
+            actual_value = float(value)
+        except ValueError:
+            raise ValueError("Invalid float value for property {}".format(name))
     else:
         # Implement here other data types
         raise NotImplementedError("Type string '{}' not implemented yet".format(
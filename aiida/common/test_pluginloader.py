@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from aiida.common import pluginloader
+from aiida.common.exceptions import MissingPluginError
+
+__copyright__ = u"Copyright (c), This file is part of the AiiDA platform. For further information please visit http://www.aiida.net/. All rights reserved."
+__license__ = "MIT license, see LICENSE.txt file."
+__version__ = "0.7.1"
+__authors__ = "The AiiDA team."
+
+BASE_MODULE = """
+class Transport(object):
+    pass
+"""
+
+PLUGIN_MODULE = """
+from {pkg}.base import Transport
+
+class {name}Transport(Transport):
+    pass
+"""
+
+
+class PluginIndexTest(unittest.TestCase):
+    """
+    Tests for the plugin index and load_plugin, on a package of plugins
+    created in a temporary folder.
+    """
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.pkg = 'aiidatestplugins{}'.format(id(self))
+        self.plugins_module = '{}.plugins'.format(self.pkg)
+        self.plugins_path = os.path.join(self.folder, self.pkg, 'plugins')
+        os.makedirs(self.plugins_path)
+        self.write_module(os.path.join(self.pkg, '__init__.py'), "")
+        self.write_module(os.path.join(self.pkg, 'base.py'), BASE_MODULE)
+        self.write_module(os.path.join(self.pkg, 'plugins', '__init__.py'), "")
+        self.write_plugin('ssh')
+        sys.path.insert(0, self.folder)
+
+        from importlib import import_module
+        self.base_class = import_module(
+            '{}.base'.format(self.pkg)).Transport
+
+        self.index_file = os.path.join(self.folder, 'plugin_index.json')
+        self.get_plugin_index_file = pluginloader._get_plugin_index_file
+        pluginloader._get_plugin_index_file = lambda: self.index_file
+        self.clear_memory()
+
+    def tearDown(self):
+        pluginloader._get_plugin_index_file = self.get_plugin_index_file
+        self.clear_memory()
+        sys.path.remove(self.folder)
+        for name in list(sys.modules):
+            if name.split('.')[0] == self.pkg:
+                del sys.modules[name]
+        shutil.rmtree(self.folder)
+
+    def clear_memory(self):
+        """
+        Forget the indexes and the plugins loaded by this process.
+        """
+        pluginloader._plugin_indexes.clear()
+        pluginloader._loaded_plugins.clear()
+        pluginloader._factory_plugins.clear()
+
+    def write_module(self, relpath, content):
+        with open(os.path.join(self.folder, relpath), 'w') as f:
+            f.write(content)
+
+    def write_plugin(self, name):
+        self.write_module(
+            os.path.join(self.pkg, 'plugins', '{}.py'.format(name)),
+            PLUGIN_MODULE.format(pkg=self.pkg, name=name.capitalize()))
+
+    def get_index(self):
+        return pluginloader.get_plugin_index(self.base_class,
+                                             self.plugins_module)
+
+    def test_index(self):
+        """
+        The index is built once, stored, and then read without importing
+        the plugins.
+        """
+        index = self.get_index()
+        self.assertEqual(index, {
+            'ssh': '{}.ssh:SshTransport'.format(self.plugins_module)})
+        self.assertTrue(os.path.exists(self.index_file))
+
+        # A new process reads the stored index
+        self.clear_memory()
+        del sys.modules['{}.ssh'.format(self.plugins_module)]
+        self.assertEqual(self.get_index(), index)
+        self.assertNotIn('{}.ssh'.format(self.plugins_module), sys.modules)
+
+    def test_invalidation(self):
+        """
+        The stored index is rebuilt when a plugin is added, but only checked
+        once per process.
+        """
+        self.get_index()
+        # The modification times may have a resolution of one second
+        time.sleep(1.1)
+        self.write_plugin('local')
+
+        # Not checked again by the same process
+        self.assertEqual(self.get_index().keys(), ['ssh'])
+
+        self.clear_memory()
+        self.assertEqual(sorted(self.get_index().keys()), ['local', 'ssh'])
+        self.clear_memory()
+        self.assertEqual(sorted(self.get_index().keys()), ['local', 'ssh'])
+
+    def test_load_plugin(self):
+        """
+        load_plugin resolves the short names through the index, and the
+        full names also without it.
+        """
+        with self.assertRaises(MissingPluginError):
+            pluginloader.load_plugin(self.base_class, self.plugins_module,
+                                     'ssh')
+        cls = pluginloader.load_plugin(self.base_class, self.plugins_module,
+                                       'ssh.SshTransport')
+        self.assertEqual(cls.__name__, 'SshTransport')
+
+        self.get_index()
+        self.assertIs(pluginloader.load_plugin(
+            self.base_class, self.plugins_module, 'ssh'), cls)
+        # Also from the stored index, in a new process
+        self.clear_memory()
+        self.assertIs(pluginloader.load_plugin(
+            self.base_class, self.plugins_module, 'ssh'), cls)
+
+        with self.assertRaises(MissingPluginError):
+            pluginloader.load_plugin(self.base_class, self.plugins_module,
+                                     'ssh.LocalTransport')
@@ -5,6 +5,9 @@ results. These are general and contain only the main logic; where appropriate,
 the routines make reference to the suitable plugins for all
 plugin-specific operations.
 """
+import json
+import os
+
 from aiida.common.datastructures import calc_states
 from aiida.scheduler.datastructures import job_states
 from aiida.common.exceptions import (
@@ -14,7 +17,8 @@ from aiida.common.exceptions import (
 )
 from aiida.common import aiidalogger
 from aiida.common.links import LinkType
-from aiida.orm import load_node
+from aiida.daemon.metadatacache import metadata_cache
+from aiida.daemon.metrics import daemon_metrics, STAGE_PARSING
 
 
 __copyright__ = u"Copyright (c), This file is part of the AiiDA platform. For further information please visit http://www.aiida.net/. All rights reserved."
@@ -24,6 +28,24 @@ __authors__ = "The AiiDA team."
 
 execlogger = aiidalogger.getChild('execmanager')
 
+# Number of threads of submit_jobs_with_authinfo that do the remote copies
+# and symlinks of the calculations being submitted
+STAGING_WORKERS = 4
+
+# Name of the submit script of the job arrays, written in the working
+# directory of the first calculation of each array
+JOB_ARRAY_SCRIPT_FILENAME = '_aiidasubmit_array.sh'
+
+# Name of the submit script of the packed jobs, written in the working
+# directory of the first calculation of each job
+JOB_PACK_SCRIPT_FILENAME = '_aiidasubmit_pack.sh'
+
+# Fields of the job template that do not go in the header of the submit
+# script, and that can differ among the calculations of a job array or of a
+# packed job (each calculation runs its own submit script)
+_JOB_ARRAY_TASK_FIELDS = ('job_name', 'working_directory', 'codes_info',
+                          'codes_run_mode', 'prepend_text', 'append_text')
+
 
 def update_running_calcs_status(authinfo):
     """
@@ -57,8 +79,8 @@ def update_running_calcs_status(authinfo):
 
     # NOTE: no further check is done that machine and
     # aiidauser are correct for each calc in calcs
-    s = Computer(dbcomputer=authinfo.dbcomputer).get_scheduler()
-    t = authinfo.get_transport()
+    s = metadata_cache.get_scheduler(authinfo.dbcomputer)
+    t = metadata_cache.get_transport(authinfo)
 
     computed = []
 
@@ -84,6 +106,17 @@ def update_running_calcs_status(authinfo):
             else:
                 found_jobs = s.getJobs(jobs=jobids_to_inquire, as_dict=True)
 
+            # The calculations of a packed job still in the queue are
+            # computed as soon as their own task ends
+            try:
+                finished_packed_calcs = _get_finished_packed_calcs(
+                    t, calcs_to_inquire, found_jobs)
+            except Exception as e:
+                execlogger.warning("There was an exception while checking the "
+                                   "tasks of the packed jobs ({}): {}".format(
+                    e.__class__.__name__, e.message))
+                finished_packed_calcs = set()
+
             # I update the status of jobs
 
             for c in calcs_to_inquire:
@@ -98,9 +131,18 @@ def update_running_calcs_status(authinfo):
                             c.pk), extra=logger_extra)
                         continue
 
+                    if c.pk in finished_packed_calcs:
+                        execlogger.debug("Inquirying calculation {} (jobid "
+                                         "{}): its task in the packed job is "
+                                         "finished, assuming job_state="
+                                         "{}".format(
+                            c.pk, jobid, job_states.DONE), extra=logger_extra)
+
+                        computed.append(c)
+                        c._set_scheduler_state(job_states.DONE)
                     # I check if the calculation to be checked (c)
                     # is in the output of qstat
-                    if jobid in found_jobs:
+                    elif jobid in found_jobs:
                         # jobinfo: the information returned by
                         # qstat for this job
                         jobinfo = found_jobs[jobid]
@@ -181,12 +223,60 @@ def update_running_calcs_status(authinfo):
                         # Someone already set it, just skip
                         pass
 
+    daemon_metrics.add_calculations(len(computed))
     return computed
 
 
+def _get_finished_packed_calcs(transport, calcs, found_jobs):
+    """
+    Return the pks of the calculations packed in a job still in the queue,
+    whose task in the job is finished: the ones with the
+    PACKED_TASK_EXIT_CODE_FILE in their working directory (see
+    Scheduler.get_submit_packed_script). All the working directories are
+    checked with a single remote command.
+
+    The calculations are checked by job id, for all the jobs still in the
+    queue: also the last calculation of a packed job whose other
+    calculations are already computed. Nothing is checked if the daemon
+    does not pack the calculations (see _use_job_packing).
+
+    :param transport: an open transport
+    :param calcs: the calculations in the WITHSCHEDULER state
+    :param found_jobs: the jobs in the queue, as a dictionary with the job
+        ids as keys
+    """
+    from aiida.common.utils import escape_for_bash
+    from aiida.scheduler import PACKED_TASK_EXIT_CODE_FILE
+
+    if not _use_job_packing():
+        return set()
+
+    workdirs = {}
+    for c in calcs:
+        job_id = c.get_job_id()
+        if job_id is not None and job_id in found_jobs:
+            workdir = c._get_remote_workdir()
+            if workdir:
+                workdirs[workdir] = c.pk
+    if not workdirs:
+        return set()
+
+    command = ('for d in {}; do if [ -e "$d"/{} ]; then echo "$d"; fi; '
+               'done'.format(" ".join(escape_for_bash(w) for w in workdirs),
+                             PACKED_TASK_EXIT_CODE_FILE))
+    retval, stdout, stderr = transport.exec_command_wait(command)
+    if retval != 0:
+        raise ValueError("Error checking the tasks of the packed jobs (exit "
+                         "code: {}, stderr: '{}')".format(retval, stderr))
+
+    return set(workdirs[w] for w in stdout.splitlines() if w in workdirs)
+
+
 def retrieve_jobs():
     from aiida.orm import JobCalculation, Computer
-    from aiida.backends.utils import get_authinfo, QueryFactory
+    from aiida.backends.utils import QueryFactory
+
+    metadata_cache.refresh()
 
     qmanager = QueryFactory()()
     # I create a unique set of pairs (computer, aiidauser)
@@ -208,7 +298,7 @@ def retrieve_jobs():
         execlogger.debug("({},{}) pair to check".format(
             aiidauser.email, computer.name))
         try:
-            authinfo = get_authinfo(computer.dbcomputer, aiidauser._dbuser)
+            authinfo = metadata_cache.get_authinfo(computer, aiidauser)
             retrieve_computed_for_authinfo(authinfo)
         except Exception as e:
             msg = ("Error while retrieving calculation status for "
@@ -228,7 +318,9 @@ def update_jobs():
     calls an update for each set of pairs (machine, aiidauser)
     """
     from aiida.orm import JobCalculation, Computer, User
-    from aiida.backends.utils import get_authinfo, QueryFactory
+    from aiida.backends.utils import QueryFactory
+
+    metadata_cache.refresh()
 
     qmanager = QueryFactory()()
     # I create a unique set of pairs (computer, aiidauser)
@@ -244,7 +336,7 @@ def update_jobs():
             aiidauser.email, computer.name))
 
         try:
-            authinfo = get_authinfo(computer.dbcomputer, aiidauser._dbuser)
+            authinfo = metadata_cache.get_authinfo(computer, aiidauser)
             computed_calcs = update_running_calcs_status(authinfo)
         except Exception as e:
             msg = ("Error while updating calculation status "
@@ -264,8 +356,10 @@ def submit_jobs():
     """
     from aiida.orm import JobCalculation, Computer, User
     from aiida.utils.logger import get_dblogger_extra
-    from aiida.backends.utils import get_authinfo, QueryFactory
+    from aiida.backends.utils import QueryFactory
+
 
+    metadata_cache.refresh()
 
     qmanager = QueryFactory()()
     # I create a unique set of pairs (computer, aiidauser)
@@ -282,7 +376,7 @@ def submit_jobs():
 
         try:
             try:
-                authinfo = get_authinfo(computer.dbcomputer, aiidauser._dbuser)
+                authinfo = metadata_cache.get_authinfo(computer, aiidauser)
             except AuthenticationError:
                 # TODO!!
                 # Put each calculation in the SUBMISSIONFAILED state because
@@ -330,7 +424,18 @@ def submit_jobs_with_authinfo(authinfo):
     """
     Submit jobs in TOSUBMIT status belonging
     to user and machine as defined in the 'dbauthinfo' table.
+
+    The files of each calculation are uploaded in turn; the remote copies and
+    symlinks of a calculation are then staged in a pool of STAGING_WORKERS
+    threads, while the next calculations are uploaded, and each calculation
+    is submitted to the scheduler as soon as its staging is completed.
+
+    If the daemon.job_packing_size property is larger than 1, or the
+    daemon.job_arrays property is True and the scheduler supports job arrays,
+    the calculations are instead submitted together when all of them are
+    staged (see submit_staged_calcs).
     """
+    from multiprocessing.pool import ThreadPool
     from aiida.orm import JobCalculation
     from aiida.utils.logger import get_dblogger_extra
 
@@ -359,22 +464,62 @@ def submit_jobs_with_authinfo(authinfo):
         # Open connection
         try:
             # I do it here so that the transport is opened only once per computer
-            with authinfo.get_transport() as t:
-                for c in calcs_to_inquire:
-                    logger_extra = get_dblogger_extra(c)
-                    t._set_logger_extra(logger_extra)
+            with metadata_cache.get_transport(authinfo) as t:
+                pool = ThreadPool(STAGING_WORKERS)
+                try:
+                    staged_calcs = []
+                    for c in calcs_to_inquire:
+                        logger_extra = get_dblogger_extra(c)
+                        t._set_logger_extra(logger_extra)
 
-                    try:
-                        submit_calc(calc=c, authinfo=authinfo, transport=t)
-                    except Exception as e:
-                        # TODO: implement a counter, after N retrials
-                        # set it to a status that
-                        # requires the user intervention
-                        execlogger.warning("There was an exception for "
-                                           "calculation {} ({}): {}".format(
-                            c.pk, e.__class__.__name__, e.message))
-                        # I just proceed to the next calculation
-                        continue
+                        try:
+                            staging = upload_calc(calc=c, authinfo=authinfo,
+                                                  transport=t)
+                        except Exception as e:
+                            # TODO: implement a counter, after N retrials
+                            # set it to a status that
+                            # requires the user intervention
+                            execlogger.warning("There was an exception for "
+                                               "calculation {} ({}): {}".format(
+                                c.pk, e.__class__.__name__, e.message))
+                            # I just proceed to the next calculation
+                            continue
+                        staged_calcs.append((c, staging, pool.apply_async(
+                            stage_calc, (staging,))))
+
+                    submit_together = (_use_job_packing() or
+                                       _use_job_arrays(authinfo))
+                    calcs_to_submit = []
+                    for c, staging, result in staged_calcs:
+                        logger_extra = get_dblogger_extra(c)
+                        t._set_logger_extra(logger_extra)
+
+                        try:
+                            try:
+                                result.get()
+                            except Exception as e:
+                                _set_submission_failed(
+                                    c, "Staging of the remote files failed: "
+                                       "{}".format(e))
+                                raise
+                            if submit_together:
+                                calcs_to_submit.append((c, staging))
+                            else:
+                                submit_staged_calc(calc=c, authinfo=authinfo,
+                                                   transport=t,
+                                                   staging=staging)
+                        except Exception as e:
+                            execlogger.warning("There was an exception for "
+                                               "calculation {} ({}): {}".format(
+                                c.pk, e.__class__.__name__, e.message))
+                            continue
+
+                    if calcs_to_submit:
+                        submit_staged_calcs(calcs_to_submit,
+                                            authinfo=authinfo, transport=t)
+                finally:
+                    pool.close()
+                    pool.join()
         # Catch exceptions also at this level (this happens only if there is
         # a problem opening the transport in the 'with t' statement,
         # because any other exception is caught and skipped above
@@ -397,6 +542,30 @@ def submit_jobs_with_authinfo(authinfo):
             raise
 
 
+def _set_submission_failed(calc, message=None):
+    """
+    Set the calculation in the SUBMISSIONFAILED state (if nobody else did it
+    already), and log the error.
+
+    :param message: the error message; by default, the traceback of the
+        exception being handled.
+    """
+    import traceback
+    from aiida.utils.logger import get_dblogger_extra
+
+    try:
+        calc._set_state(calc_states.SUBMISSIONFAILED)
+    except ModificationNotAllowed:
+        # Someone already set it, just skip
+        pass
+
+    if message is None:
+        message = "Traceback: {}".format(traceback.format_exc())
+    execlogger.error("Submission of calc {} failed, check also the "
+                     "log file! {}".format(calc.pk, message),
+                     extra=get_dblogger_extra(calc))
+
+
 def submit_calc(calc, authinfo, transport=None):
     """
     Submit a calculation
@@ -414,25 +583,56 @@ def submit_calc(calc, authinfo, transport=None):
         are done on the consistency of the given transport with the transport
         of the computer defined in the authinfo.
     """
-    from aiida.orm import Code, Computer
-    from aiida.common.folders import SandboxFolder
-    from aiida.common.exceptions import (
-        InputValidationError)
-    from aiida.orm.data.remote import RemoteData
-    from aiida.utils.logger import get_dblogger_extra
-
     if not authinfo.enabled:
         return
 
-    logger_extra = get_dblogger_extra(calc)
-
     if transport is None:
-        t = authinfo.get_transport()
+        t = metadata_cache.get_transport(authinfo)
         must_open_t = True
     else:
         t = transport
         must_open_t = False
 
+    try:
+        if must_open_t:
+            t.open()
+
+        staging = upload_calc(calc, authinfo, t)
+        try:
+            stage_calc(staging)
+        except Exception:
+            _set_submission_failed(calc)
+            raise
+        submit_staged_calc(calc, authinfo, t, staging)
+    finally:
+        # close the transport, but only if it was opened within this function
+        if must_open_t:
+            t.close()
+
+
+def upload_calc(calc, authinfo, transport):
+    """
+    First step of the submission of a calculation: put it in the SUBMITTING
+    state, create its remote working directory and upload its files.
+
+    :param calc: the calculation to submit
+        (an instance of the aiida.orm.JobCalculation class)
+    :param authinfo: the authinfo for this calculation.
+    :param transport: an already opened transport, for the computer defined
+        by the authinfo.
+    :return: a dictionary with what is left to do to submit the calculation,
+        to be passed to stage_calc and then to submit_staged_calc.
+    """
+    from aiida.common.folders import SandboxFolder
+    from aiida.common.exceptions import (
+        InputValidationError)
+    from aiida.common.setup import get_property
+    from aiida.daemon.remotefilecache import put_with_cache
+    from aiida.orm import Computer, User
+    from aiida.utils.logger import get_dblogger_extra
+
+    t = transport
+    logger_extra = get_dblogger_extra(calc)
     t._set_logger_extra(logger_extra)
 
     if calc._has_cached_links():
@@ -458,12 +658,6 @@ def submit_calc(calc, authinfo, transport=None):
                          "someone else!")
 
     try:
-        if must_open_t:
-            t.open()
-
-        s = Computer(dbcomputer=authinfo.dbcomputer).get_scheduler()
-        s.set_transport(t)
-
         computer = calc.get_computer()
 
         with SandboxFolder() as folder:
@@ -471,16 +665,22 @@ def submit_calc(calc, authinfo, transport=None):
                 folder, use_unstored_links=False)
 
             codes_info = calcinfo.codes_info
-            input_codes = [load_node(_.code_uuid, parent_class=Code)
+            input_codes = [metadata_cache.get_code(_.code_uuid)
                            for _ in codes_info ]
 
             for code in input_codes:
-                if not code.can_run_on(computer):
+                if not metadata_cache.can_run_on(code, computer):
                     raise InputValidationError(
                         "The selected code {} for calculation "
                         "{} cannot run on computer {}".
                         format(code.pk, calc.pk, computer.name))
 
+            # The job template, to submit the calculation in a job array or
+            # in a packed job
+            with open(folder.get_subfolder('.aiida').get_abs_path(
+                    'job_tmpl.json')) as f:
+                job_tmpl = json.load(f)
+
             # After this call, no modifications to the folder should be done
             calc._store_raw_input_folder(folder.abspath)
 
@@ -560,100 +760,472 @@ def submit_calc(calc, authinfo, transport=None):
             remote_symlink_list = calcinfo.remote_symlink_list
 
             if local_copy_list is not None:
+                # With the remote file cache, the files are put all
+                # together after the folders
+                if get_property('daemon.remote_file_cache'):
+                    cached_copy_list = [
+                        (src_abs_path, dest_rel_path)
+                        for src_abs_path, dest_rel_path in local_copy_list
+                        if os.path.isfile(src_abs_path)]
+                else:
+                    cached_copy_list = []
+
                 for src_abs_path, dest_rel_path in local_copy_list:
+                    if (src_abs_path, dest_rel_path) in cached_copy_list:
+                        continue
                     execlogger.debug("[submission of calc {}] "
                                      "copying local file/folder to {}".format(
                         calc.pk, dest_rel_path),
                                      extra=logger_extra)
                     t.put(src_abs_path, dest_rel_path)
 
-            if remote_copy_list is not None:
-                for (remote_computer_uuid, remote_abs_path,
-                     dest_rel_path) in remote_copy_list:
-                    if remote_computer_uuid == computer.uuid:
-                        execlogger.debug("[submission of calc {}] "
-                                         "copying {} remotely, directly on the machine "
-                                         "{}".format(calc.pk, dest_rel_path, computer.name))
-                        try:
-                            t.copy(remote_abs_path, dest_rel_path)
-                        except (IOError, OSError):
-                            execlogger.warning("[submission of calc {}] "
-                                               "Unable to copy remote resource from {} to {}! "
-                                               "Stopping.".format(calc.pk,
-                                                                  remote_abs_path, dest_rel_path),
-                                               extra=logger_extra)
-                            raise
-                    else:
-                        # TODO: implement copy between two different
-                        # machines!
-                        raise NotImplementedError(
-                            "[presubmission of calc {}] "
-                            "Remote copy between two different machines is "
-                            "not implemented yet".format(calc.pk))
-
-            if remote_symlink_list is not None:
-                for (remote_computer_uuid, remote_abs_path,
-                     dest_rel_path) in remote_symlink_list:
-                    if remote_computer_uuid == computer.uuid:
-                        execlogger.debug("[submission of calc {}] "
-                                         "copying {} remotely, directly on the machine "
-                                         "{}".format(calc.pk, dest_rel_path, computer.name))
-                        try:
-                            t.symlink(remote_abs_path, dest_rel_path)
-                        except (IOError, OSError):
-                            execlogger.warning("[submission of calc {}] "
-                                               "Unable to create remote symlink from {} to {}! "
-                                               "Stopping.".format(calc.pk,
-                                                                  remote_abs_path, dest_rel_path),
-                                               extra=logger_extra)
-                            raise
-                    else:
-                        raise IOError("It is not possible to create a symlink "
-                                      "between two different machines for "
-                                      "calculation {}".format(calc.pk))
-
-            remotedata = RemoteData(computer=computer,
-                                    remote_path=workdir)
-            remotedata.add_link_from(calc, label='remote_folder',
-                                     link_type=LinkType.CREATE)
-            remotedata.store()
-
-            job_id = s.submit_from_script(t.getcwd(), script_filename)
-            calc._set_job_id(job_id)
-            # This should always be possible, because we should be
-            # the only ones submitting this calculations,
-            # so I do not check the ModificationNotAllowed
-            calc._set_state(calc_states.WITHSCHEDULER)
-            ## I do not set the state to queued; in this way, if the
-            ## daemon is down, the user sees '(unknown)' as last state
-            ## and understands that the daemon is not running.
-            # if job_tmpl.submit_as_hold:
-            #    calc._set_scheduler_state(job_states.QUEUED_HELD)
-            #else:
-            #    calc._set_scheduler_state(job_states.QUEUED)
-
-            execlogger.debug("submitted calculation {} on {} with "
-                             "jobid {}".format(calc.pk, computer.name, job_id),
-                             extra=logger_extra)
-
-    except Exception as e:
-        import traceback
+                if cached_copy_list:
+                    execlogger.debug("[submission of calc {}] "
+                                     "copying {} local files through the "
+                                     "remote file cache".format(
+                        calc.pk, len(cached_copy_list)),
+                                     extra=logger_extra)
+                    put_with_cache(t, authinfo, remote_working_directory,
+                                   cached_copy_list)
+
+        # The remote copies and symlinks are only collected here, and done
+        # later by stage_calc. The destinations are made absolute, since the
+        # staging may happen while the transport is used (and its current
+        # directory changed) to upload other calculations.
+        copy_list = []
+        symlink_list = []
+        other_computer_copy_list = []
+
+        if remote_copy_list is not None:
+            for (remote_computer_uuid, remote_abs_path,
+                 dest_rel_path) in remote_copy_list:
+                dest_abs_path = os.path.join(workdir, dest_rel_path)
+                if remote_computer_uuid == computer.uuid:
+                    execlogger.debug("[submission of calc {}] "
+                                     "copying {} remotely, directly on the machine "
+                                     "{}".format(calc.pk, dest_rel_path, computer.name))
+                    copy_list.append((remote_abs_path, dest_abs_path))
+                else:
+                    remote_computer = Computer(uuid=remote_computer_uuid)
+                    execlogger.debug("[submission of calc {}] "
+                                     "copying {} from the machine {}".format(
+                        calc.pk, dest_rel_path, remote_computer.name))
+                    remote_authinfo = metadata_cache.get_authinfo(
+                        remote_computer, User(dbuser=calc.get_user()))
+                    # New transports, that are opened by stage_calc
+                    other_computer_copy_list.append((
+                        metadata_cache.get_transport(remote_authinfo),
+                        metadata_cache.get_transport(authinfo),
+                        remote_abs_path, dest_abs_path))
+
+        if remote_symlink_list is not None:
+            for (remote_computer_uuid, remote_abs_path,
+                 dest_rel_path) in remote_symlink_list:
+                if remote_computer_uuid == computer.uuid:
+                    execlogger.debug("[submission of calc {}] "
+                                     "copying {} remotely, directly on the machine "
+                                     "{}".format(calc.pk, dest_rel_path, computer.name))
+                    symlink_list.append((remote_abs_path,
+                                         os.path.join(workdir, dest_rel_path)))
+                else:
+                    raise IOError("It is not possible to create a symlink "
+                                  "between two different machines for "
+                                  "calculation {}".format(calc.pk))
+
+        return {
+            'calc_pk': calc.pk,
+            'transport': t,
+            'workdir': workdir,
+            'script_filename': script_filename,
+            'job_tmpl': job_tmpl,
+            'code_uuids': [code.uuid for code in input_codes],
+            'copy_list': copy_list,
+            'symlink_list': symlink_list,
+            'other_computer_copy_list': other_computer_copy_list,
+            'direct_remote_copy': get_property('daemon.direct_remote_copy'),
+        }
+
+    except Exception:
+        _set_submission_failed(calc)
+        raise
 
-        try:
-            calc._set_state(calc_states.SUBMISSIONFAILED)
-        except ModificationNotAllowed:
-            # Someone already set it, just skip
-            pass
-
-        execlogger.error("Submission of calc {} failed, check also the "
-                         "log file! Traceback: {}".format(calc.pk,
-                                                          traceback.format_exc()),
+
+def stage_calc(staging):
+    """
+    Second step of the submission of a calculation: do the remote copies and
+    symlinks. The copies and symlinks on the computer of the calculation are
+    done all together (with a single remote command, for the transports
+    supporting it), the copies from other computers are streamed through
+    this machine with copy_from_remote_to_remote (or copied directly from
+    the other computer, if the daemon.direct_remote_copy property is True and
+    the transport supports it).
+
+    It does not access the database, so that it can run in a separate thread
+    while other calculations are uploaded through the same transport.
+
+    :param staging: the dictionary returned by upload_calc
+    :raise IOError: if a copy or a symlink failed
+    """
+    from aiida.transport import copy_from_remote_to_remote
+
+    t = staging['transport']
+    try:
+        t.copy_and_symlink(staging['copy_list'], staging['symlink_list'])
+    except (IOError, OSError):
+        execlogger.warning("[submission of calc {}] "
+                           "Unable to copy or symlink the remote resources "
+                           "in {}! Stopping.".format(staging['calc_pk'],
+                                                     staging['workdir']))
+        raise
+
+    for (source_transport, destination_transport, remote_abs_path,
+         dest_abs_path) in staging['other_computer_copy_list']:
+        with source_transport, destination_transport:
+            copy_from_remote_to_remote(
+                source_transport, destination_transport, remote_abs_path,
+                dest_abs_path, direct=staging['direct_remote_copy'])
+
+
+def submit_staged_calc(calc, authinfo, transport, staging):
+    """
+    Last step of the submission of a calculation: create its remote_folder
+    output and submit its script to the scheduler.
+
+    :param calc: the calculation to submit
+        (an instance of the aiida.orm.JobCalculation class)
+    :param authinfo: the authinfo for this calculation.
+    :param transport: an already opened transport, for the computer defined
+        by the authinfo.
+    :param staging: the dictionary returned by upload_calc
+    """
+    from aiida.utils.logger import get_dblogger_extra
+
+    t = transport
+    logger_extra = get_dblogger_extra(calc)
+    t._set_logger_extra(logger_extra)
+
+    try:
+        s = metadata_cache.get_scheduler(authinfo.dbcomputer)
+        s.set_transport(t)
+
+        computer = calc.get_computer()
+        workdir = staging['workdir']
+
+        _store_remote_folder(calc, workdir)
+
+        job_id = s.submit_from_script(workdir, staging['script_filename'])
+        calc._set_job_id(job_id)
+        # This should always be possible, because we should be
+        # the only ones submitting this calculations,
+        # so I do not check the ModificationNotAllowed
+        calc._set_state(calc_states.WITHSCHEDULER)
+        ## I do not set the state to queued; in this way, if the
+        ## daemon is down, the user sees '(unknown)' as last state
+        ## and understands that the daemon is not running.
+        # if job_tmpl.submit_as_hold:
+        #    calc._set_scheduler_state(job_states.QUEUED_HELD)
+        #else:
+        #    calc._set_scheduler_state(job_states.QUEUED)
+
+        execlogger.debug("submitted calculation {} on {} with "
+                         "jobid {}".format(calc.pk, computer.name, job_id),
                          extra=logger_extra)
+        daemon_metrics.add_calculations()
+
+    except Exception:
+        _set_submission_failed(calc)
         raise
-    finally:
-        # close the transport, but only if it was opened within this function
-        if must_open_t:
-            t.close()
+
+
+def _store_remote_folder(calc, workdir):
+    """
+    Create the remote_folder output of a calculation.
+    """
+    from aiida.orm.data.remote import RemoteData
+
+    remotedata = RemoteData(computer=calc.get_computer(),
+                            remote_path=workdir)
+    remotedata.add_link_from(calc, label='remote_folder',
+                             link_type=LinkType.CREATE)
+    remotedata.store()
+
+
+def _use_job_arrays(authinfo):
+    """
+    Return True if the calculations of the authinfo are to be submitted in
+    job arrays.
+    """
+    from aiida.common.setup import get_property
+
+    if not get_property('daemon.job_arrays'):
+        return False
+    s = metadata_cache.get_scheduler(authinfo.dbcomputer)
+    try:
+        return s.get_feature('can_submit_job_arrays')
+    except NotImplementedError:
+        return False
+
+
+def _use_job_packing():
+    """
+    Return True if the calculations are to be packed in jobs.
+    """
+    from aiida.common.setup import get_property
+
+    return get_property('daemon.job_packing_size') > 1
+
+
+def _can_be_packed(staging):
+    """
+    Return True if the calculation can be packed with others in a job, i.e.
+    if it runs on a single machine.
+
+    :param staging: the dictionary returned by upload_calc
+    """
+    return staging['job_tmpl']['job_resource'].get('num_machines') in (None,
+                                                                       1)
+
+
+def _get_job_array_key(staging):
+    """
+    Return a key identifying the calculations that can be submitted in the
+    same job array: the ones with the same codes, submit script name and job
+    template (except for the fields in _JOB_ARRAY_TASK_FIELDS).
+
+    :param staging: the dictionary returned by upload_calc
+    """
+    job_tmpl = dict(staging['job_tmpl'])
+    for field in _JOB_ARRAY_TASK_FIELDS:
+        job_tmpl.pop(field, None)
+    return (tuple(staging['code_uuids']), staging['script_filename'],
+            json.dumps(job_tmpl, sort_keys=True))
+
+
+def submit_staged_calcs(calcs_stagings, authinfo, transport):
+    """
+    Last step of the submission of many calculations: the compatible ones
+    (see _get_job_array_key) are submitted together, either packed in jobs
+    of at most daemon.job_packing_size calculations (see
+    submit_staged_calcs_as_pack), if it is larger than 1 and they run on a
+    single machine, or in job arrays of at most daemon.job_array_max_size
+    calculations, if the scheduler supports them; the others are submitted
+    as in submit_staged_calc.
+
+    Errors are logged, and the calculations concerned are put in the
+    SUBMISSIONFAILED state.
+
+    :param calcs_stagings: a list of tuples (calc, staging), with the
+        dictionaries returned by upload_calc
+    :param authinfo: the authinfo for these calculations.
+    :param transport: an already opened transport, for the computer defined
+        by the authinfo.
+    """
+    from collections import OrderedDict
+    from aiida.common.setup import get_property
+
+    packing_size = get_property('daemon.job_packing_size')
+    use_job_arrays = _use_job_arrays(authinfo)
+    array_max_size = (max(get_property('daemon.job_array_max_size'), 1)
+                      if use_job_arrays else 1)
+
+    groups = OrderedDict()
+    for calc, staging in calcs_stagings:
+        groups.setdefault(_get_job_array_key(staging), []).append(
+            (calc, staging))
+
+    for group in groups.itervalues():
+        pack = packing_size > 1 and _can_be_packed(group[0][1])
+        max_size = packing_size if pack else array_max_size
+        for start in range(0, len(group), max_size):
+            batch = group[start:start + max_size]
+            try:
+                if len(batch) == 1:
+                    calc, staging = batch[0]
+                    submit_staged_calc(calc=calc, authinfo=authinfo,
+                                       transport=transport, staging=staging)
+                elif pack:
+                    submit_staged_calcs_as_pack(batch, authinfo=authinfo,
+                                                transport=transport)
+                else:
+                    submit_staged_calcs_as_array(batch, authinfo=authinfo,
+                                                 transport=transport)
+            except Exception as e:
+                execlogger.warning("There was an exception for "
+                                   "calculations {} ({}): {}".format(
+                    ", ".join(str(calc.pk) for calc, _ in batch),
+                    e.__class__.__name__, e.message))
+                continue
+
+
+def submit_staged_calcs_as_array(calcs_stagings, authinfo, transport):
+    """
+    Last step of the submission of compatible calculations (see
+    _get_job_array_key): create their remote_folder outputs and submit them
+    as a single job array, whose i-th task runs the submit script of the
+    i-th calculation in its working directory. Each calculation gets the
+    job id of its task, so that it is then updated, retrieved and killed
+    on its own.
+
+    The script of the array is written, as JOB_ARRAY_SCRIPT_FILENAME, in
+    the working directory of the first calculation.
+
+    :param calcs_stagings: a list of tuples (calc, staging), with the
+        dictionaries returned by upload_calc
+    :param authinfo: the authinfo for these calculations.
+    :param transport: an already opened transport, for the computer defined
+        by the authinfo.
+    """
+    t = transport
+    first_calc, first_staging = calcs_stagings[0]
+    workdir = first_staging['workdir']
+
+    try:
+        s = metadata_cache.get_scheduler(authinfo.dbcomputer)
+        s.set_transport(t)
+
+        for calc, staging in calcs_stagings:
+            _store_remote_folder(calc, staging['workdir'])
+
+        job_tmpl = _get_job_template(s, first_staging['job_tmpl'])
+        job_tmpl.job_name = 'aiida-array-{}'.format(first_calc.pk)
+        script_content = s.get_submit_array_script(
+            job_tmpl, [staging['workdir'] for _, staging in calcs_stagings],
+            first_staging['script_filename'])
+        _put_script(t, script_content,
+                    os.path.join(workdir, JOB_ARRAY_SCRIPT_FILENAME))
+
+        job_ids = s.submit_array_from_script(workdir, JOB_ARRAY_SCRIPT_FILENAME,
+                                             len(calcs_stagings))
+    except Exception:
+        for calc, _ in calcs_stagings:
+            _set_submission_failed(calc)
+        raise
+
+    computer_name = authinfo.dbcomputer.name
+    for (calc, _), job_id in zip(calcs_stagings, job_ids):
+        calc._set_job_id(job_id)
+        # As in submit_staged_calc, we should be the only ones submitting
+        # these calculations
+        calc._set_state(calc_states.WITHSCHEDULER)
+        execlogger.debug("submitted calculation {} on {} with "
+                         "jobid {} (job array)".format(
+            calc.pk, computer_name, job_id))
+    daemon_metrics.add_calculations(len(calcs_stagings))
+
+
+def submit_staged_calcs_as_pack(calcs_stagings, authinfo, transport):
+    """
+    Last step of the submission of compatible calculations (see
+    _get_job_array_key) running on a single machine: create their
+    remote_folder outputs and pack them in a single job, which runs the
+    submit script of each calculation in its working directory, at most
+    daemon.job_packing_concurrency of them at the same time (see
+    Scheduler.get_submit_packed_script).
+
+    The job requests the resources (machine cores and memory) of one
+    calculation times this concurrency, and its wallclock time is the one of
+    a calculation times the number of rounds needed to run all of them. All
+    the calculations get the job id of the job: each of them is computed as
+    soon as its own task ends (see update_running_calcs_status), but killing
+    one of them kills the whole job.
+
+    The script of the job is written, as JOB_PACK_SCRIPT_FILENAME, in the
+    working directory of the first calculation.
+
+    :param calcs_stagings: a list of tuples (calc, staging), with the
+        dictionaries returned by upload_calc
+    :param authinfo: the authinfo for these calculations.
+    :param transport: an already opened transport, for the computer defined
+        by the authinfo.
+    """
+    from aiida.common.setup import get_property
+
+    t = transport
+    first_calc, first_staging = calcs_stagings[0]
+    workdir = first_staging['workdir']
+    num_calcs = len(calcs_stagings)
+    concurrency = get_property('daemon.job_packing_concurrency')
+    if concurrency <= 0 or concurrency > num_calcs:
+        concurrency = num_calcs
+    num_rounds = (num_calcs + concurrency - 1) // concurrency
+
+    try:
+        s = metadata_cache.get_scheduler(authinfo.dbcomputer)
+        s.set_transport(t)
+
+        for calc, staging in calcs_stagings:
+            _store_remote_folder(calc, staging['workdir'])
+
+        job_tmpl = _get_job_template(s, first_staging['job_tmpl'],
+                                     scale_resources=concurrency)
+        job_tmpl.job_name = 'aiida-pack-{}'.format(first_calc.pk)
+        if job_tmpl.max_wallclock_seconds:
+            job_tmpl.max_wallclock_seconds *= num_rounds
+        script_content = s.get_submit_packed_script(
+            job_tmpl, [staging['workdir'] for _, staging in calcs_stagings],
+            first_staging['script_filename'], concurrency)
+        _put_script(t, script_content,
+                    os.path.join(workdir, JOB_PACK_SCRIPT_FILENAME))
+
+        job_id = s.submit_from_script(workdir, JOB_PACK_SCRIPT_FILENAME)
+    except Exception:
+        for calc, _ in calcs_stagings:
+            _set_submission_failed(calc)
+        raise
+
+    computer_name = authinfo.dbcomputer.name
+    for calc, _ in calcs_stagings:
+        calc._set_job_id(job_id)
+        # As in submit_staged_calc, we should be the only ones submitting
+        # these calculations
+        calc._set_state(calc_states.WITHSCHEDULER)
+        execlogger.debug("submitted calculation {} on {} with "
+                         "jobid {} (packed job)".format(
+            calc.pk, computer_name, job_id))
+    daemon_metrics.add_calculations(len(calcs_stagings))
+
+
+def _get_job_template(scheduler, job_tmpl_dict, scale_resources=1):
+    """
+    Rebuild the JobTemplate of a calculation from the dictionary stored by
+    upload_calc.
+
+    :param scheduler: the scheduler of the computer
+    :param job_tmpl_dict: the 'job_tmpl' of the staging dictionary
+    :param scale_resources: the number of calculations that the job
+        runs at the same time on its (single) machine: the cores and the
+        memory of the job are multiplied by it
+    """
+    from aiida.scheduler.datastructures import JobTemplate
+
+    job_tmpl = JobTemplate(job_tmpl_dict)
+    resources = {k: v for k, v in job_tmpl.job_resource.iteritems()
+                 if v is not None}
+    if scale_resources != 1:
+        if 'num_machines' in resources:
+            # The total is recomputed from the values per machine
+            resources.pop('tot_num_mpiprocs', None)
+            for key in ('num_mpiprocs_per_machine', 'num_cores_per_machine'):
+                if key in resources:
+                    resources[key] *= scale_resources
+        else:
+            resources['tot_num_mpiprocs'] *= scale_resources
+        if job_tmpl.max_memory_kb:
+            job_tmpl.max_memory_kb *= scale_resources
+    job_tmpl.job_resource = scheduler.create_job_resource(**resources)
+    return job_tmpl
+
+
+def _put_script(transport, content, remote_path):
+    """
+    Write a script, given as a string, in a remote file.
+    """
+    import tempfile
+
+    with tempfile.NamedTemporaryFile() as f:
+        f.write(content)
+        f.flush()
+        transport.putfile(f.name, remote_path)
 
 
 def retrieve_computed_for_authinfo(authinfo):
@@ -685,7 +1257,7 @@ def retrieve_computed_for_authinfo(authinfo):
     if len(calcs_to_retrieve):
 
         # Open connection
-        with authinfo.get_transport() as t:
+        with metadata_cache.get_transport(authinfo) as t:
             for calc in calcs_to_retrieve:
                 logger_extra = get_dblogger_extra(calc)
                 t._set_logger_extra(logger_extra)
@@ -819,7 +1391,9 @@ def retrieve_computed_for_authinfo(authinfo):
                     if Parser is not None:
                         # TODO: parse here
                         parser = Parser(calc)
-                        successful, new_nodes_tuple = parser.parse_from_calc()
+                        with daemon_metrics.timer(STAGE_PARSING):
+                            successful, new_nodes_tuple = (
+                                parser.parse_from_calc())
 
                         for label, n in new_nodes_tuple:
                             n.add_link_from(calc, label=label,
@@ -848,6 +1422,7 @@ def retrieve_computed_for_authinfo(authinfo):
                                          "and warnings. Check there for more information on "
                                          "the problem".format(calc.pk), extra=logger_extra)
                     retrieved.append(calc)
+                    daemon_metrics.add_calculations()
                 except Exception:
                     import traceback
 
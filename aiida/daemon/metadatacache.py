@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of the objects that the daemon needs at every tick and that rarely
+change: the authinfos of the (computer, user) pairs, the transport and
+scheduler classes with the transport parameters, and the codes.
+
+The cache lives as long as the daemon process. It is validated against a
+version of the computers and authinfos stored in the database (see
+aiida.backends.utils.get_computers_version, a setting replaced whenever
+they are saved) at the beginning of each daemon task, and anyway at most
+max_age seconds after the last validation; if the version changed, the cache
+is cleared.
+
+With SQLAlchemy, the authinfos and the codes belong to the session that
+loaded them, which is closed at the end of each daemon task: only their ids
+are kept across sessions, and they are loaded again by id in the session of
+the current thread when it changed. The other cached values do not depend on
+the session.
+"""
+import time
+import weakref
+
+from aiida.daemon.metrics import daemon_metrics
+
+__copyright__ = u"Copyright (c), This file is part of the AiiDA platform. For further information please visit http://www.aiida.net/. All rights reserved."
+__license__ = "MIT license, see LICENSE.txt file."
+__version__ = "0.7.1"
+__authors__ = "The AiiDA team."
+
+
+class DaemonMetadataCache(object):
+    """
+    Cache of authinfos, transport and scheduler classes, and codes.
+    """
+
+    # Maximum time (in seconds) between two validations of the cache
+    max_age = 60.
+
+    def __init__(self):
+        self._version = None
+        self._last_refresh = None
+        self.clear()
+
+    def clear(self):
+        """
+        Drop all the cached objects.
+        """
+        # (computer pk, user pk) -> authinfo id
+        self._authinfo_ids = {}
+        # authinfo id -> (transport class, hostname, transport parameters)
+        self._transports = {}
+        # computer id -> scheduler class
+        self._schedulers = {}
+        # uuid -> code pk
+        self._code_pks = {}
+        # (code uuid, computer pk) -> bool
+        self._can_run_on = {}
+        self._clear_session_objects()
+
+    def _clear_session_objects(self):
+        # The SQLAlchemy session of the objects below, if any
+        self._session = None
+        # authinfo id -> authinfo
+        self._authinfos = {}
+        # code pk -> code
+        self._codes = {}
+
+    def refresh(self):
+        """
+        Clear the cache if the computers or the authinfos changed in the
+        database since the last refresh.
+        """
+        from aiida.backends.utils import get_computers_version
+
+        version = get_computers_version()
+        if version != self._version:
+            self.clear()
+            self._version = version
+        self._last_refresh = time.time()
+
+    def _check(self):
+        if (self._last_refresh is None or
+                time.time() - self._last_refresh > self.max_age):
+            self.refresh()
+        self._check_session()
+
+    def _check_session(self):
+        """
+        Drop the cached authinfos and codes if they belong to another
+        SQLAlchemy session than the one of the current thread (e.g. to the
+        session closed at the end of the previous task).
+        """
+        from aiida.backends import settings
+        from aiida.backends.profile import BACKEND_SQLA
+
+        if settings.BACKEND != BACKEND_SQLA:
+            return
+        from aiida.backends.sqlalchemy import get_current_session
+
+        session = get_current_session()
+        if self._session is None or self._session() is not session:
+            self._clear_session_objects()
+            self._session = weakref.ref(session)
+
+    def get_authinfo(self, computer, aiidauser):
+        """
+        Cached version of aiida.backends.utils.get_authinfo.
+
+        :param computer: a Computer
+        :param aiidauser: a User
+        :raise AuthenticationError: if the user is not configured to use the
+            computer (this is not cached)
+        """
+        from aiida.backends.utils import get_authinfo
+
+        self._check()
+        key = (computer.pk, aiidauser.pk)
+        authinfo_id = self._authinfo_ids.get(key)
+        if authinfo_id is not None:
+            try:
+                return self._authinfos[authinfo_id]
+            except KeyError:
+                authinfo = _load_authinfo(authinfo_id)
+                if authinfo is not None:
+                    self._authinfos[authinfo_id] = authinfo
+                    return authinfo
+
+        authinfo = get_authinfo(computer.dbcomputer, aiidauser._dbuser)
+        self._authinfo_ids[key] = authinfo.id
+        self._authinfos[authinfo.id] = authinfo
+        return authinfo
+
+    def get_transport(self, authinfo):
+        """
+        Return a new (not open) transport for the given authinfo, as
+        authinfo.get_transport() does, recording the time spent in its
+        methods in the daemon metrics.
+        """
+        from aiida.orm.computer import Computer
+
+        self._check()
+        try:
+            (transport_class, hostname, params) = self._transports[authinfo.id]
+        except KeyError:
+            computer = Computer(dbcomputer=authinfo.dbcomputer)
+            transport_class = computer.get_transport_class()
+            hostname = computer.hostname
+            params = dict(computer.get_transport_params().items() +
+                          authinfo.get_auth_params().items())
+            self._transports[authinfo.id] = (transport_class, hostname, params)
+        return daemon_metrics.instrument_transport(
+            transport_class(machine=hostname, **params))
+
+    def get_scheduler(self, dbcomputer):
+        """
+        Return a new scheduler for the given computer, as
+        Computer(dbcomputer=dbcomputer).get_scheduler() does.
+        """
+        from aiida.orm.computer import Computer
+
+        self._check()
+        try:
+            return self._schedulers[dbcomputer.id]()
+        except KeyError:
+            scheduler = Computer(dbcomputer=dbcomputer).get_scheduler()
+            self._schedulers[dbcomputer.id] = scheduler.__class__
+            return scheduler
+
+    def get_code(self, uuid):
+        """
+        Return the code with the given uuid. The attributes of stored codes
+        cannot be modified, so codes are cached until the cache is cleared.
+        """
+        from aiida.orm import Code, load_node
+
+        self._check()
+        pk = self._code_pks.get(uuid)
+        try:
+            return self._codes[pk]
+        except KeyError:
+            code = load_node(uuid if pk is None else pk, parent_class=Code)
+            self._code_pks[uuid] = code.pk
+            self._codes[code.pk] = code
+            return code
+
+    def can_run_on(self, code, computer):
+        """
+        Cached version of code.can_run_on(computer).
+        """
+        self._check()
+        key = (code.uuid, computer.pk)
+        try:
+            return self._can_run_on[key]
+        except KeyError:
+            result = code.can_run_on(computer)
+            self._can_run_on[key] = result
+            return result
+
+
+def _load_authinfo(authinfo_id):
+    """
+    Return the authinfo with the given id, or None if it does not exist.
+    """
+    from aiida.backends import settings
+    from aiida.backends.profile import BACKEND_DJANGO, BACKEND_SQLA
+
+    if settings.BACKEND == BACKEND_DJANGO:
+        from aiida.backends.djsite.db.models import DbAuthInfo
+        return DbAuthInfo.objects.filter(pk=authinfo_id).first()
+    elif settings.BACKEND == BACKEND_SQLA:
+        from aiida.backends.sqlalchemy.models.authinfo import DbAuthInfo
+        return DbAuthInfo.query.get(authinfo_id)
+    else:
+        raise Exception("unknown backend {}".format(settings.BACKEND))
+
+
+# The cache of the daemon process
+metadata_cache = DaemonMetadataCache()
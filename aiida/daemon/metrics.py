@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+Metrics of the daemon tasks: for each task, the number of runs, the time
+spent, the number of calculations handled, and the time spent in the
+transports, in the database and in the parsers.
+
+The tasks run in the processes of the celery worker: each process records
+the metrics of its tasks (see DaemonMetrics) and saves them, at the end of
+each task, in a file of the METRICS_SUBDIR of the daemon folder. The files
+are merged by load_metrics, shown by 'verdi daemon metrics' and, if the
+daemon.metrics_port property is set, served by the daemon in the Prometheus
+text format (see serve_metrics).
+
+The stages can overlap: e.g. the queries made by a parser count both in the
+database and in the parsing stage. Only the time spent in the thread running
+the task is recorded: the database and transport time of other threads (e.g.
+the thread storing the log records, or the threads staging the calculations)
+is not charged to the task.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+__copyright__ = u"Copyright (c), This file is part of the AiiDA platform. For further information please visit http://www.aiida.net/. All rights reserved."
+__license__ = "MIT license, see LICENSE.txt file."
+__version__ = "0.7.1"
+__authors__ = "The AiiDA team."
+
+# Name of the folder of the metrics, inside the daemon folder
+METRICS_SUBDIR = 'metrics'
+
+# The stages whose time is recorded
+STAGE_TRANSPORT = 'transport'
+STAGE_DATABASE = 'database'
+STAGE_PARSING = 'parsing'
+STAGES = (STAGE_TRANSPORT, STAGE_DATABASE, STAGE_PARSING)
+
+# Methods of the transports whose time is recorded (see
+# DaemonMetrics.instrument_transport)
+_TRANSPORT_METHODS = (
+    'open', 'close', 'exec_command_wait', 'get', 'getfile', 'gettree', 'put',
+    'putfile', 'puttree', 'copy', 'copyfile', 'copytree', 'listdir', 'isdir',
+    'isfile', 'path_exists', 'makedirs', 'mkdir', 'chdir', 'getcwd', 'chmod',
+    'remove', 'rmtree', 'rename', 'symlink', 'normalize', 'get_attribute')
+
+
+def _new_task_metrics():
+    return {
+        'runs': 0,
+        'seconds': 0.,
+        'last_seconds': 0.,
+        'last_end': 0.,
+        'calculations': 0,
+        'stages': dict((stage, 0.) for stage in STAGES),
+    }
+
+
+class DaemonMetrics(object):
+    """
+    Metrics of the daemon tasks run by the current process.
+
+    The time spent in a stage (see the timer method) and the calculations
+    handled are assigned to the task running when they are recorded, and
+    ignored if no task is running. The time spent in a stage by other
+    threads than the one that started the task is ignored as well.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # The stages being timed by each thread, so that nested calls (e.g.
+        # a put calling putfile) are counted only once
+        self._local = threading.local()
+        self._current_task = None
+        self._task_start = None
+        self._task_thread = None
+        self.clear()
+
+    def clear(self):
+        """
+        Drop all the recorded metrics.
+        """
+        # task name -> metrics of the task (see _new_task_metrics)
+        self._tasks = {}
+
+    def get_metrics(self):
+        """
+        Return a copy of the metrics, as a dictionary with the task names as
+        keys.
+        """
+        with self._lock:
+            return json.loads(json.dumps(self._tasks))
+
+    def start_task(self, task):
+        """
+        Start recording the metrics of a run of the given task.
+        """
+        with self._lock:
+            self._tasks.setdefault(task, _new_task_metrics())
+            self._current_task = task
+            self._task_start = time.time()
+            self._task_thread = threading.current_thread()
+
+    def stop_task(self):
+        """
+        Stop recording the metrics of the running task.
+        """
+        with self._lock:
+            if self._current_task is None:
+                return
+            end = time.time()
+            elapsed = end - self._task_start
+            task_metrics = self._tasks[self._current_task]
+            task_metrics['runs'] += 1
+            task_metrics['seconds'] += elapsed
+            task_metrics['last_seconds'] = elapsed
+            task_metrics['last_end'] = end
+            self._current_task = None
+            self._task_start = None
+            self._task_thread = None
+
+    def add_calculations(self, number=1):
+        """
+        Record that the running task handled the given number of
+        calculations.
+        """
+        with self._lock:
+            if self._current_task is not None:
+                self._tasks[self._current_task]['calculations'] += number
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        Context manager recording the time spent in its block in the given
+        stage (one of STAGES). Blocks nested in a block of the same stage are
+        not counted again.
+        """
+        stages = self._local.__dict__.setdefault('stages', set())
+        if stage in stages:
+            yield
+            return
+
+        stages.add(stage)
+        start = time.time()
+        try:
+            yield
+        finally:
+            stages.discard(stage)
+            self._add_stage_time(stage, time.time() - start)
+
+    def _add_stage_time(self, stage, seconds):
+        with self._lock:
+            if (self._current_task is not None and
+                    threading.current_thread() is self._task_thread):
+                self._tasks[self._current_task]['stages'][stage] += seconds
+
+    def timed(self, stage, function):
+        """
+        Return a wrapper of the function recording its time in the given
+        stage (see timer).
+        """
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with self.timer(stage):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    def instrument_transport(self, transport):
+        """
+        Record the time spent in the methods of the given transport instance
+        in the STAGE_TRANSPORT stage.
+
+        :return: the transport
+        """
+        for name in _TRANSPORT_METHODS:
+            method = getattr(transport, name, None)
+            if method is not None:
+                setattr(transport, name, self.timed(STAGE_TRANSPORT, method))
+        return transport
+
+    def install_database_timer(self):
+        """
+        Record the time spent in the execution of the database queries in the
+        STAGE_DATABASE stage, for the current backend.
+        """
+        from aiida.backends import settings
+        from aiida.backends.profile import BACKEND_DJANGO, BACKEND_SQLA
+
+        if settings.BACKEND == BACKEND_DJANGO:
+            from django.db.backends import utils
+
+            for name in ('execute', 'executemany'):
+                method = getattr(utils.CursorWrapper, name)
+                if not getattr(method, '_aiida_timed', False):
+                    wrapper = self.timed(STAGE_DATABASE, method)
+                    wrapper._aiida_timed = True
+                    setattr(utils.CursorWrapper, name, wrapper)
+        elif settings.BACKEND == BACKEND_SQLA:
+            from sqlalchemy import event
+            from sqlalchemy.engine import Engine
+
+            if not event.contains(Engine, 'before_cursor_execute',
+                                  self._before_cursor_execute):
+                event.listen(Engine, 'before_cursor_execute',
+                             self._before_cursor_execute)
+                event.listen(Engine, 'after_cursor_execute',
+                             self._after_cursor_execute)
+                # after_cursor_execute is not fired if the statement fails
+                event.listen(Engine, 'handle_error', self._handle_error)
+        else:
+            raise Exception("unknown backend {}".format(settings.BACKEND))
+
+    # With SQLAlchemy, the start time of the statement being executed on a
+    # connection is kept in the info of the connection
+    _START_KEY = 'aiida_metrics_start'
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters,
+                               context, executemany):
+        conn.info[self._START_KEY] = time.time()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters,
+                              context, executemany):
+        self._stop_statement(conn)
+
+    def _handle_error(self, exception_context):
+        if exception_context.connection is not None:
+            self._stop_statement(exception_context.connection)
+
+    def _stop_statement(self, conn):
+        start = conn.info.pop(self._START_KEY, None)
+        if start is not None:
+            self._add_stage_time(STAGE_DATABASE, time.time() - start)
+
+    def save(self, folder=None):
+        """
+        Save the metrics in the file of the current process, in the given
+        folder (by default, the one returned by get_metrics_folder).
+        """
+        if folder is None:
+            folder = get_metrics_folder()
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        filename = os.path.join(folder, '{}.json'.format(os.getpid()))
+        # Written and then renamed, so that readers never see a partial file
+        with open(filename + '.tmp', 'w') as f:
+            json.dump(self.get_metrics(), f)
+        os.rename(filename + '.tmp', filename)
+
+
+def get_metrics_folder():
+    """
+    Return the folder of the files of the metrics.
+    """
+    from aiida.common.setup import AIIDA_CONFIG_FOLDER, DAEMON_SUBDIR
+
+    return os.path.expanduser(os.path.join(AIIDA_CONFIG_FOLDER, DAEMON_SUBDIR,
+                                           METRICS_SUBDIR))
+
+
+def clear_metrics(folder=None):
+    """
+    Remove the files of the metrics (e.g. of the processes of a previous
+    daemon).
+    """
+    if folder is None:
+        folder = get_metrics_folder()
+    if not os.path.isdir(folder):
+        return
+    for filename in os.listdir(folder):
+        if filename.endswith('.json'):
+            os.remove(os.path.join(folder, filename))
+
+
+def load_metrics(folder=None):
+    """
+    Return the metrics of all the processes, merged, as a dictionary with
+    the task names as keys: the values are summed, except for the
+    last_seconds, taken from the most recent run.
+    """
+    if folder is None:
+        folder = get_metrics_folder()
+    if not os.path.isdir(folder):
+        return {}
+
+    metrics = {}
+    for filename in sorted(os.listdir(folder)):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(folder, filename)) as f:
+                process_metrics = json.load(f)
+        except (IOError, ValueError):
+            # Removed or being replaced meanwhile
+            continue
+        for task, task_metrics in process_metrics.iteritems():
+            merged = metrics.setdefault(task, _new_task_metrics())
+            for key in ('runs', 'seconds', 'calculations'):
+                merged[key] += task_metrics[key]
+            for stage, seconds in task_metrics['stages'].iteritems():
+                merged['stages'][stage] = merged['stages'].get(
+                    stage, 0.) + seconds
+            if task_metrics['last_end'] > merged['last_end']:
+                merged['last_end'] = task_metrics['last_end']
+                merged['last_seconds'] = task_metrics['last_seconds']
+    return metrics
+
+
+def format_prometheus(metrics):
+    """
+    Return the metrics (as returned by load_metrics) in the Prometheus text
+    format.
+    """
+    families = [
+        ('aiida_daemon_task_runs_total', 'counter',
+         "Number of runs of the daemon task", 'runs'),
+        ('aiida_daemon_task_seconds_total', 'counter',
+         "Time spent in the daemon task", 'seconds'),
+        ('aiida_daemon_task_last_seconds', 'gauge',
+         "Duration of the last run of the daemon task", 'last_seconds'),
+        ('aiida_daemon_task_calculations_total', 'counter',
+         "Number of calculations handled by the daemon task", 'calculations'),
+    ]
+
+    lines = []
+    for name, metric_type, description, key in families:
+        lines.append("# HELP {} {}".format(name, description))
+        lines.append("# TYPE {} {}".format(name, metric_type))
+        for task in sorted(metrics):
+            lines.append('{}{{task="{}"}} {}'.format(name, task,
+                                                     metrics[task][key]))
+
+    name = 'aiida_daemon_task_stage_seconds_total'
+    lines.append("# HELP {} Time spent by the daemon task in each stage "
+                 "({})".format(name, ", ".join(STAGES)))
+    lines.append("# TYPE {} counter".format(name))
+    for task in sorted(metrics):
+        for stage in sorted(metrics[task]['stages']):
+            lines.append('{}{{task="{}",stage="{}"}} {}'.format(
+                name, task, stage, metrics[task]['stages'][stage]))
+
+    return "\n".join(lines) + "\n"
+
+
+def serve_metrics(port, host='127.0.0.1', folder=None):
+    """
+    Serve the metrics of all the processes (see load_metrics), in the
+    Prometheus text format, on the given local port, from a daemon thread.
+
+    :return: the server
+    """
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            content = format_prometheus(load_metrics(folder))
+            self.send_response(200)
+            self.send_header('Content-Type',
+                             'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = HTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever,
+                              name='aiida-daemon-metrics')
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+# The metrics of the daemon process
+daemon_metrics = DaemonMetrics()
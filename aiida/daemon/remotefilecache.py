@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of the local files uploaded by the daemon to the computers.
+
+The files of the local_copy_list of the calculations (e.g. the
+pseudopotentials) are often the same for many calculations. If the
+daemon.remote_file_cache property is True, each file is uploaded only once
+for every computer and user, in the CACHE_FOLDER of the remote working
+directory, with its md5 as name; it is then hard-linked in the working
+directory of each calculation. The files present in each cache are recorded
+as global settings in the database.
+
+The cached files are made read-only, so that a code cannot modify them (and
+the files of all the other calculations linked to them) in place.
+"""
+import os
+
+from aiida.common import aiidalogger
+from aiida.common.utils import escape_for_bash, md5_file
+
+__copyright__ = u"Copyright (c), This file is part of the AiiDA platform. For further information please visit http://www.aiida.net/. All rights reserved."
+__license__ = "MIT license, see LICENSE.txt file."
+__version__ = "0.7.1"
+__authors__ = "The AiiDA team."
+
+# Name of the cache folder, inside the remote working directory
+CACHE_FOLDER = '.aiida_file_cache'
+
+# Prefix of the keys of the global settings recording the cached files
+SETTING_PREFIX = 'remote_file_cache'
+
+cachelogger = aiidalogger.getChild('remotefilecache')
+
+# (path, size, mtime) -> md5 of the local files already hashed
+_md5s = {}
+_max_md5s = 10000
+
+
+def _get_md5(path):
+    """
+    Return the md5 of a local file, computing it only if the file was not
+    hashed already (or changed since).
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime)
+    try:
+        return _md5s[key]
+    except KeyError:
+        if len(_md5s) >= _max_md5s:
+            _md5s.clear()
+        md5 = md5_file(path)
+        _md5s[key] = md5
+        return md5
+
+
+def _get_setting_key(authinfo, md5):
+    return "{}|{}|{}".format(SETTING_PREFIX, authinfo.id, md5)
+
+
+def _get_cached_path(authinfo, md5):
+    """
+    :return: the remote path of the cached file with the given md5, or None
+        if it is not in the cache of the authinfo
+    """
+    from aiida.backends.utils import get_global_setting
+
+    try:
+        return get_global_setting(_get_setting_key(authinfo, md5))
+    except KeyError:
+        return None
+
+
+def _add_cached_path(authinfo, md5, remote_path):
+    from aiida.backends.utils import set_global_setting
+
+    set_global_setting(_get_setting_key(authinfo, md5), remote_path,
+                       description="Cached file on the computer of "
+                                   "authinfo {}".format(authinfo.id))
+
+
+def _del_cached_path(authinfo, md5):
+    from aiida.backends.utils import del_global_setting
+
+    try:
+        del_global_setting(_get_setting_key(authinfo, md5))
+    except KeyError:
+        pass
+
+
+def put_with_cache(transport, authinfo, remote_working_directory,
+                   file_list):
+    """
+    Put local files in the current directory of the transport, uploading
+    to the cache of the authinfo the files that are not there yet, and then
+    hard-linking all of them from the cache with a single remote command.
+
+    If the files cannot be linked (e.g. because the cache was removed), the
+    cache entries whose file is missing are dropped, and the files are
+    simply put.
+
+    :param transport: an open transport
+    :param authinfo: the authinfo of the computer and user
+    :param remote_working_directory: the absolute remote path containing
+        the CACHE_FOLDER
+    :param file_list: a list of tuples (src_abs_path, dest_rel_path) of
+        local files
+    """
+    t = transport
+    cache_folder = os.path.join(remote_working_directory, CACHE_FOLDER)
+
+    md5s = [_get_md5(src_abs_path) for src_abs_path, _ in file_list]
+    cached_paths = {}
+    for (src_abs_path, _), md5 in zip(file_list, md5s):
+        if md5 in cached_paths:
+            continue
+        remote_path = _get_cached_path(authinfo, md5)
+        if remote_path is None:
+            remote_path = os.path.join(cache_folder, md5)
+            cwd = t.getcwd()
+            t.makedirs(cache_folder, ignore_existing=True)
+            t.chdir(cwd)
+            # A file of an interrupted upload, or of a dropped entry
+            if t.isfile(remote_path):
+                t.remove(remote_path)
+            cachelogger.debug("Adding {} to the cache {}".format(
+                src_abs_path, cache_folder))
+            t.put(src_abs_path, remote_path)
+            t.chmod(remote_path, 0444)  # r--r--r--
+            _add_cached_path(authinfo, md5, remote_path)
+        cached_paths[md5] = remote_path
+
+    if not file_list:
+        return
+
+    command = " && ".join(
+        "ln -f {} {}".format(escape_for_bash(cached_paths[md5]),
+                             escape_for_bash(dest_rel_path))
+        for (_, dest_rel_path), md5 in zip(file_list, md5s))
+    retval, stdout, stderr = t.exec_command_wait(command)
+    if retval == 0:
+        return
+
+    cachelogger.warning("Unable to link the files from the cache {} (exit "
+                        "code: {}, stderr: '{}'), putting them".format(
+        cache_folder, retval, stderr))
+    for md5, remote_path in cached_paths.iteritems():
+        if not t.isfile(remote_path):
+            _del_cached_path(authinfo, md5)
+    for src_abs_path, dest_rel_path in file_list:
+        if t.isfile(dest_rel_path):
+            t.remove(dest_rel_path)
+        t.put(src_abs_path, dest_rel_path)
@@ -4,6 +4,7 @@ from datetime import timedelta
 from aiida.backends import settings
 from aiida.backends.utils import load_dbenv, is_dbenv_loaded
 from celery import Celery
+from celery.signals import task_prerun, task_postrun, worker_ready
 from celery.task import periodic_task
 
 __copyright__ = u"Copyright (c), This file is part of the AiiDA platform. For further information please visit http://www.aiida.net/. All rights reserved."
@@ -17,6 +18,7 @@ if not is_dbenv_loaded():
 from aiida.common.setup import get_profile_config
 from aiida.common.exceptions import ConfigurationError
 from aiida.daemon.timestamps import set_daemon_timestamp,get_last_daemon_timestamp
+from aiida.daemon.metrics import daemon_metrics
 
 DAEMON_INTERVALS_SUBMIT = 30
 DAEMON_INTERVALS_RETRIEVE = 30
@@ -49,6 +51,47 @@ else:
 
 app = Celery('tasks', broker=broker)
 
+# Installed before the worker processes are forked, so that all of them
+# record the time spent in the database
+daemon_metrics.install_database_timer()
+
+
+@worker_ready.connect
+def start_metrics_server(**kwargs):
+    """
+    Serve the metrics of the daemon tasks, if the daemon.metrics_port
+    property is set.
+    """
+    from aiida.common.setup import get_property
+    from aiida.daemon.metrics import serve_metrics
+
+    port = get_property('daemon.metrics_port')
+    if port:
+        serve_metrics(port)
+
+
+@task_prerun.connect
+def start_task_metrics(task=None, **kwargs):
+    daemon_metrics.start_task(task.name.rsplit('.', 1)[-1])
+
+
+@task_postrun.connect
+def save_task_metrics(**kwargs):
+    daemon_metrics.stop_task()
+    daemon_metrics.save()
+
+
+@task_postrun.connect
+def close_db_session(**kwargs):
+    """
+    Release the database session of the worker at the end of each task, so
+    that each task starts with a fresh session and the connection goes back
+    to the pool meanwhile.
+    """
+    from aiida.backends.utils import close_session
+
+    close_session()
+
 
 # the tasks as taken from the djsite.db.tasks, same tasks and same functionalities
 # will now of course fail because set_daemon_timestep has not be implementd for SA
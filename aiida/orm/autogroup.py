@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import atexit
 import datetime
 
 from aiida.common.exceptions import ValidationError, MissingPluginError
@@ -26,8 +27,21 @@ class Autogroup(object):
     The exclude/include lists, can have values 'all' if you want to include/exclude all classes.
     Otherwise, they are lists of strings like: calculation.quantumespresso.pw, data.array.kpoints, ...
     i.e.: a string identifying the base class, than the path to the class as in Calculation/Data -Factories
+
+    The nodes to be grouped are buffered (see add_node), and added to the
+    group with a single query when flush is called, or when buffer_size
+    nodes are buffered. The nodes still buffered are added at the exit of
+    the process, but code that sets current_autogroup should call flush as
+    soon as its nodes are stored.
     """
 
+    # Maximum number of nodes buffered before adding them to the group
+    buffer_size = 1000
+
+    def __init__(self):
+        self._buffered_nodes = []
+        self._flush_at_exit = False
+
     def _validate(self, param, is_exact=True):
         """
         Used internally to verify the sanity of exclude, include lists
@@ -160,6 +174,34 @@ class Autogroup(object):
             raise ValidationError("group name must be a string")
         self.group_name = gname
 
+    def add_node(self, node):
+        """
+        Buffer a stored node to be added to the group.
+
+        :param node: a stored Node
+        """
+        if not self._flush_at_exit:
+            atexit.register(self.flush)
+            self._flush_at_exit = True
+        self._buffered_nodes.append(node)
+        if len(self._buffered_nodes) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Add the buffered nodes to the group (creating it, if needed).
+        The buffer is emptied also if they cannot be added.
+        """
+        from aiida.orm import Group
+
+        nodes, self._buffered_nodes = self._buffered_nodes, []
+        if not nodes:
+            return
+
+        group = Group.get_or_create(name=self.get_group_name(),
+                                    type_string=VERDIAUTOGROUP_TYPE)[0]
+        group.add_nodes(nodes)
+
     def is_to_be_grouped(self, the_class):
         """
         :return (bool): Returns True if the_class has to be included in the autogroup,
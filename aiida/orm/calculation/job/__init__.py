@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from aiida.orm.calculation import Calculation
 from aiida.orm.implementation.calculation import JobCalculation, _input_subfolder
+from aiida.orm.implementation.general.calculation.job import kill_calculations
 
 __copyright__ = u"Copyright (c), This file is part of the AiiDA platform. For further information please visit http://www.aiida.net/. All rights reserved."
 __license__ = "MIT license, see LICENSE.txt file."
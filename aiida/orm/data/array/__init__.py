@@ -108,25 +108,31 @@ class ArrayData(Data):
         for name in self.get_arraynames():
             yield (name, self.get_array(name))
 
-    def get_array(self, name):
+    def get_array(self, name, mmap_mode=None):
         """
         Return an array stored in the node
 
         :param name: The name of the array to return.
+        :param mmap_mode: if not None, the array is memory-mapped from its
+          file with this mode (see numpy.load, e.g. 'r') rather than read
+          into memory. Memory-mapped arrays are not cached.
         """
         import numpy
 
         # raw function used only internally
-        def get_array_from_file(self, name):
+        def get_array_from_file(self, name, mmap_mode=None):
             fname = '{}.npy'.format(name)
             if fname not in self.get_folder_list():
                 raise KeyError(
                     "Array with name '{}' not found in node pk= {}".format(
                         name, self.pk))
 
-            array = numpy.load(self.get_abs_path(fname))
+            array = numpy.load(self.get_abs_path(fname), mmap_mode=mmap_mode)
             return array
 
+        if mmap_mode is not None:
+            return get_array_from_file(self, name, mmap_mode=mmap_mode)
+
         # Return with proper caching, but only after storing. Before, instead,
         # always re-read from disk
         if not self.is_stored:
@@ -15,9 +15,240 @@ __version__ = "0.7.1"
 __authors__ = "The AiiDA team."
 
 
+# Number of nodes whose arrays are memory-mapped at the same time by
+# find_bandgaps
+BANDGAPS_CHUNK_SIZE = 1000
+
 # TODO: set and get bands could have more functionalities: how do I know the number of bands for example?
 
-def find_bandgap(bandsdata, number_electrons=None, fermi_energy=None):
+def _join_spins(arrays):
+    """
+    Puts all the spins on one band per kpoint.
+
+    :param arrays: an array (N, nspins, nkpoints, nbands) of bands or
+      occupations
+    :return: an array (N, nkpoints, nspins * nbands), with the bands of the
+      first spin followed by the ones of the second spin
+    """
+    num, nspins, nkpoints, nbands = arrays.shape
+    return arrays.transpose(0, 2, 1, 3).reshape(num, nkpoints,
+                                                nspins * nbands)
+
+
+def _find_bandgap_arrays(bands, occupations=None, number_electrons=None,
+                         fermi_energy=None, spin_polarized=False):
+    """
+    Band gap analysis of N band structures at once, see find_bandgap.
+
+    :param bands: an array (N, nkpoints, nbands), where the bands of the two
+      spins (if any) are already joined
+    :param occupations: an array of the same shape as bands, used if neither
+      number_electrons nor fermi_energy are given
+    :param number_electrons: an array of N numbers of electrons
+    :param fermi_energy: an array of N Fermi energies
+    :param spin_polarized: whether each band holds one electron (rather
+      than two)
+    :return: (is_insulator, gap, homo, lumo), four arrays of length N. gap
+      is nan for metals, homo and lumo are nan when gap is.
+    """
+    num, num_kpoints, num_bands = bands.shape
+    # index arrays to pick one band per kpoint
+    n_idx, k_idx = numpy.ogrid[:num, :num_kpoints]
+
+    # analysis on occupations:
+    if fermi_energy is None:
+
+        if number_electrons is None:
+            # sort the bands by energy, and reorder the occupations
+            # accordingly since after joining the two spins, I might have
+            # unsorted stuff. The sort is stable, so that equal energies keep
+            # their order
+            order = numpy.argsort(bands, axis=2, kind='mergesort')
+            bands = bands[n_idx[:, :, None], k_idx[:, :, None], order]
+            occupations = occupations[n_idx[:, :, None], k_idx[:, :, None],
+                                      order]
+            number_electrons = numpy.floor(
+                occupations.sum(axis=(1, 2)) / num_kpoints + 0.5)
+
+            # a band is occupied if its occupation rounds to a positive
+            # integer, i.e. if it is at least one half
+            occupied = occupations >= 0.5
+            if not occupied.any(axis=2).all():
+                raise ValueError("Found a kpoint without occupied bands")
+            homo_indexes = num_bands - 1 - numpy.argmax(
+                occupied[:, :, ::-1], axis=2)
+
+            # there must be intersections of valence and conduction bands
+            # if the homo is not the same band at every kpoint
+            is_metal = (homo_indexes != homo_indexes[:, :1]).any(axis=1)
+            if (homo_indexes[~is_metal] + 1 >= num_bands).any():
+                raise ValueError("To understand if it is a metal or "
+                                 "insulator, need more bands than "
+                                 "n_band=number_electrons")
+            lumo_indexes = numpy.minimum(homo_indexes + 1, num_bands - 1)
+
+        else:
+            bands = numpy.sort(bands, axis=2)
+            number_electrons = numpy.asarray(number_electrons).astype(int)
+
+            # find the zero-temperature occupation per band (1 for
+            # spin-polarized calculation, 2 otherwise)
+            number_electrons_per_band = 1 if spin_polarized else 2
+            # the nth and the (n+1)th level
+            homo_indexes = (number_electrons //
+                            number_electrons_per_band - 1)[:, None]
+            lumo_indexes = homo_indexes + 1
+            if (lumo_indexes >= num_bands).any():
+                raise ValueError("To understand if it is a metal or "
+                                 "insulator, need more bands than "
+                                 "n_band=number_electrons")
+            homo_indexes = numpy.repeat(homo_indexes, num_kpoints, axis=1)
+            lumo_indexes = numpy.repeat(lumo_indexes, num_kpoints, axis=1)
+            is_metal = numpy.zeros(num, dtype=bool)
+
+        # gather the energies of the homo and lumo bands, for every kpoint
+        homo = bands[n_idx, k_idx, homo_indexes].max(axis=1)
+        lumo = bands[n_idx, k_idx, lumo_indexes].min(axis=1)
+
+        if not spin_polarized:
+            # if #electrons is odd and we have a non spin polarized
+            # calculation it must be a metal
+            is_metal |= (number_electrons % 2 == 1)
+
+        # if the nth band crosses the (n+1)th, it is a metal
+        gap = lumo - homo
+        is_metal |= gap < 0.
+
+    # analysis on the fermi energy
+    else:
+        fermi_energy = numpy.asarray(fermi_energy, dtype=float)[:, None]
+
+        # the energy range of each level
+        bands = numpy.sort(bands, axis=2)
+        maxs = bands.max(axis=1)
+        mins = bands.min(axis=1)
+
+        if (fermi_energy[:, 0] > maxs.max(axis=1)).any():
+            raise ValueError("The Fermi energy is above all band energies, "
+                             "don't know what to do")
+        if (fermi_energy[:, 0] < mins.min(axis=1)).any():
+            raise ValueError("The Fermi energy is below all band energies, "
+                             "don't know what to do.")
+
+        # one band is crossed by the fermi energy
+        is_metal = ((mins < fermi_energy) & (fermi_energy < maxs)).any(axis=1)
+
+        # case of semimetals, fermi energy at the crossing of two bands
+        # this will only work if the dirac point is computed!
+        is_semimetal = ~is_metal & (
+            (maxs == fermi_energy).any(axis=1) &
+            (mins == fermi_energy).any(axis=1))
+
+        # take the max of the band maxima below the fermi energy, and the
+        # min of the band minima above it
+        homo = numpy.where(maxs < fermi_energy, maxs, -numpy.inf).max(axis=1)
+        lumo = numpy.where(mins > fermi_energy, mins, numpy.inf).min(axis=1)
+        gap = lumo - homo
+        gap[is_semimetal] = 0.
+
+        if numpy.isinf(gap[~is_metal & ~is_semimetal]).any():
+            raise ValueError("The Fermi energy is at the edge of the band "
+                             "energies, don't know what to do")
+        if (gap[~is_metal & ~is_semimetal] <= 0.).any():
+            raise Exception("Something wrong has been implemented. "
+                            "Revise the code!")
+
+    is_insulator = ~is_metal & (gap > 0.)
+    gap = numpy.where(is_metal, numpy.nan, gap)
+    homo = numpy.where(is_metal, numpy.nan, homo)
+    lumo = numpy.where(is_metal, numpy.nan, lumo)
+    return is_insulator, gap, homo, lumo
+
+
+def _to_optional_float(value):
+    """
+    :return: value as a float, or None if it is nan
+    """
+    if numpy.isnan(value):
+        return None
+    return float(value)
+
+
+def _get_bands_arrays(bandsdata, need_occupations, mmap_mode=None):
+    """
+    :return: (bands, occupations) of a BandsData, occupations being None if
+      not needed
+    """
+    try:
+        bands = bandsdata.get_array('bands', mmap_mode=mmap_mode)
+    except KeyError:
+        raise KeyError("Cannot do much of a band analysis without bands")
+
+    occupations = None
+    if need_occupations:
+        try:
+            occupations = bandsdata.get_array('occupations',
+                                              mmap_mode=mmap_mode)
+        except KeyError:
+            raise KeyError("Cannot determine metallicity if I don't have "
+                           "either fermi energy, or occupations")
+    return bands, occupations
+
+
+def _prepare_bands(arrays, spin_resolved):
+    """
+    Brings the (N, nkpoints, nbands) or (N, nspins, nkpoints, nbands) arrays
+    of a group of band structures in the form expected by
+    _find_bandgap_arrays.
+
+    :return: a list of arrays (N, nkpoints, nbands), one per spin channel if
+      spin_resolved, otherwise a list with the spins joined
+    """
+    if arrays is None:
+        return None
+    if arrays.ndim == 3:
+        return [arrays]
+    if spin_resolved:
+        return [arrays[:, i] for i in range(arrays.shape[1])]
+    return [_join_spins(arrays)]
+
+
+def _analyse_bands(bands, occupations, number_electrons, fermi_energy,
+                   spin_resolved):
+    """
+    Runs the band gap analysis on a group of band structures with the same
+    shape.
+
+    :param bands: an array (N, nkpoints, nbands) or (N, nspins, nkpoints,
+      nbands)
+    :param occupations: None or an array of the same shape as bands
+    :param number_electrons: None or an array of N numbers of electrons (or
+      (N, nspins) if spin_resolved)
+    :param fermi_energy: None or an array of N Fermi energies
+    :return: a list with one tuple (is_insulator, gap, homo, lumo) of arrays
+      per spin channel (a single one unless spin_resolved)
+    """
+    spin_polarized = bands.ndim == 4
+    channels = _prepare_bands(bands, spin_resolved)
+    occupation_channels = _prepare_bands(occupations, spin_resolved)
+
+    results = []
+    for i, channel in enumerate(channels):
+        channel_electrons = number_electrons
+        if number_electrons is not None and spin_resolved and spin_polarized:
+            channel_electrons = number_electrons[:, i]
+        results.append(_find_bandgap_arrays(
+            channel,
+            occupations=(None if occupation_channels is None
+                         else occupation_channels[i]),
+            number_electrons=channel_electrons,
+            fermi_energy=fermi_energy,
+            spin_polarized=spin_polarized))
+    return results
+
+
+def find_bandgap(bandsdata, number_electrons=None, fermi_energy=None,
+                 spin_resolved=False):
     """
     Tries to guess whether the bandsdata represent an insulator.
     This method is meant to be used only for electronic bands (not phonons)
@@ -31,6 +262,10 @@ def find_bandgap(bandsdata, number_electrons=None, fermi_energy=None):
 
     :param number_electrons: (optional, float) number of electrons in the unit cell
     :param fermi_energy: (optional, float) value of the fermi energy.
+    :param spin_resolved: (optional, default False) if True and the bands
+      have two spin channels, the analysis is done on each channel
+      separately. number_electrons is then a list with the number of
+      electrons of each channel.
 
     :note: By default, the algorithm uses the occupations array
       to guess the number of electrons and the occupied bands. This is to be
@@ -45,146 +280,197 @@ def find_bandgap(bandsdata, number_electrons=None, fermi_energy=None):
     :return: (is_insulator, gap), where is_insulator is a boolean, and gap a
              float. The gap is None in case of a metal, zero when the homo is
              equal to the lumo (e.g. in semi-metals).
+             If spin_resolved, a list with one such tuple per spin channel.
     """
+    return _find_bandgaps([bandsdata], number_electrons, fermi_energy,
+                          spin_resolved, as_list=False)[0]
 
-    def nint(num):
-        """
-        Stable rounding function
-        """
-        if (num > 0):
-            return int(num + .5)
-        else:
-            return int(num - .5)
 
-    if fermi_energy and number_electrons:
-        raise ValueError("Specify either the number of electrons or the "
-                         "Fermi energy, but not both")
-
-    try:
-        stored_bands = bandsdata.get_bands()
-    except KeyError:
-        raise KeyError("Cannot do much of a band analysis without bands")
-
-    if len(stored_bands.shape) == 3:
-        # I write the algorithm for the generic case of having both the
-        # spin up and spin down array
-
-        # put all spins on one band per kpoint
-        bands = numpy.concatenate([_ for _ in stored_bands], axis=1)
-    else:
-        bands = stored_bands
+def find_homo_lumo(bandsdata, number_electrons=None, fermi_energy=None,
+                   spin_resolved=False):
+    """
+    Returns the energies of the highest occupied and of the lowest
+    unoccupied level, with the same analysis of find_bandgap (see its
+    documentation for the parameters).
 
-    # analysis on occupations:
-    if fermi_energy is None:
+    :return: (homo, lumo), two floats, or None for a metal. If
+      spin_resolved, a list with one such tuple per spin channel.
+    """
+    return _find_bandgaps([bandsdata], number_electrons, fermi_energy,
+                          spin_resolved, as_list=False, homo_lumo=True)[0]
 
-        num_kpoints = len(bands)
 
-        if number_electrons is None:
-            try:
-                _, stored_occupations = bandsdata.get_bands(also_occupations=True)
-            except KeyError:
-                raise KeyError("Cannot determine metallicity if I don't have "
-                               "either fermi energy, or occupations")
+def find_bandgaps(bandsdata_list, number_electrons=None, fermi_energy=None,
+                  spin_resolved=False, homo_lumo=False):
+    """
+    Runs find_bandgap on many BandsData nodes at once.
+
+    The nodes are processed in chunks of BANDGAPS_CHUNK_SIZE: the arrays of
+    a chunk are memory-mapped from the repository (and not cached in the
+    nodes), the band structures with the same shape are analysed together,
+    and the maps are released before the next chunk.
+
+    :param bandsdata_list: a list of BandsData
+    :param number_electrons: (optional) a list with the number of electrons
+      of each node (a list per node if spin_resolved)
+    :param fermi_energy: (optional) a list with the Fermi energy of each
+      node
+    :param spin_resolved: see find_bandgap
+    :param homo_lumo: if True, (homo, lumo) are returned as well
+
+    :return: a list with, for each node, what find_bandgap returns, or
+      (is_insulator, gap, homo, lumo) if homo_lumo is True; None for the
+      nodes whose arrays cannot be read, or are inconsistent
+    """
+    return _find_bandgaps(bandsdata_list, number_electrons, fermi_energy,
+                          spin_resolved, as_list=True, homo_lumo=homo_lumo)
 
-            # put the occupations in the same order of bands, also in case of multiple bands
-            if len(stored_occupations.shape) == 3:
-                # I write the algorithm for the generic case of having both the
-                # spin up and spin down array
 
-                # put all spins on one band per kpoint
-                occupations = numpy.concatenate([_ for _ in stored_occupations], axis=1)
-            else:
-                occupations = stored_occupations
-
-            # now sort the bands by energy
-            # Note: I am sort of assuming that I have an electronic ground state
-
-            # sort the bands by energy, and reorder the occupations accordingly
-            # since after joining the two spins, I might have unsorted stuff
-            bands, occupations = [numpy.array(y) for y in zip(*[zip(*j) for j in
-                                                                [sorted(zip(i[0].tolist(), i[1].tolist()),
-                                                                        key=lambda x: x[0])
-                                                                 for i in zip(bands, occupations)]])]
-            number_electrons = int(round(sum([sum(i) for i in occupations]) / num_kpoints))
-
-            homo_indexes = [numpy.where(numpy.array([nint(_) for _ in x]) > 0)[0][-1] for x in occupations]
-            if len(set(homo_indexes)) > 1:  # there must be intersections of valence and conduction bands
-                return False, None
-            else:
-                homo = [_[0][_[1]] for _ in zip(bands, homo_indexes)]
-                try:
-                    lumo = [_[0][_[1] + 1] for _ in zip(bands, homo_indexes)]
-                except IndexError:
-                    raise ValueError("To understand if it is a metal or insulator, "
-                                     "need more bands than n_band=number_electrons")
+def _find_bandgaps(bandsdata_list, number_electrons, fermi_energy,
+                   spin_resolved, as_list, homo_lumo=False):
+    """
+    Implementation of find_bandgap, find_homo_lumo and find_bandgaps.
 
-        else:
-            bands = numpy.sort(bands)
-            number_electrons = int(number_electrons)
-
-            # find the zero-temperature occupation per band (1 for spin-polarized
-            # calculation, 2 otherwise)
-            number_electrons_per_band = 4 - len(stored_bands.shape)  # 1 or 2
-            # gather the energies of the homo band, for every kpoint
-            homo = [i[number_electrons / number_electrons_per_band - 1] for i in bands]  # take the nth level
-            try:
-                # gather the energies of the lumo band, for every kpoint
-                lumo = [i[number_electrons / number_electrons_per_band] for i in bands]  # take the n+1th level
-            except IndexError:
-                raise ValueError("To understand if it is a metal or insulator, "
-                                 "need more bands than n_band=number_electrons")
-
-        if number_electrons % 2 == 1 and len(stored_bands.shape) == 2:
-            # if #electrons is odd and we have a non spin polarized calculation
-            # it must be a metal and I don't need further checks
-            return False, None
-
-        # if the nth band crosses the (n+1)th, it is an insulator
-        gap = min(lumo) - max(homo)
-        if gap == 0.:
-            return False, 0.
-        elif gap < 0.:
-            return False, None
-        else:
-            return True, gap
+    :param as_list: whether number_electrons and fermi_energy are lists
+      with one value per node, or the values for all the nodes
+    :param homo_lumo: if True, (is_insulator, gap, homo, lumo) is returned
+      for find_bandgaps, (homo, lumo) for find_homo_lumo
+    """
+    if fermi_energy is not None and number_electrons is not None:
+        raise ValueError("Specify either the number of electrons or the "
+                         "Fermi energy, but not both")
 
-    # analysis on the fermi energy
+    num = len(bandsdata_list)
+    if not as_list:
+        if number_electrons is not None:
+            number_electrons = [number_electrons] * num
+        if fermi_energy is not None:
+            fermi_energy = [fermi_energy] * num
+    need_occupations = number_electrons is None and fermi_energy is None
+
+    # A single node is read in memory as usual, many are memory-mapped,
+    # a chunk at a time
+    if as_list:
+        mmap_mode = 'r'
+        chunk_size = BANDGAPS_CHUNK_SIZE
     else:
-        # reorganize the bands, rather than per kpoint, per energy level
+        mmap_mode = None
+        chunk_size = 1
+
+    results = [None] * num
+    for start in range(0, num, chunk_size):
+        groups = _group_bands_arrays(bandsdata_list, start,
+                                     min(start + chunk_size, num),
+                                     need_occupations, mmap_mode,
+                                     skip_errors=as_list)
+        _analyse_groups(groups, results, number_electrons, fermi_energy,
+                        spin_resolved, as_list, homo_lumo,
+                        skip_errors=as_list)
+        # Release the maps of the chunk
+        del groups
+
+    return results
+
+
+def _group_bands_arrays(bandsdata_list, start, stop, need_occupations,
+                        mmap_mode, skip_errors):
+    """
+    Read the arrays of the nodes from start to stop, and group them by the
+    shape of their bands.
 
-        # I need the bands sorted by energy
-        bands.sort()
+    :param skip_errors: if True, the nodes whose arrays cannot be read, or
+      are inconsistent, are left out of the groups
+    :return: a dictionary {shape: [(index, bands, occupations), ...]}
+    """
+    groups = {}
+    for i in range(start, stop):
+        try:
+            bands, occupations = _get_bands_arrays(
+                bandsdata_list[i], need_occupations, mmap_mode=mmap_mode)
+            if occupations is not None and occupations.shape != bands.shape:
+                raise ValueError("The occupations and the bands of node {} "
+                                 "have different shapes".format(
+                    bandsdata_list[i].pk))
+        except Exception:
+            if skip_errors:
+                continue
+            raise
+        groups.setdefault(bands.shape, []).append((i, bands, occupations))
+    return groups
 
-        levels = bands.transpose()
-        max_mins = [(max(i), min(i)) for i in levels]
 
-        if fermi_energy > bands.max():
-            raise ValueError("The Fermi energy is above all band energies, "
-                             "don't know what to do")
-        if fermi_energy < bands.min():
-            raise ValueError("The Fermi energy is below all band energies, "
-                             "don't know what to do.")
+def _analyse_groups(groups, results, number_electrons, fermi_energy,
+                    spin_resolved, as_list, homo_lumo, skip_errors):
+    """
+    Analyse the groups returned by _group_bands_arrays, and put the results
+    of each node at its index in results (see _find_bandgaps for the other
+    parameters).
+
+    :param skip_errors: if True, a group that cannot be analysed (e.g.
+      because of a node without occupied bands at some kpoint, or with a
+      Fermi energy out of its bands) is analysed again one node at a time,
+      and the result of the nodes that cannot be analysed is left to None
+    """
+    for group in groups.itervalues():
+        try:
+            _analyse_group(group, results, number_electrons, fermi_energy,
+                           spin_resolved, as_list, homo_lumo)
+        except ValueError:
+            if not skip_errors:
+                raise
+            if len(group) == 1:
+                continue
+            for item in group:
+                try:
+                    _analyse_group([item], results, number_electrons,
+                                   fermi_energy, spin_resolved, as_list,
+                                   homo_lumo)
+                except ValueError:
+                    continue
 
-        # one band is crossed by the fermi energy
-        if any(i[1] < fermi_energy and fermi_energy < i[0] for i in max_mins):
-            return False, None
 
-        # case of semimetals, fermi energy at the crossing of two bands
-        # this will only work if the dirac point is computed!
-        elif (any(i[0] == fermi_energy for i in max_mins) and
-                  any(i[1] == fermi_energy for i in max_mins)):
-            return False, 0.
-        # insulating case
+def _analyse_group(group, results, number_electrons, fermi_energy,
+                   spin_resolved, as_list, homo_lumo):
+    """
+    Analyse the nodes of a group with the same shape together, and put
+    their results at their index in results.
+    """
+    need_occupations = number_electrons is None and fermi_energy is None
+    indexes = [i for i, _, _ in group]
+    bands = numpy.array([b for _, b, _ in group], dtype=float)
+    occupations = None
+    if need_occupations:
+        occupations = numpy.array([o for _, _, o in group], dtype=float)
+    group_electrons = None
+    if number_electrons is not None:
+        group_electrons = numpy.array(
+            [number_electrons[i] for i in indexes])
+    group_fermi = None
+    if fermi_energy is not None:
+        group_fermi = numpy.array([fermi_energy[i] for i in indexes],
+                                  dtype=float)
+
+    channels = _analyse_bands(bands, occupations, group_electrons,
+                              group_fermi, spin_resolved)
+
+    for pos, i in enumerate(indexes):
+        node_results = []
+        for is_insulator, gap, homo, lumo in channels:
+            if homo_lumo and not as_list:
+                node_results.append((_to_optional_float(homo[pos]),
+                                     _to_optional_float(lumo[pos])))
+            elif homo_lumo:
+                node_results.append((bool(is_insulator[pos]),
+                                     _to_optional_float(gap[pos]),
+                                     _to_optional_float(homo[pos]),
+                                     _to_optional_float(lumo[pos])))
+            else:
+                node_results.append((bool(is_insulator[pos]),
+                                     _to_optional_float(gap[pos])))
+        if spin_resolved and bands.ndim == 4:
+            results[i] = node_results
         else:
-            # take the max of the band maxima below the fermi energy
-            homo = max([i[0] for i in max_mins if i[0] < fermi_energy])
-            # take the min of the band minima above the fermi energy
-            lumo = min([i[1] for i in max_mins if i[1] > fermi_energy])
-            gap = lumo - homo
-            if gap <= 0.:
-                raise Exception("Something wrong has been implemented. "
-                                "Revise the code!")
-            return True, gap
+            results[i] = node_results[0]
 
 
 class BandsData(KpointsData):
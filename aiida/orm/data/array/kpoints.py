@@ -887,34 +887,42 @@ class KpointsData(ArrayData):
         else:
             raise ValueError("Input format not recognized")
 
-        kpoints = [tuple(point_coordinates[path[0][0]])]
+        # Each segment is built at once. The points are computed as
+        # numpy.linspace does for each coordinate (start + i * step, with
+        # the last point set to the end), so that they do not depend on
+        # the implementation
+        last_point = numpy.array([point_coordinates[path[0][0]]], dtype=float)
+        pieces = [last_point]
         labels = [(0, path[0][0])]
+        num_kpoints = 1
 
         for count_piece, i in enumerate(path):
             ini_label = i[0]
             end_label = i[1]
-            ini_coord = point_coordinates[ini_label]
-            end_coord = point_coordinates[end_label]
-
-            path_piece = zip(numpy.linspace(ini_coord[0], end_coord[0],
-                                            num_points[count_piece]),
-                             numpy.linspace(ini_coord[1], end_coord[1],
-                                            num_points[count_piece]),
-                             numpy.linspace(ini_coord[2], end_coord[2],
-                                            num_points[count_piece]),
-                             )
-
-            for count, j in enumerate(path_piece):
-                if all(numpy.array(kpoints[-1]) == j):
-                    continue  # avoid duplcates
-                else:
-                    kpoints.append(j)
-
-                # add labels for the first and last point
-                if count == 0:
-                    labels.append((len(kpoints) - 1, ini_label))
-                if count == len(path_piece) - 1:
-                    labels.append((len(kpoints) - 1, end_label))
+            ini_coord = numpy.array(point_coordinates[ini_label], dtype=float)
+            end_coord = numpy.array(point_coordinates[end_label], dtype=float)
+            num = num_points[count_piece]
+
+            step = (end_coord - ini_coord) / float(max(num - 1, 1))
+            path_piece = ini_coord + numpy.arange(num)[:, None] * step
+            if num > 1:
+                path_piece[-1] = end_coord
+
+            # avoid duplicates: a point equal to the previous one is skipped
+            previous = numpy.concatenate([last_point, path_piece[:-1]])
+            is_new = numpy.any(path_piece != previous, axis=1)
+
+            # add labels for the first and last point, if they were added
+            if is_new[0]:
+                labels.append((num_kpoints, ini_label))
+            num_kpoints += int(is_new.sum())
+            if is_new[-1]:
+                labels.append((num_kpoints - 1, end_label))
+
+            pieces.append(path_piece[is_new])
+            last_point = path_piece[-1:]
+
+        kpoints = numpy.concatenate(pieces)
 
         # I still have some duplicates in the labels: eliminate them
         sorted(set(labels), key=lambda x: x[0])
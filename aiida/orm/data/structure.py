@@ -574,6 +574,52 @@ def get_symbols_string(symbols, weights):
         return "{{{}}}".format("".join(sorted(pieces)))
 
 
+def get_descriptor_filters(elements=None, mode='any', formula=None):
+    """
+    Builds the QueryBuilder filters selecting StructureData nodes by means
+    of their descriptors (see :py:meth:`StructureData.get_descriptors`), so
+    that the selection runs in the database. They work with both backends.
+
+    :param elements: a list of element symbols
+    :param mode: how the structures are selected by elements:
+
+        * 'any': structures containing at least one of the elements
+        * 'all': structures containing all the elements
+        * 'only': structures containing no other elements
+
+    :param formula: if not None, only the structures with this reduced
+        formula (in hill_compact mode, e.g. 'BaO3Ti') are selected
+    :return: a filters dictionary for the StructureData
+    """
+    from aiida.common.exceptions import InputValidationError
+
+    filters = {}
+    if elements:
+        elements = sorted(set(elements))
+        if mode == 'any':
+            filters['or'] = [
+                {'attributes.descriptors.composition': {'has_key': e}}
+                for e in elements]
+        elif mode == 'all':
+            filters['and'] = [
+                {'attributes.descriptors.composition': {'has_key': e}}
+                for e in elements]
+        elif mode == 'only':
+            # At least one of the elements, and none of the other ones (one
+            # condition per element of the periodic table)
+            filters['and'] = [{'or': [
+                {'attributes.descriptors.composition': {'has_key': e}}
+                for e in elements]}] + [
+                {'attributes.descriptors.composition': {'~has_key': e}}
+                for e in _valid_symbols if e not in elements]
+        else:
+            raise InputValidationError("Unknown mode '{}' for the elements"
+                                       "".format(mode))
+    if formula is not None:
+        filters['attributes.descriptors.formula_reduced'] = formula
+    return filters
+
+
 def has_vacancies(weights):
     """
     Returns True if the sum of the weights is less than one.
@@ -721,6 +767,10 @@ class StructureData(Data):
                               ("pymatgen", "pymatgen_structure"),
                               ("pymatgen_molecule", "pymatgen_structure")]
 
+    # Files with the sites in the compact representation (see set_compact)
+    _positions_filename = "sites_positions.npy"
+    _kind_indices_filename = "sites_kind_indices.npy"
+
     @property
     def _set_defaults(self):
         parent_dict = super(StructureData, self)._set_defaults
@@ -948,8 +998,7 @@ class StructureData(Data):
         # Translate the structure to the origin, such that the minimal values in each dimension
         # amount to (0,0,0)
         positions -= position_min
-        for index, site in enumerate(self.get_attr('sites')):
-            site['position'] = list(positions[index])
+        self.reset_sites_positions(positions.tolist())
 
         # The orthorhombic cell that (just) accomodates the whole structure is now given by the
         # extremas of position in each dimension:
@@ -1023,11 +1072,240 @@ class StructureData(Data):
             used to group and/or order the symbols in the formula
         """
 
-        symbol_list = [self.get_kind(s.kind_name).get_symbols_string()
-                       for s in self.sites]
+        symbol_list = [self.get_kind(k).get_symbols_string()
+                       for k in self.get_site_kindnames()]
 
         return get_formula(symbol_list, mode=mode, separator=separator)
 
+    def get_descriptors(self, spacegroup=None):
+        """
+        Returns a compact description of the structure. It is computed and
+        stored in the 'descriptors' attribute when the structure is stored,
+        so that structures can be listed and searched without loading their
+        kinds and sites (see :py:func:`get_descriptor_filters`).
+
+        :param spacegroup: if True, the number of the space group is
+            computed with pyspglib (and ASE), if they are available. By
+            default, the value of the 'structure.descriptors_spacegroup'
+            property is used.
+        :return: a dictionary with the keys:
+
+            * formula: the formula in 'hill' mode
+            * formula_reduced: the formula in 'hill_compact' mode
+            * composition: the number of atoms of each element (weighted
+              by the occupation of the sites for alloys and vacancies)
+            * elements: the comma-separated, sorted element symbols
+            * nelements, nsites: number of elements and sites
+            * volume: the cell volume in Angstrom^3
+            * cell_lengths: the lengths of the cell vectors in Angstrom
+            * spacegroup: the space group number (only if computed)
+        """
+        from collections import defaultdict
+
+        kinds = {k.name: k for k in self.kinds}
+        kind_names = self.get_site_kindnames()
+
+        symbol_list = []
+        composition = defaultdict(float)
+        for kind_name in kind_names:
+            kind = kinds[kind_name]
+            symbol_list.append(kind.get_symbols_string())
+            for symbol, weight in zip(kind.symbols, kind.weights):
+                composition[symbol] += weight
+
+        descriptors = {
+            'formula': get_formula(symbol_list, mode='hill'),
+            'formula_reduced': get_formula(symbol_list, mode='hill_compact'),
+            'composition': dict(composition),
+            'elements': ",".join(sorted(composition)),
+            'nelements': len(composition),
+            'nsites': len(kind_names),
+            'volume': float(self.get_cell_volume()),
+            'cell_lengths': [float(l) for l in self.cell_lengths],
+        }
+
+        if spacegroup is None:
+            from aiida.common.setup import get_property
+            spacegroup = get_property('structure.descriptors_spacegroup')
+
+        if (spacegroup and has_pyspglib() and has_ase() and
+                not self.is_alloy() and not self.has_vacancies()):
+            from pyspglib.spglib import get_symmetry_dataset
+            try:
+                dataset = get_symmetry_dataset(self.get_ase())
+            except Exception:
+                # The space group is optional: do not prevent the storage
+                dataset = None
+            if dataset:
+                descriptors['spacegroup'] = int(dataset['number'])
+
+        return descriptors
+
+    def store(self, *args, **kwargs):
+        """
+        Store the structure, together with its descriptors (see
+        :py:meth:`get_descriptors`).
+        """
+        if not self.is_stored:
+            try:
+                descriptors = self.get_descriptors()
+            except (KeyError, ValueError):
+                # Inconsistent kinds and sites: _validate() will complain
+                descriptors = None
+            if descriptors is not None:
+                self._set_attr('descriptors', descriptors)
+            self._write_compact_sites()
+
+        return super(StructureData, self).store(*args, **kwargs)
+
+    def copy(self):
+        """
+        Copy the structure (the arrays of the compact representation are
+        written first, so that they are copied with the folder).
+        """
+        self._write_compact_sites()
+        return super(StructureData, self).copy()
+
+    def is_compact(self):
+        """
+        :return: True if the sites are stored in the compact representation
+            (see :py:meth:`set_compact`)
+        """
+        return self.get_attr('compact_sites', False)
+
+    def set_compact(self, value=True):
+        """
+        Choose how the sites are stored. By default, each site is a
+        dictionary in the 'sites' attribute. In the compact representation,
+        the positions and the indices of the kinds of the sites are numpy
+        arrays stored in the folder of the node (as for ArrayData), while
+        the kinds are still in the attributes. This is much faster for
+        large structures, both to build them (appending a site does not
+        rewrite the list of sites) and to store and load them.
+
+        The ``sites`` property and the methods using it work in both
+        representations. Can only be called before storing.
+
+        :param value: True for the compact representation, False for the
+            default one.
+        """
+        from aiida.common.exceptions import ModificationNotAllowed
+
+        if self.is_stored:
+            raise ModificationNotAllowed(
+                "The StructureData object cannot be modified, "
+                "it has already been stored")
+
+        if bool(value) == self.is_compact():
+            return
+
+        if value:
+            kind_indices = {k['name']: i for i, k in
+                            enumerate(self.get_attr('kinds', []))}
+            raw_sites = self.get_attr('sites', [])
+            self._compact_positions = [list(s['position'])
+                                       for s in raw_sites]
+            self._compact_kind_indices = [kind_indices[s['kind_name']]
+                                          for s in raw_sites]
+            try:
+                self._del_attr('sites')
+            except AttributeError:
+                pass
+            self._set_attr('compact_sites', True)
+        else:
+            raw_sites = [site.get_raw() for site in self.sites]
+            self._clear_compact_sites()
+            self._del_attr('compact_sites')
+            self._set_attr('sites', raw_sites)
+
+    def _get_compact_sites(self):
+        """
+        Return the positions and the kind indices of the sites in the compact
+        representation. Before storing, they are lists that can be appended
+        to, and are written to the folder only when storing. After storing,
+        they are numpy arrays read from the folder, and cached.
+
+        :return: a tuple (positions, kind_indices)
+        """
+        import numpy
+
+        try:
+            if self._compact_positions is not None:
+                return (self._compact_positions, self._compact_kind_indices)
+        except AttributeError:
+            pass
+
+        if self._positions_filename in self.get_folder_list():
+            positions = numpy.load(self.get_abs_path(
+                self._positions_filename))
+            kind_indices = numpy.load(self.get_abs_path(
+                self._kind_indices_filename))
+        else:
+            positions = numpy.zeros((0, 3))
+            kind_indices = numpy.zeros((0,), dtype=numpy.int32)
+
+        if self.is_stored:
+            self._compact_positions = positions
+            self._compact_kind_indices = kind_indices
+        else:
+            # E.g. a copy of a stored structure: switch to lists, to allow
+            # for appending
+            self._compact_positions = positions.tolist()
+            self._compact_kind_indices = kind_indices.tolist()
+        return (self._compact_positions, self._compact_kind_indices)
+
+    @classmethod
+    def _load_kind_indices(cls, uuid):
+        """
+        Return the kind indices of the sites of the stored structure with the
+        given uuid, in the compact representation, reading them from the
+        repository without loading the node (see _get_compact_sites).
+        """
+        import numpy
+        from aiida.common.folders import RepositoryFolder
+
+        folder = RepositoryFolder(section=cls._section_name,
+                                  uuid=uuid).get_subfolder(
+            cls._path_subfolder_name, reset_limit=True)
+        if cls._kind_indices_filename in folder.get_content_list():
+            return numpy.load(folder.get_abs_path(
+                cls._kind_indices_filename))
+        return numpy.zeros((0,), dtype=numpy.int32)
+
+    def _write_compact_sites(self):
+        """
+        Write the arrays of the compact representation to the folder of the
+        node (before storing).
+        """
+        import tempfile
+        import numpy
+
+        if self.is_stored or not self.is_compact():
+            return
+
+        (positions, kind_indices) = self._get_compact_sites()
+        arrays = [
+            (self._positions_filename,
+             numpy.array(positions, dtype=float).reshape((-1, 3))),
+            (self._kind_indices_filename,
+             numpy.array(kind_indices, dtype=numpy.int32)),
+        ]
+        for (fname, array) in arrays:
+            with tempfile.NamedTemporaryFile() as f:
+                numpy.save(f, array)
+                f.flush()
+                self.add_path(f.name, fname)
+
+    def _clear_compact_sites(self):
+        """
+        Remove the sites of the compact representation
+        """
+        self._compact_positions = None
+        self._compact_kind_indices = None
+        for fname in (self._positions_filename, self._kind_indices_filename):
+            if fname in self.get_folder_list():
+                self.remove_path(fname)
+
     def get_site_kindnames(self):
         """
         Return a list with length equal to the number of sites of this structure,
@@ -1039,6 +1317,9 @@ class StructureData(Data):
 
         :return: a list of strings
         """
+        if self.is_compact():
+            kind_names = [k['name'] for k in self.get_attr('kinds', [])]
+            return [kind_names[i] for i in self._get_compact_sites()[1]]
         return [this_site.kind_name for this_site in self.sites]
 
     def get_composition(self):
@@ -1051,8 +1332,8 @@ class StructureData(Data):
 
         :returns: a dictionary with the composition
         """
-        symbols_list = [self.get_kind(s.kind_name).get_symbols_string()
-                        for s in self.sites]
+        symbols_list = [self.get_kind(k).get_symbols_string()
+                        for k in self.get_site_kindnames()]
         composition = {
             symbol: symbols_list.count(symbol)
             for symbol
@@ -1168,9 +1449,16 @@ class StructureData(Data):
                                          [k.name for k in self.kinds]))
 
         # If here, no exceptions have been raised, so I add the site.
-        # I join two lists. Do not use .append, which would work in-place
-        self._set_attr('sites',
-                       self.get_attr('sites', []) + [new_site.get_raw()])
+        if self.is_compact():
+            # Appended in place: the arrays are only written when storing
+            kind_index = [k.name for k in self.kinds].index(site.kind_name)
+            (positions, kind_indices) = self._get_compact_sites()
+            positions.append(list(new_site.position))
+            kind_indices.append(kind_index)
+        else:
+            # I join two lists. Do not use .append, which would work in-place
+            self._set_attr('sites',
+                           self.get_attr('sites', []) + [new_site.get_raw()])
 
     def append_atom(self, **kwargs):
         """
@@ -1370,13 +1658,23 @@ class StructureData(Data):
                 "The StructureData object cannot be modified, "
                 "it has already been stored")
 
-        self._set_attr('sites', [])
+        if self.is_compact():
+            self._clear_compact_sites()
+            self._compact_positions = []
+            self._compact_kind_indices = []
+        else:
+            self._set_attr('sites', [])
 
     @property
     def sites(self):
         """
-        Returns a list of sites.
+        Returns a list of sites (a read-only sequence of sites in the compact
+        representation, see :py:meth:`set_compact`).
         """
+        if self.is_compact():
+            (positions, kind_indices) = self._get_compact_sites()
+            kind_names = [k['name'] for k in self.get_attr('kinds', [])]
+            return SitesView(positions, kind_indices, kind_names)
         try:
             raw_sites = self.get_attr('sites')
         except AttributeError:
@@ -1500,7 +1798,8 @@ class StructureData(Data):
         else:
 
             # test consistency of th enew input
-            n_sites = len(self.sites)
+            old_sites = self.sites
+            n_sites = len(old_sites)
             if n_sites != len(new_positions) and conserve_particle:
                 raise ValueError(
                     "the new positions should be as many as the previous structure.")
@@ -1519,10 +1818,19 @@ class StructureData(Data):
                                      "found instead {}".format(len(this_pos)))
 
                 # now append this Site to the new_site list.
-                new_site = Site(site=self.sites[i])  # So we make a copy
+                new_site = Site(site=old_sites[i])  # So we make a copy
                 new_site.position = copy.deepcopy(this_pos)
                 new_sites.append(new_site)
 
+            if self.is_compact():
+                # The kinds do not change
+                kind_indices = list(self._get_compact_sites()[1])
+                self._clear_compact_sites()
+                self._compact_positions = [list(s.position)
+                                           for s in new_sites]
+                self._compact_kind_indices = kind_indices
+                return
+
             # now clear the old sites, and substitute with the new ones
             self.clear_sites()
             for this_new_site in new_sites:
@@ -2157,6 +2465,36 @@ class Kind(object):
         return "name '{}', symbol '{}'".format(self.name, symbol)
 
 
+class SitesView(object):
+    """
+    Read-only sequence of the sites of a
+    :py:class:`StructureData <aiida.orm.data.structure.StructureData>` in
+    the compact representation. The Site objects are built when they are
+    accessed.
+    """
+
+    def __init__(self, positions, kind_indices, kind_names):
+        self._positions = positions
+        self._kind_indices = kind_indices
+        self._kind_names = kind_names
+
+    def __len__(self):
+        return len(self._kind_indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in xrange(*index.indices(len(self)))]
+        return Site(kind_name=self._kind_names[self._kind_indices[index]],
+                    position=self._positions[index])
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return '<{}: {} sites>'.format(self.__class__.__name__, len(self))
+
+
 class Site(object):
     """
     This class contains the information about a given site of the system.
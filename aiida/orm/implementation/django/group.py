@@ -146,7 +146,7 @@ class Group(AbstractGroup):
                             "of such objects, it is instead {}".format(
                 str(type(nodes))))
 
-        list_pk = []
+        list_pk = set()
         for node in nodes:
             if not isinstance(node, (Node, DbNode)):
                 raise TypeError("Invalid type of one of the elements passed "
@@ -156,8 +156,12 @@ class Group(AbstractGroup):
             if node.pk is None:
                 raise ValueError("At least one of the provided nodes is "
                                  "unstored, stopping...")
-            list_pk.append(node.pk)
+            list_pk.add(node.pk)
 
+        if not list_pk:
+            return
+        # A single query for the nodes already in the group, and a single
+        # bulk INSERT for the others
         self.dbgroup.dbnodes.add(*list_pk)
 
     @property
@@ -203,7 +207,7 @@ class Group(AbstractGroup):
                             "list of such objects, it is instead {}".format(
                 str(type(nodes))))
 
-        list_pk = []
+        list_pk = set()
         for node in nodes:
             if not isinstance(node, (Node, DbNode)):
                 raise TypeError("Invalid type of one of the elements passed "
@@ -213,8 +217,11 @@ class Group(AbstractGroup):
             if node.pk is None:
                 raise ValueError("At least one of the provided nodes is "
                                  "unstored, stopping...")
-            list_pk.append(node.pk)
+            list_pk.add(node.pk)
 
+        if not list_pk:
+            return
+        # A single DELETE
         self.dbgroup.dbnodes.remove(*list_pk)
 
     @classmethod
@@ -1324,47 +1324,9 @@ class AbstractJobCalculation(object):
             actually being submitted at the same time in another thread.
         """
         # TODO: Check if we want to add a status "KILLED" or something similar.
-        from aiida.common.exceptions import (InvalidOperation,
-                                             RemoteOperationError)
-
-        old_state = self.get_state()
-
-        if (old_state == calc_states.NEW or old_state == calc_states.TOSUBMIT):
-            self._set_state(calc_states.FAILED)
-            self.logger.warning(
-                "Calculation {} killed by the user "
-                "(it was in {} state)".format(self.pk, old_state))
-            return
-
-        if old_state != calc_states.WITHSCHEDULER:
-            raise InvalidOperation("Cannot kill a calculation in {} state"
-                                   .format(old_state))
-
-        # I get the scheduler plugin class and initialize it with the correct
-        # transport
-        computer = self.get_computer()
-        t = self._get_transport()
-        s = computer.get_scheduler()
-        s.set_transport(t)
-
-        # And I call the proper kill method for the job ID of this calculation
-        with t:
-            retval = s.kill(self.get_job_id())
-
-        # Raise error is something went wrong
-        if not retval:
-            raise RemoteOperationError(
-                "An error occurred while trying to kill "
-                "calculation {} (jobid {}), see log "
-                "(maybe the calculation already finished?)"
-                    .format(self.pk, self.get_job_id()))
-        else:
-            # Do not set the state, but let the parser do its job
-            # self._set_state(calc_states.FAILED)
-            self._logger.warning(
-                "Calculation {} killed by the user "
-                "(it was {})".format(self.pk,
-                                     calc_states.WITHSCHEDULER))
+        error = kill_calculations([self])[self.pk]
+        if error is not None:
+            raise error
 
     def _presubmit(self, folder, use_unstored_links=False):
         """
@@ -1839,6 +1801,94 @@ class AbstractJobCalculation(object):
         return errfile_content
 
 
+def kill_calculations(calcs):
+    """
+    Kill many calculations on the cluster, as JobCalculation.kill does.
+
+    The calculations are grouped by (computer, user): a single transport is
+    opened for each group, and the job ids of the group are passed to the
+    scheduler kill command in batches (see Scheduler.kill_jobs).
+
+    :param calcs: a list of JobCalculation objects
+    :return: a dictionary with the pks of the calculations as keys, and None
+        if the calculation was killed, or the exception that JobCalculation.kill
+        raises otherwise (InvalidOperation if the calculation is in a state
+        that cannot be killed, RemoteOperationError if the scheduler did not
+        kill the job)
+    """
+    from aiida.common.exceptions import (AuthenticationError, NotExistent,
+                                         InvalidOperation,
+                                         RemoteOperationError)
+    from aiida.orm.computer import Computer
+
+    results = {}
+    # (computer id, user id) -> (authinfo, {job id: [calculations]})
+    groups = {}
+
+    for calc in calcs:
+        old_state = calc.get_state()
+
+        if (old_state == calc_states.NEW or old_state == calc_states.TOSUBMIT):
+            calc._set_state(calc_states.FAILED)
+            calc.logger.warning(
+                "Calculation {} killed by the user "
+                "(it was in {} state)".format(calc.pk, old_state))
+            results[calc.pk] = None
+            continue
+
+        if old_state != calc_states.WITHSCHEDULER:
+            results[calc.pk] = InvalidOperation(
+                "Cannot kill a calculation in {} state".format(old_state))
+            continue
+
+        try:
+            dbcomputer = calc.dbnode.dbcomputer
+            if dbcomputer is None:
+                raise NotExistent("No computer has been set for "
+                                  "calculation {}".format(calc.pk))
+            key = (dbcomputer.id, calc.get_user().id)
+            if key not in groups:
+                groups[key] = (calc._get_authinfo(), {})
+        except (NotExistent, AuthenticationError) as e:
+            results[calc.pk] = e
+            continue
+        groups[key][1].setdefault(str(calc.get_job_id()), []).append(calc)
+
+    for (authinfo, jobs) in groups.itervalues():
+        t = authinfo.get_transport()
+        s = Computer(dbcomputer=authinfo.dbcomputer).get_scheduler()
+        s.set_transport(t)
+
+        try:
+            with t:
+                killed = s.kill_jobs(jobs.keys())
+        except Exception as e:
+            for job_calcs in jobs.itervalues():
+                for calc in job_calcs:
+                    results[calc.pk] = RemoteOperationError(
+                        "An error occurred while trying to kill calculation "
+                        "{}: {}".format(calc.pk, e))
+            continue
+
+        for jobid, job_calcs in jobs.iteritems():
+            for calc in job_calcs:
+                if killed.get(jobid, False):
+                    # Do not set the state, but let the parser do its job
+                    calc.logger.warning(
+                        "Calculation {} killed by the user "
+                        "(it was {})".format(calc.pk,
+                                             calc_states.WITHSCHEDULER))
+                    results[calc.pk] = None
+                else:
+                    results[calc.pk] = RemoteOperationError(
+                        "An error occurred while trying to kill "
+                        "calculation {} (jobid {}), see log "
+                        "(maybe the calculation already finished?)"
+                            .format(calc.pk, jobid))
+
+    return results
+
+
 class CalculationResultManager(object):
     """
     An object used internally to interface the calculation object with the Parser
@@ -4,6 +4,7 @@ import collections
 
 from copy import copy
 
+from sqlalchemy import literal, select
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm.session import make_transient
 
@@ -147,7 +148,7 @@ class Group(AbstractGroup):
                             "of such objects, it is instead {}".format(
                 str(type(nodes))))
 
-        list_nodes = []
+        node_ids = set()
         for node in nodes:
             if not isinstance(node, (Node, DbNode)):
                 raise TypeError("Invalid type of one of the elements passed "
@@ -158,16 +159,19 @@ class Group(AbstractGroup):
             if node.id is None:
                 raise ValueError("At least one of the provided nodes is "
                                  "unstored, stopping...")
-            if isinstance(node, Node):
-                to_add = node.dbnode
-            else:
-                to_add = node
-
-            if to_add not in self._dbgroup.dbnodes:
-                # ~ list_nodes.append(to_add)
-                self._dbgroup.dbnodes.append(to_add)
+            node_ids.add(node.id)
+
+        if not node_ids:
+            return
+
+        # A single INSERT ... SELECT of the nodes not in the group yet
+        group_node_ids = select([table_groups_nodes.c.dbnode_id]).where(
+            table_groups_nodes.c.dbgroup_id == self.id)
+        new_rows = select([DbNode.id, literal(self.id)]).where(
+            DbNode.id.in_(node_ids)).where(~DbNode.id.in_(group_node_ids))
+        session.execute(table_groups_nodes.insert().from_select(
+            ['dbnode_id', 'dbgroup_id'], new_rows))
         session.commit()
-        # ~ self._dbgroup.dbnodes.extend(list_nodes)
 
     @property
     def nodes(self):
@@ -212,7 +216,7 @@ class Group(AbstractGroup):
                             "list of such objects, it is instead {}".format(
                 str(type(nodes))))
 
-        list_nodes = []
+        node_ids = set()
         for node in nodes:
             if not isinstance(node, (Node, DbNode)):
                 raise TypeError("Invalid type of one of the elements passed "
@@ -222,16 +226,14 @@ class Group(AbstractGroup):
             if node.id is None:
                 raise ValueError("At least one of the provided nodes is "
                                  "unstored, stopping...")
-            if isinstance(node, Node):
-                node = node.dbnode
-            # If we don't check first, SqlA might issue a DELETE statement for
-            # an unexisting key, resulting in an error
-            if node in self._dbgroup.dbnodes:
-                list_nodes.append(node)
+            node_ids.add(node.id)
 
-        for node in list_nodes:
-            self._dbgroup.dbnodes.remove(node)
+        if not node_ids:
+            return
 
+        sa.session.execute(table_groups_nodes.delete().where(
+            table_groups_nodes.c.dbgroup_id == self.id).where(
+            table_groups_nodes.c.dbnode_id.in_(node_ids)))
         sa.session.commit()
 
     @classmethod
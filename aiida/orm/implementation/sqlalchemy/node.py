@@ -731,19 +731,14 @@ class Node(AbstractNode):
                     self._repository_folder.abspath, move=True, overwrite=True)
                 raise
 
-            # Set up autogrouping used be verdi run
+            # Set up autogrouping used be verdi run (the node is buffered,
+            # and added to the group together with the next ones)
             autogroup = aiida.orm.autogroup.current_autogroup
-            grouptype = aiida.orm.autogroup.VERDIAUTOGROUP_TYPE
-
             if autogroup is not None:
                 if not isinstance(autogroup, aiida.orm.autogroup.Autogroup):
                     raise ValidationError("current_autogroup is not an AiiDA Autogroup")
-
                 if autogroup.is_to_be_grouped(self):
-                    group_name = autogroup.get_group_name()
-                    if group_name is not None:
-                        g = Group.get_or_create(name=group_name, type_string=grouptype)[0]
-                        g.add_nodes(self)
+                    autogroup.add_node(self)
 
         return self
 
@@ -44,6 +44,14 @@ def error_handler(error):
     return response
 
 
+## Release the database session of the thread serving a request when the
+# request is done
+@app.teardown_appcontext
+def close_db_session(exception=None):
+    from aiida.backends.utils import close_session
+    close_session()
+
+
 ## Add resources to the api
 api.add_resource(Computer,
                  # supported urls
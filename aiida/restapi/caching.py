@@ -1,7 +1,253 @@
-from flask_cache import Cache
-from aiida.restapi.api import app
-from aiida.restapi.common.config import cache_config
+"""
+Caching of the responses of the REST API.
 
-#Would be nice to be able to specify here what has to be cached or not!
-#Probably this is not doable because cachced and memoize only work as decorators
-cache = Cache(app, config=cache_config)
+Responses are kept in a two-level cache: an in-process LRU cache, and
+optionally a store shared among the processes serving the API (e.g.
+memcached), see CACHE_CONFIG in aiida.restapi.common.config.
+
+Two kinds of entries are stored:
+ - responses that only depend on the content of a single stored node
+   (details, attributes and extras of a pk). The node version is part of
+   their key, and since every modification of a node increments its version
+   they never expire.
+ - responses to queries. Their key contains a watermark of the database
+   (the last node id and the last link id), so that they are invalidated
+   as soon as nodes or links are added. In-place modifications of existing
+   nodes do not move the watermark: their key also contains the current
+   period of CACHE_CONFIG['query_timeout'] seconds (see get_time_bucket),
+   so that they are invalidated at the end of each period.
+
+The key of an entry is also used as ETag of the response, so that clients
+sending If-None-Match get a 304 (Not Modified) without the query being run.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, Response
+
+from aiida.restapi.common.config import CACHE_CONFIG
+
+
+class LRUCache(object):
+    """
+    A thread-safe, size-bounded cache that evicts the least recently used
+    entries first. Entries may have a timeout (in seconds).
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :return: the value stored for key, or None if there is no such
+          (or only an expired) entry
+        """
+        with self._lock:
+            try:
+                (expires, value) = self._entries.pop(key)
+            except KeyError:
+                return None
+            if expires is not None and expires < time.time():
+                return None
+            # Re-insert as most recently used
+            self._entries[key] = (expires, value)
+            return value
+
+    def set(self, key, value, timeout=None):
+        """
+        Stores value for key. If timeout is None, the entry does not expire
+        (but can be evicted).
+        """
+        if timeout is None:
+            expires = None
+        else:
+            expires = time.time() + timeout
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, value)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ResponseCache(object):
+    """
+    The in-process LRU cache, backed by an optional shared store
+    implementing the werkzeug cache interface (get, set).
+    """
+
+    def __init__(self, size, shared=None):
+        self.local = LRUCache(size)
+        self.shared = shared
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                (timeout, data) = value
+                self.local.set(key, value, timeout=timeout)
+        if value is None:
+            return None
+        return value[1]
+
+    def set(self, key, data, timeout=None):
+        value = (timeout, data)
+        self.local.set(key, value, timeout=timeout)
+        if self.shared is not None:
+            # For werkzeug caches a timeout of 0 means no expiration
+            self.shared.set(key, value, timeout=timeout or 0)
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+
+def get_shared_store(config):
+    """
+    Builds the store shared by the processes serving the API.
+
+    :param config: None, or a dictionary with the 'type' of the store
+      ('memcached' or 'redis') and the arguments of the corresponding
+      werkzeug cache class (e.g. 'servers' for memcached, 'host' and 'port'
+      for redis)
+    :return: a werkzeug cache, or None
+    """
+    from aiida.common.exceptions import ConfigurationError
+
+    if not config:
+        return None
+
+    config = dict(config)
+    store_type = config.pop('type', None)
+    config.setdefault('key_prefix', 'aiida_restapi_')
+
+    if store_type == 'memcached':
+        from werkzeug.contrib.cache import MemcachedCache
+        return MemcachedCache(**config)
+    elif store_type == 'redis':
+        from werkzeug.contrib.cache import RedisCache
+        return RedisCache(**config)
+    else:
+        raise ConfigurationError("Unknown type of shared cache: {}".format(
+            store_type))
+
+
+cache = ResponseCache(CACHE_CONFIG['size'],
+                      shared=get_shared_store(CACHE_CONFIG.get('shared')))
+
+
+def get_db_watermark():
+    """
+    :return: a tuple with the largest node id and the largest link id. It
+      changes whenever nodes are stored or linked.
+    """
+    from aiida.orm.querybuilder import QueryBuilder
+
+    session = QueryBuilder()._get_session()
+    return tuple(session.execute(
+        "SELECT (SELECT max(id) FROM db_dbnode), "
+        "(SELECT max(id) FROM db_dblink)").first())
+
+
+def get_node_version(pk):
+    """
+    :return: the version of the node with the given pk, or None if the node
+      does not exist
+    """
+    from aiida.orm.querybuilder import QueryBuilder
+    from aiida.orm.node import Node
+
+    qb = QueryBuilder()
+    qb.append(Node, filters={'id': {'==': pk}}, project=['nodeversion'])
+    res = qb.first()
+    if res is None:
+        return None
+    return res[0]
+
+
+def get_time_bucket(timeout):
+    """
+    :return: the number of the current period of timeout seconds
+    """
+    return int(time.time() // timeout)
+
+
+def get_cache_key(path, url):
+    """
+    :param path: the path of the request
+    :param url: the full url of the request (the response embeds it)
+    :return: a tuple (key, timeout). key is None if the response is not
+      to be cached. timeout is None for entries that never expire.
+    """
+    from aiida.common.hashing import make_hash
+    from aiida.restapi.common.utils import parse_path
+
+    (resource_type, page, pk, query_type) = parse_path(path)
+
+    if query_type == 'schema':
+        return (None, None)
+
+    if pk is not None and query_type in ('default', 'attributes',
+                                         'extras'):
+        nodeversion = get_node_version(pk)
+        if nodeversion is None:
+            return (None, None)
+        return (make_hash([url, pk, nodeversion]), None)
+    else:
+        timeout = CACHE_CONFIG['query_timeout']
+        if not timeout:
+            return (None, None)
+        # Also the ETag must change when the entry expires
+        return (make_hash([url, list(get_db_watermark()),
+                           get_time_bucket(timeout)]), timeout)
+
+
+def cache_response(method):
+    """
+    Decorator of the get methods of the resources: serves the response
+    from the cache if possible, and caches it otherwise.
+    """
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        from urllib import unquote
+
+        (key, timeout) = get_cache_key(unquote(request.path),
+                                       unquote(request.url))
+        if key is None:
+            return method(*args, **kwargs)
+
+        # The key identifies the content of the response
+        if key in request.if_none_match:
+            response = Response(status=304)
+            response.set_etag(key)
+            return response
+
+        cached = cache.get(key)
+        if cached is not None:
+            (data, headers, mimetype) = cached
+            response = Response(data, status=200, headers=headers,
+                                mimetype=mimetype)
+        else:
+            response = method(*args, **kwargs)
+            # Streamed responses are not buffered
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            headers = [(k, v) for (k, v) in response.headers.items()
+                       if k not in ('Content-Length', 'Content-Type')]
+            cache.set(key, (response.get_data(), headers, response.mimetype),
+                      timeout=timeout)
+
+        response.set_etag(key)
+        return response
+
+    return wrapper
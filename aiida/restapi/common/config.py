@@ -2,6 +2,16 @@
 LIMIT_DEFAULT = 400
 PERPAGE_DEFAULT = 20
 
+## Exact counts of the query results are cached for this time (in seconds)
+COUNT_CACHE_TIMEOUT = 60
+
+## Responses listing more than STREAM_THRESHOLD results are serialised while
+# the rows are read from the database (through a server-side cursor, in
+# batches of STREAM_BATCH_SIZE rows), instead of being built in memory.
+# Streamed responses are not cached.
+STREAM_THRESHOLD = 100
+STREAM_BATCH_SIZE = 100
+
 ##Version prefix for all the URLs
 PREFIX="/api/v2"
 
@@ -22,19 +32,17 @@ SERIALIZER_CONFIG = {'datetime_format': 'default'}
 # dictionary its value is assumed to be 'default'.
 # DATETIME_FORMAT: allowed values are 'asinput' and 'default'.
 
-## Caching
-#memcached: backend caching system
-cache_config={'CACHE_TYPE': 'memcached'}
-
-#Caching TIMEOUTS (in seconds)
-CACHING_TIMEOUTS = {
-    'nodes': 10,
-    'users': 10,
-    'calculations': 10,
-    'computers': 10,
-    'datas': 10,
-    'groups': 10,
-    'codes': 10,
+## Caching (see aiida.restapi.caching)
+# size: number of responses kept in the in-process cache of each worker
+# query_timeout: (in seconds) bound on the lifetime of the cached responses
+#   to queries, which are otherwise invalidated when nodes or links are added
+# shared: optional store shared among the workers, e.g.
+#   {'type': 'memcached', 'servers': ['127.0.0.1:11211']} or
+#   {'type': 'redis', 'host': 'localhost', 'port': 6379}
+CACHE_CONFIG = {
+    'size': 1000,
+    'query_timeout': 60,
+    'shared': None,
 }
 
 #Schema customization (if file schema_custom.json is present in this folder)
@@ -51,3 +59,10 @@ except IOError:
 
 # IO tree
 MAX_TREE_DEPTH = 5
+# Maximum number of links followed from each node of the tree (per direction)
+MAX_TREE_FANOUT = 100
+
+# Statistics: nodes with an id seen less than this time ago (in seconds) are
+# not added to the stored summary yet, but counted at each request. It must
+# be longer than the transactions that store nodes
+STATISTICS_GRACE_TIME = 600
@@ -0,0 +1,85 @@
+"""
+Extraction of the provenance graph around a node.
+
+The neighbourhood of a node is walked in a single recursive query over the
+links table, instead of going through the transitive closure (DbPath) and
+reconstructing the direct links from the projected paths. The walk is
+bounded both in depth and in fan-out, i.e. in the number of links followed
+from each node in each direction.
+"""
+
+# The walk towards the ancestors and the one towards the descendants are two
+# recursive CTEs of the same statement. Each row carries the node from
+# which it was reached, so that the traversed links come with the nodes.
+# UNION (rather than UNION ALL) discards rows already found, so that
+# diamonds in the graph do not multiply the rows.
+_NEIGHBOURHOOD_SQL = """
+WITH RECURSIVE
+ancestors(id, depth, reached_from) AS (
+        SELECT :pk, 0, CAST(NULL AS INTEGER)
+    UNION
+        SELECT l.input_id, a.depth + 1, a.id
+        FROM ancestors a,
+        LATERAL (SELECT input_id FROM db_dblink
+                 WHERE output_id = a.id
+                 ORDER BY input_id LIMIT :fanout) l
+        WHERE a.depth < :depth
+),
+descendants(id, depth, reached_from) AS (
+        SELECT :pk, 0, CAST(NULL AS INTEGER)
+    UNION
+        SELECT l.output_id, d.depth + 1, d.id
+        FROM descendants d,
+        LATERAL (SELECT output_id FROM db_dblink
+                 WHERE input_id = d.id
+                 ORDER BY output_id LIMIT :fanout) l
+        WHERE d.depth < :depth
+)
+SELECT 'ancestors', w.id, w.depth, w.reached_from, n.type
+FROM ancestors w JOIN db_dbnode n ON n.id = w.id
+UNION ALL
+SELECT 'desc', w.id, w.depth, w.reached_from, n.type
+FROM descendants w JOIN db_dbnode n ON n.id = w.id
+"""
+
+
+def get_neighbourhood(pk, depth, fanout):
+    """
+    Returns the nodes within depth links from the node pk (following the
+    links in one direction, either towards the ancestors or towards the
+    descendants) and the links traversed to reach them.
+
+    :param pk: the pk of the central node
+    :param depth: the maximum number of links between the central node and
+      the returned nodes
+    :param fanout: the maximum number of links followed from each node, in
+      each direction
+    :return: a tuple (nodes, links). nodes is a dictionary
+      {pk: (type, direction, depth)} where direction is 'ancestors', 'desc'
+      or None for the central node, and depth is the smallest distance from
+      the central node. links is a set of (input pk, output pk) tuples.
+      nodes is empty if the node does not exist.
+    """
+    from aiida.orm.querybuilder import QueryBuilder
+
+    session = QueryBuilder()._get_session()
+    rows = session.execute(_NEIGHBOURHOOD_SQL,
+                           {'pk': pk, 'depth': depth, 'fanout': fanout})
+
+    nodes = {}
+    links = set()
+    for (direction, node_pk, node_depth, reached_from, node_type) in rows:
+        if node_depth == 0:
+            nodes[node_pk] = (node_type, None, 0)
+            continue
+
+        if direction == 'ancestors':
+            links.add((node_pk, reached_from))
+        else:
+            links.add((reached_from, node_pk))
+
+        known = nodes.get(node_pk)
+        if known is None or known[2] > node_depth:
+            nodes[node_pk] = (node_type, direction, node_depth)
+
+    return (nodes, links)
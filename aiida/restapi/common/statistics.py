@@ -0,0 +1,208 @@
+"""
+Node statistics for the REST API, computed by the database.
+
+The number of nodes per (user, type, creation day) never changes for a node
+that has been stored, so these counts are materialised in a summary (kept as
+a global setting of the database) together with the id of the last node
+they include. Each request only aggregates the nodes stored after this
+watermark.
+
+The ids of the nodes are assigned when they are stored, but become visible
+only when their transaction is committed, so a node with a lower id can
+appear after a node with a larger one. For this reason, the summary also
+keeps the largest id seen at some recent times (at most every
+STATISTICS_GRACE_TIME / 10 seconds), and the watermark is advanced to an
+id only STATISTICS_GRACE_TIME after it was seen, when all the transactions
+that were open at that time have ended.
+
+The modification times change in place, so they cannot be summarised
+incrementally: they are aggregated by the database at each request.
+"""
+import json
+import time
+from collections import defaultdict
+
+from aiida.restapi.common.config import STATISTICS_GRACE_TIME
+
+# Key of the global setting where the summary is stored
+SUMMARY_SETTING = 'restapi|statistics_summary'
+
+# Minimum time (in seconds) between two ids recorded in the summary
+CHECKPOINT_INTERVAL = STATISTICS_GRACE_TIME / 10.
+
+
+def _group_by(tclass, column, min_id=None, max_id=None):
+    """
+    Counts the nodes of class tclass grouped by creator, type and day of
+    the given column.
+
+    The QueryBuilder takes care of the joins and of the filters on the
+    type, while the aggregation is added on top of its query.
+
+    :param tclass: the node class
+    :param column: 'ctime' or 'mtime'
+    :param min_id: if not None, only nodes with a larger id are counted
+    :param max_id: if not None, only nodes with id up to max_id are counted
+    :return: a list of tuples (email, type, day, count)
+    """
+    from sqlalchemy import func
+    from aiida.orm.querybuilder import QueryBuilder
+    from aiida.orm import User
+
+    filters = {}
+    if min_id is not None:
+        filters.setdefault('id', {})['>'] = min_id
+    if max_id is not None:
+        filters.setdefault('id', {})['<='] = max_id
+
+    qb = QueryBuilder()
+    qb.append(tclass, tag='node', filters=filters)
+    qb.append(User, creator_of='node', tag='user')
+
+    node = qb.get_alias('node')
+    user = qb.get_alias('user')
+    day = func.to_char(getattr(node, column), 'YYYY-MM-DD')
+
+    query = qb.get_query().with_entities(
+        user.email, node.type, day, func.count(node.id)).group_by(
+        user.email, node.type, day)
+
+    return [tuple(row) for row in query]
+
+
+def _get_max_id():
+    """
+    :return: the largest id of the nodes (or None)
+    """
+    from aiida.orm.querybuilder import QueryBuilder
+    from aiida.orm.node import Node
+
+    qb = QueryBuilder()
+    qb.append(Node, project=[{'id': {'func': 'max'}}])
+    return qb.first()[0]
+
+
+def get_ctime_summary():
+    """
+    Returns the number of nodes per (user, type, creation day), refreshing
+    the stored summary if needed.
+
+    :return: a list of tuples (email, type, day, count). Keys may appear
+      more than once, their counts have to be summed.
+    """
+    from aiida.backends.utils import get_global_setting, set_global_setting
+    from aiida.orm.node import Node
+
+    try:
+        summary = json.loads(get_global_setting(SUMMARY_SETTING))
+    except KeyError:
+        summary = {}
+
+    watermark = summary.get('watermark')
+    counts = [tuple(c) for c in summary.get('counts', [])]
+    # A list of [time, largest id of the nodes at that time]
+    checkpoints = summary.get('checkpoints', [])
+    changed = False
+
+    now = time.time()
+    if not checkpoints or now - checkpoints[-1][0] >= CHECKPOINT_INTERVAL:
+        max_id = _get_max_id()
+        last_id = checkpoints[-1][1] if checkpoints else watermark
+        if max_id is not None and max_id != last_id:
+            checkpoints.append([now, max_id])
+            changed = True
+
+    # All the nodes up to the ids seen before the grace time are committed
+    settled = [c for c in checkpoints if c[0] <= now - STATISTICS_GRACE_TIME]
+    if settled:
+        checkpoints = checkpoints[len(settled):]
+        new_watermark = settled[-1][1]
+        if watermark is None or new_watermark > watermark:
+            new_counts = _group_by(Node, 'ctime', min_id=watermark,
+                                   max_id=new_watermark)
+            merged = defaultdict(int)
+            for (email, node_type, day, count) in counts + new_counts:
+                merged[(email, node_type, day)] += count
+            counts = [k + (v,) for (k, v) in merged.iteritems()]
+            watermark = new_watermark
+        changed = True
+
+    if changed:
+        set_global_setting(SUMMARY_SETTING,
+                           json.dumps({'watermark': watermark,
+                                       'counts': counts,
+                                       'checkpoints': checkpoints}),
+                           description="Summary of the node statistics "
+                                       "served by the REST API")
+
+    # Nodes stored after the watermark are counted on the fly
+    return counts + _group_by(Node, 'ctime', min_id=watermark)
+
+
+def _count_statistics(rows):
+    """
+    :param rows: an iterable of tuples (type, ctime day, mtime day, count)
+      where ctime or mtime day are None
+    :return: the statistics dictionary of a set of nodes
+    """
+
+    types = defaultdict(int)
+    ctime_by_month = defaultdict(int)
+    ctime_by_day = defaultdict(int)
+    mtime_by_month = defaultdict(int)
+    mtime_by_day = defaultdict(int)
+
+    for (node_type, cday, mday, count) in rows:
+        if cday is not None:
+            types[node_type] += count
+            ctime_by_day[cday] += count
+            ctime_by_month[cday[:7]] += count
+        if mday is not None:
+            mtime_by_day[mday] += count
+            mtime_by_month[mday[:7]] += count
+
+    return {
+        "types": dict(types),
+        "ctime_by_month": dict(ctime_by_month),
+        "ctime_by_day": dict(ctime_by_day),
+        "mtime_by_month": dict(mtime_by_month),
+        "mtime_by_day": dict(mtime_by_day),
+    }
+
+
+def get_statistics(tclass, users=[]):
+    """
+    Returns the statistics of the nodes of class tclass: total count, counts
+    by type and by creation/modification month and day, and the same
+    statistics for each user.
+
+    :param tclass: the node class
+    :param users: the emails of the users for which the statistics are
+      returned. All the users if empty.
+    """
+    prefix = tclass._query_type_string
+
+    rows_by_user = defaultdict(list)
+    for (email, node_type, day, count) in get_ctime_summary():
+        if node_type.startswith(prefix):
+            rows_by_user[email].append((node_type, day, None, count))
+    for (email, node_type, day, count) in _group_by(tclass, 'mtime'):
+        rows_by_user[email].append((node_type, None, day, count))
+
+    all_rows = [row for rows in rows_by_user.itervalues() for row in rows]
+    statistics = _count_statistics(all_rows)
+    statistics["total"] = sum(statistics["types"].itervalues())
+
+    if isinstance(users, basestring):
+        users = [users]
+    if len(users) == 0:
+        users = [email for (email, rows) in rows_by_user.iteritems()
+                 if any(r[1] is not None for r in rows)]
+
+    statistics["users"] = {}
+    for user in users:
+        user_statistics = _count_statistics(rows_by_user.get(user, []))
+        user_statistics["total"] = sum(user_statistics["types"].itervalues())
+        statistics["users"][user] = user_statistics
+
+    return statistics
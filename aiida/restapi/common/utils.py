@@ -12,6 +12,9 @@ from datetime import datetime, timedelta
 # Imported by the translators
 pk_dbsynonym = 'id'
 
+# Admitted values of the 'count' key of the query string
+COUNT_MODES = ('exact', 'estimate', 'none')
+
 # Conversion map from the query_string operators to the query_builder operators
 op_conv_map = {
     '=': '==',
@@ -145,8 +148,57 @@ def parse_path(path_string):
             page = int(path.pop(0))
             return (resource_type, page, pk, query_type)
 
+def encode_cursor(column, value, pk):
+    """
+    Builds the opaque continuation token used by the keyset (cursor)
+    pagination. The token records the position of the last row of a page,
+    i.e. the value of the ordering column and the id used as tie-breaker.
+
+    :param column: (string) the name of the ordering column
+    :param value: the value of the ordering column in the last row
+    :param pk: (integer) the id of the last row
+    :return: a url-safe string
+    """
+    import base64
+    import json
+
+    if isinstance(value, datetime):
+        value = {'datetime': value.isoformat()}
+
+    token = base64.urlsafe_b64encode(json.dumps([column, value, pk]))
+    return token.rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Inverse of encode_cursor().
+
+    :param token: (string) the continuation token passed by the client
+    :return: a tuple (column, value, pk), or None if the token is empty,
+      meaning that the first page is requested
+    """
+    import base64
+    import json
+    from dateutil import parser as dtparser
+
+    if not token:
+        return None
+
+    try:
+        padded = str(token) + '=' * (-len(token) % 4)
+        (column, value, pk) = json.loads(base64.urlsafe_b64decode(padded))
+        pk = int(pk)
+        if isinstance(value, dict):
+            value = dtparser.parse(value['datetime'])
+    except (TypeError, ValueError, KeyError):
+        raise RestInputValidationError("The cursor value is not valid")
+
+    return (column, value, pk)
+
+
 def validate_request(limit=None, offset=None, perpage=None, page=None,
-                     query_type=None, is_querystring_defined=False):
+                     query_type=None, is_querystring_defined=False,
+                     cursor=None, count=None):
     """
     Performs various checks on the consistency of the request.
     Add here all the checks that you want to do, except validity of the page
@@ -173,6 +225,18 @@ def validate_request(limit=None, offset=None, perpage=None, page=None,
     if query_type == 'schema' and is_querystring_defined:
         raise RestInputValidationError("schema requests do not allow "
                                        "specifying a query string")
+    # 5. cursors replace both the page and the offset
+    if cursor is not None and (page is not None or offset is not None):
+        raise RestValidationError("cursor key is incompatible with page "
+                                  "and offset")
+    # 6. count has a fixed set of values, and pages need the exact count to
+    # know which one is the last
+    if count is not None and count not in COUNT_MODES:
+        raise RestInputValidationError("count must be one of: {}".format(
+            ", ".join(COUNT_MODES)))
+    if page is not None and count is not None and count != 'exact':
+        raise RestValidationError("requesting a specific page requires "
+                                  "count=exact")
 
 
 def paginate(page, perpage, total_count):
@@ -272,7 +336,8 @@ class CustomJSONEncoder(JSONEncoder):
         return JSONEncoder.default(self, obj)
 
 
-def build_headers(rel_pages=None, url=None, total_count=None):
+def build_headers(rel_pages=None, url=None, total_count=None,
+                  rel_cursors=None, is_estimate=False):
     """
     Construct the header dictionary for an HTTP response. It includes related
      pages, total count of results (before pagination).
@@ -280,20 +345,28 @@ def build_headers(rel_pages=None, url=None, total_count=None):
     last)
     :param url: (string) the full url, i.e. the url that the client uses to
     get Rest resources
+    :param total_count: the number of results. If None, no count header is set
+    :param rel_cursors: a dictionary defining the continuation tokens of the
+    related pages (first, next) in keyset pagination
+    :param is_estimate: if True, total_count is the estimate of the query
+    planner and it is returned in the X-Total-Count-Estimate header
     :return:
     """
 
     ## Type validation
-    # mandatory parameters
-    try:
-        total_count = int(total_count)
-    except ValueError:
-        raise InputValidationError("total_count must be a long integer")
-
     # non mandatory parameters
+    if total_count is not None:
+        try:
+            total_count = int(total_count)
+        except ValueError:
+            raise InputValidationError("total_count must be a long integer")
+
     if rel_pages is not None and not isinstance(rel_pages, dict):
         raise InputValidationError("rel_pages must be a dictionary")
 
+    if rel_cursors is not None and not isinstance(rel_cursors, dict):
+        raise InputValidationError("rel_cursors must be a dictionary")
+
     if url is not None:
         try:
             url = str(url)
@@ -305,13 +378,21 @@ def build_headers(rel_pages=None, url=None, total_count=None):
     if rel_pages is not None and url is None:
         raise InputValidationError("'rel_pages' parameter requires 'url' "
                                    "parameter to be defined")
+    if rel_cursors is not None and url is None:
+        raise InputValidationError("'rel_cursors' parameter requires 'url' "
+                                   "parameter to be defined")
 
     headers = {}
+    expose_header = []
 
-    ## Setting mandatory headers
-    # set X-Total-Count
-    headers['X-Total-Count'] = total_count
-    expose_header = ["X-Total-Count"]
+    # set X-Total-Count (or its estimate)
+    if total_count is not None:
+        if is_estimate:
+            count_header = 'X-Total-Count-Estimate'
+        else:
+            count_header = 'X-Total-Count'
+        headers[count_header] = total_count
+        expose_header.append(count_header)
 
     ## Two auxiliary functions
     def split_url(url):
@@ -329,6 +410,14 @@ def build_headers(rel_pages=None, url=None, total_count=None):
         return '<' + '/'.join(new_path_elems) + \
                question_mark + query_string + ">; rel={}, ".format(rel)
 
+    def make_cursor_url(rel, token):
+        # Replace the cursor of the current request, if any
+        fields = [f for f in query_string.split('&')
+                  if f and not f.startswith('cursor=')]
+        fields.append('cursor=%22{}%22'.format(token))
+        return '<' + path + '?' + '&'.join(fields) + \
+               ">; rel={}, ".format(rel)
+
     ## Setting non-mandatory parameters
     # set links to related pages
     if rel_pages is not None:
@@ -345,19 +434,71 @@ def build_headers(rel_pages=None, url=None, total_count=None):
         else:
             pass
 
+    # set links to related pages in keyset pagination
+    if rel_cursors is not None:
+        (path, query_string, question_mark) = split_url(url)
+        links = []
+        for (rel, token) in rel_cursors.iteritems():
+            if token is not None:
+                links.append(make_cursor_url(rel, token))
+        if links:
+            headers['Link'] = ''.join(links)
+            expose_header.append("Link")
+
     # to expose header access in cross-domain requests
     headers['Access-Control-Expose-Headers'] =','.join(expose_header)
 
     return headers
 
 
-def build_response(status=200, headers=None, data=None):
+def generate_json(data, encoder=None):
+    """
+    Serialises data to JSON piece by piece. Besides the types handled by the
+    JSON encoder of the app, data may contain generators, that are
+    serialised as lists while they are consumed, i.e. while the response is
+    being sent. Each item of a generator is encoded at once.
+
+    :param data: the object to serialise
+    :param encoder: the JSONEncoder instance to use. By default, the encoder
+      of the app without key sorting, so that the C implementation of the
+      json module is used.
+    :return: a generator of strings
+    """
+    from types import GeneratorType
+    from flask import current_app
+
+    if encoder is None:
+        encoder = current_app.json_encoder(sort_keys=False)
+
+    if isinstance(data, dict):
+        yield '{'
+        for i, (key, value) in enumerate(data.iteritems()):
+            if i > 0:
+                yield ', '
+            yield encoder.encode(key) + ': '
+            for chunk in generate_json(value, encoder):
+                yield chunk
+        yield '}'
+    elif isinstance(data, GeneratorType):
+        yield '['
+        for i, item in enumerate(data):
+            if i > 0:
+                yield ', '
+            yield encoder.encode(item)
+        yield ']'
+    else:
+        yield encoder.encode(data)
+
+
+def build_response(status=200, headers=None, data=None, stream=False):
     """
 
     :param status: status of the response, e.g. 200=OK, 400=bad request
     :param headers: dictionary for additional header k,v pairs,
     e.g. X-total-count=<number of rows resulting from query>
     :param data: a dictionary with the data returned by the Resource
+    :param stream: if True, data is serialised while the response is being
+    sent (see generate_json()), and it may contain generators
     :return: a Flask response object
     """
 
@@ -377,7 +518,12 @@ def build_response(status=200, headers=None, data=None):
         raise InputValidationError("header must be a dictionary")
 
     # Build response
-    response = jsonify(data)
+    if stream:
+        from flask import Response, stream_with_context
+        response = Response(stream_with_context(generate_json(data)),
+                            mimetype='application/json')
+    else:
+        response = jsonify(data)
     response.status_code = status
 
     if headers is not None:
@@ -449,6 +595,8 @@ def build_translator_parameters(field_list):
     nalist = None
     elist = None
     nelist = None
+    cursor = None
+    count = None
 
     ## Count how many time a key has been used for the filters and check if
     # reserved keyword
@@ -495,6 +643,12 @@ def build_translator_parameters(field_list):
     if 'nelist' in field_counts.keys() and field_counts['nelist'] > 1:
         raise RestInputValidationError("You cannot specify nelist more than "
                                        "once")
+    if 'cursor' in field_counts.keys() and field_counts['cursor'] > 1:
+        raise RestInputValidationError("You cannot specify cursor more than "
+                                       "once")
+    if 'count' in field_counts.keys() and field_counts['count'] > 1:
+        raise RestInputValidationError("You cannot specify count more than "
+                                       "once")
 
     ## Extract results
     for field in field_list:
@@ -546,6 +700,20 @@ def build_translator_parameters(field_list):
                 raise RestInputValidationError(
                     "only assignment operator '=' "
                     "is permitted after 'nelist'")
+        elif field[0] == 'cursor':
+            if field[1] == '=':
+                cursor = field[2]
+            else:
+                raise RestInputValidationError(
+                    "only assignment operator '=' "
+                    "is permitted after 'cursor'")
+        elif field[0] == 'count':
+            if field[1] == '=':
+                count = field[2]
+            else:
+                raise RestInputValidationError(
+                    "only assignment operator '=' "
+                    "is permitted after 'count'")
 
         elif field[0] == 'orderby':
             if field[1] == '=':
@@ -585,7 +753,7 @@ def build_translator_parameters(field_list):
                 filters.update({field_key: filter_value})
 
     return (limit, offset, perpage, orderby, filters, alist, nalist, elist,
-            nelist)
+            nelist, cursor, count)
 
 
 def parse_query_string(query_string):
@@ -1,5 +1,7 @@
 from aiida.restapi.common.utils import parse_query_string,\
     parse_path, paginate, validate_request, build_response, build_headers
+from aiida.restapi.common.config import LIMIT_DEFAULT, STREAM_THRESHOLD
+from aiida.restapi.caching import cache_response
 from urllib import unquote
 
 from flask import request
@@ -17,6 +19,75 @@ class BaseResource(Resource):
     def __init__(self):
         self.trans = None
 
+    def get_paginated_results(self, page=None, perpage=None, limit=None,
+                              offset=None, cursor=None, count=None):
+        """
+        Runs the query of the translator (that has to be set already) with
+        the required pagination, and builds the headers of the response.
+
+        Three pagination modes are supported:
+         - pages: /page/<int:page>/?perpage=<int>. The exact count is needed
+           to know which is the last page
+         - limit and offset: like pages, it becomes slow for large offsets
+           since the database has to skip all the rows before the offset
+         - keyset: ?cursor="<token>"&limit=<int>. The token points to the
+           last row of the previous page, which the database seeks directly
+           through the index of the ordering column. An empty token
+           requests the first page. The continuation tokens of the next
+           pages are returned in the Link header.
+
+        The count of the results is optional (count=exact|estimate|none):
+        by default it is exact, except in keyset pagination where it is not
+        computed.
+
+        Lists that can be longer than STREAM_THRESHOLD are streamed: the
+        results are a generator, consumed while the response is sent.
+
+        :return: a tuple (headers, results, stream)
+        """
+        if count is None:
+            count = 'none' if cursor is not None else 'exact'
+
+        if count == 'exact':
+            total_count = self.trans.get_total_count()
+        elif count == 'estimate':
+            total_count = self.trans.get_estimated_count()
+        else:
+            total_count = None
+        is_estimate = (count == 'estimate')
+
+        ## Pagination (if required)
+        rel_pages = None
+        rel_cursors = None
+        if page is not None:
+            (limit, offset, rel_pages) = paginate(page, perpage, total_count)
+        elif limit is None:
+            limit = LIMIT_DEFAULT
+        self.trans.set_limit_offset(limit=limit, offset=offset)
+
+        ## Number of results expected (at most)
+        n_results = int(limit)
+        if count == 'exact':
+            n_results = min(n_results, total_count - int(offset or 0))
+        stream = n_results > STREAM_THRESHOLD and not (
+            self.trans._is_pk_query and
+            self.trans._result_type == self.trans.__label__)
+
+        results = self.trans.get_results(stream=stream)
+        if cursor is not None:
+            # If the results are streamed, this needs its own query
+            rel_cursors = dict(first="",
+                               next=self.trans.get_next_cursor(int(limit)))
+        if rel_pages is not None:
+            headers = build_headers(rel_pages=rel_pages, url=request.url,
+                                    total_count=total_count)
+        else:
+            headers = build_headers(rel_cursors=rel_cursors, url=request.url,
+                                    total_count=total_count,
+                                    is_estimate=is_estimate)
+
+        return (headers, results, stream)
+
     def get(self, **kwargs):
         """
         Get method for the Computer resource
@@ -32,12 +103,13 @@ class BaseResource(Resource):
         ## Parse request
         (resource_type, page, pk, query_type) = parse_path(path)
         (limit, offset, perpage, orderby, filters, alist, nalist, elist,
-             nelist) = parse_query_string(query_string)
+             nelist, cursor, count) = parse_query_string(query_string)
 
         ## Validate request
         validate_request(limit=limit, offset=offset, perpage=perpage,
                          page=page, query_type=query_type,
-                         is_querystring_defined=(bool(query_string)))
+                         is_querystring_defined=(bool(query_string)),
+                         cursor=cursor, count=count)
 
         ## Treat the schema case which does not imply access to the DataBase
         if query_type == 'schema':
@@ -46,26 +118,17 @@ class BaseResource(Resource):
             results = self.trans.get_schema()
             ## Build response and return it
             headers = build_headers(url=request.url, total_count=1)
+            stream = False
 
         else:
             ## Set the query, and initialize qb object
-            self.trans.set_query(filters=filters, orders=orderby, pk=pk)
+            self.trans.set_query(filters=filters, orders=orderby, pk=pk,
+                                 cursor=cursor)
 
-            ## Count results
-            total_count = self.trans.get_total_count()
-
-            ## Pagination (if required)
-            if page is not None:
-                (limit, offset, rel_pages) = paginate(page, perpage, total_count)
-                self.trans.set_limit_offset(limit=limit, offset=offset)
-                headers = build_headers(rel_pages=rel_pages, url=request.url,
-                                        total_count=total_count)
-            else:
-                self.trans.set_limit_offset(limit=limit, offset=offset)
-                headers = build_headers(url=request.url, total_count=total_count)
-
-            ## Retrieve results
-            results = self.trans.get_results()
+            ## Retrieve results (paginated if required), and count them
+            (headers, results, stream) = self.get_paginated_results(
+                page=page, perpage=perpage, limit=limit, offset=offset,
+                cursor=cursor, count=count)
 
         ## Build response and return it
         data = dict(method=request.method,
@@ -76,12 +139,15 @@ class BaseResource(Resource):
 		query_string=request.query_string,
 		resource_type=resource_type,
 		data=results)
-        return build_response(status=200, headers=headers, data=data)
+        return build_response(status=200, headers=headers, data=data,
+                              stream=stream)
 
 
-class Node(Resource):
+class Node(BaseResource):
     ##Differs from BaseResource in trans.set_query() mostly because it takes
     # query_type as an input
+    method_decorators = [cache_response]
+
     def __init__(self):
         from aiida.restapi.translator.node import NodeTranslator
         self.trans = NodeTranslator()
@@ -104,12 +170,13 @@ class Node(Resource):
         (resource_type, page, pk, query_type) = parse_path(path)
 
         (limit, offset, perpage, orderby, filters, alist, nalist, elist,
-         nelist) = parse_query_string(query_string)
+         nelist, cursor, count) = parse_query_string(query_string)
 
         ## Validate request
         validate_request(limit=limit, offset=offset, perpage=perpage,
                          page=page, query_type=query_type,
-                         is_querystring_defined=(bool(query_string)))
+                         is_querystring_defined=(bool(query_string)),
+                         cursor=cursor, count=count)
 
         ## Treat the schema case which does not imply access to the DataBase
         if query_type == 'schema':
@@ -119,46 +186,38 @@ class Node(Resource):
 
             ## Build response and return it
             headers = build_headers(url=request.url, total_count=1)
+            stream = False
 
         elif query_type == "statistics":
             (limit, offset, perpage, orderby, filters, alist, nalist, elist,
-                  nelist) = parse_query_string(query_string)
+                  nelist, cursor, count) = parse_query_string(query_string)
             headers = build_headers(url=request.url, total_count=0)
             if len(filters) > 0 :
                 usr = filters["user"]["=="]
             else:
                 usr = []
             results = self.trans.get_statistics(self.tclass, usr)
+            stream = False
 
         elif query_type == "tree":
-            if len(filters) > 0 :
-                depth = filters["depth"]["=="]
-            else:
-                depth = None
-            results = self.trans.get_io_tree(pk, depth)
+            depth = filters.get("depth", {}).get("==")
+            fanout = filters.get("fanout", {}).get("==")
+            results = self.trans.get_io_tree(pk, depth, fanout)
             headers = build_headers(url=request.url, total_count=0)
+            # The tree is made of generators
+            stream = True
 
         else:
             ## Instantiate a translator and initialize it
             self.trans.set_query(filters=filters, orders=orderby,
                               query_type=query_type, pk=pk, alist=alist,
-                                 nalist=nalist, elist=elist, nelist=nelist)
-
-            ## Count results
-            total_count = self.trans.get_total_count()
-
-            ## Pagination (if required)
-            if page is not None:
-                (limit, offset, rel_pages) = paginate(page, perpage, total_count)
-                self.trans.set_limit_offset(limit=limit, offset=offset)
-                headers = build_headers(rel_pages=rel_pages, url=request.url,
-                                        total_count=total_count)
-            else:
-                self.trans.set_limit_offset(limit=limit, offset=offset)
-                headers = build_headers(url=request.url, total_count=total_count)
+                                 nalist=nalist, elist=elist, nelist=nelist,
+                                 cursor=cursor)
 
-            ## Retrieve results
-            results = self.trans.get_results()
+            ## Retrieve results (paginated if required), and count them
+            (headers, results, stream) = self.get_paginated_results(
+                page=page, perpage=perpage, limit=limit, offset=offset,
+                cursor=cursor, count=count)
 
         ## Build response
         data = dict(method=request.method,
@@ -169,7 +228,8 @@ class Node(Resource):
                     query_string=query_string,
                     resource_type=resource_type,
                     data=results)
-        return build_response(status=200, headers=headers, data=data)
+        return build_response(status=200, headers=headers, data=data,
+                              stream=stream)
 
 class Computer(BaseResource):
     def __init__(self):
@@ -1,11 +1,14 @@
+import copy
+
 from aiida.common.exceptions import InputValidationError, InvalidOperation, ConfigurationError
-#from aiida.restapi.caching import cache
-#from aiida.restapi.common.config import CACHING_TIMEOUTS
 from aiida.orm.querybuilder import QueryBuilder
 from aiida.restapi.common.exceptions import RestValidationError, \
     RestInputValidationError
-from aiida.restapi.common.utils import pk_dbsynonym
-from aiida.restapi.common.config import LIMIT_DEFAULT, custom_schema
+from aiida.restapi.common.utils import pk_dbsynonym, encode_cursor, \
+    decode_cursor
+from aiida.restapi.common.config import LIMIT_DEFAULT, custom_schema, \
+    COUNT_CACHE_TIMEOUT, STREAM_BATCH_SIZE, CACHE_CONFIG
+from aiida.restapi.caching import LRUCache
 from aiida.common.utils import get_object_from_string, issingular
 from aiida.backends.settings import BACKEND
 from aiida.backends.profile import BACKEND_DJANGO, BACKEND_SQLA
@@ -32,6 +35,18 @@ class BaseTranslator(object):
     _is_pk_query = None
     _total_count = None
 
+    # Keyset pagination: list of (column, order) pairs defining the ordering,
+    # and the last row of the results, used to build the next cursor
+    _keyset_order = None
+    _last_result = None
+    _n_results = None
+    # Filters of the query without the keyset filters (used for the count)
+    _count_filters = None
+
+    # Cache of the exact counts, shared by all the translators of the
+    # process: queryhelp hash -> count, expiring after COUNT_CACHE_TIMEOUT
+    _count_cache = LRUCache(CACHE_CONFIG['size'])
+
 
     def __init__(self):
         """
@@ -126,26 +141,33 @@ class BaseTranslator(object):
 
     def count(self):
         """
-        Count the number of rows returned by the query and set total_count
+        Count the number of rows returned by the query and set total_count.
+        Counts are cached for COUNT_CACHE_TIMEOUT seconds, so that browsing
+        through the pages of the same query does not count it again.
         """
-        if self._is_qb_initialized:
-            self._total_count = self.qb.count()
-        else:
+        from aiida.common.hashing import make_hash
+
+        if not self._is_qb_initialized:
             raise InvalidOperation("query builder object has not been "
                                    "initialized.")
 
-            # def caching_method(self):
-            #     """
-            #     class method for caching. It is a wrapper of the
-            # flask_cache memoize
-            #     method. To be used as a decorator
-            #     :return: the flask_cache memoize method with the timeout kwarg
-            #     corrispondent to the class
-            #     """
-            #     return cache.memoize()
-            #
+        # The filters only (and not orders and limits) define the count
+        if self._count_filters is None:
+            filters = self._query_help['filters']
+        else:
+            filters = self._count_filters
+        key = make_hash([self._query_help['path'], filters])
+        total_count = self._count_cache.get(key)
+        if total_count is None:
+            if self._count_filters is None:
+                total_count = self.qb.count()
+            else:
+                total_count = QueryBuilder(path=self._query_help['path'],
+                                           filters=filters).count()
+            self._count_cache.set(key, total_count,
+                                  timeout=COUNT_CACHE_TIMEOUT)
 
-        #    @cache.memoize(timeout=CACHING_TIMEOUTS[self.__label__])
+        self._total_count = total_count
 
     def get_total_count(self):
         """
@@ -158,6 +180,37 @@ class BaseTranslator(object):
 
         return self._total_count
 
+    def get_estimated_count(self):
+        """
+        Returns the number of rows of the query as estimated by the
+        PostgreSQL planner, without running the query. The cost does not
+        depend on the size of the result set, but the value can be off,
+        especially for complex filters.
+        :return: the estimated count (integer)
+        """
+        from sqlalchemy.dialects.postgresql.psycopg2 import \
+            PGDialect_psycopg2
+
+        if not self._is_qb_initialized:
+            raise InvalidOperation("query builder object has not been "
+                                   "initialized.")
+
+        if self._count_filters is None:
+            query = self.qb.get_query()
+        else:
+            query = QueryBuilder(path=self._query_help['path'],
+                                 filters=self._count_filters).get_query()
+        compiled = query.statement.compile(dialect=PGDialect_psycopg2())
+        cursor = query.session.connection().connection.cursor()
+        try:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + unicode(compiled),
+                           compiled.params)
+            plan = cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+        return int(plan[0]['Plan']['Plan Rows'])
+
     def set_filters(self, filters={}):
         """
         Add filters in query_help.
@@ -264,7 +317,110 @@ class BaseTranslator(object):
         for tag, columns in orders.iteritems():
             self._query_help['order_by'][tag] = def_order(columns)
 
-    def set_query(self, filters=None, orders=None, projections=None, pk=None):
+    def set_keyset(self, orders, cursor):
+        """
+        Defines the ordering and the filters for the keyset (cursor)
+        pagination. Rows are ordered by (ordering column, id) and the cursor
+        selects the rows that come after the last row of the previous page,
+        so that the database can seek directly to the requested page instead
+        of skipping 'offset' rows.
+
+        :param orders: list of signed column names as in the query string.
+          Only one column is allowed, possibly followed by 'id'.
+        :param cursor: (string) the continuation token. If empty, the first
+          page is requested.
+        :return: the filter dictionary to be added to the filters of the
+          results tag
+        """
+        orders = [pk_dbsynonym if c.lstrip('+-') == 'pk' else c
+                  for c in (orders or [])]
+
+        # Strip the order sign
+        def signed(column):
+            if column[0] == '-':
+                return (column[1:], 'desc')
+            elif column[0] == '+':
+                return (column[1:], 'asc')
+            return (column, 'asc')
+
+        keyset = [signed(c) for c in orders]
+        if keyset and keyset[-1][0] == pk_dbsynonym:
+            id_order = keyset.pop(-1)
+            if keyset and keyset[0][1] != id_order[1]:
+                raise RestInputValidationError("cursor pagination requires "
+                                               "the same order direction "
+                                               "for all the columns")
+        if len(keyset) > 1:
+            raise RestInputValidationError("cursor pagination supports "
+                                           "ordering by a single column "
+                                           "(plus the id)")
+        if keyset:
+            keyset.append((pk_dbsynonym, keyset[0][1]))
+        elif orders:
+            keyset = [id_order]
+        else:
+            keyset = [(pk_dbsynonym, 'asc')]
+
+        self._keyset_order = keyset
+        self._query_help['order_by'][self._result_type] = [
+            {column: order} for (column, order) in keyset]
+
+        position = decode_cursor(cursor)
+        if position is None:
+            return {}
+
+        (column, value, pk) = position
+        if column != keyset[0][0]:
+            raise RestInputValidationError("the cursor does not correspond "
+                                           "to the requested ordering")
+
+        op = '>' if keyset[0][1] == 'asc' else '<'
+        if column == pk_dbsynonym:
+            return {pk_dbsynonym: {op: pk}}
+        else:
+            return {'or': [{column: {op: value}},
+                           {column: {'==': value}, pk_dbsynonym: {op: pk}}]}
+
+    def get_next_cursor(self, limit):
+        """
+        Returns the continuation token pointing to the page following the
+        results, or None if this is the last page.
+
+        If the results have not been retrieved yet (e.g. because they are
+        streamed), the last row of the page is looked up with a query
+        projecting only the keyset columns.
+
+        :param limit: the page size used for the query
+        """
+        if self._keyset_order is None:
+            return None
+
+        if self._n_results is None:
+            query_help = dict(self._query_help)
+            query_help['project'] = {
+                self._result_type: [c for (c, o) in self._keyset_order]}
+            qb = QueryBuilder(**query_help)
+            qb.offset(limit - 1)
+            qb.limit(1)
+            results = qb.dict()
+            if not results:
+                return None
+            last_result = results[0][self._result_type]
+        else:
+            if self._last_result is None or self._n_results < limit:
+                return None
+            last_result = self._last_result
+
+        column = self._keyset_order[0][0]
+        try:
+            return encode_cursor(column, last_result[column],
+                                 last_result[pk_dbsynonym])
+        except KeyError:
+            raise RestValidationError("cursor pagination requires the "
+                                      "ordering column to be projected")
+
+    def set_query(self, filters=None, orders=None, projections=None, pk=None,
+                  cursor=None):
         """
         Adds filters, default projections, order specs to the query_help,
         and initializes the qb object
@@ -272,6 +428,8 @@ class BaseTranslator(object):
         :param filters: dictionary with the filters
         :param orders: dictionary with the order for each tag
         :param pk (integer): pk of a specific node
+        :param cursor: (string) continuation token for keyset pagination.
+          If not None, the results are ordered by (orders, id)
         """
 
         tagged_filters = {}
@@ -299,6 +457,23 @@ class BaseTranslator(object):
         ## Add filters
         self.set_filters(tagged_filters)
 
+        ## Add the keyset filters (the ordering is defined there as well).
+        # The count has to ignore them, so the plain filters are kept aside
+        if cursor is not None:
+            if self._is_pk_query and self._result_type == self.__label__:
+                raise RestInputValidationError("selecting a specific pk does "
+                                               "not allow to specify a "
+                                               "cursor")
+            self._count_filters = copy.deepcopy(self._query_help["filters"])
+            keyset_filters = self.set_keyset(orders, cursor)
+            result_filters = self._query_help["filters"].setdefault(
+                self._result_type, {})
+            if 'or' in result_filters and 'or' in keyset_filters:
+                result_filters['and'] = [{'or': result_filters.pop('or')},
+                                         keyset_filters]
+            else:
+                result_filters.update(keyset_filters)
+
         ## Add projections
         if projections is None:
             self.set_default_projections()
@@ -306,8 +481,16 @@ class BaseTranslator(object):
             tagged_projections = {self._result_type: projections}
             self.set_projections(tagged_projections)
 
+        ## The keyset columns are needed to build the next cursor
+        if cursor is not None:
+            projected = self._query_help["project"].get(self._result_type)
+            if projected is not None and '**' not in projected:
+                self._query_help["project"][self._result_type] = list(
+                    projected) + [c for (c, o) in self._keyset_order
+                                  if c not in projected]
+
         ##Add order_by
-        if orders is not None:
+        if orders is not None and cursor is None:
             tagged_orders = {self._result_type: orders}
             self.set_order(tagged_orders)
 
@@ -364,30 +547,44 @@ class BaseTranslator(object):
             raise InvalidOperation("query builder object has not been "
                                    "initialized.")
 
-    def get_formatted_result(self, label):
+    def _iter_formatted_result(self, label):
+        """
+        Runs the query and yields the results tagged as "label", fetching
+        them from the database in batches of STREAM_BATCH_SIZE rows.
+        """
+        from aiida.backends.settings import BACKEND
+
+        if BACKEND == "django":
+            from django.db import transaction
+            with transaction.atomic():
+                for tmp in self.qb.iterdict(batch_size=STREAM_BATCH_SIZE):
+                    yield tmp[label]
+        elif BACKEND == "sqlalchemy":
+            for tmp in self.qb.iterdict(batch_size=STREAM_BATCH_SIZE):
+                yield tmp[label]
+
+    def get_formatted_result(self, label, stream=False):
         """
         Runs the query and retrieves results tagged as "label"
         :param label (string): the tag of the results to be extracted out of
         the query rows.
-        :return: a list of the query results
+        :param stream: if True, the results are returned as a generator, and
+        the query runs only when it is consumed
+        :return: a list (or generator) of the query results
         """
 
         if not self._is_qb_initialized:
             raise InvalidOperation("query builder object has not been "
                                    "initialized.")
 
-        results = []
-        from aiida.backends.settings import BACKEND
-
-        if self._total_count > 0:
-            if BACKEND == "django":
-                from django.db import transaction
-                with transaction.atomic():
-                    for tmp in self.qb.iterdict():
-                        results.append(tmp[label])
-            elif BACKEND == "sqlalchemy":
-                for tmp in self.qb.iterdict():
-                    results.append(tmp[label])
+        if stream:
+            results = self._iter_formatted_result(label)
+        else:
+            # No need to count the rows first: an empty query yields nothing
+            results = list(self._iter_formatted_result(label))
+            self._n_results = len(results)
+            if results:
+                self._last_result = results[-1]
 
         # TODO think how to make it less hardcoded
         if self._result_type == 'input_of':
@@ -397,10 +594,12 @@ class BaseTranslator(object):
         else:
             return {self.__label__: results}
 
-    def get_results(self):
+    def get_results(self, stream=False):
         """
         Returns either list of nodes or details of single node from database
 
+        :param stream: if True, the results are serialised while they are
+        read from the database (see get_formatted_result())
         :return: either list of nodes or details of single node
         from database
         """
@@ -410,13 +609,8 @@ class BaseTranslator(object):
             raise InvalidOperation("query builder object has not been "
                                    "initialized.")
 
-        ## Count the total number of rows returned by the query (if not
-        # already done)
-        if self._total_count is None:
-            self.count()
-
         ## Retrieve data
-        data = self.get_formatted_result(self._result_type)
+        data = self.get_formatted_result(self._result_type, stream=stream)
         return data
 
     def _check_pk_validity(self, pk):
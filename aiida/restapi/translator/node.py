@@ -1,9 +1,8 @@
 from aiida.restapi.translator.base import BaseTranslator
-from aiida.restapi.caching import cache
 from aiida.common.exceptions import InputValidationError, ValidationError, \
     InvalidOperation
 from aiida.restapi.common.exceptions import RestValidationError
-from aiida.restapi.common.config import CACHING_TIMEOUTS, custom_schema
+from aiida.restapi.common.config import custom_schema
 
 
 class NodeTranslator(BaseTranslator):
@@ -82,7 +81,7 @@ class NodeTranslator(BaseTranslator):
 
     def set_query(self, filters=None, orders=None, projections=None,
                   query_type=None, pk=None, alist=None, nalist=None,
-                  elist=None, nelist=None):
+                  elist=None, nelist=None, cursor=None):
         """
         Adds filters, default projections, order specs to the query_help,
         and initializes the qb object
@@ -94,6 +93,7 @@ class NodeTranslator(BaseTranslator):
         :param query_type: (string) specify the result or the content (
         "attr")
         :param pk: (integer) pk of a specific node
+        :param cursor: (string) continuation token for keyset pagination
         """
 
         ## Check the compatibility of query_type and pk
@@ -122,7 +122,7 @@ class NodeTranslator(BaseTranslator):
         super(NodeTranslator, self).set_query(filters=filters,
                                               orders=orders,
                                               projections=projections,
-                                              pk=pk)
+                                              pk=pk, cursor=cursor)
 
 
     def _get_content(self):
@@ -138,13 +138,11 @@ class NodeTranslator(BaseTranslator):
         ## Initialization
         data = {}
 
-        ## Count the total number of rows returned by the query (if not
-        # already done)
-        if self._total_count is None:
-            self.count()
+        ## A single node is expected, so there is no need to count the rows
+        first = self.qb.first()
 
-        if self._total_count > 0:
-            n = self.qb.first()[0]
+        if first is not None:
+            n = first[0]
             if self._content_type == "attributes":
                 # Get all attrs if nalist and alist are both None
                 if self._alist is None and self._nalist is None:
@@ -195,163 +193,85 @@ class NodeTranslator(BaseTranslator):
 
         return data
 
-    def get_results(self):
+    def get_results(self, stream=False):
         """
         Returns either a list of nodes or details of single node from database
 
+        :param stream: if True, the list of nodes is serialised while it is
+        read from the database (the content of a node is never streamed)
         :return: either a list of nodes or the details of single node
         from the database
         """
         if self._content_type is not None:
             return self._get_content()
         else:
-            return super(NodeTranslator, self).get_results()
+            return super(NodeTranslator, self).get_results(stream=stream)
 
     def get_statistics(self, tclass, users=[]):
-       from aiida.orm.querybuilder import QueryBuilder as QB
-       from aiida.orm import User
-       from collections import Counter
-       from datetime import datetime
-
-       def count_statistics(dataset):
-
-           def get_statistics_dict(dataset):
-               results = {}
-               for count, typestring in sorted((v, k) for k, v in dataset.iteritems())[::-1]:
-                   results[typestring] = count
-               return results
-
-           count_dict = {}
-
-           types = Counter([r[3] for r in dataset])
-           count_dict["types"] = get_statistics_dict(types)
-
-           ctimelist = [r[1].strftime("%Y-%m") for r in dataset]
-           ctime = Counter(ctimelist)
-           count_dict["ctime_by_month"] = get_statistics_dict(ctime)
-
-           ctimelist = [r[1].strftime("%Y-%m-%d") for r in dataset]
-           ctime = Counter(ctimelist)
-           count_dict["ctime_by_day"] = get_statistics_dict(ctime)
-
-           mtimelist = [r[2].strftime("%Y-%m") for r in dataset]
-           mtime = Counter(ctimelist)
-           count_dict["mtime_by_month"] = get_statistics_dict(mtime)
-
-           mtimelist = [r[1].strftime("%Y-%m-%d") for r in dataset]
-           mtime = Counter(ctimelist)
-           count_dict["mtime_by_day"] = get_statistics_dict(mtime)
-
-           return count_dict
-
-       statistics = {}
-
-       q = QB()
-       q.append(tclass, project=['id', 'ctime', 'mtime', 'type'], tag='node')
-       q.append(User, creator_of='node', project='email')
-       qb_res = q.all()
-
-       # total count
-       statistics["total"] = len(qb_res)
-
-       node_users = Counter([r[4] for r in qb_res])
-       statistics["users"]={}
-
-       if isinstance(users,basestring):
-           users = [users]
-       if len(users) == 0:
-           users = node_users
-
-       for user in users:
-           user_data = [r for r in qb_res if r[4] == user]
-           # statistics for user data
-           statistics["users"][user] = count_statistics(user_data)
-           statistics["users"][user]["total"] = node_users[user]
-
-       # statistics for node data
-       statistics.update( count_statistics(qb_res))
-
-       return statistics
-
-    def get_io_tree(self, nodeId, maxDepth=None):
-        from aiida.orm.querybuilder import QueryBuilder
-        from aiida.orm.node import Node
-
-        def addNodes(nodeId, maxDepth, nodes, addedNodes, addedEdges, edgeType):
-            qb= QueryBuilder()
-            qb.append(Node, tag="main", filters={"id":{"==":nodeId}})
-            if edgeType == "ancestors":
-                qb.append(Node, tag=edgeType, project=['id', 'type'], edge_project=['path', 'depth'],
-                        ancestor_of_beta='main', edge_filters={'depth':{'<=':maxDepth}})
-            elif edgeType == "desc":
-                qb.append(Node, tag=edgeType, project=['id', 'type'], edge_project=['path', 'depth'],
-                        descendant_of_beta='main', edge_filters={'depth':{'<=':maxDepth}})
-
-            if (qb.count() > 0):
-                qbResults = qb.get_results_dict()
-
-                for resultDict in qbResults:
-                    if resultDict[edgeType]["id"] not in addedNodes:
-                        nodes.append({"id": len(addedNodes),
-                                      "nodeid":resultDict[edgeType]["id"],
-                                      "nodetype":resultDict[edgeType]["type"],
-                                      "group":edgeType + "-" +str(resultDict["main--"+edgeType]["depth"])
-                                     })
-                        addedNodes.append(resultDict[edgeType]["id"])
-
-                    path = resultDict["main--"+edgeType]["path"]
-                    if edgeType == "ancestors":
-                        startEdge = path[0]
-                        endEdge = path[1]
-                    elif edgeType == "desc":
-                        startEdge = path[-2]
-                        endEdge = path[-1]
-                    if startEdge not in addedEdges.keys():
-                        addedEdges[startEdge] = [endEdge]
-                    elif endEdge not in addedEdges[startEdge]:
-                        addedEdges[startEdge].append(endEdge)
-
-            return nodes, addedNodes, addedEdges
-
-        def addEdges(edges, addedNodes, addedEdges):
-            for fromNodeId in addedEdges.keys():
-                fromNodeIdIndex = addedNodes.index(fromNodeId)
-                for toNodeId in addedEdges[fromNodeId]:
-                    toNodeIdIndex = addedNodes.index(toNodeId)
-                    edges.append({"from": fromNodeIdIndex,
-                                  "to": toNodeIdIndex,
-                                  "arrows": "to",
-                                  "color":{"inherit":'from'}
-                                 })
-
-            return edges
-
-        nodes=[]
-        edges=[]
-        addedNodes = []
-        addedEdges = {}
+        """
+        Returns the statistics of the nodes of class tclass (see
+        aiida.restapi.common.statistics). They are aggregated by the
+        database, and never require loading the nodes.
+
+        :param tclass: the node class
+        :param users: the emails of the users for which the statistics are
+          returned. All the users if empty.
+        """
+        from aiida.restapi.common.statistics import get_statistics
+
+        return get_statistics(tclass, users)
+
+    def get_io_tree(self, nodeId, maxDepth=None, maxFanout=None):
+        """
+        Returns the provenance graph around a node, in the format of the
+        vis.js library: a list of nodes and a list of edges referring to the
+        nodes through their index in the list.
+
+        The graph is extracted with a single query (see
+        aiida.restapi.common.graph), and the nodes and edges are returned as
+        generators, so that they are serialised as they are built.
+
+        :param nodeId: the pk of the central node
+        :param maxDepth: the maximum distance (number of links) of the nodes
+          from the central node. MAX_TREE_DEPTH by default
+        :param maxFanout: the maximum number of links followed from each
+          node in each direction. MAX_TREE_FANOUT by default
+        :return: a dictionary with the 'nodes' and 'edges' generators
+        """
+        from aiida.restapi.common.config import MAX_TREE_DEPTH, \
+            MAX_TREE_FANOUT
+        from aiida.restapi.common.graph import get_neighbourhood
 
         if maxDepth is None:
-            from aiida.restapi.common.config import MAX_TREE_DEPTH
             maxDepth = MAX_TREE_DEPTH
+        if maxFanout is None:
+            maxFanout = MAX_TREE_FANOUT
+
+        (nodes, links) = get_neighbourhood(nodeId, maxDepth, maxFanout)
 
-        qb= QueryBuilder()
-        qb.append(Node, tag="main",  project=["id", "type"], filters={"id":{"==":nodeId}})
-        if qb.count() > 0:
-            mainNode = qb.first()
-            nodes.append({"id": 0,
-                          "nodeid":mainNode[0],
-                          "nodetype":mainNode[1],
-                          "group": "mainNode"
-                         })
-            addedNodes.append(mainNode[0])
-
-        # get all descendents
-        nodes, addedNodes, addedEdges = addNodes(nodeId, maxDepth, nodes,
-                               addedNodes, addedEdges, "ancestors")
-        nodes, addedNodes, addedEdges = addNodes(nodeId, maxDepth, nodes,
-                               addedNodes, addedEdges, "desc")
-
-        edges = addEdges(edges, addedNodes, addedEdges)
-
-        return {"nodes": nodes, "edges": edges}
+        # Position of each node in the list, the central node comes first
+        ordered_pks = sorted(nodes, key=lambda pk: (pk != nodeId, pk))
+        index = dict((pk, i) for (i, pk) in enumerate(ordered_pks))
+
+        def iter_nodes():
+            for pk in ordered_pks:
+                (nodetype, direction, depth) = nodes[pk]
+                if direction is None:
+                    group = "mainNode"
+                else:
+                    group = direction + "-" + str(depth)
+                yield {"id": index[pk],
+                       "nodeid": pk,
+                       "nodetype": nodetype,
+                       "group": group
+                       }
+
+        def iter_edges():
+            for (from_pk, to_pk) in links:
+                yield {"from": index[from_pk],
+                       "to": index[to_pk],
+                       "arrows": "to",
+                       "color": {"inherit": 'from'}
+                       }
+
+        return {"nodes": iter_nodes(), "edges": iter_edges()}
@@ -24,6 +24,11 @@ def SchedulerFactory(module):
     return BaseFactory(module, Scheduler, "aiida.scheduler.plugins")
 
 
+# The file where each task of a packed job (see
+# Scheduler.get_submit_packed_script) writes its exit code when it ends
+PACKED_TASK_EXIT_CODE_FILE = '.aiida_task_exit_code'
+
+
 class SchedulerError(AiidaException):
     pass
 
@@ -44,11 +49,22 @@ class Scheduler(object):
     # 'can_query_by_user': True if I can pass the 'user' argument to
     # get_joblist_command (and in this case, no 'jobs' should be given).
     # Otherwise, if False, a list of jobs is passed, and no 'user' is given.
+    # 'can_submit_job_arrays': True if the plugin implements
+    # _get_submit_script_array_header and _get_array_task_job_id, and sets
+    # _array_task_id_variable (see get_submit_array_script).
     _features = {}
 
     # The class to be used for the job resource.
     _job_resource_class = None
 
+    # The maximum number of job ids passed to a single kill command by
+    # kill_jobs
+    _kill_jobs_batch_size = 100
+
+    # The environment variable with the (1-based) index of the task, in the
+    # tasks of a job array
+    _array_task_id_variable = None
+
     def __init__(self):
         self._transport = None
 
@@ -171,6 +187,152 @@ class Scheduler(object):
 
         return "\n".join(script_lines)
 
+    def get_submit_array_script(self, job_tmpl, task_working_directories,
+                                task_script):
+        """
+        Return the submit script of a job array, as a string.
+
+        The i-th task of the array (counting from 1) goes in the i-th working
+        directory, and runs there the task_script with bash, redirecting its
+        output and error to the sched_output_path and sched_error_path of
+        job_tmpl. The task_script is typically the submit script of a single
+        job, whose scheduler directives are then just comments.
+
+        :param job_tmpl: a JobTemplate with the scheduler options of each
+            task (resources, walltime, queue, ...).
+        :param task_working_directories: the list of the absolute working
+            directories of the tasks
+        :param task_script: the name of the script of each task, in its
+            working directory
+        """
+        empty_line = ""
+
+        script_lines = []
+        script_lines.append("#!/bin/bash")
+        script_lines.append(empty_line)
+
+        script_lines.append(self._get_submit_script_array_header(
+            len(task_working_directories)))
+        script_lines.append(self._get_submit_script_header(
+            self._get_tasks_job_template(job_tmpl)))
+        script_lines.append(empty_line)
+
+        for task_id, working_directory in enumerate(task_working_directories,
+                                                    start=1):
+            script_lines.append("AIIDA_TASK_DIRS[{}]={}".format(
+                task_id, escape_for_bash(working_directory)))
+        script_lines.append(empty_line)
+
+        script_lines.append('cd "${{AIIDA_TASK_DIRS[${}]}}" || exit 1'.format(
+            self._array_task_id_variable))
+        script_lines.append(self._get_task_run_line(job_tmpl, task_script))
+        script_lines.append(empty_line)
+
+        return "\n".join(script_lines)
+
+    def get_submit_packed_script(self, job_tmpl, task_working_directories,
+                                 task_script, max_concurrent_tasks):
+        """
+        Return the submit script of a single job running many tasks, as a
+        string.
+
+        Each task goes in its working directory, and runs there the
+        task_script with bash (as in get_submit_array_script); at most
+        max_concurrent_tasks tasks run at the same time. When a task ends,
+        its exit code is written in the PACKED_TASK_EXIT_CODE_FILE of its
+        working directory.
+
+        :param job_tmpl: a JobTemplate with the scheduler options of the
+            whole job, i.e. with enough resources for max_concurrent_tasks
+            tasks, and enough time for all of them; its sched_output_path,
+            sched_error_path and sched_join_files are used for each task.
+        :param task_working_directories: the list of the absolute working
+            directories of the tasks
+        :param task_script: the name of the script of each task, in its
+            working directory
+        :param max_concurrent_tasks: the maximum number of tasks running at
+            the same time
+        """
+        empty_line = ""
+
+        script_lines = []
+        script_lines.append("#!/bin/bash")
+        script_lines.append(empty_line)
+
+        script_lines.append(self._get_submit_script_header(
+            self._get_tasks_job_template(job_tmpl)))
+        script_lines.append(empty_line)
+
+        script_lines.append("aiida_run_task() {")
+        script_lines.append('    cd "$1" || return 1')
+        script_lines.append("    {}".format(
+            self._get_task_run_line(job_tmpl, task_script)))
+        script_lines.append("    echo $? > {}".format(
+            PACKED_TASK_EXIT_CODE_FILE))
+        script_lines.append("}")
+        script_lines.append(empty_line)
+
+        script_lines.append("AIIDA_TASK_DIRS=(")
+        for working_directory in task_working_directories:
+            script_lines.append(escape_for_bash(working_directory))
+        script_lines.append(")")
+        script_lines.append(empty_line)
+
+        script_lines.append('for aiida_task_dir in "${AIIDA_TASK_DIRS[@]}"; do')
+        script_lines.append('    while [ "$(jobs -pr | wc -l)" -ge {} ]; '
+                            'do'.format(int(max_concurrent_tasks)))
+        script_lines.append("        sleep 1")
+        script_lines.append("    done")
+        script_lines.append('    aiida_run_task "$aiida_task_dir" &')
+        script_lines.append("done")
+        script_lines.append("wait")
+        script_lines.append(empty_line)
+
+        return "\n".join(script_lines)
+
+    def _get_tasks_job_template(self, job_tmpl):
+        """
+        Return a copy of the job template of a job running many tasks (see
+        get_submit_array_script and get_submit_packed_script), with the
+        scheduler output discarded: the output of each task is redirected
+        by the script itself.
+        """
+        from aiida.common.exceptions import InternalError
+
+        if not isinstance(job_tmpl, JobTemplate):
+            raise InternalError("job_tmpl should be of type JobTemplate")
+
+        tasks_tmpl = JobTemplate(job_tmpl)
+        tasks_tmpl.sched_output_path = '/dev/null'
+        tasks_tmpl.sched_error_path = None
+        tasks_tmpl.sched_join_files = True
+        return tasks_tmpl
+
+    def _get_task_run_line(self, job_tmpl, task_script):
+        """
+        Return the line running the script of a task with bash, redirecting
+        its output and error as the scheduler would do for the job template.
+        """
+        run_line = "bash {}".format(escape_for_bash(task_script))
+        if job_tmpl.sched_output_path:
+            run_line += " > {}".format(
+                escape_for_bash(job_tmpl.sched_output_path))
+        if job_tmpl.sched_join_files:
+            run_line += " 2>&1"
+        elif job_tmpl.sched_error_path:
+            run_line += " 2> {}".format(
+                escape_for_bash(job_tmpl.sched_error_path))
+        return run_line
+
+    def _get_submit_script_array_header(self, num_tasks):
+        """
+        Return the lines of the submit script header that make it a job
+        array with tasks from 1 to num_tasks.
+
+        To be implemented by the plugins supporting job arrays.
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def _get_submit_script_header(self, job_tmpl):
         """
@@ -403,6 +565,32 @@ stderr:
             self._get_submit_command(escape_for_bash(submit_script)))
         return self._parse_submit_output(retval, stdout, stderr)
 
+    def submit_array_from_script(self, working_directory, submit_script,
+                                 num_tasks):
+        """
+        Goes in the working directory and submits the submit_script of a
+        job array (see get_submit_array_script).
+
+        Return the list of the JobIDs of the tasks of the array, in order,
+        in a valid format to be used for querying and killing each task.
+
+        Typically, this function does not need to be modified by the plugins.
+        """
+        jobid = self.submit_from_script(working_directory, submit_script)
+        return [self._get_array_task_job_id(jobid, task_id)
+                for task_id in range(1, num_tasks + 1)]
+
+    def _get_array_task_job_id(self, jobid, task_id):
+        """
+        Return the JobID of a task of a job array.
+
+        To be implemented by the plugins supporting job arrays.
+
+        :param jobid: the JobID returned by the submission of the array
+        :param task_id: the index of the task (counting from 1)
+        """
+        raise NotImplementedError
+
     def kill(self, jobid):
         """
         Kill a remote job, and try to parse the output message of the scheduler
@@ -419,6 +607,28 @@ stderr:
             self._get_kill_command(jobid))
         return self._parse_kill_output(retval, stdout, stderr)
 
+    def kill_jobs(self, jobids):
+        """
+        Kill many remote jobs, passing up to _kill_jobs_batch_size job ids
+        to each kill command.
+
+        :param jobids: a list of job ids (strings)
+
+        :return: a dictionary with the job ids as keys, and True if the
+          job seems to have been killed, False otherwise.
+        """
+        results = {}
+        for start in range(0, len(jobids), self._kill_jobs_batch_size):
+            batch = jobids[start:start + self._kill_jobs_batch_size]
+            if len(batch) == 1:
+                results[batch[0]] = self.kill(batch[0])
+                continue
+            retval, stdout, stderr = self.transport.exec_command_wait(
+                self._get_kill_command(" ".join(batch)))
+            results.update(
+                self._parse_kill_jobs_output(retval, stdout, stderr, batch))
+        return results
+
     def _get_kill_command(self, jobid):
         """
         Return the command to kill the job with specified jobid.
@@ -427,6 +637,33 @@ stderr:
         """
         raise NotImplementedError
 
+    def _parse_kill_jobs_output(self, retval, stdout, stderr, jobids):
+        """
+        Parse the output of a kill command with many job ids.
+
+        By default, if the command failed, the jobs whose id appears in
+        stderr are considered not killed, and the others killed (if no id
+        appears, none of them); otherwise the output is parsed as the one
+        of a single kill.
+
+        :return: a dictionary with the job ids as keys, and True if the
+          job seems to have been killed, False otherwise.
+        """
+        import re
+
+        if retval == 0:
+            killed = self._parse_kill_output(retval, stdout, stderr)
+            return {jobid: killed for jobid in jobids}
+
+        failed = set(jobid for jobid in jobids if re.search(
+            r'(?<![\w.-]){}(?![\w-])'.format(re.escape(jobid)), stderr))
+        self.logger.error("Error killing jobs {}: retval={}; stdout={}; "
+                          "stderr={}".format(" ".join(jobids), retval,
+                                             stdout, stderr))
+        if not failed:
+            return {jobid: False for jobid in jobids}
+        return {jobid: jobid not in failed for jobid in jobids}
+
     def _parse_kill_output(self, retval, stdout, stderr):
         """
         Parse the output of the kill command.
@@ -114,6 +114,7 @@ class PbsBaseClass(aiida.scheduler.Scheduler):
     # Query only by list of jobs and not by user
     _features = {
         'can_query_by_user': False,
+        'can_submit_job_arrays': True,
     }
 
     # The class to be used for the job resource.
@@ -728,6 +729,16 @@ class PbsBaseClass(aiida.scheduler.Scheduler):
         # http://stackoverflow.com/questions/1697815
         return datetime.datetime.fromtimestamp(time.mktime(time_struct))
 
+    def _get_array_task_job_id(self, jobid, task_id):
+        """
+        Return the JobID of a task of a job array: qsub returns e.g.
+        123[].server for the array, and the tasks are 123[1].server, ...
+        """
+        if '[]' in jobid:
+            return jobid.replace('[]', '[{}]'.format(task_id), 1)
+        jobnum, sep, server = jobid.partition('.')
+        return "{}[{}]{}{}".format(jobnum, task_id, sep, server)
+
     def _parse_submit_output(self, retval, stdout, stderr):
         """
         Parse the output of the submit command, as returned by executing the
@@ -755,7 +766,9 @@ class PbsBaseClass(aiida.scheduler.Scheduler):
         """
         Return the command to kill the job with specified jobid.
         """
-        submit_command = 'qdel {}'.format(jobid)
+        # The ids of the tasks of job arrays contain brackets: escape them
+        submit_command = 'qdel {}'.format(
+            " ".join(escape_for_bash(j) for j in jobid.split()))
 
         self.logger.info("killing job {}".format(jobid))
 
@@ -86,6 +86,21 @@ _map_status_sge = {
     'EhRqw' : job_states.UNDETERMINED
     }
 
+
+def _parse_task_ids(tasks):
+    """
+    Return the list of the task ids of a job array in the format of qstat,
+    e.g. '4', '5-10:1', or a comma-separated list of them.
+    """
+    task_ids = []
+    for task_range in tasks.split(','):
+        task_range, _, step = task_range.partition(':')
+        first, _, last = task_range.partition('-')
+        task_ids.extend(range(int(first), int(last or first) + 1,
+                              int(step or 1)))
+    return task_ids
+
+
 class SgeJobResource(ParEnvJobResource):
     pass
 
@@ -99,7 +114,10 @@ class SgeScheduler(aiida.scheduler.Scheduler):
     # user, but not by job id
     _features = {
         'can_query_by_user': True,
+        'can_submit_job_arrays': True,
         }
+
+    _array_task_id_variable = 'SGE_TASK_ID'
     
     # The class to be used for the job resource.
     _job_resource_class = SgeJobResource
@@ -133,9 +151,26 @@ class SgeScheduler(aiida.scheduler.Scheduler):
         #raise NotImplementedError
 
     def _get_detailed_jobinfo_command(self,jobid):
+        jobid, _, task_id = jobid.partition('.')
         command = "qacct -j {}".format(escape_for_bash(jobid))
+        if task_id:
+            # A task of a job array
+            command += " -t {}".format(escape_for_bash(task_id))
         return command
 
+    def _get_submit_script_array_header(self, num_tasks):
+        """
+        Return the header line making the script a job array.
+        """
+        return "#$ -t 1-{}".format(num_tasks)
+
+    def _get_array_task_job_id(self, jobid, task_id):
+        """
+        Return the JobID of a task of a job array: qsub -terse returns e.g.
+        123.1-10:1 for the array, and the tasks are 123.1, 123.2, ...
+        """
+        return "{}.{}".format(jobid.split('.')[0], task_id)
+
     def _get_submit_script_header(self, job_tmpl):
         """
         Return the submit script header, using the parameters from the
@@ -466,8 +501,28 @@ class SgeScheduler(aiida.scheduler.Scheduler):
                 except IndexError:
                     self.logger.warning("No 'slots' field for job "
                                   "id {}".format(this_job.job_id))
-                
-            joblist.append(this_job)
+
+            # The tasks of a job array: each running task is listed on its
+            # own, the pending ones together as a range
+            try:
+                job_element = job.getElementsByTagName('tasks').pop(0)
+                element_child = job_element.childNodes.pop(0)
+                tasks = str(element_child.data).strip()
+            except IndexError:
+                joblist.append(this_job)
+                continue
+
+            try:
+                task_ids = _parse_task_ids(tasks)
+            except ValueError:
+                self.logger.warning("Unrecognized 'tasks' field '{}' for job "
+                                    "id {}".format(tasks, this_job.job_id))
+                joblist.append(this_job)
+                continue
+            for task_id in task_ids:
+                this_task = JobInfo(this_job)
+                this_task.job_id = "{}.{}".format(this_job.job_id, task_id)
+                joblist.append(this_task)
         #self.logger.debug("joblist final: {}".format(joblist))
         return joblist
 
@@ -153,7 +153,10 @@ class SlurmScheduler(aiida.scheduler.Scheduler):
     # Query only by list of jobs and not by user
     _features = {
         'can_query_by_user': False,
+        'can_submit_job_arrays': True,
         }
+
+    _array_task_id_variable = 'SLURM_ARRAY_TASK_ID'
     
     # The class to be used for the job resource.
     _job_resource_class = SlurmJobResource
@@ -191,8 +194,10 @@ class SlurmScheduler(aiida.scheduler.Scheduler):
         
         # I add the environment variable SLURM_TIME_FORMAT in front to be
         # sure to get the times in 'standard' format
+        # With --array, each task of a job array is listed on its own, with
+        # the task job id (e.g. 123_4) also while pending
         command = ["SLURM_TIME_FORMAT='standard'", "squeue", "--noheader",
-                   "-o '{}'".format(_field_separator.join(
+                   "--array", "-o '{}'".format(_field_separator.join(
                        _[0] for _ in self.fields))]
 
         if user and jobs:
@@ -411,6 +416,18 @@ class SlurmScheduler(aiida.scheduler.Scheduler):
 
         return submit_command
       
+    def _get_submit_script_array_header(self, num_tasks):
+        """
+        Return the header line making the script a job array.
+        """
+        return "#SBATCH --array=1-{}".format(num_tasks)
+
+    def _get_array_task_job_id(self, jobid, task_id):
+        """
+        Return the JobID of a task of a job array.
+        """
+        return "{}_{}".format(jobid, task_id)
+
     def _parse_submit_output(self, retval, stdout, stderr):
         """
         Parse the output of the submit command, as returned by executing the
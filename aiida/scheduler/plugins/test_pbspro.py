@@ -1057,3 +1057,20 @@ class TestSubmitScript(unittest.TestCase):
                 num_cores_per_mpiproc=23
             )
 
+
+
+class TestJobArrays(unittest.TestCase):
+    def test_job_array_ids(self):
+        """
+        The job ids of the tasks, and the header of the array.
+        """
+        s = PbsproScheduler()
+
+        self.assertEquals(s._get_array_task_job_id('68350[].mycluster', 2),
+                          '68350[2].mycluster')
+        self.assertEquals(s._get_array_task_job_id('68350[]', 2),
+                          '68350[2]')
+        self.assertEquals(s._get_submit_script_array_header(3),
+                          '#PBS -J 1-3')
+        self.assertEquals(s._get_kill_command('68350[1] 68350[2]'),
+                          "qdel '68350[1]' '68350[2]'")
@@ -136,6 +136,35 @@ text_check_queue_job_info="""<?xml version='1.0'?>
         </job_info>
         """
         
+text_qstat_job_array_xml_test = """<?xml version='1.0'?>
+<job_info  xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+  <queue_info>
+    <job_list state="running">
+      <JB_job_number>1212400</JB_job_number>
+      <JB_name>aiida-array-12</JB_name>
+      <JB_owner>dorigm7s</JB_owner>
+      <state>r</state>
+      <JAT_start_time>2013-06-18T12:08:23</JAT_start_time>
+      <queue_name>serial.q@node080</queue_name>
+      <slots>1</slots>
+      <tasks>1</tasks>
+    </job_list>
+  </queue_info>
+  <job_info>
+    <job_list state="pending">
+      <JB_job_number>1212400</JB_job_number>
+      <JB_name>aiida-array-12</JB_name>
+      <JB_owner>dorigm7s</JB_owner>
+      <state>qw</state>
+      <JB_submission_time>2013-06-18T12:00:57</JB_submission_time>
+      <queue_name></queue_name>
+      <slots>1</slots>
+      <tasks>2-4:1</tasks>
+    </job_list>
+  </job_info>
+</job_info>
+"""
+
 test_raw_data = """<job_list state="running">
       <JB_job_number>1212299</JB_job_number>
       <JAT_prio>10.05000</JAT_prio>
@@ -290,6 +319,31 @@ class TestCommand(unittest.TestCase):
             job_list_raise=sge._parse_joblist_output(retval, stdout, stderr)
         logging.disable(logging.NOTSET)
         
+    def test_parse_joblist_output_job_array(self):
+        """
+        Each task of a job array is a job, also when pending.
+        """
+        sge = SgeScheduler()
+
+        job_list = sge._parse_joblist_output(
+            0, text_qstat_job_array_xml_test, '')
+
+        self.assertEquals([j.job_id for j in job_list],
+                          ['1212400.1', '1212400.2', '1212400.3',
+                           '1212400.4'])
+        self.assertEquals([j.job_state for j in job_list],
+                          [job_states.RUNNING] + [job_states.QUEUED] * 3)
+
+    def test_job_array_ids(self):
+        sge = SgeScheduler()
+
+        self.assertEquals(sge._get_array_task_job_id('1176936.1-3:1', 2),
+                          '1176936.2')
+        self.assertEquals(sge._get_detailed_jobinfo_command('1176936.2'),
+                          "qacct -j '1176936' -t '2'")
+        self.assertEquals(sge._get_submit_script_array_header(3),
+                          '#$ -t 1-3')
+
     def test_submit_script(self):
         """
         """
@@ -330,6 +330,142 @@ class TestSubmitScript(unittest.TestCase):
             )
 
 
+class FakeTransport(object):
+    """
+    A transport that only records the commands, and returns a fixed output.
+    """
+
+    def __init__(self, retval, stdout, stderr):
+        self.output = (retval, stdout, stderr)
+        self.commands = []
+
+    def chdir(self, path):
+        self.commands.append('cd {}'.format(path))
+
+    def exec_command_wait(self, command):
+        self.commands.append(command)
+        return self.output
+
+
+class TestKillJobs(unittest.TestCase):
+    def test_kill_jobs(self):
+        """
+        All the jobs are killed with a single scancel.
+        """
+        scheduler = SlurmScheduler()
+        transport = FakeTransport(0, "", "")
+        scheduler.set_transport(transport)
+
+        result = scheduler.kill_jobs(['123', '124', '125'])
+
+        self.assertEquals(transport.commands, ['scancel 123 124 125'])
+        self.assertEquals(result, {'123': True, '124': True, '125': True})
+
+    def test_kill_jobs_failed(self):
+        """
+        Only the jobs mentioned in the error are not killed.
+        """
+        scheduler = SlurmScheduler()
+        scheduler.set_transport(FakeTransport(
+            1, "", "scancel: error: Kill job error on job id 124: "
+                   "Invalid job id specified"))
+
+        result = scheduler.kill_jobs(['123', '124', '1245'])
+
+        self.assertEquals(result, {'123': True, '124': False, '1245': True})
+
+
+class TestJobArrays(unittest.TestCase):
+    def test_submit_array_script(self):
+        """
+        Each task of the array runs the script in its own directory.
+        """
+        from aiida.scheduler.datastructures import JobTemplate
+
+        s = SlurmScheduler()
+
+        job_tmpl = JobTemplate()
+        job_tmpl.job_resource = s.create_job_resource(
+            num_machines=1, num_mpiprocs_per_machine=1)
+        job_tmpl.max_wallclock_seconds = 3600
+        job_tmpl.sched_output_path = '_scheduler-stdout.txt'
+        job_tmpl.sched_error_path = '_scheduler-stderr.txt'
+        job_tmpl.sched_join_files = False
+
+        submit_script_text = s.get_submit_array_script(
+            job_tmpl, ['/scratch/a', '/scratch/b c'], '_aiidasubmit.sh')
+
+        self.assertTrue(submit_script_text.startswith('#!/bin/bash'))
+        self.assertTrue('#SBATCH --array=1-2' in submit_script_text)
+        self.assertTrue('#SBATCH --time=01:00:00' in submit_script_text)
+        self.assertTrue('#SBATCH --output=/dev/null' in submit_script_text)
+        self.assertTrue("AIIDA_TASK_DIRS[1]='/scratch/a'" in submit_script_text)
+        self.assertTrue("AIIDA_TASK_DIRS[2]='/scratch/b c'" in
+                        submit_script_text)
+        self.assertTrue('cd "${AIIDA_TASK_DIRS[$SLURM_ARRAY_TASK_ID]}" || '
+                        'exit 1' in submit_script_text)
+        self.assertTrue("bash '_aiidasubmit.sh' > '_scheduler-stdout.txt' "
+                        "2> '_scheduler-stderr.txt'" in submit_script_text)
+
+    def test_submit_array(self):
+        """
+        The job ids of the tasks are returned, in order.
+        """
+        s = SlurmScheduler()
+        transport = FakeTransport(0, "Submitted batch job 1234\n", "")
+        s.set_transport(transport)
+
+        job_ids = s.submit_array_from_script('/scratch/a', 'array.sh', 3)
+
+        self.assertEquals(transport.commands,
+                          ['cd /scratch/a', "sbatch 'array.sh'"])
+        self.assertEquals(job_ids, ['1234_1', '1234_2', '1234_3'])
+
+    def test_joblist_command(self):
+        """
+        The tasks of the job arrays are listed one by one.
+        """
+        s = SlurmScheduler()
+        command = s._get_joblist_command(jobs=['1234_1', '1234_2'])
+
+        self.assertTrue(' --array ' in command)
+        self.assertTrue(command.endswith('--jobs=1234_1,1234_2'))
+
+
+class TestJobPacking(unittest.TestCase):
+    def test_submit_packed_script(self):
+        """
+        The tasks run concurrently in their own directories, and each of them
+        writes its exit code when it ends.
+        """
+        from aiida.scheduler import PACKED_TASK_EXIT_CODE_FILE
+        from aiida.scheduler.datastructures import JobTemplate
+
+        s = SlurmScheduler()
+
+        job_tmpl = JobTemplate()
+        job_tmpl.job_resource = s.create_job_resource(
+            num_machines=1, num_mpiprocs_per_machine=4)
+        job_tmpl.max_wallclock_seconds = 3600
+        job_tmpl.sched_output_path = '_scheduler-stdout.txt'
+        job_tmpl.sched_join_files = True
+
+        submit_script_text = s.get_submit_packed_script(
+            job_tmpl, ['/scratch/a', '/scratch/b c', '/scratch/d'],
+            '_aiidasubmit.sh', 2)
+
+        self.assertTrue(submit_script_text.startswith('#!/bin/bash'))
+        self.assertFalse('--array' in submit_script_text)
+        self.assertTrue('#SBATCH --ntasks-per-node=4' in submit_script_text)
+        self.assertTrue('#SBATCH --output=/dev/null' in submit_script_text)
+        self.assertTrue("'/scratch/b c'" in submit_script_text)
+        self.assertTrue("bash '_aiidasubmit.sh' > '_scheduler-stdout.txt' "
+                        "2>&1" in submit_script_text)
+        self.assertTrue("echo $? > {}".format(PACKED_TASK_EXIT_CODE_FILE) in
+                        submit_script_text)
+        self.assertTrue('-ge 2 ]' in submit_script_text)
+        self.assertTrue(submit_script_text.rstrip().endswith('wait'))
+
 
 if __name__ == '__main__':        
     unittest.main()
@@ -289,10 +289,14 @@ class Transport(object):
          supported by all plugins, we still force it to True for the final put.
 
         .. note:: the supported keys in kwargs are callback, dereference,
-           overwrite and ignore_nonexisting.
+           overwrite and ignore_nonexisting. The key direct, which asks
+           plugins to copy the data without passing through this computer
+           if possible, is ignored.
         """
         from aiida.common.folders import SandboxFolder
 
+        kwargs.pop('direct', None)
+
         kwargs_get = {'callback': None,
                       'dereference': kwargs.pop('dereference',True),
                       'overwrite': True,
@@ -582,6 +586,42 @@ class Transport(object):
         """
         raise NotImplementedError
 
+    def rmtrees(self, paths):
+        """
+        Remove recursively the content at many paths. Plugins can override
+        it to remove them with fewer remote operations.
+
+        :param paths: a list of absolute paths to remove
+        :return: a dictionary with the paths as keys, and None if the path
+            was removed, or an error message otherwise
+        """
+        results = {}
+        for path in paths:
+            try:
+                self.rmtree(path)
+                results[path] = None
+            except (IOError, OSError) as e:
+                results[path] = str(e)
+        return results
+
+    def copy_and_symlink(self, copy_list, symlink_list):
+        """
+        Copy and symlink many files or folders on the remote machine: first
+        all the copies, then all the symlinks. Plugins can override it to do
+        it with fewer remote operations.
+
+        :param copy_list: a list of tuples (remotesource, remotedestination)
+            to copy, with the same meaning as the parameters of copy
+        :param symlink_list: a list of tuples (remotesource,
+            remotedestination) to symlink, with the same meaning as the
+            parameters of symlink
+        :raise IOError: if one of the operations failed
+        """
+        for remotesource, remotedestination in copy_list:
+            self.copy(remotesource, remotedestination)
+        for remotesource, remotedestination in symlink_list:
+            self.symlink(remotesource, remotedestination)
+
     def gotocomputer_command(self, remotedir):
         """
         Return a string to be run using os.system in order to connect
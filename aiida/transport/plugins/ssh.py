@@ -36,6 +36,26 @@ def convert_to_bool(string):
     else:
         raise ValueError("Invalid boolean value provided")
 
+
+def _read_stderr(channel, text, max_size):
+    """
+    Return text followed by the standard error available on the channel,
+    without waiting, truncated to its last max_size characters.
+    """
+    while channel.recv_stderr_ready():
+        text = (text + channel.recv_stderr(max_size))[-max_size:]
+    return text
+
+
+def _discard_stdout(channel, chunk_size):
+    """
+    Read and discard the standard output available on the channel, without
+    waiting.
+    """
+    while channel.recv_ready():
+        channel.recv(chunk_size)
+
+
 class SshTransport(aiida.transport.Transport):
     """
     Support connection, command execution and data transfer to remote computers via SSH+SFTP.
@@ -60,10 +80,22 @@ class SshTransport(aiida.transport.Transport):
     # define a _get_PARAMNAME_suggestion_string
     # to return a suggestion; it must accept only one parameter, being a Computer
     # instance
+    # Size of the chunks of data read from a channel and written to another
+    # by copy_from_remote_to_remote
+    _stream_chunk_size = 1048576
+    # Maximum size of the standard error of the streaming commands that is
+    # kept for the error messages
+    _stream_stderr_size = 65536
+    # Maximum time (in seconds) between two checks of the streaming channels
+    _stream_poll_interval = 0.1
+
     _valid_auth_params = _valid_connect_params + [
         'load_system_host_keys',
         'key_policy',
         ]
+
+    # The maximum number of paths removed by a single rm command in rmtrees
+    _rmtrees_batch_size = 100
     
     @classmethod
     def _convert_username_fromstring(cls, string):
@@ -394,6 +426,9 @@ class SshTransport(aiida.transport.Transport):
 
         self._is_open = False
         self._sftp = None
+        # Whether tar can be used on the remote machine to transfer the
+        # trees in bulk (None if not checked yet)
+        self._tar_available = None
         
         self._machine = machine
 
@@ -671,6 +706,48 @@ class SshTransport(aiida.transport.Transport):
                               "stderr: '{}'".format(retval, stdout, stderr))
             raise IOError("Error while executing rm. Exit code: {}".format(retval) )
 
+
+    def rmtrees(self, paths):
+        """
+        Remove many files or directories recursively, with one rm command
+        for every _rmtrees_batch_size paths. If a command fails, the paths
+        of its batch that still exist are reported as not removed.
+
+        :param paths: a list of remote paths to delete
+        :return: a dictionary with the paths as keys, and None if the path
+            was removed, or an error message otherwise
+        """
+        for path in paths:
+            if not path:
+                raise ValueError('Input to rmtrees() must be a list of non '
+                                 'empty strings. Found instead %s as path'
+                                 % path)
+
+        results = {}
+        for start in range(0, len(paths), self._rmtrees_batch_size):
+            batch = paths[start:start + self._rmtrees_batch_size]
+            command = 'rm -r -f {}'.format(
+                " ".join(escape_for_bash(path) for path in batch))
+
+            retval, stdout, stderr = self.exec_command_wait(command)
+
+            if retval == 0:
+                if stderr.strip():
+                    self.logger.warning("There was nonempty stderr in the rm "
+                                        "command: {}".format(stderr))
+                results.update((path, None) for path in batch)
+            else:
+                self.logger.error("Problem executing rm. Exit code: {}, "
+                                  "stdout: '{}', stderr: '{}'".format(
+                    retval, stdout, stderr))
+                for path in batch:
+                    if self.path_exists(path):
+                        results[path] = ("Error while executing rm. Exit "
+                                         "code: {}, stderr: {}".format(
+                            retval, stderr.strip()))
+                    else:
+                        results[path] = None
+        return results
     
     def rmdir(self, path):
         """
@@ -877,6 +954,11 @@ class SshTransport(aiida.transport.Transport):
         else: # remotepath exists already: copy the folder inside of it!
             remotepath = os.path.join(remotepath,os.path.split(localpath)[1])
             self.mkdir(remotepath) # create a nested folder
+
+        # Transfer the whole tree with a single tar command, if possible
+        if self._has_tar():
+            self._puttree_tar(localpath, remotepath)
+            return
         
         # TODO, NOTE: we are not using 'onerror' because we checked above that
         # the folder exists, but it would be better to use it
@@ -1036,6 +1118,11 @@ class SshTransport(aiida.transport.Transport):
         else: # localpath exists already: copy the folder inside of it!
             localpath = os.path.join(localpath,os.path.split(remotepath)[1])
             os.mkdir(localpath) # create a nested folder
+
+        # Transfer the whole tree with a single tar command, if possible
+        if self._has_tar():
+            self._gettree_tar(remotepath, localpath)
+            return
         
         item_list = self.listdir(remotepath)
         dest = str(localpath)
@@ -1049,6 +1136,114 @@ class SshTransport(aiida.transport.Transport):
                 self.getfile( os.path.join(remotepath,item) , os.path.join(dest,item) )
 
 
+    def _has_tar(self):
+        """
+        Return True if the tar command is available on the remote machine
+        (checked only once per transport).
+        """
+        if self._tar_available is None:
+            retval, _, _ = self.exec_command_wait('command -v tar')
+            self._tar_available = (retval == 0)
+            if not self._tar_available:
+                self.logger.debug("tar is not available on {}, the trees "
+                                  "are transferred file by file".format(
+                    self._machine))
+        return self._tar_available
+
+    def _puttree_tar(self, localpath, remotepath):
+        """
+        Put the content of the local folder localpath in the existing remote
+        folder remotepath, streaming it to a remote tar command.
+        Symbolic links are followed.
+
+        :raise IOError: if the tar execution failed
+        """
+        import tarfile
+
+        command = 'tar -x -f - -C {}'.format(escape_for_bash(remotepath))
+        ssh_stdin, stdout, stderr, channel = self._exec_command_internal(
+            command)
+        try:
+            archive = tarfile.open(fileobj=ssh_stdin, mode='w|',
+                                   dereference=True)
+            try:
+                for item in os.listdir(localpath):
+                    archive.add(os.path.join(localpath, item), arcname=item)
+            finally:
+                archive.close()
+        finally:
+            ssh_stdin.flush()
+            ssh_stdin.channel.shutdown_write()
+
+        stdout.read()
+        retval = channel.recv_exit_status()
+        stderr_text = stderr.read()
+        if retval != 0:
+            self.logger.error("Problem executing tar. Exit code: {}, "
+                              "stderr: '{}', command: '{}'".format(
+                retval, stderr_text, command))
+            raise IOError("Error while executing tar. Exit code: {}, "
+                          "stderr: '{}', command: '{}'".format(
+                retval, stderr_text, command))
+
+    def _gettree_tar(self, remotepath, localpath):
+        """
+        Get the content of the remote folder remotepath in the existing local
+        folder localpath, streaming it from a remote tar command.
+        Symbolic links are followed; the entries of the archive that would
+        be extracted outside localpath, or that are not regular files,
+        directories or links to other entries, are skipped.
+
+        :raise IOError: if the tar execution failed
+        """
+        import tarfile
+
+        def is_safe(name):
+            return not (os.path.isabs(name) or
+                        os.pardir in name.split('/'))
+
+        def safe_members(archive):
+            for member in archive:
+                if (is_safe(member.name) and
+                        (member.isfile() or member.isdir() or
+                         (member.islnk() and is_safe(member.linkname)))):
+                    yield member
+                else:
+                    self.logger.warning("Skipping the entry {} of the tar "
+                                        "archive of {}".format(member.name,
+                                                               remotepath))
+
+        command = 'tar -c -h -f - -C {} .'.format(escape_for_bash(remotepath))
+        ssh_stdin, stdout, stderr, channel = self._exec_command_internal(
+            command)
+        ssh_stdin.channel.shutdown_write()
+
+        tar_error = None
+        try:
+            archive = tarfile.open(fileobj=stdout, mode='r|')
+            try:
+                archive.extractall(localpath, members=safe_members(archive))
+            finally:
+                archive.close()
+        except tarfile.TarError as e:
+            # If the remote tar failed, its error is more informative
+            tar_error = e
+        # Consume what is left of the stream
+        stdout.read()
+
+        retval = channel.recv_exit_status()
+        stderr_text = stderr.read()
+        if retval == 0 and tar_error is not None:
+            raise IOError("Error while reading the tar archive of {}: "
+                          "{}".format(remotepath, tar_error))
+        if retval != 0:
+            self.logger.error("Problem executing tar. Exit code: {}, "
+                              "stderr: '{}', command: '{}'".format(
+                retval, stderr_text, command))
+            raise IOError("Error while executing tar. Exit code: {}, "
+                          "stderr: '{}', command: '{}'".format(
+                retval, stderr_text, command))
+
     def get_attribute(self,path):
         """
         Returns the object Fileattribute, specified in aiida.transport
@@ -1173,6 +1368,226 @@ class SshTransport(aiida.transport.Transport):
                           "command: '{}'".format(retval, stdout, stderr,
                                                  command) )
 
+
+    def copy_from_remote_to_remote(self, transportdestination,
+                                   remotesource, remotedestination, **kwargs):
+        """
+        Copy files or folders from a remote computer to another remote computer.
+
+        If the destination transport is also an SshTransport, the data is
+        streamed from a command run on this computer (cat for files, tar for
+        folders) to a command run on the destination computer, without being
+        written to the local disk. With direct=True, the data is first tried
+        to be copied with scp, run on this computer: this works only if this
+        computer can connect to the destination computer without a password.
+        Otherwise, the data is copied through a local sandbox folder, as in
+        the parent class.
+
+        :param transportdestination: transport to be used for the destination computer
+        :param str remotesource: path to the remote source directory / file
+        :param str remotedestination: path to the remote destination directory / file
+        :param kwargs: the supported keys are callback (ignored when
+            streaming), dereference, overwrite, ignore_nonexisting and direct.
+
+        :raise IOError: if the copy failed, or remotesource does not exist
+            (and ignore_nonexisting is False)
+        :raise OSError: if trying to overwrite, or to copy more than one
+            file or folder in a destination that is not a folder
+        """
+        if not isinstance(transportdestination, SshTransport):
+            kwargs.pop('direct', None)
+            return super(SshTransport, self).copy_from_remote_to_remote(
+                transportdestination, remotesource, remotedestination,
+                **kwargs)
+
+        direct = kwargs.pop('direct', False)
+        dereference = kwargs.pop('dereference', True)
+        overwrite = kwargs.pop('overwrite', True)
+        ignore_nonexisting = kwargs.pop('ignore_nonexisting', False)
+        kwargs.pop('callback', None)
+        if kwargs:
+            self.logger.error("Unknown parameters passed to "
+                              "copy_from_remote_to_remote")
+
+        # TODO : add dereference
+        if not dereference:
+            raise NotImplementedError
+
+        if self.has_magic(remotesource):
+            sources = self.glob(remotesource)
+        elif self.path_exists(remotesource):
+            sources = [remotesource]
+        else:
+            sources = []
+        if not sources:
+            if ignore_nonexisting:
+                return
+            raise IOError("The remote path {} does not exist".format(
+                remotesource))
+
+        if transportdestination.isdir(remotedestination):
+            destinations = [os.path.join(remotedestination,
+                                         os.path.split(source.rstrip('/'))[1])
+                            for source in sources]
+        elif len(sources) > 1:
+            raise OSError("Can't copy more than one file or folder in the "
+                          "same destination, which is not a folder")
+        else:
+            destinations = [remotedestination]
+
+        if not overwrite:
+            for destination in destinations:
+                if transportdestination.path_exists(destination):
+                    raise OSError("Destination already exists: not "
+                                  "overwriting it")
+
+        if direct:
+            try:
+                self._exec_scp_to_remote(transportdestination, sources,
+                                         remotedestination)
+                return
+            except IOError as e:
+                self.logger.warning("Unable to copy directly from {} to {}, "
+                                    "streaming the data through this "
+                                    "computer: {}".format(
+                    self._machine, transportdestination._machine, e))
+
+        for source, destination in zip(sources, destinations):
+            if self.isdir(source):
+                self._exec_stream_to_remote(
+                    transportdestination,
+                    'tar -c -h -f - -C {} .'.format(escape_for_bash(source)),
+                    'mkdir -p {0} && tar -x -f - -C {0}'.format(
+                        escape_for_bash(destination)))
+            else:
+                self._exec_stream_to_remote(
+                    transportdestination,
+                    'cat {}'.format(escape_for_bash(source)),
+                    'cat > {}'.format(escape_for_bash(destination)))
+
+    def _exec_stream_to_remote(self, transportdestination, source_command,
+                               destination_command):
+        """
+        Run source_command on this computer, and destination_command on the
+        computer of transportdestination (an open SshTransport), writing the
+        standard output of the first to the standard input of the second.
+
+        The standard error of both commands (and the standard output of the
+        second) is read while streaming, so that a full channel never stalls
+        the commands; only its last _stream_stderr_size bytes are kept. If
+        the destination command stops before the end of the stream, the
+        source command is closed.
+
+        :raise IOError: if one of the commands failed
+        """
+        import select
+        import socket
+
+        src_stdin, _, _, src_channel = self._exec_command_internal(
+            source_command)
+        src_stdin.channel.shutdown_write()
+        dst_stdin, _, _, dst_channel = (
+            transportdestination._exec_command_internal(destination_command))
+
+        src_stderr_text = ''
+        dst_stderr_text = ''
+        pending = ''
+        src_eof = False
+        dst_open = True
+        while dst_open and not (src_eof and not pending):
+            select.select([src_channel, dst_channel], [], [],
+                          self._stream_poll_interval)
+            src_stderr_text = _read_stderr(src_channel, src_stderr_text,
+                                           self._stream_stderr_size)
+            dst_stderr_text = _read_stderr(dst_channel, dst_stderr_text,
+                                           self._stream_stderr_size)
+            _discard_stdout(dst_channel, self._stream_chunk_size)
+
+            if not pending and not src_eof:
+                # Checked before reading, not to miss the last data
+                eof = src_channel.eof_received
+                if src_channel.recv_ready():
+                    pending = src_channel.recv(self._stream_chunk_size)
+                elif eof:
+                    src_eof = True
+
+            if dst_channel.exit_status_ready():
+                dst_open = False
+            elif pending and dst_channel.send_ready():
+                try:
+                    pending = pending[dst_channel.send(pending):]
+                except (socket.error, EOFError):
+                    # The destination command stopped: its error is
+                    # reported below
+                    dst_open = False
+
+        if dst_open:
+            dst_stdin.channel.shutdown_write()
+        else:
+            # Do not read what is left of the source
+            src_channel.close()
+
+        while not (src_channel.exit_status_ready() and
+                   dst_channel.exit_status_ready()):
+            select.select([src_channel, dst_channel], [], [],
+                          self._stream_poll_interval)
+            src_stderr_text = _read_stderr(src_channel, src_stderr_text,
+                                           self._stream_stderr_size)
+            dst_stderr_text = _read_stderr(dst_channel, dst_stderr_text,
+                                           self._stream_stderr_size)
+            _discard_stdout(dst_channel, self._stream_chunk_size)
+        src_stderr_text = _read_stderr(src_channel, src_stderr_text,
+                                       self._stream_stderr_size)
+        dst_stderr_text = _read_stderr(dst_channel, dst_stderr_text,
+                                       self._stream_stderr_size)
+        src_retval = src_channel.recv_exit_status()
+        dst_retval = dst_channel.recv_exit_status()
+
+        if src_retval != 0 or dst_retval != 0:
+            self.logger.error("Problem copying to {}. Exit codes: {} and {}, "
+                              "stderr: '{}' and '{}', commands: '{}' and "
+                              "'{}'".format(transportdestination._machine,
+                                            src_retval, dst_retval,
+                                            src_stderr_text, dst_stderr_text,
+                                            source_command,
+                                            destination_command))
+            raise IOError("Error while copying to {}. Exit codes: {} and {}, "
+                          "stderr: '{}' and '{}'".format(
+                transportdestination._machine, src_retval, dst_retval,
+                src_stderr_text, dst_stderr_text))
+
+    def _exec_scp_to_remote(self, transportdestination, sources,
+                            remotedestination):
+        """
+        Copy the sources to the computer of transportdestination with scp,
+        run on this computer in batch mode (i.e., failing if a password is
+        needed).
+
+        :raise IOError: if the scp execution failed
+        """
+        connect_args = transportdestination._connect_args
+        host = transportdestination._machine
+        if connect_args.get('username'):
+            host = '{}@{}'.format(connect_args['username'], host)
+        port_flag = ''
+        if connect_args.get('port'):
+            port_flag = '-P {}'.format(int(connect_args['port']))
+
+        # The destination is interpreted by the remote shell (so it is
+        # escaped twice), and relative to the home directory
+        destination = os.path.join(transportdestination.getcwd(),
+                                   remotedestination)
+        command = 'scp -B -r -q {} {} {}'.format(
+            port_flag,
+            " ".join(escape_for_bash(source) for source in sources),
+            escape_for_bash('{}:{}'.format(host,
+                                           escape_for_bash(destination))))
+
+        retval, stdout, stderr = self.exec_command_wait(command)
+        if retval != 0:
+            raise IOError("Error while executing scp. Exit code: {}, "
+                          "stderr: '{}', command: '{}'".format(
+                retval, stderr, command))
                 
     def _local_listdir(self,path,pattern=None):
         """
@@ -1417,7 +1832,67 @@ class SshTransport(aiida.transport.Transport):
                 self.sftp.symlink(this_s, this_d)
         else:
             self.sftp.symlink(s,d)
-    
+
+    def copy_and_symlink(self, copy_list, symlink_list):
+        """
+        Copy and symlink many files or folders on the remote machine with a
+        single remote command (a chain of cp and ln commands, stopping at
+        the first failure). Sources with patterns are expanded with glob,
+        so they are processed with copy and symlink, in the same order.
+
+        :param copy_list: a list of tuples (remotesource, remotedestination)
+            to copy (recursively, as copy with dereference=False)
+        :param symlink_list: a list of tuples (remotesource,
+            remotedestination) to symlink
+        :raise IOError: if the execution failed
+        """
+        # paths of symlinks are normalized as in symlink
+        operations = ([(self.copy, 'cp -r -f', src, dst)
+                       for src, dst in copy_list] +
+                      [(self.symlink, 'ln -s', os.path.normpath(src),
+                        os.path.normpath(dst))
+                       for src, dst in symlink_list])
+
+        commands = []
+        for method, shell_command, src, dst in operations:
+            if not src or not dst:
+                raise ValueError("Input to copy_and_symlink() must contain "
+                                 "non empty strings. Found instead {} and "
+                                 "{}".format(src, dst))
+            if self.has_magic(dst):
+                raise ValueError("Pathname patterns are not allowed in the "
+                                 "destination")
+            if self.has_magic(src):
+                self._exec_copy_and_symlink(commands)
+                commands = []
+                method(src, dst)
+            else:
+                commands.append('{} {} {}'.format(
+                    shell_command, escape_for_bash(src),
+                    escape_for_bash(dst)))
+        self._exec_copy_and_symlink(commands)
+
+    def _exec_copy_and_symlink(self, commands):
+        # to simplify writing the above copy_and_symlink function
+        if not commands:
+            return
+
+        command = " && ".join(commands)
+        retval, stdout, stderr = self.exec_command_wait(command)
+
+        if retval == 0:
+            if stderr.strip():
+                self.logger.warning("There was nonempty stderr in the cp "
+                                    "and ln commands: {}".format(stderr))
+        else:
+            self.logger.error("Problem executing cp and ln. Exit code: {}, "
+                              "stdout: '{}', stderr: '{}', command: "
+                              "'{}'".format(retval, stdout, stderr, command))
+            raise IOError("Error while executing cp and ln. Exit code: {}, "
+                          "stdout: '{}', stderr: '{}', "
+                          "command: '{}'".format(retval, stdout, stderr,
+                                                 command))
+
     def path_exists(self,path):
         """
         Check if path exists
@@ -874,6 +874,59 @@ class TestPutGetTree(unittest.TestCase):
             t.chdir('..')
             t.rmtree(directory)
 
+    @run_for_all_plugins
+    def test_copy_and_symlink(self, custom_transport):
+        import os
+        import random
+        import string
+
+        local_dir = os.path.join('/', 'tmp')
+        remote_dir = local_dir
+        directory = 'tmp_try'
+
+        with custom_transport as t:
+            t.chdir(remote_dir)
+
+            while os.path.exists(os.path.join(local_dir, directory)):
+                # I append a random letter/number until it is unique
+                directory += random.choice(
+                    string.ascii_uppercase + string.digits)
+
+            t.mkdir(directory)
+            t.chdir(directory)
+
+            local_base_dir = os.path.join(local_dir, directory, 'local')
+            os.mkdir(local_base_dir)
+
+            text = 'Viva Verdi\n'
+            for filename in ['a.txt', 'b.tmp', 'c.txt']:
+                with open(os.path.join(local_base_dir, filename), 'w') as f:
+                    f.write(text)
+
+            # copies (also with patterns) are done before the symlinks
+            t.mkdir('dest')
+            t.copy_and_symlink(
+                copy_list=[('local', os.path.join('dest', 'copy')),
+                           (os.path.join('local', '*.txt'), 'dest')],
+                symlink_list=[(os.path.join(local_base_dir, 'b.tmp'),
+                               os.path.join('dest', 'copy', 'link'))])
+            self.assertEquals(set(['copy', 'a.txt', 'c.txt']),
+                              set(t.listdir('dest')))
+            self.assertEquals(set(['a.txt', 'b.tmp', 'c.txt', 'link']),
+                              set(t.listdir(os.path.join('dest', 'copy'))))
+            self.assertEquals(os.readlink(os.path.join(
+                local_base_dir, '..', 'dest', 'copy', 'link')),
+                os.path.join(local_base_dir, 'b.tmp'))
+
+            # a failure raises
+            with self.assertRaises((IOError, OSError)):
+                t.copy_and_symlink(copy_list=[('nonexisting', 'dest')],
+                                   symlink_list=[])
+
+            # exit
+            t.chdir('..')
+            t.rmtree(directory)
+
 
     @run_for_all_plugins
     def test_put(self, custom_transport):
@@ -60,5 +60,147 @@ class TestBasicConnection(unittest.TestCase):
         logging.disable(logging.NOTSET)
 
 
+class TestTreeTransfer(unittest.TestCase):
+    """
+    Test the transfer of trees, with tar and file by file.
+    """
+
+    def test_puttree_gettree(self):
+        import os
+        import shutil
+        import tempfile
+
+        local_dir = tempfile.mkdtemp()
+        try:
+            source = os.path.join(local_dir, 'source')
+            os.makedirs(os.path.join(source, 'sub', 'empty'))
+            for i in range(20):
+                with open(os.path.join(source, 'f{}'.format(i)), 'w') as f:
+                    f.write('Viva Verdi\n' * i)
+            with open(os.path.join(source, 'sub', 'g'), 'w') as f:
+                f.write('g')
+
+            for tar_available in [True, False]:
+                with SshTransport(machine='localhost', timeout=30,
+                                  load_system_host_keys=True,
+                                  key_policy='AutoAddPolicy') as t:
+                    t._tar_available = tar_available
+                    remote = os.path.join(local_dir, 'remote_{}'.format(
+                        tar_available))
+                    back = os.path.join(local_dir, 'back_{}'.format(
+                        tar_available))
+                    t.puttree(source, remote)
+                    t.gettree(remote, back)
+
+                for dirpath, dirnames, filenames in os.walk(source):
+                    relpath = os.path.relpath(dirpath, source)
+                    self.assertEquals(
+                        sorted(dirnames + filenames),
+                        sorted(os.listdir(os.path.join(back, relpath))))
+                    for filename in filenames:
+                        with open(os.path.join(dirpath, filename)) as f1:
+                            with open(os.path.join(back, relpath,
+                                                   filename)) as f2:
+                                self.assertEquals(f1.read(), f2.read())
+        finally:
+            shutil.rmtree(local_dir)
+
+
+class TestCopyFromRemoteToRemote(unittest.TestCase):
+    """
+    Test the copy between two ssh transports, streamed through this machine.
+    """
+
+    def test_copy_from_remote_to_remote(self):
+        import os
+        import shutil
+        import tempfile
+
+        local_dir = tempfile.mkdtemp()
+        try:
+            source = os.path.join(local_dir, 'source')
+            os.makedirs(os.path.join(source, 'sub'))
+            with open(os.path.join(source, 'a.txt'), 'w') as f:
+                f.write('Viva Verdi\n')
+            with open(os.path.join(source, 'sub', 'b.txt'), 'w') as f:
+                f.write('Viva Verdi\n' * 1000)
+
+            params = dict(machine='localhost', timeout=30,
+                          load_system_host_keys=True,
+                          key_policy='AutoAddPolicy')
+            with SshTransport(**params) as t1:
+                with SshTransport(**params) as t2:
+                    t1.chdir(local_dir)
+                    t2.chdir(local_dir)
+                    # A folder, into a new folder
+                    t1.copy_from_remote_to_remote(t2, 'source', 'dest')
+                    self.assertEquals(set(os.listdir(os.path.join(
+                        local_dir, 'dest'))), set(['a.txt', 'sub']))
+                    # A file, into an existing folder
+                    t1.copy_from_remote_to_remote(
+                        t2, os.path.join('source', 'sub', 'b.txt'), 'dest')
+                    with open(os.path.join(local_dir, 'dest', 'b.txt')) as f:
+                        self.assertEquals(f.read(), 'Viva Verdi\n' * 1000)
+                    with self.assertRaises(IOError):
+                        t1.copy_from_remote_to_remote(t2, 'nonexisting',
+                                                      'dest')
+        finally:
+            shutil.rmtree(local_dir)
+
+
+
+class TestRmtrees(unittest.TestCase):
+    """
+    Test the removal of many paths, with one rm command for each batch.
+    """
+
+    def test_rmtrees(self):
+        import os
+        import shutil
+        import tempfile
+
+        local_dir = tempfile.mkdtemp()
+        try:
+            paths = []
+            for i in range(5):
+                path = os.path.join(local_dir, 'folder {}'.format(i))
+                os.makedirs(os.path.join(path, 'sub'))
+                with open(os.path.join(path, 'sub', 'a.txt'), 'w') as f:
+                    f.write('Viva Verdi\n')
+                paths.append(path)
+            # Not existing paths are not an error
+            paths.append(os.path.join(local_dir, 'nonexisting'))
+
+            commands = []
+            with SshTransport(machine='localhost', timeout=30,
+                              load_system_host_keys=True,
+                              key_policy='AutoAddPolicy') as t:
+                t._rmtrees_batch_size = 2
+                exec_command_wait = t.exec_command_wait
+
+                def counting_exec_command_wait(command):
+                    commands.append(command)
+                    return exec_command_wait(command)
+
+                t.exec_command_wait = counting_exec_command_wait
+                results = t.rmtrees(paths[:3])
+                self.assertEquals(results, {path: None for path in paths[:3]})
+                self.assertEquals(len(commands), 2)
+                self.assertEquals(sorted(os.listdir(local_dir)),
+                                  ['folder 3', 'folder 4'])
+
+                # If a command fails, the paths still existing are reported
+                t.exec_command_wait = lambda command: (1, '', 'Error')
+                results = t.rmtrees(paths[3:])
+                self.assertIsNone(results[paths[5]])
+                for path in paths[3:5]:
+                    self.assertIn('Error', results[path])
+
+                with self.assertRaises(ValueError):
+                    t.rmtrees([''])
+        finally:
+            shutil.rmtree(local_dir)
+
+
 if __name__ == '__main__': 
     unittest.main()
@@ -5,6 +5,16 @@ __license__ = "MIT license, see LICENSE.txt file."
 __authors__ = "The AiiDA team."
 __version__ = "0.7.1"
 
+import json
+import logging
+import os
+import Queue
+import sys
+import threading
+import time
+import traceback
+
+
 def get_dblogger_extra(obj):
     """
     Given an object (Node, Calculation, ...) return a dictionary to be passed
@@ -22,3 +32,209 @@ def get_dblogger_extra(obj):
         objname = obj.__class__.__module__ + "." + obj.__class__.__name__
     objpk = obj.pk
     return {'objpk': objpk, 'objname': objname}
+
+
+class BufferedDBLogHandler(logging.Handler):
+    """
+    Base class of the handlers storing the log records in the DbLog table.
+
+    Records without objpk and objname (see get_dblogger_extra) are ignored.
+    The others are converted to rows when they are emitted and put in a
+    bounded queue. A background thread takes the rows from the queue and
+    stores them with multi-row inserts, as soon as batch_size rows are
+    waiting or at most flush_interval seconds after the first one.
+
+    When the queue is full, emit either blocks until there is room
+    (overflow='block') or discards the record (overflow='drop'); the
+    number of discarded records is printed on stderr.
+
+    flush() waits until all the records emitted so far are stored. It is
+    also called when the handler is closed, which the logging module does
+    for all the handlers when the interpreter exits.
+
+    Subclasses implement _store_rows for their backend.
+    """
+
+    # Default maximum time (in seconds) that flush waits for
+    flush_timeout = 60.
+
+    def __init__(self, level=logging.NOTSET, queue_size=None,
+                 flush_interval=None, overflow=None, batch_size=500):
+        from aiida.common.setup import get_property
+
+        logging.Handler.__init__(self, level)
+
+        if queue_size is None:
+            queue_size = get_property('logging.db_log_queue_size')
+        if flush_interval is None:
+            flush_interval = get_property('logging.db_log_flush_interval')
+        if overflow is None:
+            overflow = get_property('logging.db_log_overflow')
+        if overflow not in ('block', 'drop'):
+            raise ValueError("overflow must be either 'block' or 'drop'")
+
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.batch_size = batch_size
+
+        self._worker_lock = threading.Lock()
+        self._queue = None
+        self._worker = None
+        self._pid = None
+        self._dropped = 0
+
+    def _get_row(self, record):
+        """
+        Return the row of the DbLog table for a record, or None if the record
+        is not to be stored.
+        """
+        from aiida.utils import timezone
+
+        objpk = record.__dict__.get('objpk', None)
+        objname = record.__dict__.get('objname', None)
+
+        # Filter: Do not store in DB if no objpk and objname is given
+        if objpk is None or objname is None:
+            return None
+
+        return {'time': timezone.now(),
+                'loggername': record.name,
+                'levelname': record.levelname,
+                'objname': objname,
+                'objpk': objpk,
+                'message': record.getMessage(),
+                'metadata': json.dumps(record.__dict__)}
+
+    def _ensure_worker(self):
+        """
+        Start the background thread, if it is not running in this process
+        (e.g. after a fork, which only keeps the calling thread).
+        """
+        if self._pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._pid != os.getpid():
+                self._queue = Queue.Queue(self.queue_size)
+                self._dropped = 0
+            elif self._worker.is_alive():
+                return
+            self._pid = os.getpid()
+            self._worker = threading.Thread(target=self._run,
+                                            name="BufferedDBLogHandler")
+            self._worker.daemon = True
+            self._worker.start()
+
+    def emit(self, record):
+        try:
+            row = self._get_row(record)
+        except Exception:
+            # To avoid loops with the error handler, I just print.
+            # Hopefully, though, this should not happen!
+            traceback.print_exc()
+            return
+
+        if row is None:
+            return
+
+        self._ensure_worker()
+        if self.overflow == 'drop':
+            try:
+                self._queue.put_nowait(row)
+            except Queue.Full:
+                with self._worker_lock:
+                    self._dropped += 1
+        else:
+            self._queue.put(row)
+
+    def _run(self):
+        """
+        Main loop of the background thread.
+        """
+        rows = []
+        deadline = None
+        try:
+            while True:
+                if deadline is None:
+                    timeout = None
+                else:
+                    timeout = max(deadline - time.time(), 0.)
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except Queue.Empty:
+                    item = None
+
+                if isinstance(item, dict):
+                    rows.append(item)
+                    if deadline is None:
+                        deadline = time.time() + self.flush_interval
+                    if len(rows) < self.batch_size:
+                        continue
+                    flush_request = None
+                else:
+                    # None if the time of the batch is over, otherwise the
+                    # event of a flush request
+                    flush_request = item
+
+                self._write(rows)
+                rows = []
+                deadline = None
+                if flush_request is not None:
+                    flush_request.set()
+        finally:
+            self._worker_finished()
+
+    def _write(self, rows):
+        """
+        Store the rows, reporting the errors and the discarded records on
+        stderr (logging them could cause loops).
+        """
+        if self._dropped:
+            with self._worker_lock:
+                dropped, self._dropped = self._dropped, 0
+            print >> sys.stderr, ("{} log records were discarded, the queue "
+                                  "of the DbLog handler was full".format(
+                dropped))
+        if not rows:
+            return
+        try:
+            self._store_rows(rows)
+        except Exception:
+            traceback.print_exc()
+
+    def _store_rows(self, rows):
+        """
+        Store rows in the DbLog table, with a multi-row insert.
+
+        :param rows: a list of dictionaries with the values of the columns
+          time, loggername, levelname, objname, objpk, message and metadata
+          (a json string)
+        """
+        raise NotImplementedError
+
+    def _worker_finished(self):
+        """
+        Called in the background thread before it exits, e.g. to release
+        its database connection.
+        """
+        pass
+
+    def flush(self, timeout=None):
+        """
+        Wait until all the records emitted so far by this process are stored.
+
+        :param timeout: the maximum time to wait, in seconds. By default
+          flush_timeout, so that the interpreter can exit even if the
+          database does not respond.
+        """
+        if self._pid != os.getpid() or not self._worker.is_alive():
+            return
+        if timeout is None:
+            timeout = self.flush_timeout
+        event = threading.Event()
+        self._queue.put(event)
+        event.wait(timeout)
+
+    def close(self):
+        self.flush()
+        logging.Handler.close(self)
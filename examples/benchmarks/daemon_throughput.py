@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the throughput of the daemon pipeline: submission, update of
+the calculations with the scheduler, retrieval and parsing (see
+aiida.daemon.execmanager).
+
+Trivial calculations (running /bin/true with the templatereplacer plugin)
+are created on a dedicated computer, that uses the local transport and the
+direct scheduler, so that no queue and no network are involved; the same
+functions run by the daemon tasks are then called in turn until all the
+calculations created by the benchmark are finished, or for at most a
+maximum duration. For each stage, the time spent, the number of
+calculations handled and the mean time per calculation are reported,
+together with the overall number of calculations per minute, and the
+calculations still pending at the end, if any. Only the calculations
+created by the benchmark are counted, not the ones left on the computer by
+previous runs.
+
+The benchmark needs a configured profile, and stores its calculations in
+its database.
+
+Usage: python daemon_throughput.py [number of calculations] [max seconds]
+"""
+import sys
+import tempfile
+import time
+
+from aiida.backends.utils import load_dbenv, is_dbenv_loaded
+
+__copyright__ = u"Copyright (c), This file is part of the AiiDA platform. For further information please visit http://www.aiida.net/. All rights reserved."
+__license__ = "MIT license, see LICENSE.txt file."
+__authors__ = "The AiiDA team."
+__version__ = "0.7.1"
+
+COMPUTER_NAME = 'benchmark-direct'
+
+# Pause (in seconds) when no calculation moved on, e.g. while the jobs run
+POLL_INTERVAL = 0.1
+
+# Default maximum duration (in seconds) of the pipeline
+MAX_DURATION = 3600
+
+
+def get_computer():
+    """
+    Return the benchmark computer, creating and configuring it (for the
+    current user) if needed.
+    """
+    from aiida.orm import Computer
+    from aiida.common.exceptions import NotExistent
+
+    try:
+        computer = Computer.get(COMPUTER_NAME)
+    except NotExistent:
+        computer = Computer(name=COMPUTER_NAME,
+                            hostname='localhost',
+                            description="Computer of the daemon benchmark",
+                            transport_type='local',
+                            scheduler_type='direct',
+                            workdir=tempfile.mkdtemp(
+                                prefix='aiida-benchmark-'))
+        computer.store()
+    configure_computer(computer)
+    return computer
+
+
+def configure_computer(computer):
+    from aiida.backends.settings import BACKEND
+    from aiida.backends.profile import BACKEND_DJANGO, BACKEND_SQLA
+    from aiida.backends.utils import get_automatic_user, get_authinfo
+    from aiida.common.exceptions import AuthenticationError
+
+    user = get_automatic_user()
+    try:
+        get_authinfo(computer.dbcomputer, user)
+        return
+    except AuthenticationError:
+        pass
+
+    if BACKEND == BACKEND_DJANGO:
+        from aiida.backends.djsite.db.models import DbAuthInfo
+    elif BACKEND == BACKEND_SQLA:
+        from aiida.backends.sqlalchemy.models.authinfo import DbAuthInfo
+    else:
+        raise Exception("Unknown backend {}".format(BACKEND))
+
+    authinfo = DbAuthInfo(dbcomputer=computer.dbcomputer, aiidauser=user)
+    authinfo.set_auth_params({})
+    authinfo.save()
+
+
+def create_calculations(computer, num_calcs):
+    """
+    Create num_calcs calculations of /bin/true on the computer, and put
+    them in the TOSUBMIT state.
+
+    :return: the list of the pks of the calculations
+    """
+    from aiida.orm import Code, DataFactory
+
+    ParameterData = DataFactory('parameter')
+
+    code = Code(remote_computer_exec=(computer, '/bin/true'))
+    code.label = 'benchmark-true'
+    code.set_input_plugin_name('simpleplugins.templatereplacer')
+    code.store()
+
+    template = ParameterData(dict={}).store()
+    pks = []
+    for _ in range(num_calcs):
+        calc = code.new_calc()
+        calc.set_resources({"num_machines": 1,
+                            "num_mpiprocs_per_machine": 1})
+        calc.set_withmpi(False)
+        calc.add_link_from(template, label='template')
+        calc.store_all()
+        calc.submit()
+        pks.append(calc.pk)
+    return pks
+
+
+def count_calculations(pks, state):
+    """
+    Return the number of calculations among the ones with the given pks that
+    are in the given state.
+    """
+    from aiida.orm.calculation.job import JobCalculation
+    from aiida.orm.querybuilder import QueryBuilder
+
+    qb = QueryBuilder()
+    qb.append(JobCalculation, filters={'id': {'in': pks},
+                                       'state': {'==': state}})
+    return qb.count()
+
+
+def run_pipeline(pks, max_duration=MAX_DURATION):
+    """
+    Run the stages of the daemon until none of the calculations with the
+    given pks is left to submit, update or retrieve, or for at most
+    max_duration seconds.
+
+    :return: a list of tuples (stage name, elapsed time, number of
+        calculations handled), the total elapsed time, and a dictionary with
+        the number of calculations still pending in each state (empty if
+        all the calculations are finished)
+    """
+    from aiida.common.datastructures import calc_states
+    from aiida.daemon.execmanager import (
+        submit_jobs, update_jobs, retrieve_jobs)
+
+    # Each stage takes the calculations out of a state
+    stages = [
+        ('submit', submit_jobs, calc_states.TOSUBMIT),
+        ('update', update_jobs, calc_states.WITHSCHEDULER),
+        ('retrieve and parse', retrieve_jobs, calc_states.COMPUTED),
+    ]
+    times = dict((name, 0.) for name, _, _ in stages)
+    handled = dict((name, 0) for name, _, _ in stages)
+
+    start = time.time()
+    while True:
+        pending = {}
+        moved = 0
+        for name, function, state in stages:
+            before = count_calculations(pks, state)
+            stage_start = time.time()
+            function()
+            times[name] += time.time() - stage_start
+            left = count_calculations(pks, state)
+            handled[name] += max(before - left, 0)
+            moved += max(before - left, 0)
+            if left:
+                pending[state] = left
+        if not pending or time.time() - start > max_duration:
+            break
+        if not moved:
+            time.sleep(POLL_INTERVAL)
+    total = time.time() - start
+
+    return ([(name, times[name], handled[name]) for name, _, _ in stages],
+            total, pending)
+
+
+if __name__ == "__main__":
+    num_calcs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    max_duration = float(sys.argv[2]) if len(sys.argv) > 2 else MAX_DURATION
+
+    if not is_dbenv_loaded():
+        load_dbenv()
+
+    computer = get_computer()
+
+    start = time.time()
+    pks = create_calculations(computer, num_calcs)
+    print "created {} calculations in {:.3f} s".format(
+        num_calcs, time.time() - start)
+
+    stages, total, pending = run_pipeline(pks, max_duration)
+    for name, elapsed, count in stages:
+        print "{:<20} {:6d} calcs {:9.3f} s {:9.3f} ms/calc".format(
+            name, count, elapsed, 1000. * elapsed / count if count else 0.)
+    # The calculations that went through the whole pipeline
+    finished = stages[-1][2]
+    print "total {:.3f} s, {:.1f} calculations per minute".format(
+        total, 60. * finished / total)
+    if pending:
+        print "stopped after {:.0f} s, calculations still pending: {}".format(
+            total, ", ".join("{} {}".format(count, state)
+                                    for state, count in pending.iteritems()))
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the band gap analysis of BandsData nodes: the legacy scalar
+implementation, the vectorized find_bandgap called on each node, and the
+batch find_bandgaps.
+
+Usage: verdi run find_bandgap.py [number of nodes]
+"""
+import sys
+import time
+
+import numpy
+
+from aiida.backends.utils import load_dbenv, is_dbenv_loaded
+
+__copyright__ = u"Copyright (c), This file is part of the AiiDA platform. For further information please visit http://www.aiida.net/. All rights reserved."
+__license__ = "MIT license, see LICENSE.txt file."
+__authors__ = "The AiiDA team."
+__version__ = "0.7.1"
+
+if not is_dbenv_loaded():
+    load_dbenv()
+
+from aiida.orm import DataFactory
+from aiida.orm.data.array.bands import find_bandgap, find_bandgaps
+
+BandsData = DataFactory('array.bands')
+
+NUM_KPOINTS = 100
+NUM_BANDS = 20
+NUM_ELECTRONS = 16
+
+
+def legacy_find_bandgap(bandsdata, number_electrons=None, fermi_energy=None):
+    """
+    The implementation of find_bandgap before vectorization, kept as a
+    reference.
+    """
+
+    def nint(num):
+        """
+        Stable rounding function
+        """
+        if (num > 0):
+            return int(num + .5)
+        else:
+            return int(num - .5)
+
+    if fermi_energy and number_electrons:
+        raise ValueError("Specify either the number of electrons or the "
+                         "Fermi energy, but not both")
+
+    try:
+        stored_bands = bandsdata.get_bands()
+    except KeyError:
+        raise KeyError("Cannot do much of a band analysis without bands")
+
+    if len(stored_bands.shape) == 3:
+        # I write the algorithm for the generic case of having both the
+        # spin up and spin down array
+
+        # put all spins on one band per kpoint
+        bands = numpy.concatenate([_ for _ in stored_bands], axis=1)
+    else:
+        bands = stored_bands
+
+    # analysis on occupations:
+    if fermi_energy is None:
+
+        num_kpoints = len(bands)
+
+        if number_electrons is None:
+            try:
+                _, stored_occupations = bandsdata.get_bands(also_occupations=True)
+            except KeyError:
+                raise KeyError("Cannot determine metallicity if I don't have "
+                               "either fermi energy, or occupations")
+
+            # put the occupations in the same order of bands, also in case of multiple bands
+            if len(stored_occupations.shape) == 3:
+                # I write the algorithm for the generic case of having both the
+                # spin up and spin down array
+
+                # put all spins on one band per kpoint
+                occupations = numpy.concatenate([_ for _ in stored_occupations], axis=1)
+            else:
+                occupations = stored_occupations
+
+            # now sort the bands by energy
+            # Note: I am sort of assuming that I have an electronic ground state
+
+            # sort the bands by energy, and reorder the occupations accordingly
+            # since after joining the two spins, I might have unsorted stuff
+            bands, occupations = [numpy.array(y) for y in zip(*[zip(*j) for j in
+                                                                [sorted(zip(i[0].tolist(), i[1].tolist()),
+                                                                        key=lambda x: x[0])
+                                                                 for i in zip(bands, occupations)]])]
+            number_electrons = int(round(sum([sum(i) for i in occupations]) / num_kpoints))
+
+            homo_indexes = [numpy.where(numpy.array([nint(_) for _ in x]) > 0)[0][-1] for x in occupations]
+            if len(set(homo_indexes)) > 1:  # there must be intersections of valence and conduction bands
+                return False, None
+            else:
+                homo = [_[0][_[1]] for _ in zip(bands, homo_indexes)]
+                try:
+                    lumo = [_[0][_[1] + 1] for _ in zip(bands, homo_indexes)]
+                except IndexError:
+                    raise ValueError("To understand if it is a metal or insulator, "
+                                     "need more bands than n_band=number_electrons")
+
+        else:
+            bands = numpy.sort(bands)
+            number_electrons = int(number_electrons)
+
+            # find the zero-temperature occupation per band (1 for spin-polarized
+            # calculation, 2 otherwise)
+            number_electrons_per_band = 4 - len(stored_bands.shape)  # 1 or 2
+            # gather the energies of the homo band, for every kpoint
+            homo = [i[number_electrons / number_electrons_per_band - 1] for i in bands]  # take the nth level
+            try:
+                # gather the energies of the lumo band, for every kpoint
+                lumo = [i[number_electrons / number_electrons_per_band] for i in bands]  # take the n+1th level
+            except IndexError:
+                raise ValueError("To understand if it is a metal or insulator, "
+                                 "need more bands than n_band=number_electrons")
+
+        if number_electrons % 2 == 1 and len(stored_bands.shape) == 2:
+            # if #electrons is odd and we have a non spin polarized calculation
+            # it must be a metal and I don't need further checks
+            return False, None
+
+        # if the nth band crosses the (n+1)th, it is an insulator
+        gap = min(lumo) - max(homo)
+        if gap == 0.:
+            return False, 0.
+        elif gap < 0.:
+            return False, None
+        else:
+            return True, gap
+
+    # analysis on the fermi energy
+    else:
+        # reorganize the bands, rather than per kpoint, per energy level
+
+        # I need the bands sorted by energy
+        bands.sort()
+
+        levels = bands.transpose()
+        max_mins = [(max(i), min(i)) for i in levels]
+
+        if fermi_energy > bands.max():
+            raise ValueError("The Fermi energy is above all band energies, "
+                             "don't know what to do")
+        if fermi_energy < bands.min():
+            raise ValueError("The Fermi energy is below all band energies, "
+                             "don't know what to do.")
+
+        # one band is crossed by the fermi energy
+        if any(i[1] < fermi_energy and fermi_energy < i[0] for i in max_mins):
+            return False, None
+
+        # case of semimetals, fermi energy at the crossing of two bands
+        # this will only work if the dirac point is computed!
+        elif (any(i[0] == fermi_energy for i in max_mins) and
+                  any(i[1] == fermi_energy for i in max_mins)):
+            return False, 0.
+        # insulating case
+        else:
+            # take the max of the band maxima below the fermi energy
+            homo = max([i[0] for i in max_mins if i[0] < fermi_energy])
+            # take the min of the band minima above the fermi energy
+            lumo = min([i[1] for i in max_mins if i[1] > fermi_energy])
+            gap = lumo - homo
+            if gap <= 0.:
+                raise Exception("Something wrong has been implemented. "
+                                "Revise the code!")
+            return True, gap
+
+
+def create_bands(num_nodes, seed=0):
+    """
+    Creates num_nodes stored BandsData with random bands, half of them
+    spin-polarized, and zero-temperature occupations.
+    """
+    rng = numpy.random.RandomState(seed)
+    nodes = []
+    for i in range(num_nodes):
+        if i % 2:
+            shape = (2, NUM_KPOINTS, NUM_BANDS)
+            occupation = 1.
+        else:
+            shape = (NUM_KPOINTS, NUM_BANDS)
+            occupation = 2.
+        bands = numpy.sort(rng.normal(size=shape), axis=-1)
+        bands += numpy.arange(NUM_BANDS) * rng.uniform(0., 2.)
+        occupations = numpy.zeros(shape)
+        occupations[..., :NUM_ELECTRONS // 2] = occupation
+
+        node = BandsData()
+        node.set_kpoints(rng.uniform(size=(NUM_KPOINTS, 3)))
+        node.set_bands(bands, occupations=occupations)
+        node.store()
+        nodes.append(node)
+    return nodes
+
+
+def timeit(label, function):
+    start = time.time()
+    result = function()
+    print "{:<40} {:8.3f} s".format(label, time.time() - start)
+    return result
+
+
+if __name__ == "__main__":
+    num_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    nodes = timeit("Creating {} BandsData".format(num_nodes),
+                   lambda: create_bands(num_nodes))
+
+    for mode, kwargs_list in [
+            ('occupations', [{}] * num_nodes),
+            ('number of electrons',
+             [{'number_electrons': NUM_ELECTRONS}] * num_nodes),
+            ('Fermi energy', [{'fermi_energy': 0.}] * num_nodes)]:
+        print "Band gap from the {}".format(mode)
+        for node in nodes:
+            node.clear_internal_cache()
+        legacy = timeit("  legacy find_bandgap",
+                        lambda: [legacy_find_bandgap(n, **k) for n, k in
+                                 zip(nodes, kwargs_list)])
+        for node in nodes:
+            node.clear_internal_cache()
+        single = timeit("  find_bandgap",
+                        lambda: [find_bandgap(n, **k) for n, k in
+                                 zip(nodes, kwargs_list)])
+        batch_kwargs = {}
+        for key in kwargs_list[0]:
+            batch_kwargs[key] = [k[key] for k in kwargs_list]
+        batch = timeit("  find_bandgaps",
+                       lambda: find_bandgaps(nodes, **batch_kwargs))
+        if not legacy == single == batch:
+            print "  Warning: the results differ!"
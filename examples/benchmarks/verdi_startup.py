@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the startup time of verdi, for commands that should not need
+the database: the help, the completion of the commands and of the
+subcommands.
+
+Cold runs start without the cached manifest of the commands (so that all
+the command modules are imported to rebuild it), warm runs with it.
+
+Usage: python verdi_startup.py [number of repetitions]
+"""
+import os
+import subprocess
+import sys
+import time
+
+__copyright__ = u"Copyright (c), This file is part of the AiiDA platform. For further information please visit http://www.aiida.net/. All rights reserved."
+__license__ = "MIT license, see LICENSE.txt file."
+__authors__ = "The AiiDA team."
+__version__ = "0.7.1"
+
+COMMANDS = [
+    ['help'],
+    ['completion', '1', 'verdi', ''],
+    ['completion', '2', 'verdi', 'calculation', ''],
+]
+
+
+def get_manifest_file():
+    from aiida.common.setup import AIIDA_CONFIG_FOLDER
+    from aiida.cmdline.verdilib import COMMANDS_MANIFEST_FNAME
+
+    return os.path.join(os.path.expanduser(AIIDA_CONFIG_FOLDER),
+                        COMMANDS_MANIFEST_FNAME)
+
+
+def run_verdi(args):
+    """
+    Run verdi with the given arguments, and return the elapsed time.
+    """
+    start = time.time()
+    with open(os.devnull, 'w') as devnull:
+        subprocess.call([sys.executable, '-c',
+                         'from aiida.cmdline.verdilib import run; run()',
+                         'verdi'] + args,
+                        stdout=devnull, stderr=devnull)
+    return time.time() - start
+
+
+def clear_manifest(manifest_file):
+    try:
+        os.remove(manifest_file)
+    except OSError:
+        pass
+
+
+if __name__ == "__main__":
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    manifest_file = get_manifest_file()
+
+    for args in COMMANDS:
+        cold = []
+        warm = []
+        for _ in range(repetitions):
+            clear_manifest(manifest_file)
+            cold.append(run_verdi(args))
+            warm.append(run_verdi(args))
+        print "verdi {:<35} cold {:6.3f} s   warm {:6.3f} s".format(
+            " ".join(args), min(cold), min(warm))
@@ -50,7 +50,6 @@ extras_require={
         'flask-marshmallow==0.7.0',
         'itsdangerous==0.24',
         'flask-httpauth==3.2.0',
-        'flask-cache==0.13.1',
         'python-memcached==1.58',
     ],
 }